@@ -0,0 +1,7 @@
+import QtQuick 2.15
+import Friture 1.0
+
+// the ring of spectrogram columns, scrolled by the scene graph
+SpectrogramItem {
+    clip: true
+}
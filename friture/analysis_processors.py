@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""DSP of the heavy docks, separated from their widgets so that it can run
+either in the GUI process or in an analysis worker process.
+
+The processors are pickled to be sent to the workers, so they only hold
+numpy arrays and plain Python objects."""
+
+from abc import ABC, abstractmethod
+
+import numpy
+from numpy import concatenate, zeros
+
+from friture.audioproc import audioproc
+from friture.filter import NOCTAVE
+from friture.octavefilters import Octave_Filters
+from friture.ringbuffer import RingBuffer
+from friture.signal.correlation import generalized_cross_correlation
+from friture.signal.decimate import decimate_multiple, decimate_multiple_filtic
+
+
+class AnalysisProcessor(ABC):
+    '''Base class of the processors.
+
+    A worker reads the samples in windows of `window` samples, every `hop` samples.'''
+
+    window = 1
+    hop = 1
+
+    @abstractmethod
+    def process_frames(self, frames):
+        '''Process a (channels, frames, window) array, return a result or None.'''
+
+    def merge(self, results):
+        '''Combine the results of several calls, only the last one by default.'''
+        return results[-1]
+
+
+class StreamProcessor(AnalysisProcessor):
+    '''Base class of the processors of the contiguous stream of samples,
+    read as single-sample windows.'''
+
+    @abstractmethod
+    def process(self, floatdata):
+        '''Process a (channels, samples) block, return a result or None.'''
+
+    def process_frames(self, frames):
+        # consecutive single-sample windows are the contiguous stream
+        return self.process(frames[:, :, 0])
+
+
+class STFTProcessor(AnalysisProcessor):
+    '''Power spectra of overlapping frames, like the STFT service.'''
+
+    def __init__(self, channels, fft_size, hop, samplerate):
+        self.channels = channels
+        self.window = fft_size
+        self.hop = hop
+
+        self.proc = audioproc()
+        self.proc.set_samplerate(samplerate)
+        self.proc.set_fftsize(fft_size)
+
+    def get_freq_scale(self):
+        return self.proc.get_freq_scale()
+
+    def get_freq_weighting(self):
+        return self.proc.get_freq_weighting()
+
+    def process_frames(self, frames):
+        if self.channels is not None:
+            if max(self.channels) >= frames.shape[0]:
+                # the channels are not available in the buffer
+                return None
+            frames = frames[list(self.channels)]
+
+        # the spectra array is reused by the next batch
+        return self.proc.analyze_frames(frames).copy()
+
+    def merge(self, results):
+        # all the frames are needed, in order
+        return concatenate(results, axis=2)
+
+
+class OctaveSpectrumProcessor(StreamProcessor):
+    '''Smoothed energies of the fractional-octave bands, (bands, channels).'''
+
+    def __init__(self, bandsperoctave, samplerate, response_time):
+        self.samplerate = samplerate
+        self.filters = Octave_Filters(bandsperoctave, samplerate)
+
+        # smoothed band energies, (bands, channels)
+        self.dispbuffers = zeros((self.filters.nbands, 0))
+
+        # set the parameters of the smoothing filters
+        self.setresponsetime(response_time)
+
+    def setresponsetime(self, response_time):
+        # time = SMOOTH_DISPLAY_TIMER_PERIOD_MS/1000. #DISPLAY
+        # time = 0.025 #IMPULSE setting for a sound level meter
+        # time = 0.125 #FAST setting for a sound level meter
+        # time = 1. #SLOW setting for a sound level meter
+        self.response_time = response_time
+
+        # an exponential smoothing filter is a simple IIR filter
+        # s_i = alpha*x_i + (1-alpha)*s_{i-1}
+        # we compute alpha so that the N most recent samples represent 100*w percent of the output
+        w = 0.65
+        decs = self.filters.get_decs()
+        ns = [self.response_time * self.samplerate / dec for dec in decs]
+        self.alphas = numpy.array([1. - (1. - w) ** (1. / (n + 1)) for n in ns])
+
+    def setbandsperoctave(self, bandsperoctave):
+        self.filters.setbandsperoctave(bandsperoctave)
+        # recreate the ring buffers
+        self.dispbuffers = zeros((bandsperoctave * NOCTAVE, 0))
+        # reset the parameters of the smoothing filters
+        self.setresponsetime(self.response_time)
+
+    def setsamplerate(self, samplerate):
+        # the band frequencies and the smoothing depend on the sample rate
+        self.samplerate = samplerate
+        self.filters.setsamplerate(samplerate)
+        self.dispbuffers = zeros((self.filters.nbands, 0))
+        self.setresponsetime(self.response_time)
+
+    def process(self, floatdata):
+        # the behaviour of the filters functions is sometimes
+        # unexpected when they are called on empty arrays
+        if floatdata.shape[1] == 0:
+            return None
+
+        nchannels = floatdata.shape[0]
+        if self.dispbuffers.shape[1] != nchannels:
+            self.dispbuffers = zeros((self.filters.nbands, nchannels))
+
+        # the bands of each octave are filtered and their energies smoothed in place,
+        # for all the channels at once, by a single kernel call
+        self.filters.smoothed_energies(floatdata, self.alphas, self.dispbuffers)
+
+        return self.dispbuffers
+
+
+class DelayEstimatorProcessor(StreamProcessor):
+    '''Delay between the first two channels, from the cross-correlation of their subsampled signals.
+
+    The result is a (delay_ms, distance_m, correlation, Xcorr_extremum) tuple.'''
+
+    def __init__(self, delayrange_s, samplerate):
+        self.delayrange_s = delayrange_s
+
+        # We will decimate several times
+        # no decimation => 1/fs = 23 µs resolution
+        # 1 ms resolution => fs = 1000 Hz is enough => can divide the sampling rate by 44 !
+        # if I decimate 2 times (2**2 = 4 => 0.092 ms (3 cm) resolution)!
+        # if I decimate 3 times (2**3 = 8 => 0.184 ms (6 cm) resolution)!
+        # if I decimate 4 times (2**4 = 16 => 0.368 ms (12 cm) resolution)!
+        # if I decimate 5 times (2**5 = 32 => 0.7 ms (24 cm) resolution)!
+        # (actually, I could fit a gaussian on the cross-correlation peak to get
+        # higher resolution even at low sample rates)
+        self.Ndec = 2
+
+        self.subsampled_sampling_rate = samplerate / 2 ** (self.Ndec)
+        self.zfs0 = decimate_multiple_filtic(self.Ndec)
+        self.zfs1 = decimate_multiple_filtic(self.Ndec)
+
+        # ringbuffer for the subsampled data of the two channels,
+        # read with a cursor of half-overlapping windows
+        time = 2 * self.delayrange_s
+        length = time * self.subsampled_sampling_rate
+        overlap = 0.5
+        self.ringbuffer = RingBuffer()
+        self.reader = self.ringbuffer.add_reader(int(length), int(overlap * length))
+
+        self.old_Xcorr = None
+
+        self.delay_ms = 0.
+        self.distance_m = 0.
+        self.correlation = 0.
+        self.Xcorr_extremum = 0.
+
+    def process(self, floatdata):
+        if floatdata.shape[0] < 2 or floatdata.shape[1] == 0:
+            return None
+
+        # separate the channels
+        x0 = floatdata[0, :]
+        x1 = floatdata[1, :]
+        # subsample them
+        x0_dec, self.zfs0 = decimate_multiple(self.Ndec, x0, self.zfs0)
+        x1_dec, self.zfs1 = decimate_multiple(self.Ndec, x1, self.zfs1)
+        # push to the ring buffer of the subsampled data
+        self.ringbuffer.push(numpy.vstack((x0_dec, x1_dec)))
+
+        time = 2 * self.delayrange_s
+
+        windows = self.reader.windows()
+
+        if windows.shape[1] == 0:
+            return None
+
+        for k in range(windows.shape[1]):
+            d0 = windows[0, k]
+            d1 = windows[1, k]
+            std0 = numpy.std(d0)
+            std1 = numpy.std(d1)
+            if std0 > 0. and std1 > 0.:
+                Xcorr = generalized_cross_correlation(d0, d1)
+
+                if self.old_Xcorr is not None and self.old_Xcorr.shape == Xcorr.shape:
+                    # smoothing
+                    alpha = 0.3
+                    smoothed_Xcorr = alpha * Xcorr + (1. - alpha) * self.old_Xcorr
+                else:
+                    smoothed_Xcorr = Xcorr
+
+                absXcorr = numpy.abs(smoothed_Xcorr)
+                i = numpy.argmax(absXcorr)
+
+                # normalize
+                # Xcorr_max_norm = Xcorr_unweighted[i]/(d0.size*std0*std1)
+                self.Xcorr_extremum = smoothed_Xcorr[i]
+                Xcorr_max_norm = abs(smoothed_Xcorr[i]) / (3 * numpy.std(smoothed_Xcorr))
+                self.delay_ms = 1e3 * float(i) / self.subsampled_sampling_rate
+
+                # delays larger than the half of the window most likely are actually negative
+                if self.delay_ms > 1e3 * time / 2.:
+                    self.delay_ms -= 1e3 * time
+
+                # store for smoothing
+                self.old_Xcorr = smoothed_Xcorr
+            else:
+                self.delay_ms = 0.
+                Xcorr_max_norm = 0.
+                self.Xcorr_extremum = 0.
+
+            c = 340.  # speed of sound, in meters per second (approximate)
+            self.distance_m = self.delay_ms * 1e-3 * c
+
+            # home-made measure of the significance
+            slope = 0.12
+            p = 3
+            x = (Xcorr_max_norm > 1.) * (Xcorr_max_norm - 1.)
+            x = (slope * x) ** p
+            self.correlation = int((x / (1. + x)) * 100)
+
+        return (self.delay_ms, self.distance_m, self.correlation, self.Xcorr_extremum)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Optional pool of worker processes that run the DSP of the heavy docks.
+
+The audio buffers store their samples in shared ring buffers, that the workers
+read directly. The GUI process only sends small messages to the workers
+(new job, new data, end of job), and receives the compact results of the jobs."""
+
+import logging
+import os
+import queue
+import traceback
+import multiprocessing
+from itertools import count
+
+from friture.ringbuffer import DEFAULT_READER_LAG
+from friture.shared_ringbuffer import SharedRingBuffer, SharedRingBufferView
+
+__workerPoolInstance = None
+
+
+def GetAnalysisWorkerPool():
+    global __workerPoolInstance
+    if __workerPoolInstance is None:
+        __workerPoolInstance = AnalysisWorkerPool()
+    return __workerPoolInstance
+
+
+def default_worker_count():
+    # leave one core to the GUI process and the audio capture
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def worker_main(connection, results):
+    '''Main loop of a worker process.'''
+    ringbuffers = {}
+    jobs = {}
+
+    def remove_job(job_id):
+        processor, name, reader = jobs.pop(job_id, (None, None, None))
+        if name is not None and not any(job[1] == name for job in jobs.values()):
+            ringbuffers.pop(name).close()
+
+    while True:
+        # handle all the pending messages before processing the new data once
+        messages = [connection.recv()]
+        while connection.poll():
+            messages.append(connection.recv())
+
+        new_data = False
+        for message in messages:
+            kind = message[0]
+            if kind == "add":
+                job_id, name, processor = message[1:]
+                if name not in ringbuffers:
+                    ringbuffers[name] = SharedRingBufferView(name)
+                reader = ringbuffers[name].add_reader(processor.window, processor.hop)
+                jobs[job_id] = (processor, name, reader)
+            elif kind == "remove":
+                remove_job(message[1])
+            elif kind == "data":
+                new_data = True
+            elif kind == "stop":
+                for ringbuffer in ringbuffers.values():
+                    ringbuffer.close()
+                return
+
+        if not new_data:
+            continue
+
+        for job_id, (processor, name, reader) in list(jobs.items()):
+            try:
+                frames = reader.windows()
+                if frames.shape[1] == 0:
+                    continue
+                result = processor.process_frames(frames)
+                if result is not None:
+                    results.put((job_id, result, None))
+            except Exception:
+                # report the failure once, the job is dropped
+                # and the GUI process runs it from now on
+                results.put((job_id, None, traceback.format_exc()))
+                remove_job(job_id)
+
+
+class AnalysisJob:
+    '''Handle given to a dock whose processor runs in a worker process.'''
+
+    def __init__(self, pool, job_id, worker, processor, ringbuffer):
+        self.pool = pool
+        self.job_id = job_id
+        self.worker = worker
+        self.processor = processor
+        self.ringbuffer = ringbuffer
+        self.results = []
+
+        # reader of the ring buffer when the job runs in the GUI process, see fail
+        self.reader = None
+
+    def fail(self):
+        '''Run the processor in the GUI process from now on, after it failed in the worker.'''
+        self.reader = self.ringbuffer.add_reader(self.processor.window, self.processor.hop)
+
+    def fetch(self):
+        '''Return the results received since the previous fetch, merged by the processor,
+        or None if there are none yet.'''
+        if self.reader is not None:
+            frames = self.reader.windows()
+            if frames.shape[1] > 0:
+                result = self.processor.process_frames(frames)
+                if result is not None:
+                    self.results.append(result)
+        else:
+            # the samples themselves reach the worker through the shared ring buffer
+            self.pool.notify(self.worker)
+            self.pool.collect()
+
+        if len(self.results) == 0:
+            return None
+
+        results, self.results = self.results, []
+        return self.processor.merge(results)
+
+    def unsubscribe(self):
+        if self.pool is not None:
+            self.pool.remove(self)
+            self.pool = None
+        if self.reader is not None:
+            self.ringbuffer.remove_reader(self.reader)
+            self.reader = None
+
+
+class AnalysisWorkerPool:
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+        # (process, connection, number of jobs) for each worker
+        self.workers = []
+        self.results = None
+        self.jobs = {}
+        self.job_ids = count()
+
+    def enabled(self):
+        return len(self.workers) > 0
+
+    def start(self, nworkers=None):
+        if self.enabled():
+            return
+
+        if nworkers is None:
+            nworkers = default_worker_count()
+
+        # spawn, so that the workers do not inherit the Qt and audio state of the GUI process
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+
+        for i in range(nworkers):
+            connection, child_connection = context.Pipe()
+            process = context.Process(target=worker_main, args=(child_connection, self.results),
+                                      name="Friture analysis worker %d" % (i), daemon=True)
+            process.start()
+            self.workers.append([process, connection, 0])
+
+        self.logger.info("Started %d analysis worker processes", nworkers)
+
+    def stop(self):
+        for process, connection, njobs in self.workers:
+            try:
+                connection.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+
+        for process, connection, njobs in self.workers:
+            process.join(timeout=1.)
+            if process.is_alive():
+                process.terminate()
+
+        if self.enabled():
+            self.logger.info("Stopped the analysis worker processes")
+
+        self.workers = []
+        self.jobs = {}
+
+    def submit(self, processor, audiobuffer):
+        '''Run a processor on the samples of an audio buffer, in the least loaded worker.
+        Return an AnalysisJob, or None if the processor has to run in the GUI process.'''
+        ringbuffer = audiobuffer.ringbuffer
+
+        if not self.enabled() or not isinstance(ringbuffer, SharedRingBuffer):
+            return None
+
+        # the capacity cannot be reserved from the worker
+        ringbuffer.grow_if_needed(processor.window + max(processor.hop, DEFAULT_READER_LAG))
+
+        worker = min(range(len(self.workers)), key=lambda index: self.workers[index][2])
+        job = AnalysisJob(self, next(self.job_ids), worker, processor, ringbuffer)
+
+        self.workers[worker][1].send(("add", job.job_id, ringbuffer.name, processor))
+        self.workers[worker][2] += 1
+        self.jobs[job.job_id] = job
+
+        self.logger.info("New analysis job %d (%s) in worker %d", job.job_id, type(processor).__name__, worker)
+
+        return job
+
+    def remove(self, job):
+        if self.jobs.pop(job.job_id, None) is None:
+            return
+
+        self.workers[job.worker][1].send(("remove", job.job_id))
+        self.workers[job.worker][2] -= 1
+
+    def notify(self, worker):
+        self.workers[worker][1].send(("data",))
+
+    def collect(self):
+        '''Dispatch the results received from the workers to their jobs.'''
+        while True:
+            try:
+                job_id, result, error = self.results.get_nowait()
+            except queue.Empty:
+                return
+
+            job = self.jobs.get(job_id)
+            if job is None:
+                # late result of a removed job
+                continue
+
+            if error is not None:
+                # the worker has dropped the job
+                self.logger.error("Analysis job %d failed in worker %d, running it in the GUI process:\n%s", job_id, job.worker, error)
+                del self.jobs[job_id]
+                self.workers[job.worker][2] -= 1
+                job.fail()
+            else:
+                job.results.append(result)
@@ -54,8 +54,16 @@ from friture.plotting.coordinateTransform import CoordinateTransform
 from friture.plotting.scaleDivision import ScaleDivision, Tick
 from friture.spectrum_data import Spectrum_Data
 from friture.plotFilledCurve import PlotFilledCurve
+from friture.spectrogram_item import SpectrogramItem
 from friture.filled_curve import FilledCurve
 from friture.qml_tools import qml_url
+from friture.signal.fft_backend import select_fft_backend
+from friture.capture_thread import CaptureThread
+from friture.input_sources import InputSources
+from friture.offline_sources import open_source
+from friture.analysis_workers import GetAnalysisWorkerPool
+from friture.history_store import DEFAULT_HISTORY_SECONDS
+from friture.spectrogram_archive import GetSpectrogramArchives, DEFAULT_ARCHIVE_BYTES
 
 # the display timer could be made faster when the processing
 # power allows it, firing down to every 10 ms
@@ -100,6 +108,7 @@ class Friture(QMainWindow, ):
         qmlRegisterType(FilledCurve, 'Friture', 1, 0, 'FilledCurve')
         qmlRegisterType(PlotCurve, 'Friture', 1, 0, 'PlotCurve')
         qmlRegisterType(PlotFilledCurve, 'Friture', 1, 0, 'PlotFilledCurve')
+        qmlRegisterType(SpectrogramItem, 'Friture', 1, 0, 'SpectrogramItem')
         qmlRegisterType(Tick, 'Friture', 1, 0, 'Tick')
         qmlRegisterSingletonType(Store, 'Friture', 1, 0, 'Store', lambda engine, script_engine: GetStore())
 
@@ -107,6 +116,9 @@ class Friture(QMainWindow, ):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
+        # Pick the fastest FFT implementation available on this machine
+        select_fft_backend()
+
         # Initialize the audio data ring buffer
         self.audiobuffer = AudioBuffer()
 
@@ -114,6 +126,9 @@ class Friture(QMainWindow, ):
         # signal containing new data from the audio callback thread, processed as numpy array
         AudioBackend().new_data_available.connect(self.audiobuffer.handle_new_data)
 
+        # the audio buffers of the additional input devices, that the docks can pick from
+        self.input_sources = InputSources(AudioBackend(), self.audiobuffer)
+
         # this timer is used to update widgets that just need to display as fast as they can
         self.display_timer = QtCore.QTimer()
         self.display_timer.setInterval(SMOOTH_DISPLAY_TIMER_PERIOD_MS)  # constant timing
@@ -142,7 +157,6 @@ class Friture(QMainWindow, ):
         # timer ticks
         self.display_timer.timeout.connect(self.dockmanager.canvasUpdate)
         self.display_timer.timeout.connect(self.level_widget.canvasUpdate)
-        self.display_timer.timeout.connect(AudioBackend().fetchAudioData)
 
         # toolbar clicks
         self.ui.actionStart.triggered.connect(self.timer_toggle)
@@ -162,16 +176,26 @@ class Friture(QMainWindow, ):
         self.ui.toolBar.setMovable(False)
         self.ui.toolBar.setFloatable(False)
 
+        # the audio capture is drained in its own thread, at audio rate,
+        # so that a slow repaint cannot cause input overflows
+        self.capture_thread = CaptureThread(AudioBackend())
+        self.capture_thread.error.connect(self.show_error)
+
         # start timers
         self.timer_toggle()
         self.slow_timer.start()
+        self.capture_thread.start()
 
         self.logger.info("Init finished, entering the main loop")
 
     # exception hook that logs to console, file, and display a message box
     def excepthook(self, exception_type, exception_value, traceback_object):
         gui_message = fileexcepthook(exception_type, exception_value, traceback_object)
+        self.show_error(gui_message)
 
+    # slot
+    # also receives the errors of the capture thread, that cannot show a message box itself
+    def show_error(self, gui_message):
         # we do not want to flood the user with message boxes when the error happens repeatedly on each timer event
         if not self.errorDialogOpened:
             self.errorDialogOpened = True
@@ -188,7 +212,10 @@ class Friture(QMainWindow, ):
 
     # event handler
     def closeEvent(self, event):
+        self.capture_thread.stop()
         AudioBackend().close()
+        GetAnalysisWorkerPool().stop()
+        GetSpectrogramArchives().close()
         self.saveAppState()
         event.accept()
 
@@ -254,6 +281,12 @@ class Friture(QMainWindow, ):
 
         settings = QtCore.QSettings("Friture", "Friture")
 
+        # restore the audio settings first, so that the docks
+        # are restored with the right sample rate
+        settings.beginGroup("AudioBackend")
+        self.settings_dialog.restoreState(settings)
+        settings.endGroup()
+
         settings.beginGroup("Docks")
         self.dockmanager.restoreState(settings)
         settings.endGroup()
@@ -263,10 +296,6 @@ class Friture(QMainWindow, ):
         self.restoreState(settings.value("windowState", type=QtCore.QByteArray))
         settings.endGroup()
 
-        settings.beginGroup("AudioBackend")
-        self.settings_dialog.restoreState(settings)
-        settings.endGroup()
-
     # slot
     def timer_toggle(self):
         if self.display_timer.isActive():
@@ -385,6 +414,33 @@ def main():
         logger.info("Adding the following to the Library paths: %s", pluginsPath)
         QApplication.addLibraryPath(pluginsPath)
 
+    # --workers[=N] runs the heavy analyses in N worker processes (all the cores
+    # but one by default), handled first since the audio buffers depend on it,
+    # --spectrogram-archive=DIR archives the spectrogram columns for hours of scrollback,
+    # in at most --spectrogram-archive-mb=MB shared by the docks (1024 by default), handled first
+    # since the spectrogram settings depend on it
+    archive_directory = None
+    archive_bytes = DEFAULT_ARCHIVE_BYTES
+
+    for arg in sys.argv[1:]:
+        if arg == "--workers":
+            GetAnalysisWorkerPool().start()
+        elif arg.startswith("--workers="):
+            try:
+                GetAnalysisWorkerPool().start(max(1, int(arg[len("--workers="):])))
+            except ValueError:
+                logger.error("Invalid number of analysis workers: %s", arg)
+        elif arg.startswith("--spectrogram-archive="):
+            archive_directory = arg[len("--spectrogram-archive="):]
+        elif arg.startswith("--spectrogram-archive-mb="):
+            try:
+                archive_bytes = int(float(arg[len("--spectrogram-archive-mb="):]) * 1024 ** 2)
+            except ValueError:
+                logger.error("Invalid spectrogram archive size: %s", arg)
+
+    if archive_directory is not None:
+        GetSpectrogramArchives().set_directory(archive_directory, archive_bytes)
+
     # Splash screen
     pixmap = QPixmap(":/images/splash.png")
     splash = QSplashScreen(pixmap)
@@ -398,15 +454,52 @@ def main():
 
     profile = "no"  # "python" or "kcachegrind" or anything else to disable
 
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--python":
+    # --input=SOURCE analyzes a WAV file, raw:PATH:SAMPLERATE:CHANNELS:DTYPE
+    # or synthetic:KIND[:FREQUENCY] instead of the input device,
+    # --fast reads it as fast as possible instead of in real time,
+    # --telemetry=PATH writes the capture telemetry of each tick to a CSV file,
+    # --history=PATH records the captured audio to a disk-backed ring of
+    # --history-hours=HOURS (4 by default), that --input=history:PATH:SECONDS_AGO replays
+    offline_source = None
+    realtime = True
+    history_path = None
+    history_seconds = DEFAULT_HISTORY_SECONDS
+
+    for arg in sys.argv[1:]:
+        if arg == "--python":
             profile = "python"
-        elif sys.argv[1] == "--kcachegrind":
+        elif arg == "--kcachegrind":
             profile = "kcachegrind"
-        elif sys.argv[1] == "--no":
+        elif arg == "--no":
             profile = "no"
+        elif arg.startswith("--input="):
+            offline_source = arg[len("--input="):]
+        elif arg == "--fast":
+            realtime = False
+        elif arg.startswith("--telemetry="):
+            AudioBackend().telemetry.start_dump(arg[len("--telemetry="):])
+        elif arg.startswith("--history="):
+            history_path = arg[len("--history="):]
+        elif arg.startswith("--history-hours="):
+            try:
+                history_seconds = 3600. * float(arg[len("--history-hours="):])
+            except ValueError:
+                logger.error("Invalid history duration: %s", arg)
+        elif arg == "--workers" or arg.startswith("--workers=") or arg.startswith("--spectrogram-archive"):
+            # already handled
+            pass
         else:
-            logger.info("command-line arguments (%s) not recognized", sys.argv[1:])
+            logger.info("command-line argument (%s) not recognized", arg)
+
+    if history_path is not None:
+        AudioBackend().set_history(history_path, history_seconds)
+
+    if offline_source is not None:
+        try:
+            source = open_source(offline_source, AudioBackend().get_samplerate())
+            AudioBackend().set_offline_source(source, realtime)
+        except (OSError, ValueError):
+            logger.exception("Failed to open the offline source '%s'", offline_source)
 
     return_code = 0
     if profile == "python":
@@ -19,16 +19,29 @@
 
 import logging
 import math
+import threading
+from time import perf_counter
 
 from PyQt5 import QtCore
 import sounddevice
 import rtmixer
-from numpy import ndarray, vstack, int8, int16, float64, float32, frombuffer, concatenate
+
+from friture.device_cache import DeviceCapabilityCache
+from friture.capture_telemetry import CaptureTelemetry
+from friture.history_store import HistoryStore, DEFAULT_HISTORY_SECONDS
+from numpy import ndarray, int8, int16, float64, float32, frombuffer, empty, concatenate
 import numpy as np
 
-# the sample rate below should be dynamic, taken from PyAudio/PortAudio
-SAMPLING_RATE = 48000
+# sample rate used until another one is selected,
+# the current one is given by AudioBackend().get_samplerate()
+DEFAULT_SAMPLING_RATE = 48000
+# sample rates offered in the settings
+SAMPLING_RATES = [16000, 22050, 44100, 48000, 96000, 192000]
 FRAMES_PER_BUFFER = 512
+# number of chunks delivered per fetch when an offline source is read as fast as possible
+OFFLINE_CHUNKS_PER_FETCH = 32
+# minimum period of the coalesced deliveries, the period of the display timer of the main window
+COALESCED_DELIVERY_PERIOD_MS = 10
 
 __audiobackendInstance = None
 
@@ -65,10 +78,157 @@ def AudioBackend():
     return __audiobackendInstance
 
 
+class PendingDelivery:
+    '''Blocks drained by the capture thread and not delivered yet.
+
+    They are delivered as a single block per display tick, with at most one block
+    waiting in the GUI thread, so that the widgets are notified once per tick
+    whatever the wake-up rate of the capture thread.'''
+
+    def __init__(self):
+        self.blocks = []
+        self.time = 0.
+        self.overflow = False
+        self.last_delivery = 0.
+        # set by the capture thread when it emits a block, cleared by the GUI thread when it handles it
+        self.in_flight = threading.Event()
+
+    def queue(self, floatdata, input_time, input_overflow):
+        # the previous blocks are dropped if the channels or the sample type changed in between
+        if len(self.blocks) > 0 and (self.blocks[0].shape[0] != floatdata.shape[0] or self.blocks[0].dtype != floatdata.dtype):
+            self.blocks = []
+
+        self.blocks += [floatdata]
+        self.time = input_time
+        self.overflow = self.overflow or input_overflow
+
+    def busy(self):
+        return self.in_flight.is_set() or len(self.blocks) > 0
+
+    # emit the pending blocks as a single one, unless the previous delivery
+    # is still waiting in the GUI thread or was less than a display tick ago
+    def flush(self, signal):
+        if len(self.blocks) == 0 or self.in_flight.is_set():
+            return
+
+        now = perf_counter()
+        if now - self.last_delivery < COALESCED_DELIVERY_PERIOD_MS / 1000.:
+            return
+
+        if len(self.blocks) == 1:
+            floatdata = self.blocks[0]
+        else:
+            floatdata = concatenate(self.blocks, axis=1)
+        input_overflow = self.overflow
+
+        self.blocks = []
+        self.overflow = False
+        self.last_delivery = now
+
+        self.in_flight.set()
+        signal.emit(floatdata, self.time, input_overflow)
+
+    # called in the GUI thread, when the block is handled
+    def delivered(self):
+        self.in_flight.clear()
+
+
+class InputSource(QtCore.QObject):
+    '''An additional input device, captured alongside the main one.
+
+    All the channels of the device are delivered, with their own signal, so that
+    each source feeds its own audio buffer. The stream times are shifted to the
+    timeline of the main stream, so that the sources can be compared.'''
+
+    underflow = QtCore.pyqtSignal()
+    new_data_available = QtCore.pyqtSignal(ndarray, float, bool)
+
+    def __init__(self, device, stream, ringBuffer, action, nchannels_max):
+        super().__init__()
+
+        self.logger = logging.getLogger(__name__)
+
+        self.device = device
+        self.name = device['name']
+        (self.stream, self.ringBuffer, self.action, self.nchannels_max) = (stream, ringBuffer, action, nchannels_max)
+
+        # difference between the clock of this stream and the one of the main stream
+        self.time_offset = 0.
+
+        self.xruns = 0
+
+        # the blocks are coalesced like the ones of the main input
+        self.pending = PendingDelivery()
+        # the source lives in the GUI thread, so this connection is queued when emitting from the capture thread
+        self.new_data_available.connect(self.data_delivered)
+
+    def stream_time(self):
+        try:
+            return self.stream.time
+        except (sounddevice.PortAudioError, OSError):
+            return 0
+
+    # method
+    # the timestamps of this source are expressed in the timeline of the reference stream time
+    def align(self, reference_time):
+        self.time_offset = self.stream_time() - reference_time
+
+    def get_stream_time(self):
+        return self.stream_time() - self.time_offset
+
+    # method
+    # drain the ring buffer in a whole number of chunks, queued for the next delivery
+    def fetch(self, dtype):
+        available = self.ringBuffer.read_available
+        count = available - available % FRAMES_PER_BUFFER
+        if count == 0:
+            return
+
+        read, buf1, buf2 = self.ringBuffer.get_read_buffers(count)
+        assert read == count
+
+        floatdata = empty((self.nchannels_max, count), dtype=dtype)
+        buffer1 = frombuffer(buf1, dtype='float32').reshape(-1, self.nchannels_max)
+        buffer2 = frombuffer(buf2, dtype='float32').reshape(-1, self.nchannels_max)
+        n1 = buffer1.shape[0]
+        floatdata[:, :n1] = buffer1.T
+        floatdata[:, n1:] = buffer2.T
+
+        self.ringBuffer.advance_read_index(count)
+
+        input_time = self.get_stream_time()
+
+        input_overflows = self.action.stats.input_overflows
+        input_overflow = input_overflows > self.xruns
+        if input_overflow:
+            self.xruns = input_overflows
+            self.logger.info("Stream overflow on '%s'!", self.name)
+            self.underflow.emit()
+
+        self.pending.queue(floatdata, input_time, input_overflow)
+
+    def flush_pending(self):
+        self.pending.flush(self.new_data_available)
+
+    # slot
+    def data_delivered(self, floatdata, input_time, input_overflow):
+        self.pending.delivered()
+
+    def start(self):
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+
+
 class __AudioBackend(QtCore.QObject):
 
     underflow = QtCore.pyqtSignal()
     new_data_available = QtCore.pyqtSignal(ndarray, float, bool)
+    samplerate_changed = QtCore.pyqtSignal(int)
+    # an additional input source was opened or closed
+    input_opened = QtCore.pyqtSignal(object)
+    input_closed = QtCore.pyqtSignal(object)
 
     def __init__(self):
         QtCore.QObject.__init__(self)
@@ -77,11 +237,36 @@ class __AudioBackend(QtCore.QObject):
 
         self.duo_input = False
 
+        # explicit set of input channels, for multichannel devices,
+        # None to use the first channel, or the first two channels in duo input
+        self.channels = None
+
+        # type of the samples delivered to the widgets,
+        # float32 halves the memory bandwidth of the whole processing pipeline
+        self.dtype = float64
+
+        # the audio drained by the capture thread is accumulated and delivered in a single
+        # block per display tick, with at most one block pending in the GUI thread
+        self.pending = PendingDelivery()
+        # the sender lives in the GUI thread, so this connection is queued when emitting from the capture thread
+        self.new_data_available.connect(self.data_delivered)
+
+        # fetchAudioData runs in the capture thread, this lock protects the stream
+        # and the channel selection against changes made from the GUI thread
+        self.lock = threading.Lock()
+
+        self.samplerate = DEFAULT_SAMPLING_RATE
+        # sample rate of the input device, that an offline source does not change
+        self.device_samplerate = DEFAULT_SAMPLING_RATE
+
         self.logger.info("Initializing audio backend")
 
         # look for devices
-        self.input_devices = self.get_input_devices()
-        self.output_devices = self.get_output_devices()
+        self.enumerate_devices()
+
+        # the formats supported by the devices are probed when they are opened,
+        # and cached on disk for the next launches
+        self.capability_cache = DeviceCapabilityCache()
 
         self.logger.info(f"Found {len(self.input_devices)} input devices and {len(self.output_devices)} output devices")
 
@@ -94,11 +279,29 @@ class __AudioBackend(QtCore.QObject):
         self.action = None
         self.nchannels_max = 0
 
+        # additional input devices, captured in the same pass as the main one
+        self.extra_inputs = []
+
+        # backlog, latency and drain time of each fetch
+        self.telemetry = CaptureTelemetry()
+
+        # disk-backed history of the captured samples, see set_history
+        self.history = None
+        self.history_path = None
+        self.history_seconds = DEFAULT_HISTORY_SECONDS
+
+        # file or synthetic source that replaces the input device, see set_offline_source
+        self.offline_source = None
+        self.offline_realtime = True
+        self.offline_running = True
+        self.offline_start = None
+        self.offline_frames = 0
+
         # we will try to open all the input devices until one
         # works, starting by the default input device
         for device in self.input_devices:
             try:
-                (self.stream, self.ringBuffer, self.action, self.nchannels_max) = self.open_stream(device)
+                (self.stream, self.ringBuffer, self.action, self.nchannels_max) = self.open_stream(device, self.device_samplerate)
                 self.stream.start()
                 self.device = device
                 self.logger.info("Success")
@@ -119,67 +322,88 @@ class __AudioBackend(QtCore.QObject):
 
         self.chunk_number = 0
 
+        # frames read from the recording, and stream time spent paused since it started,
+        # to timestamp the frames, see capture_time
+        self.frames_read = 0
+        self.capture_gap = 0.
+        self.pause_time = None
+
         self.devices_with_timing_errors = []
 
     def close(self):
-        if self.stream is not None:
-            self.stream.stop()
-            self.stream = None
+        self.telemetry.stop_dump()
+        with self.lock:
+            if self.history is not None:
+                self.history.close()
+                self.history = None
+            if self.stream is not None:
+                self.stream.stop()
+                self.stream = None
+            for source in self.extra_inputs:
+                source.stop()
+            self.extra_inputs = []
 
     # method
-    def get_readable_devices_list(self):
-        input_devices = self.get_input_devices()
-
-        raw_devices = sounddevice.query_devices()
-
-        try:
-            default_input_device = sounddevice.query_devices(kind='input')
-            default_input_device['index'] = raw_devices.index(default_input_device)
-        except sounddevice.PortAudioError:
-            self.logger.exception("Failed to query the default input device")
-            default_input_device = None
+    # query the devices and host APIs once, the other methods use the resulting lists
+    def enumerate_devices(self):
+        devices = sounddevice.query_devices()
+        self.hostapis = sounddevice.query_hostapis()
 
-        devices_list = []
-        for device in input_devices:
-            api = sounddevice.query_hostapis(device['hostapi'])['name']
+        # the default devices are looked up before the devices are tagged with their index,
+        # since the lookup compares the device dictionaries
+        self.default_input_index = self.find_default_device(devices, 'input')
+        self.default_output_index = self.find_default_device(devices, 'output')
 
-            if default_input_device is not None and device['index'] == default_input_device['index']:
-                extra_info = ' (default)'
-            else:
-                extra_info = ''
+        for index, device in enumerate(devices):
+            device['index'] = index
 
-            nchannels = device['max_input_channels']
+        self.input_devices = self.sort_devices([device for device in devices if device['max_input_channels'] > 0], self.default_input_index)
+        self.output_devices = self.sort_devices([device for device in devices if device['max_output_channels'] > 0], self.default_output_index)
 
-            desc = "%s (%d channels) (%s) %s" % (device['name'], nchannels, api, extra_info)
+    # method
+    def find_default_device(self, devices, kind):
+        # early exit if there is no such device. Otherwise query_devices(kind=...) fails
+        channels_key = 'max_input_channels' if kind == 'input' else 'max_output_channels'
+        if not any(device[channels_key] > 0 for device in devices):
+            return None
 
-            devices_list += [desc]
+        try:
+            default_device = sounddevice.query_devices(kind=kind)
+        except sounddevice.PortAudioError:
+            self.logger.exception("Failed to query the default %s device", kind)
+            return None
 
-        return devices_list
+        if 'index' in default_device:
+            return default_device['index']
+        return list(devices).index(default_device)
 
     # method
-    def get_readable_output_devices_list(self):
-        output_devices = self.get_output_devices()
-
-        raw_devices = sounddevice.query_devices()
-        default_output_device = sounddevice.query_devices(kind='output')
-        default_output_device['index'] = raw_devices.index(default_output_device)
+    # the default device comes first
+    def sort_devices(self, devices, default_index):
+        return sorted(devices, key=lambda device: device['index'] != default_index)
 
-        devices_list = []
-        for device in output_devices:
-            api = sounddevice.query_hostapis(device['hostapi'])['name']
+    # method
+    def get_hostapi_name(self, device):
+        return self.hostapis[device['hostapi']]['name']
 
-            if default_output_device is not None and device['index'] == default_output_device['index']:
-                extra_info = ' (default)'
-            else:
-                extra_info = ''
+    # method
+    def get_readable_devices_list(self):
+        return [self.get_readable_device(device, self.default_input_index, device['max_input_channels']) for device in self.input_devices]
 
-            nchannels = device['max_output_channels']
+    # method
+    def get_readable_output_devices_list(self):
+        return [self.get_readable_device(device, self.default_output_index, device['max_output_channels']) for device in self.output_devices]
 
-            desc = "%s (%d channels) (%s) %s" % (device['name'], nchannels, api, extra_info)
+    # method
+    def get_readable_device(self, device, default_index, nchannels):
+        api = self.get_hostapi_name(device)
 
-            devices_list += [desc]
+        if device['index'] == default_index:
+            extra_info = ' (default)'
+        else:
+            extra_info = ''
 
-        return devices_list
+        return "%s (%d channels) (%s) %s" % (device['name'], nchannels, api, extra_info)
 
     # method
     def get_default_input_device(self):
@@ -202,123 +426,212 @@ class __AudioBackend(QtCore.QObject):
     # method
     # returns a list of input devices index, starting with the system default
     def get_input_devices(self):
-        devices = sounddevice.query_devices()
+        return self.input_devices
 
-        # early exit if there is no input device. Otherwise query_devices(kind='input') fails
-        input_devices = [device for device in devices if device['max_input_channels'] > 0]
+    # method
+    # returns a list of output devices index, starting with the system default
+    def get_output_devices(self):
+        return self.output_devices
 
-        if len(input_devices) == 0:
-            return []
+    # method.
+    # The index parameter is the index in the self.input_devices list of devices !
+    # The return parameter is also an index in the same list.
+    def select_input_device(self, index):
+        with self.lock:
+            device = self.input_devices[index]
 
-        try:
-            default_input_device = sounddevice.query_devices(kind='input')
-        except sounddevice.PortAudioError:
-            self.logger.exception("Failed to query the default input device")
-            default_input_device = None
+            # save current stream in case we need to restore it
+            previous_stream = self.stream
+            previous_ringBuffer = self.ringBuffer
+            previous_action = self.action
+            previous_nchannels_max = self.nchannels_max
+            previous_device = self.device
+
+            self.logger.info("Trying to open input device #%d", index)
+
+            try:
+                (self.stream, self.ringBuffer, self.action, self.nchannels_max) = self.open_stream(device, self.device_samplerate)
+                self.device = device
+                self.stream.start()
+                success = True
+            except Exception:
+                self.logger.exception("Failed to open input device")
+                success = False
+                if self.stream is not None:
+                    self.stream.stop()
+                # restore previous stream
+                self.stream = previous_stream
+                self.ringBuffer = previous_ringBuffer
+                self.action = previous_action
+                self.nchannels_max = previous_nchannels_max
+                self.device = previous_device
+
+            if success:
+                self.logger.info("Success")
+
+                self.frames_read = 0
+                self.capture_gap = 0.
+                self.pause_time = None
 
-        input_devices = []
-        if default_input_device is not None:
-            # start by the default input device
-            default_input_device['index'] = devices.index(default_input_device)
-            input_devices += [default_input_device]
+                if previous_stream is not None:
+                    previous_stream.stop()
 
-        for device in devices:
-            # select only the input devices by looking at the number of input channels
-            if device['max_input_channels'] > 0:
-                device['index'] = devices.index(device)
-                # default input device has already been inserted
-                if default_input_device is not None and device['index'] != default_input_device['index']:
-                    input_devices += [device]
+                self.first_channel = 0
+                nchannels = self.device['max_input_channels']
+                if nchannels == 1:
+                    self.second_channel = 0
+                else:
+                    self.second_channel = 1
 
-        return input_devices
+                # the channel indices of the previous device are meaningless on the new one
+                if self.channels is not None:
+                    self.channels = list(range(nchannels))
+
+            return success, self.input_devices.index(self.device)
 
     # method
-    # returns a list of output devices index, starting with the system default
-    def get_output_devices(self):
-        devices = sounddevice.query_devices()
+    # reopen the current input device at the given sample rate
+    # returns the success and the sample rate in use
+    def select_samplerate(self, samplerate):
+        with self.lock:
+            if samplerate == self.samplerate:
+                return True, self.samplerate
 
-        default_output_device = sounddevice.query_devices(kind='output')
+            if self.offline_source is not None:
+                self.logger.error("The sample rate is set by the offline source")
+                return False, self.samplerate
 
-        output_devices = []
-        if default_output_device is not None:
-            # start by the default input device
-            default_output_device['index'] = devices.index(default_output_device)
-            output_devices += [default_output_device]
+            previous_stream = self.stream
 
-        for device in devices:
-            # select only the output devices by looking at the number of output channels
-            if device['max_output_channels'] > 0:
-                device['index'] = devices.index(device)
-                # default output device has already been inserted
-                if default_output_device is not None and device['index'] != default_output_device['index']:
-                    output_devices += [device]
+            self.logger.info("Trying to switch to %d Hz", samplerate)
 
-        return output_devices
+            try:
+                (stream, ringBuffer, action, nchannels_max) = self.open_stream(self.device, samplerate)
+                stream.start()
+            except Exception:
+                self.logger.exception("Failed to open input device at %d Hz", samplerate)
+                return False, self.samplerate
 
-    # method.
-    # The index parameter is the index in the self.input_devices list of devices !
-    # The return parameter is also an index in the same list.
-    def select_input_device(self, index):
+            if previous_stream is not None:
+                previous_stream.stop()
+
+            (self.stream, self.ringBuffer, self.action, self.nchannels_max) = (stream, ringBuffer, action, nchannels_max)
+            self.samplerate = samplerate
+            self.device_samplerate = samplerate
+            self.xruns = 0
+            self.frames_read = 0
+            self.capture_gap = 0.
+            self.pause_time = None
+
+            # the additional inputs follow the main one, the ones that do not support the new rate are closed
+            failed_inputs = []
+            for source in self.extra_inputs:
+                source.stop()
+                try:
+                    (source.stream, source.ringBuffer, source.action, source.nchannels_max) = self.open_stream(source.device, samplerate)
+                    source.start()
+                    source.xruns = 0
+                    source.align(self.get_stream_time())
+                except Exception:
+                    self.logger.exception("Failed to reopen additional input device '%s' at %d Hz", source.name, samplerate)
+                    failed_inputs.append(source)
+            for source in failed_inputs:
+                self.extra_inputs.remove(source)
+
+        for source in failed_inputs:
+            self.input_closed.emit(source)
+
+        # let the widgets recompute their kernels, filters and frequency scales
+        self.samplerate_changed.emit(samplerate)
+
+        return True, samplerate
+
+    # method
+    def get_samplerate(self):
+        return self.samplerate
+
+    # method
+    # the sample rate of the input device, even when an offline source is read
+    def get_device_samplerate(self):
+        return self.device_samplerate
+
+    # method
+    # open an additional input device, with all its channels, at the current sample rate
+    # The index parameter is the index in the self.input_devices list of devices.
+    # returns the success and the new source
+    def open_extra_input(self, index):
         device = self.input_devices[index]
 
-        # save current stream in case we need to restore it
-        previous_stream = self.stream
-        previous_ringBuffer = self.ringBuffer
-        previous_action = self.action
-        previous_nchannels_max = self.nchannels_max
-        previous_device = self.device
+        with self.lock:
+            for source in self.extra_inputs:
+                if source.device['index'] == device['index']:
+                    return True, source
 
-        self.logger.info("Trying to open input device #%d", index)
+            if self.device is not None and device['index'] == self.device['index']:
+                self.logger.error("Device '%s' is already the main input device", device['name'])
+                return False, None
 
-        try:
-            (self.stream, self.ringBuffer, self.action, self.nchannels_max) = self.open_stream(device)
-            self.device = device
-            self.stream.start()
-            success = True
-        except Exception:
-            self.logger.exception("Failed to open input device")
-            success = False
-            if self.stream is not None:
-                self.stream.stop()
-            # restore previous stream
-            self.stream = previous_stream
-            self.ringBuffer = previous_ringBuffer
-            self.action = previous_action
-            self.nchannels_max = previous_nchannels_max
-            self.device = previous_device
+            self.logger.info("Trying to open additional input device #%d", index)
 
-        if success:
-            self.logger.info("Success")
+            try:
+                source = InputSource(device, *self.open_stream(device, self.samplerate))
+                source.start()
+            except Exception:
+                self.logger.exception("Failed to open additional input device")
+                return False, None
 
-            if previous_stream is not None:
-                previous_stream.stop()
+            source.align(self.get_stream_time())
+            self.extra_inputs.append(source)
 
-            self.first_channel = 0
-            nchannels = self.device['max_input_channels']
-            if nchannels == 1:
-                self.second_channel = 0
-            else:
-                self.second_channel = 1
+        self.input_opened.emit(source)
 
-        return success, self.input_devices.index(self.device)
+        return True, source
+
+    # method
+    def close_extra_input(self, source):
+        with self.lock:
+            if source not in self.extra_inputs:
+                return
+            self.logger.info("Closing additional input device '%s'", source.name)
+            source.stop()
+            self.extra_inputs.remove(source)
+
+        self.input_closed.emit(source)
+
+    # method
+    def get_extra_inputs(self):
+        return list(self.extra_inputs)
 
     # method
     def select_first_channel(self, index):
-        self.first_channel = index
-        success = True
-        return success, self.first_channel
+        with self.lock:
+            self.first_channel = index
+            success = True
+            return success, self.first_channel
 
     # method
     def select_second_channel(self, index):
-        self.second_channel = index
-        success = True
-        return success, self.second_channel
+        with self.lock:
+            self.second_channel = index
+            success = True
+            return success, self.second_channel
+
+    # method
+    # select an arbitrary set of input channels, delivered as the rows of the data blocks
+    def select_channels(self, channels):
+        with self.lock:
+            channels = [int(channel) for channel in channels]
+            if len(channels) == 0 or min(channels) < 0 or max(channels) >= self.nchannels_max:
+                self.logger.error("Invalid channel selection %s for a device with %d channels", channels, self.nchannels_max)
+                return False, self.get_selected_channels()
+            self.channels = channels
+            return True, self.channels
 
     # method
-    def open_stream(self, device):
-        self.log_supported_input_formats(device)
+    def open_stream(self, device, samplerate):
+        self.probe_supported_input_formats(device)
 
-        self.logger.info("Opening the stream for device '%s'", device['name'])
+        self.logger.info("Opening the stream for device '%s' at %d Hz", device['name'], samplerate)
 
         # by default we open the device stream with all the channels
         # (interleaved in the data buffer)
@@ -327,7 +640,7 @@ class __AudioBackend(QtCore.QObject):
             channels=device['max_input_channels'],
             blocksize=FRAMES_PER_BUFFER,
             # latency=latency,
-            samplerate=SAMPLING_RATE)
+            samplerate=samplerate)
 
         sampleSize = 4  # the sample size in bytes (float32)
         nchannels_max = device['max_input_channels']  # the number of channels that we record
@@ -337,7 +650,7 @@ class __AudioBackend(QtCore.QObject):
         ringbufferSeconds = 3.
 
         # The number of elements in the buffer (must be a power of 2)
-        ringbufferSize = 2**int(math.log2(ringbufferSeconds * SAMPLING_RATE))
+        ringbufferSize = 2**int(math.log2(ringbufferSeconds * samplerate))
 
         ringBuffer = rtmixer.RingBuffer(elementSize, ringbufferSize)
 
@@ -349,8 +662,27 @@ class __AudioBackend(QtCore.QObject):
 
         return (stream, ringBuffer, action, nchannels_max)
 
-    def log_supported_input_formats(self, device):
-        samplerates = [22050, 44100, 48000, 96000]
+    # method
+    # returns the cached formats of the device, or None when they have not been probed yet
+    def get_supported_input_formats(self, device):
+        return self.capability_cache.get(device, self.get_hostapi_name(device))
+
+    # method
+    def probe_supported_input_formats(self, device):
+        api = self.get_hostapi_name(device)
+
+        formats = self.capability_cache.get(device, api)
+        if formats is not None:
+            self.logger.info(f"Supported formats for '{device['name']}' on '{api}' (cached): {formats}")
+            return
+
+        # the sweep runs before the stream is opened, on the thread that opens it,
+        # since PortAudio cannot be queried concurrently
+        self.sweep_input_formats(device, api)
+
+    # method
+    def sweep_input_formats(self, device, api):
+        samplerates = SAMPLING_RATES
         dtypes = [float32, int16, int8]
         supported_formats = []
         for samplerate in samplerates:
@@ -366,7 +698,7 @@ class __AudioBackend(QtCore.QObject):
                 except Exception:
                     pass # check_input_settings throws when the format is not supported
 
-        api = sounddevice.query_hostapis(device['hostapi'])['name']
+        self.capability_cache.set(device, api, supported_formats)
         self.logger.info(f"Supported formats for '{device['name']}' on '{api}': {supported_formats}")
 
     # method
@@ -374,7 +706,7 @@ class __AudioBackend(QtCore.QObject):
         # by default we open the device stream with all the channels
         # (interleaved in the data buffer)
         stream = sounddevice.OutputStream(
-            samplerate=SAMPLING_RATE,
+            samplerate=self.samplerate,
             blocksize=FRAMES_PER_BUFFER,
             device=device['index'],
             channels=device['max_output_channels'],
@@ -390,7 +722,7 @@ class __AudioBackend(QtCore.QObject):
             device=device['index'],
             channels=device['max_output_channels'],
             dtype=output_format,
-            samplerate=SAMPLING_RATE)
+            samplerate=self.samplerate)
 
     # method
     # return the index of the current input device in the input devices list
@@ -420,6 +752,15 @@ class __AudioBackend(QtCore.QObject):
     def get_current_second_channel(self):
         return self.second_channel
 
+    # method
+    def get_selected_channels(self):
+        if self.channels is not None:
+            return self.channels
+        elif self.duo_input:
+            return [self.first_channel, self.second_channel]
+        else:
+            return [self.first_channel]
+
     # method
     def get_current_device_nchannels(self):
         return self.device['max_input_channels']
@@ -427,50 +768,205 @@ class __AudioBackend(QtCore.QObject):
     def get_device_outputchannels_count(self, device):
         return device['max_output_channels']
 
-    def fetchAudioData(self):
-        if self.action is None or self.ringBuffer is None:
+    # method
+    # replace the input device by a file or synthetic source (see offline_sources),
+    # read at the pace of its sample rate, or as fast as possible.
+    # A None source goes back to the input device.
+    def set_offline_source(self, source, realtime=True):
+        with self.lock:
+            self.offline_source = source
+            self.offline_realtime = realtime
+            self.offline_start = None
+            self.offline_frames = 0
+
+            if self.stream is not None:
+                if source is None:
+                    self.start_capture()
+                else:
+                    self.stop_capture()
+
+            samplerate = source.samplerate if source is not None else self.device_samplerate
+
+        if source is not None:
+            self.logger.info("Reading from an offline source at %d Hz, %s", samplerate, "in real time" if realtime else "as fast as possible")
+
+        if samplerate != self.samplerate:
+            self.samplerate = samplerate
+            self.samplerate_changed.emit(samplerate)
+
+    # method
+    # record the captured samples to a disk-backed ring store of the given duration,
+    # a None path stops the recording
+    def set_history(self, path, seconds=DEFAULT_HISTORY_SECONDS):
+        with self.lock:
+            if self.history is not None:
+                self.history.close()
+                self.history = None
+            self.history_path = path
+            self.history_seconds = seconds
+
+    def get_history(self):
+        return self.history
+
+    def record_history(self, floatdata):
+        if self.history_path is None:
             return
 
-        while self.ringBuffer.read_available >= FRAMES_PER_BUFFER:
-            read, buf1, buf2 = self.ringBuffer.get_read_buffers(FRAMES_PER_BUFFER)
-            assert read == FRAMES_PER_BUFFER
-            buffer1 = frombuffer(buf1, dtype='float32')
-            buffer2 = frombuffer(buf2, dtype='float32')
-            buffer = concatenate((buffer1, buffer2)).astype(float64)
-            buffer.shape = -1, self.nchannels_max
-            self.ringBuffer.advance_read_index(FRAMES_PER_BUFFER)
+        # the store is (re)created with the format of the captured data
+        if self.history is None or self.history.channels != floatdata.shape[0] or self.history.samplerate != self.samplerate:
+            if self.history is not None:
+                self.logger.warning("The capture format changed, restarting the history")
+                self.history.close()
+            try:
+                self.history = HistoryStore(self.history_path, floatdata.shape[0], self.samplerate, self.history_seconds)
+            except OSError:
+                self.logger.exception("Failed to open the history file %s", self.history_path)
+                self.history_path = None
+                self.history = None
+                return
 
-            channel = self.get_current_first_channel()
-            if self.duo_input:
-                channel_2 = self.get_current_second_channel()
+        self.history.push(floatdata)
 
-            floatdata1 = buffer[:, channel]
+    def fetch_offline(self):
+        if not self.offline_running:
+            return
 
-            if self.duo_input:
-                floatdata2 = buffer[:, channel_2]
-                floatdata = vstack((floatdata1, floatdata2))
-            else:
-                floatdata = floatdata1
-                floatdata.shape = (1, floatdata.size)
+        if self.offline_realtime:
+            now = perf_counter()
+            if self.offline_start is None:
+                # (re)start the clock where the delivered data stops
+                self.offline_start = now - self.offline_frames / self.samplerate
+            due = int((now - self.offline_start) * self.samplerate) - self.offline_frames
+            count = due - due % FRAMES_PER_BUFFER
+        elif self.pending.busy():
+            # as fast as the widgets can handle it
+            count = 0
+        else:
+            count = OFFLINE_CHUNKS_PER_FETCH * FRAMES_PER_BUFFER
+
+        if count <= 0 or self.offline_source.exhausted():
+            return
 
-            input_time = self.get_stream_time()
+        data = self.offline_source.read(count)
 
-            input_overflows = self.action.stats.input_overflows
-            input_overflow = input_overflows > self.xruns
-            if input_overflow:
-                self.xruns = input_overflows
-                self.logger.info("Stream overflow!")
-                self.underflow.emit()
+        channels = [channel for channel in self.get_selected_channels() if channel < data.shape[0]]
+        if len(channels) == 0:
+            channels = [0]
 
-            self.new_data_available.emit(floatdata, input_time, input_overflow)
+        floatdata = data[channels, :].astype(self.dtype)
 
-            self.chunk_number += 1
+        self.offline_frames += floatdata.shape[1]
+        self.chunk_number += floatdata.shape[1] // FRAMES_PER_BUFFER
+
+        # the time of an offline source is the position in the source
+        self.emit_data(floatdata, self.offline_frames / self.samplerate, False)
+
+        if self.offline_source.exhausted():
+            self.logger.info("End of the offline source, after %.1f s", self.offline_frames / self.samplerate)
+
+    def fetchAudioData(self):
+        with self.lock:
+            if self.offline_source is not None:
+                self.fetch_offline()
+                self.flush_pending()
+                return
+
+            if self.action is None or self.ringBuffer is None:
+                return
+
+            t0 = perf_counter()
+            backlog = self.ringBuffer.read_available
+            oldest_frame_time = self.capture_time(self.frames_read)
+
+            # drain everything that is available, in a whole number of chunks,
+            # and queue it for the next delivery
+            available = self.ringBuffer.read_available
+            count = available - available % FRAMES_PER_BUFFER
+            if count > 0:
+                self.deliver(count)
+            self.flush_pending()
+
+            # drain the additional inputs in the same pass, each one has its own pending delivery
+            for source in self.extra_inputs:
+                source.fetch(self.dtype)
+                source.flush_pending()
+
+            # age of the oldest frame that was waiting in the ring buffer, in the stream time
+            chunk_age = self.get_stream_time() - oldest_frame_time if backlog > 0 and oldest_frame_time is not None else 0.
+            t1 = perf_counter()
+            self.telemetry.record(t1, t1 - t0, backlog, chunk_age, self.xruns)
+
+    # stream time of the capture of a frame of the recording, or None before it starts.
+    # The callback records the ADC time of the first frame of the recording action,
+    # and the action ends instead of dropping frames, so the next ones follow at the sample rate
+    def capture_time(self, frame):
+        if self.action.actual_time == 0.:
+            return None
+        return self.action.actual_time + self.capture_gap + frame / self.device_samplerate
+
+    def deliver(self, count):
+        read, buf1, buf2 = self.ringBuffer.get_read_buffers(count)
+        assert read == count
+
+        channels = self.get_selected_channels()
+
+        # select the channels straight from the two parts of the rtmixer ring buffer,
+        # so that only the selected channels are converted to the pipeline type,
+        # as one (channels, frames) block whatever the number of channels
+        floatdata = empty((len(channels), count), dtype=self.dtype)
+        buffer1 = frombuffer(buf1, dtype='float32').reshape(-1, self.nchannels_max)
+        buffer2 = frombuffer(buf2, dtype='float32').reshape(-1, self.nchannels_max)
+        n1 = buffer1.shape[0]
+        floatdata[:, :n1] = buffer1[:, channels].T
+        floatdata[:, n1:] = buffer2[:, channels].T
+
+        self.ringBuffer.advance_read_index(count)
+        self.frames_read += count
+
+        input_time = self.get_stream_time()
+
+        input_overflows = self.action.stats.input_overflows
+        input_overflow = input_overflows > self.xruns
+        if input_overflow:
+            self.xruns = input_overflows
+            self.logger.info("Stream overflow!")
+            self.underflow.emit()
+
+        self.record_history(floatdata)
+
+        self.emit_data(floatdata, input_time, input_overflow)
+
+        self.chunk_number += count // FRAMES_PER_BUFFER
+
+    def emit_data(self, floatdata, input_time, input_overflow):
+        self.pending.queue(floatdata, input_time, input_overflow)
+
+    def flush_pending(self):
+        self.pending.flush(self.new_data_available)
+
+    # slot
+    def data_delivered(self, floatdata, input_time, input_overflow):
+        self.pending.delivered()
 
     def set_single_input(self):
-        self.duo_input = False
+        with self.lock:
+            self.duo_input = False
+            self.channels = None
 
     def set_duo_input(self):
-        self.duo_input = True
+        with self.lock:
+            self.duo_input = True
+            self.channels = None
+
+    def set_all_inputs(self):
+        return self.select_channels(range(self.nchannels_max))
+
+    def set_float32_pipeline(self, enabled):
+        with self.lock:
+            self.dtype = float32 if enabled else float64
+
+    def is_float32_pipeline(self):
+        return self.dtype == float32
 
     # returns the stream time in seconds
     def get_stream_time(self):
@@ -485,10 +981,35 @@ class __AudioBackend(QtCore.QObject):
                 self.logger.exception("Failed to read stream time")
             return 0
 
+    # stop_capture and start_capture are called with the lock held,
+    # so that the stream is not stopped or started during a fetch
+    def stop_capture(self):
+        if self.pause_time is None:
+            self.pause_time = self.get_stream_time()
+        self.stream.stop()
+
+    def start_capture(self):
+        self.stream.start()
+        # the frames recorded after a pause are later than their count tells
+        if self.pause_time is not None:
+            self.capture_gap += self.get_stream_time() - self.pause_time
+            self.pause_time = None
+
     def pause(self):
-        if self.stream is not None:
-            self.stream.stop()
+        with self.lock:
+            self.offline_running = False
+            self.offline_start = None
+            if self.stream is not None:
+                self.stop_capture()
+            for source in self.extra_inputs:
+                source.stop()
 
     def restart(self):
-        if self.stream is not None:
-            self.stream.start()
+        with self.lock:
+            self.offline_running = True
+            if self.stream is not None and self.offline_source is None:
+                self.start_capture()
+            for source in self.extra_inputs:
+                source.start()
+                # the clocks may have drifted while stopped
+                source.align(self.get_stream_time())
@@ -20,17 +20,22 @@
 from PyQt5 import QtCore
 import numpy as np
 from friture.ringbuffer import RingBuffer
-
-FRAMES_PER_BUFFER = 1024
+from friture.shared_ringbuffer import SharedRingBuffer
+from friture.analysis_workers import GetAnalysisWorkerPool
 
 
 class AudioBuffer(QtCore.QObject):
+    # emitted once per block delivered by the audio backend
     new_data_available = QtCore.pyqtSignal(np.ndarray)
 
     def __init__(self):
         super().__init__()
 
-        self.ringbuffer = RingBuffer()
+        # the analysis workers read the samples from shared memory
+        if GetAnalysisWorkerPool().enabled():
+            self.ringbuffer = SharedRingBuffer()
+        else:
+            self.ringbuffer = RingBuffer()
         self.newpoints = 0
         self.lastDataTime = 0.
 
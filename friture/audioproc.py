@@ -19,9 +19,10 @@
 
 import logging
 
-from numpy import linspace, log10, cos, arange, pi
-from numpy.fft import rfft
-from friture.audiobackend import SAMPLING_RATE
+from numpy import linspace, log10, cos, arange, pi, empty, multiply
+from friture.signal.fft_backend import rfft
+from friture.ringbuffer import frames_view
+from friture.audiobackend import DEFAULT_SAMPLING_RATE
 
 
 class audioproc():
@@ -29,7 +30,8 @@ class audioproc():
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
-        self.freq = linspace(0, SAMPLING_RATE / 2, 10)
+        self.samplerate = DEFAULT_SAMPLING_RATE
+        self.freq = linspace(0, self.samplerate / 2, 10)
         self.A = 0. * self.freq
         self.B = 0. * self.freq
         self.C = 0. * self.freq
@@ -39,6 +41,11 @@ class audioproc():
 
         self.fft_size = 10
 
+        # work buffers for the batched analysis, reused from one call to the next
+        self.windowed = empty((0, 0, 0))
+        self.typed_window = self.window
+        self.spectra = empty((0, 0, 0))
+
     def analyzelive(self, samples):
         # FFT for a linear transformation in frequency scale
         fft = rfft(samples * self.window)
@@ -46,6 +53,38 @@ class audioproc():
 
         return spectrum
 
+    def analyzelive_batch(self, samples, hop):
+        '''Compute the power spectra of all the frames of `samples`, a
+        (channels, length) array, taken every `hop` samples.'''
+        return self.analyze_frames(frames_view(samples, self.fft_size, hop))
+
+    def analyze_frames(self, frames):
+        '''Compute the power spectra of a (channels, frames, fft_size) array.
+
+        All the frames are windowed and transformed at once, with a single rfft call.
+        The result is a (channels, frequencies, frames) array that is reused
+        by the next call, so the caller must not hold on to it.'''
+        # the work is done in the precision of the samples (float32 or float64)
+        if self.windowed.shape != frames.shape or self.windowed.dtype != frames.dtype:
+            self.windowed = empty(frames.shape, dtype=frames.dtype)
+            self.typed_window = self.window.astype(frames.dtype)
+        multiply(frames, self.typed_window, out=self.windowed)
+
+        fft = rfft(self.windowed, axis=-1)
+
+        channels, count, bins = fft.shape
+        if self.spectra.shape != (channels, bins, count) or self.spectra.dtype != frames.dtype:
+            self.spectra = empty((channels, bins, count), dtype=frames.dtype)
+
+        # write the spectra with the frequencies along the first axis of each channel,
+        # which is the layout expected by the smoothing and display code
+        spectra = self.spectra.transpose(0, 2, 1)
+        multiply(fft.real, fft.real, out=spectra)
+        spectra += fft.imag ** 2
+        spectra /= self.size_sq
+
+        return self.spectra
+
     def norm_square(self, fft):
         return (fft*fft.conjugate()).real / self.size_sq
 
@@ -56,6 +95,13 @@ class audioproc():
             self.update_window()
             self.update_size()
 
+    def set_samplerate(self, samplerate):
+        if samplerate != self.samplerate:
+            self.samplerate = samplerate
+            # force the frequency scale to be recomputed
+            self.freq = linspace(0, self.samplerate / 2, 10)
+            self.update_freq_cache()
+
     def set_maxfreq(self, maxfreq):
         if maxfreq != self.maxfreq:
             self.maxfreq = maxfreq
@@ -78,12 +124,14 @@ class audioproc():
         n = arange(0, N)
         # Hann window : better frequency resolution than the rectangular window
         self.window = 0.5 * (1. - cos(2 * pi * n / (N - 1)))
+        # force the batch work buffers to be reallocated with the new window
+        self.windowed = empty((0, 0, 0))
         self.logger.info("audioproc: updating window")
 
     def update_freq_cache(self):
         if len(self.freq) != self.fft_size / 2 + 1:
             self.logger.info("audioproc: updating self.freq cache")
-            self.freq = linspace(0, SAMPLING_RATE // 2, self.fft_size // 2 + 1)
+            self.freq = linspace(0, self.samplerate // 2, self.fft_size // 2 + 1)
 
             # compute psychoacoustic weighting. See http://en.wikipedia.org/wiki/A-weighting
             f = self.freq
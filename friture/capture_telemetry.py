@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per-tick measurements of the capture path: backlog of the capture ring
+buffer, age of the delivered audio, duration of the drain, and overflows.
+
+They are kept in fixed-size arrays, so that recording them costs no allocation."""
+
+import logging
+import threading
+
+import numpy as np
+
+# number of ticks kept, a bit less than 30 s at the default capture period
+TELEMETRY_LENGTH = 4096
+
+
+class CaptureTelemetry:
+
+    def __init__(self, length=TELEMETRY_LENGTH):
+        self.logger = logging.getLogger(__name__)
+
+        # written from the capture thread, read from the GUI thread
+        self.lock = threading.Lock()
+
+        self.times = np.zeros(length)
+        self.drain_durations = np.zeros(length)
+        self.backlogs = np.zeros(length, dtype=np.int64)
+        self.chunk_ages = np.zeros(length)
+        self.overflows = np.zeros(length, dtype=np.int64)
+
+        self.length = length
+        self.index = 0
+        self.count = 0
+
+        self.dump_file = None
+
+    # method
+    # time in seconds, drain duration in seconds, backlog in frames,
+    # age of the oldest delivered frame since its capture in seconds, cumulative count of overflows
+    def record(self, time, drain_duration, backlog, chunk_age, overflows):
+        with self.lock:
+            i = self.index
+            self.times[i] = time
+            self.drain_durations[i] = drain_duration
+            self.backlogs[i] = backlog
+            self.chunk_ages[i] = chunk_age
+            self.overflows[i] = overflows
+
+            self.index = (i + 1) % self.length
+            self.count = min(self.count + 1, self.length)
+
+            if self.dump_file is not None:
+                self.dump_file.write("%.6f,%.6f,%d,%.6f,%d\n" % (time, drain_duration, backlog, chunk_age, overflows))
+
+    # method
+    # the recorded ticks, oldest first
+    def history(self):
+        with self.lock:
+            order = (self.index - self.count + np.arange(self.count)) % self.length
+            return (self.times[order], self.drain_durations[order], self.backlogs[order],
+                    self.chunk_ages[order], self.overflows[order])
+
+    # method
+    def summary(self):
+        '''Statistics over the recorded ticks, or None if there is none.'''
+        times, drain_durations, backlogs, chunk_ages, overflows = self.history()
+
+        if len(times) == 0:
+            return None
+
+        span = times[-1] - times[0]
+        overflow_count = overflows[-1] - overflows[0]
+
+        p50, p99 = np.percentile(drain_durations, [50, 99])
+
+        return {
+            "ticks": len(times),
+            "span_s": span,
+            "drain_p50_ms": 1e3 * p50,
+            "drain_p99_ms": 1e3 * p99,
+            "drain_max_ms": 1e3 * drain_durations.max(),
+            "backlog_max_frames": int(backlogs.max()),
+            "chunk_age_p99_ms": 1e3 * np.percentile(chunk_ages, 99),
+            "chunk_age_max_ms": 1e3 * chunk_ages.max(),
+            "overflows_per_minute": 60. * overflow_count / span if span > 0 else 0.,
+        }
+
+    # method
+    # append each tick to a CSV file, until stop_dump is called
+    def start_dump(self, path):
+        with self.lock:
+            if self.dump_file is not None:
+                self.dump_file.close()
+            self.dump_file = open(path, "w")
+            self.dump_file.write("time_s,drain_s,backlog_frames,chunk_age_s,overflows\n")
+        self.logger.info("Dumping the capture telemetry to %s", path)
+
+    def stop_dump(self):
+        with self.lock:
+            if self.dump_file is not None:
+                self.dump_file.close()
+                self.dump_file = None
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import sys
+
+from PyQt5 import QtCore
+
+from friture.audiobackend import FRAMES_PER_BUFFER
+from friture.exceptionhandler import fileexcepthook
+
+
+def capture_period_ms(samplerate):
+    # wake up twice per audio chunk, so that the capture ring buffer is drained
+    # at audio rate, whatever the load of the GUI thread
+    return max(1, int(500 * FRAMES_PER_BUFFER / samplerate))
+
+
+class CaptureWorker(QtCore.QObject):
+
+    # message of an exception raised while draining, for the GUI thread
+    error = QtCore.pyqtSignal(str)
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+        self.timer = None
+        # an error that repeats on each wake-up is reported once
+        self.failing = False
+
+    # slot
+    def start(self):
+        # the timer is created here so that it belongs to the capture thread
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(capture_period_ms(self.backend.get_samplerate()))
+        self.timer.timeout.connect(self.drain)
+        self.timer.start()
+
+    # slot
+    def samplerate_changed(self, samplerate):
+        if self.timer is not None:
+            self.timer.setInterval(capture_period_ms(samplerate))
+
+    # slot
+    def drain(self):
+        # the data signals of the backend are emitted from this thread,
+        # so they are queued to the widgets in the GUI thread. The backend
+        # coalesces the blocks so that a single one is pending at a time
+        try:
+            self.backend.fetchAudioData()
+        except Exception:
+            # the message boxes can only be shown from the GUI thread,
+            # the exception is reported there through a queued signal
+            if not self.failing:
+                self.failing = True
+                self.error.emit(fileexcepthook(*sys.exc_info()))
+            return
+
+        self.failing = False
+
+
+class CaptureThread:
+    '''Drains the audio capture ring buffer in a dedicated thread,
+    decoupled from the display timer of the GUI thread.'''
+
+    def __init__(self, backend):
+        self.logger = logging.getLogger(__name__)
+
+        self.backend = backend
+
+        self.thread = QtCore.QThread()
+        self.thread.setObjectName("Capture")
+
+        self.worker = CaptureWorker(backend)
+        self.worker.moveToThread(self.thread)
+        self.error = self.worker.error
+        self.thread.started.connect(self.worker.start)
+        backend.samplerate_changed.connect(self.worker.samplerate_changed)
+
+    def start(self):
+        self.logger.info("Starting the capture thread, polling every %d ms", capture_period_ms(self.backend.get_samplerate()))
+        self.thread.start(QtCore.QThread.TimeCriticalPriority)
+
+    def stop(self):
+        if self.thread.isRunning():
+            self.logger.info("Stopping the capture thread")
+            self.thread.quit()
+            self.thread.wait()
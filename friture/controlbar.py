@@ -38,6 +38,11 @@ class ControlBar(QtWidgets.QWidget):
         self.combobox_select.setCurrentIndex(0)
         self.combobox_select.setToolTip("Select the type of audio widget")
 
+        # only shown when additional input devices are open
+        self.combobox_source = QtWidgets.QComboBox(self)
+        self.combobox_source.setToolTip("Select the input device of the audio widget")
+        self.combobox_source.setVisible(False)
+
         self.settings_button = QtWidgets.QToolButton(self)
         self.settings_button.setToolTip("Customize the audio widget")
 
@@ -52,6 +57,7 @@ class ControlBar(QtWidgets.QWidget):
         self.close_button.setToolTip("Close the audio widget")
 
         self.layout.addWidget(self.combobox_select)
+        self.layout.addWidget(self.combobox_source)
         self.layout.addWidget(self.settings_button)
         self.layout.addWidget(self.close_button)
         self.layout.addStretch()
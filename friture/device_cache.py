@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""On-disk cache of the formats supported by the audio devices, so that
+they are not probed again on each launch."""
+
+import json
+import logging
+import os
+
+import appdirs
+
+CACHE_FILE_NAME = "device_capabilities.json"
+
+
+def device_key(device, api):
+    return "%s|%s|%d" % (api, device['name'], device['max_input_channels'])
+
+
+class DeviceCapabilityCache:
+
+    def __init__(self, path=None):
+        self.logger = logging.getLogger(__name__)
+
+        if path is None:
+            dirs = appdirs.AppDirs("Friture", "")
+            path = os.path.join(dirs.user_cache_dir, CACHE_FILE_NAME)
+
+        self.path = path
+        self.capabilities = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                capabilities = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            self.logger.exception("Failed to read the device capability cache, it will be rebuilt")
+            return {}
+
+        return capabilities if isinstance(capabilities, dict) else {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # write to a temporary file first, so that a crash cannot leave a truncated cache
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.capabilities, f, indent=1)
+            os.replace(temp_path, self.path)
+        except OSError:
+            self.logger.exception("Failed to write the device capability cache")
+
+    def get(self, device, api):
+        '''Return the cached formats of the device, or None if it has not been probed yet.'''
+        return self.capabilities.get(device_key(device, api))
+
+    def set(self, device, api, formats):
+        self.capabilities[device_key(device, api)] = formats
+        self.save()
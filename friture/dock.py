@@ -30,13 +30,16 @@ class Dock(QtWidgets.QWidget):
         super().__init__(parent)
 
         self.dockmanager = parent.dockmanager
-        self.audiobuffer = parent.audiobuffer
+        self.input_sources = parent.input_sources
+        self.audiobuffer = self.input_sources.main_audiobuffer()
 
         self.setObjectName(name)
 
         self.control_bar = ControlBar(self)
 
         self.control_bar.combobox_select.activated.connect(self.indexChanged)
+        self.control_bar.combobox_source.activated.connect(self.source_select)
+        self.input_sources.sources_changed.connect(self.sources_changed)
         self.control_bar.settings_button.clicked.connect(self.settings_slot)
         self.control_bar.close_button.clicked.connect(self.closeClicked)
 
@@ -56,9 +59,13 @@ class Dock(QtWidgets.QWidget):
             widgetId = widgetIds()[0]
 
         self.widget_select(widgetId)
+        self.sources_changed()
 
     # note that by default the closeEvent is accepted, no need to do it explicitely
     def closeEvent(self, event):
+        # close the audio widget too, so that it releases its shared resources
+        if self.audiowidget is not None:
+            self.audiowidget.close()
         self.dockmanager.close_dock(self)
 
     def closeClicked(self, checked):
@@ -99,6 +106,32 @@ class Dock(QtWidgets.QWidget):
         index = widgetIds().index(widgetId)
         self.control_bar.combobox_select.setCurrentIndex(index)
 
+    # slot
+    def source_select(self, index):
+        audiobuffer = self.input_sources.audiobuffers[index]
+
+        if audiobuffer is self.audiobuffer:
+            return
+
+        self.audiobuffer.new_data_available.disconnect(self.audiowidget.handle_new_data)
+        self.audiobuffer = audiobuffer
+        self.audiowidget.set_buffer(self.audiobuffer)
+        self.audiobuffer.new_data_available.connect(self.audiowidget.handle_new_data)
+
+        self.control_bar.combobox_source.setCurrentIndex(index)
+
+    # slot
+    def sources_changed(self):
+        # fall back to the main input when the source of the dock has been closed
+        if self.audiobuffer not in self.input_sources.audiobuffers:
+            self.source_select(0)
+
+        combobox = self.control_bar.combobox_source
+        combobox.clear()
+        combobox.addItems(self.input_sources.names)
+        combobox.setCurrentIndex(self.input_sources.index_of(self.audiobuffer))
+        combobox.setVisible(len(self.input_sources.names) > 1)
+
     def canvasUpdate(self):
         if self.audiowidget is not None:
             self.audiowidget.canvasUpdate()
@@ -118,8 +151,12 @@ class Dock(QtWidgets.QWidget):
     # method
     def saveState(self, settings):
         settings.setValue("type", self.widgetId)
+        settings.setValue("source", self.input_sources.names[self.input_sources.index_of(self.audiobuffer)])
         self.audiowidget.saveState(settings)
 
     # method
     def restoreState(self, settings):
+        source = settings.value("source", "")
+        if source in self.input_sources.names:
+            self.source_select(self.input_sources.names.index(source))
         self.audiowidget.restoreState(settings)
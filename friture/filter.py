@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from numpy import arange, sqrt, zeros, array
-from friture_extensions.lfilter import pyx_lfilter_float64_1D
-from .signal.decimate import decimate
+from friture_extensions.lfilter import pyx_lfilter_1D, pyx_lfilter_2D
+from friture_extensions.filter_bank import pyx_filter_bank_smoothed_energies
+from .signal.decimate import decimate, decimate_filtic
 
 NOCTAVE = 9
 
@@ -70,7 +71,7 @@ def octave_filter_bank(forward, feedback, x, zis=None):
             zis += [zeros(max(len(forward[i]), len(feedback[i])) - 1)]
 
     for i in range(0, filter_count):
-        filt, zf = pyx_lfilter_float64_1D(forward[i], feedback[i], x, zis[i])
+        filt, zf = pyx_lfilter_1D(forward[i], feedback[i], x, zis[i])
         # zf can be reused to restart the filter
         zfs += [zf]
         y += [filt]
@@ -80,16 +81,23 @@ def octave_filter_bank(forward, feedback, x, zis=None):
 # Note: we may have one filter in excess here : the low-pass filter for decimation
 # does approximately the same thing as the low-pass component of the highest band-pass
 # filter for the octave
+# The decimation is done by the polyphase half-band filter of friture.signal.decimate
 
 
-def octave_filter_bank_decimation(blow, alow, forward, feedback, x, zis):
+def octave_filter_bank_decimation(forward, feedback, x, zis):
+    # Design-time only: the band signals are plotted by filter_design.main(),
+    # the analysis uses octave_filter_bank_decimation_energies.
     # This function filters the waveform x with the array of filters
     # specified by the forward and feedback parameters. Each row
     # of the forward and feedback parameters are the parameters
     # to the Matlab builtin function "filter".
+    # x is either a 1D signal or a (channels, samples) array, in which case
+    # all the channels are filtered together by the 2D kernel.
     bands_per_octave = len(forward)
     filter_count = NOCTAVE * bands_per_octave
 
+    lfilter = pyx_lfilter_2D if x.ndim == 2 else pyx_lfilter_1D
+
     y = [0.] * filter_count
     dec = [0.] * filter_count
 
@@ -102,14 +110,14 @@ def octave_filter_bank_decimation(blow, alow, forward, feedback, x, zis):
 
     for j in range(0, NOCTAVE):
         for i in range(0, bands_per_octave)[::-1]:
-            filt, zf = pyx_lfilter_float64_1D(forward[i], feedback[i], x_dec, zis[m])
+            filt, zf = lfilter(forward[i], feedback[i], x_dec, zis[m])
             m += 1
             # zf can be reused to restart the filter
             zfs += [zf]
             y[k] = filt
             dec[k] = 2 ** j
             k -= 1
-        x_dec, zf = decimate(blow, alow, x_dec, zis[m])
+        x_dec, zf = decimate(x_dec, zis[m])
         m += 1
         # zf can be reused to restart the filter
         zfs += [zf]
@@ -117,16 +125,59 @@ def octave_filter_bank_decimation(blow, alow, forward, feedback, x, zis):
     return y, dec, zfs
 
 
-def octave_filter_bank_decimation_filtic(blow, alow, forward, feedback):
-    '''build a proper array of zero initial conditions to start the filters.'''
+def octave_filter_bank_decimation_energies(forward, feedback, x, zis, alphas, energies):
+    # Same filter bank as octave_filter_bank_decimation, but only the smoothed
+    # energies of the bands are computed, updated in place in `energies`, a
+    # (bands, channels) array, with the smoothing factors `alphas`.
+    # forward and feedback are (bands_per_octave, order + 1) arrays, all the
+    # bands of an octave are filtered by a single kernel call.
+    # x is a (channels, samples) array.
+    bands_per_octave = forward.shape[0]
+
+    x_dec = x
+
+    zfs = []
+
+    for j in range(0, NOCTAVE):
+        # the bands of the octave j are in increasing order, from the end
+        k = (NOCTAVE - 1 - j) * bands_per_octave
+        # the filter delays are updated in place
+        pyx_filter_bank_smoothed_energies(forward, feedback, x_dec, zis[2 * j],
+                                          alphas[k:k + bands_per_octave], energies[k:k + bands_per_octave])
+        zfs += [zis[2 * j]]
+        x_dec, zf = decimate(x_dec, zis[2 * j + 1])
+        # zf can be reused to restart the filter
+        zfs += [zf]
+
+    return zfs
+
+
+def octave_filter_bank_decimation_energies_filtic(forward, feedback, nchannels):
+    '''build a proper array of zero initial conditions to start the filters
+    of octave_filter_bank_decimation_energies'''
+    zfs = []
+
+    for j in range(0, NOCTAVE):
+        zfs += [zeros((forward.shape[0], nchannels, max(forward.shape[1], feedback.shape[1]) - 1))]
+        zfs += [decimate_filtic(nchannels)]
+
+    return zfs
+
+
+def octave_filter_bank_decimation_filtic(forward, feedback, nchannels=None):
+    '''build a proper array of zero initial conditions to start the filters
+    of octave_filter_bank_decimation, at design time.
+    With nchannels, the initial conditions are for (channels, samples) inputs.'''
     bands_per_octave = len(forward)
     zfs = []
 
+    def filtic(l):
+        return zeros(l) if nchannels is None else zeros((nchannels, l))
+
     for j in range(0, NOCTAVE):
         for i in range(0, bands_per_octave)[::-1]:
             l = max(len(forward[i]), len(feedback[i])) - 1
-            zfs += [zeros(l)]
-        l = max(len(blow), len(alow)) - 1
-        zfs += [zeros(l)]
+            zfs += [filtic(l)]
+        zfs += [decimate_filtic(nchannels)]
 
     return zfs
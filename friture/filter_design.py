@@ -1,24 +1,29 @@
 # -*- coding: utf-8 -*-
-from numpy import pi, exp, arange, cos, sin, sqrt, zeros, ones, log, arange, set_printoptions
+from numpy import pi, exp, arange, cos, sin, sqrt, zeros, ones, log, arange, set_printoptions, minimum
 # the three following lines are a workaround for a bug with scipy and py2exe
 # together. See http://www.pyinstaller.org/ticket/83 for reference.
 from scipy.special import factorial
 import scipy
 scipy.factorial = factorial
 
-# importing from scipy.signal.signaltools and scipy.signal.filter_design instead of scipy.signal
-# decreases dramatically the number of modules imported
-from scipy.signal.signaltools import lfilter
-from scipy.signal.filter_design import ellip, butter, cheby1, iirdesign, freqz
-from scipy.signal.fir_filter_design import firwin
+from scipy.signal import ellip, butter, cheby1, freqz, firwin
 
 # allow this script to properly import other friture modules
 import sys
-sys.path.insert(0, '.')
+if __name__ == "__main__":
+    sys.path.insert(0, '.')
 from friture.filter import (octave_frequencies, octave_filter_bank,
-                            octave_filter_bank_decimation, NOCTAVE)
+                            octave_filter_bank_decimation,
+                            octave_filter_bank_decimation_filtic, NOCTAVE)
+from friture.signal.decimate import decimate, decimate_filtic
+
+from friture.audiobackend import DEFAULT_SAMPLING_RATE, SAMPLING_RATES
 
-from friture.audiobackend import SAMPLING_RATE
+# the highest octave of the bank is moved down by whole octaves until its center
+# is below this fraction of the Nyquist frequency
+MAX_TOP_OCTAVE_CENTER = 0.75
+# the band edges above this fraction of the Nyquist frequency are squeezed below it
+MAX_BAND_EDGE = 0.98
 
 # bank of filters for any other kind of frequency scale
 # http://cobweb.ecn.purdue.edu/~malcolm/apple/tr35/PattersonsEar.pdf
@@ -103,7 +108,7 @@ def octave_filters(total_band_count, bands_per_octave):
 
     fi, f_low, f_high = octave_frequencies(total_band_count, bands_per_octave)
 
-    fs = SAMPLING_RATE
+    fs = DEFAULT_SAMPLING_RATE
     wi = fi / (fs / 2.)  # normalized frequencies
     w_low = f_low / (fs / 2.)
     w_high = f_high / (fs / 2.)
@@ -126,7 +131,7 @@ def octave_filters(total_band_count, bands_per_octave):
     return [B, A, fi, f_low, f_high]
 
 
-def octave_filters_oneoctave(total_band_count, bands_per_octave):
+def octave_filters_oneoctave(total_band_count, bands_per_octave, fs=DEFAULT_SAMPLING_RATE):
     # Bandpass Filter Generation
     pbrip = .5      # Pass band ripple
     sbrip = 50      # Stop band rejection
@@ -139,11 +144,18 @@ def octave_filters_oneoctave(total_band_count, bands_per_octave):
     f_low = f_low[-bands_per_octave:]
     f_high = f_high[-bands_per_octave:]
 
-    fs = SAMPLING_RATE
+    # the lower octaves are filtered by the same filters after decimation,
+    # so the center frequencies stay on the nominal ones when the highest octave
+    # is moved by whole octaves
+    while sqrt(fi[0] * fi[-1]) >= MAX_TOP_OCTAVE_CENTER * fs / 2.:
+        fi, f_low, f_high = fi / 2., f_low / 2., f_high / 2.
+
     wi = fi / (fs / 2.)  # normalized frequencies
     w_low = f_low / (fs / 2.)
     w_high = f_high / (fs / 2.)
-    w_high = (w_high < 1.) * w_high + (w_high >= 1.) * 1.
+    # the bands that reach the Nyquist frequency keep their relative width
+    w_high = minimum(w_high, MAX_BAND_EDGE)
+    w_low = minimum(w_low, w_high * f_low / f_high)
 
     B = []
     A = []
@@ -162,33 +174,28 @@ def octave_filters_oneoctave(total_band_count, bands_per_octave):
     return [B, A, fi, f_low, f_high]
 
 
+def filters_params(fs):
+    '''design the filters of the highest octave at the sample rate fs,
+    for all the supported numbers of bands per octave'''
+    params = {}
+
+    for bands_per_octave in [1, 3, 6, 12, 24]:
+        total_band_count = NOCTAVE * bands_per_octave
+        [boct, aoct, fi, flow, fhigh] = octave_filters_oneoctave(total_band_count, bands_per_octave, fs)
+        params['%d' % bands_per_octave] = [boct, aoct, fi.tolist(), flow.tolist(), fhigh.tolist()]
+
+    return params
+
+
 def generate_filters_params():
     import os
     import json
 
     params = {}
 
-    # generate the low-pass filter for decimation
-    Ndec = 3
-    fc = 0.5
-    # other possibilities
-    # (bdec, adec) = ellip(Ndec, 0.05, 30, fc)
-    # print(bdec)
-    # (bdec, adec) = cheby1(Ndec, 0.05, fc)
-    # (bdec, adec) = butter(Ndec, fc)
-    (bdec, adec) = iirdesign(0.48, 0.50, 0.05, 70, analog=0, ftype='ellip', output='ba')
-    # bdec = firwin(30, fc)
-    # adec = [1.]
-
-    # set_printoptions(precision=24)
-
-    params['dec'] = [bdec.tolist(), adec.tolist()]
-
-    # generate the octave filters
-    for bands_per_octave in [1, 3, 6, 12, 24]:
-        total_band_count = NOCTAVE * bands_per_octave
-        [boct, aoct, fi, flow, fhigh] = octave_filters_oneoctave(total_band_count, bands_per_octave)
-        params['%d' % bands_per_octave] = [boct, aoct, fi.tolist(), flow.tolist(), fhigh.tolist()]
+    # generate the octave filters, for each sample rate offered in the settings
+    for fs in SAMPLING_RATES:
+        params['%d' % fs] = filters_params(fs)
 
     out = """\
 # Filters parameters generated from filter_design.py
@@ -216,12 +223,12 @@ def main():
     from numpy import log10, linspace, interp, angle, array, concatenate
 
     N = 2048 * 2 * 2
-    fs = float(SAMPLING_RATE)
+    fs = float(DEFAULT_SAMPLING_RATE)
     channel_count = 20
     low_freq = 20.
 
     impulse = zeros(N)
-    impulse[N / 2] = 1
+    impulse[N // 2] = 1
     f = 1000.
     # impulse = sin(2*pi*f*arange(0, N/fs, 1./fs))
 
@@ -256,54 +263,40 @@ def main():
         m += 1
         semilogx(f, p, 'ko')
 
-    Ndec = 3
-    fc = 0.5
-    # other possibilities
-    # (bdec, adec) = ellip(Ndec, 0.05, 30, fc)
-    # print bdec
-    # (bdec, adec) = cheby1(Ndec, 0.05, fc)
-    # (bdec, adec) = butter(Ndec, fc)
-    (bdec, adec) = iirdesign(0.48, 0.50, 0.05, 70, analog=0, ftype='ellip', output='ba')
-    # bdec = firwin(30, fc)
-    # adec = [1.]
-
+    # the decimation filter is the polyphase half-band filter of friture.signal.decimate
     figure()
     subplot(211)
 
     response = 20. * log10(abs(fft(impulse)))
     plot(fftshift(freqScale), fftshift(response), label="impulse")
 
-    y = lfilter(bdec, adec, impulse)
-    response = 20. * log10(abs(fft(y)))
-    plot(fftshift(freqScale), fftshift(response), label="lowpass")
+    ydec3, zf = decimate(impulse, decimate_filtic())
 
-    ydec = y[::2].repeat(2)
+    ydec = ydec3.repeat(2)
     response = 20. * log10(abs(fft(ydec)))
-    plot(fftshift(freqScale), fftshift(response), label="lowpass + dec2 + repeat2")
+    plot(fftshift(freqScale), fftshift(response), label="half-band dec2 + repeat2")
 
-    ydec2 = interp(list(range(0, len(y))), list(range(0, len(y), 2)), y[::2])
+    ydec2 = interp(list(range(0, len(impulse))), list(range(0, len(impulse), 2)), ydec3)
     response = 20. * log10(abs(fft(ydec2)))
-    plot(fftshift(freqScale), fftshift(response), label="lowpass + dec2 + interp2")
+    plot(fftshift(freqScale), fftshift(response), label="half-band dec2 + interp2")
 
-    ydec3 = y[::2]
     response = 20. * log10(abs(fft(ydec3)))
-    freqScale2 = fftfreq(int(N / 2), 2. / fs)
-    plot(freqScale2, fftshift(response), label="lowpass + dec2")
+    freqScale2 = fftfreq(N // 2, 2. / fs)
+    plot(fftshift(freqScale2), fftshift(response), label="half-band dec2")
 
     legend(loc="lower left")
 
     subplot(212)
     plot(list(range(0, len(impulse))), impulse, label="impulse")
-    plot(list(range(0, len(impulse))), y, label="lowpass")
-    plot(list(range(0, len(impulse))), ydec, label="lowpass + dec2 + repeat2")
-    plot(list(range(0, len(impulse))), ydec2, label="lowpass + dec2 + interp2")
-    plot(list(range(0, len(impulse), 2)), ydec3, label="lowpass + dec2")
+    plot(list(range(0, len(impulse))), ydec, label="half-band dec2 + repeat2")
+    plot(list(range(0, len(impulse))), ydec2, label="half-band dec2 + interp2")
+    plot(list(range(0, len(impulse), 2)), ydec3, label="half-band dec2")
     legend()
 
     [boct, aoct, fi, flow, fhigh] = octave_filters_oneoctave(total_band_count, bands_per_octave)
-    y, dec, zfs = octave_filter_bank_decimation(bdec, adec, boct, aoct, impulse)
+    boct, aoct = array(boct), array(aoct)
+    y, dec, zfs = octave_filter_bank_decimation(boct, aoct, impulse, octave_filter_bank_decimation_filtic(boct, aoct))
     # print "Filter lengths with decimation"
-    # print len(bdec), len(adec)
     # for b, a in zip(boct, aoct):
     #       print len(b), len(a)
 
@@ -327,8 +320,9 @@ def main():
             m += 1
 
     [boct, aoct, fi, flow, fhigh] = octave_filters_oneoctave(total_band_count, bands_per_octave)
-    y1, dec, zfs = octave_filter_bank_decimation(bdec, adec, boct, aoct, impulse[0:int(N / 2)])
-    y2, dec, zfs = octave_filter_bank_decimation(bdec, adec, boct, aoct, impulse[int(N / 2):], zis=zfs)
+    boct, aoct = array(boct), array(aoct)
+    y1, dec, zfs = octave_filter_bank_decimation(boct, aoct, impulse[0:int(N / 2)], octave_filter_bank_decimation_filtic(boct, aoct))
+    y2, dec, zfs = octave_filter_bank_decimation(boct, aoct, impulse[int(N / 2):], zis=zfs)
 
     y = []
     for y1one, y2one in zip(y1, y2):
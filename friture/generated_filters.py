@@ -4,880 +4,5070 @@ import json
 
 JSON_PARAMS = """
 {
-    "1": [
-        [
-            [
-                0.3363108965857415,
-                0.0029152307841421206,
-                -0.6666769535463926,
-                0.0029152307841421848,
-                0.3363108965857415
+    "16000": {
+        "1": [
+            [
+                [
+                    0.22487581200577675,
+                    0.0005739721261747866,
+                    -0.44456115617820335,
+                    0.0005739721261748865,
+                    0.2248758120057768
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    0.26165176274523205,
+                    0.3571603710358635,
+                    0.1013600836871606,
+                    0.2842096764867384
+                ]
+            ],
+            [
+                4000.0
+            ],
+            [
+                2828.42712474619
+            ],
+            [
+                5656.85424949238
             ]
         ],
-        [
+        "12": [
             [
-                1.0,
-                1.5179045779899951,
-                0.6045055666013909,
-                0.3215227493617134,
-                0.2710064035996947
+                [
+                    0.004429061683566576,
+                    -0.005360793626691758,
+                    0.005599661487197775,
+                    -0.00536079362669176,
+                    0.004429061683566577
+                ],
+                [
+                    0.004589046183949756,
+                    -0.004621439969264208,
+                    0.0046401024026397186,
+                    -0.004621439969264205,
+                    0.004589046183949755
+                ],
+                [
+                    0.004768377525011449,
+                    -0.0038205782817279017,
+                    0.0036883128176896187,
+                    -0.0038205782817279047,
+                    0.004768377525011451
+                ],
+                [
+                    0.00496931281571499,
+                    -0.0029567961188849304,
+                    0.002763826195738814,
+                    -0.0029567961188849317,
+                    0.004969312815714989
+                ],
+                [
+                    0.005194361325642752,
+                    -0.0020297630540940755,
+                    0.0018891645817190365,
+                    -0.0020297630540940755,
+                    0.005194361325642752
+                ],
+                [
+                    0.005446310822113887,
+                    -0.0010405857999298746,
+                    0.001089207712440204,
+                    -0.0010405857999298735,
+                    0.005446310822113886
+                ],
+                [
+                    0.005728256333115791,
+                    7.769380744224585e-06,
+                    0.0003900109593661611,
+                    7.769380744224585e-06,
+                    0.005728256333115791
+                ],
+                [
+                    0.006043631499870424,
+                    0.0011099834725241196,
+                    -0.00018309879086041906,
+                    0.001109983472524115,
+                    0.006043631499870427
+                ],
+                [
+                    0.006396242682349994,
+                    0.002257821191572594,
+                    -0.0006083218657622482,
+                    0.0022578211915725934,
+                    0.006396242682349994
+                ],
+                [
+                    0.006790305977732889,
+                    0.0034395039528360943,
+                    -0.0008712218128272994,
+                    0.003439503952836095,
+                    0.006790305977732892
+                ],
+                [
+                    0.007230487305045102,
+                    0.004639035568669243,
+                    -0.0009696598721114989,
+                    0.004639035568669241,
+                    0.007230487305045105
+                ],
+                [
+                    0.007721945698405469,
+                    0.005835510427446951,
+                    -0.0009197309754994616,
+                    0.0058355104274469514,
+                    0.0077219456984054646
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -1.7339488693434253,
+                    2.6591872064158952,
+                    -1.6565147159486493,
+                    0.9127657996212475
+                ],
+                [
+                    1.0,
+                    -1.4967911075737823,
+                    2.461866069927299,
+                    -1.4260641669489051,
+                    0.9078307927458725
+                ],
+                [
+                    1.0,
+                    -1.2391480544701368,
+                    2.2795011601063577,
+                    -1.177197815376391,
+                    0.9026325071214362
+                ],
+                [
+                    1.0,
+                    -0.9604198844045303,
+                    2.119709118317981,
+                    -0.9096221780799465,
+                    0.8971588459241072
+                ],
+                [
+                    1.0,
+                    -0.6603409593110232,
+                    1.991211448337955,
+                    -0.6233939129683436,
+                    0.8913974027617259
+                ],
+                [
+                    1.0,
+                    -0.33909665447271137,
+                    1.9036516417664155,
+                    -0.3190275912486251,
+                    0.8853354884876639
+                ],
+                [
+                    1.0,
+                    0.0025362762736120537,
+                    1.8672395369772183,
+                    0.002377511558549525,
+                    0.8789601642112482
+                ],
+                [
+                    1.0,
+                    0.3630240516675258,
+                    1.892168972808706,
+                    0.3389911359963016,
+                    0.8722582812631503
+                ],
+                [
+                    1.0,
+                    0.7398843549099932,
+                    1.9877542751171418,
+                    0.6880871480429597,
+                    0.8652165289358393
+                ],
+                [
+                    1.0,
+                    1.1294703287113739,
+                    2.1612405613616295,
+                    1.0458629737115097,
+                    0.8578214908813582
+                ],
+                [
+                    1.0,
+                    1.5267344241656418,
+                    2.416268609110776,
+                    1.4072492845402056,
+                    0.8500597111102672
+                ],
+                [
+                    1.0,
+                    1.9249808281080896,
+                    2.751025032706521,
+                    1.765720023970942,
+                    0.8419177705949875
+                ]
+            ],
+            [
+                2828.42712474619,
+                2996.614153753362,
+                3174.802103936399,
+                3363.585661014858,
+                3563.5948725613566,
+                3775.4972507267735,
+                4000.0,
+                4237.852377437181,
+                4489.848193237491,
+                4756.828460010885,
+                5039.684199579492,
+                5339.359416680136
+            ],
+            [
+                2747.907294916178,
+                2911.3063656843738,
+                3084.4216508158815,
+                3267.8309064821997,
+                3462.1462440245714,
+                3668.0161728186845,
+                3886.1277646144235,
+                4117.208946573967,
+                4362.03093066103,
+                4621.410787489092,
+                4896.21417321862,
+                5187.358218604037
+            ],
+            [
+                2911.306365684375,
+                3084.421650815881,
+                3267.8309064821997,
+                3462.1462440245723,
+                3668.0161728186845,
+                3886.127764614423,
+                4117.208946573968,
+                4362.030930661031,
+                4621.410787489091,
+                4896.214173218622,
+                5187.3582186040385,
+                5495.814589832355
             ]
         ],
-        [
-            16000.0
-        ],
-        [
-            11313.70849898476
+        "24": [
+            [
+                [
+                    0.0034508818620722784,
+                    -0.005488369099389738,
+                    0.007896952784760495,
+                    -0.0054883690993897385,
+                    0.0034508818620722784
+                ],
+                [
+                    0.003469966575250404,
+                    -0.005121488091807126,
+                    0.007536980786400325,
+                    -0.005121488091807125,
+                    0.003469966575250404
+                ],
+                [
+                    0.0034902271671465156,
+                    -0.004738707762353755,
+                    0.0071836062994330915,
+                    -0.004738707762353754,
+                    0.0034902271671465148
+                ],
+                [
+                    0.0035117333961514185,
+                    -0.004339712336163744,
+                    0.006839422967405124,
+                    -0.004339712336163744,
+                    0.0035117333961514176
+                ],
+                [
+                    0.003534559042863644,
+                    -0.003924232511785966,
+                    0.006507262442328867,
+                    -0.003924232511785965,
+                    0.0035345590428636424
+                ],
+                [
+                    0.00355878213492702,
+                    -0.003492054374922333,
+                    0.006190192621275671,
+                    -0.0034920543749223315,
+                    0.00355878213492702
+                ],
+                [
+                    0.0035844851838918064,
+                    -0.003043029295480062,
+                    0.005891510786059135,
+                    -0.0030430292954800636,
+                    0.0035844851838918064
+                ],
+                [
+                    0.003611755434695619,
+                    -0.0025770848735794994,
+                    0.005614730553025198,
+                    -0.0025770848735794994,
+                    0.003611755434695619
+                ],
+                [
+                    0.0036406851283858174,
+                    -0.0020942369975162235,
+                    0.005363561420862302,
+                    -0.0020942369975162217,
+                    0.003640685128385815
+                ],
+                [
+                    0.0036713717787311313,
+                    -0.0015946030720448022,
+                    0.005141879592086192,
+                    -0.0015946030720448024,
+                    0.0036713717787311313
+                ],
+                [
+                    0.003703918463396818,
+                    -0.0010784164682774808,
+                    0.004953688645718162,
+                    -0.001078416468277482,
+                    0.003703918463396819
+                ],
+                [
+                    0.0037384341303852114,
+                    -0.0005460422364477346,
+                    0.00480306856403472,
+                    -0.0005460422364477338,
+                    0.0037384341303852106
+                ],
+                [
+                    0.0037750339204713685,
+                    2.005890827078843e-06,
+                    0.0046941115769209025,
+                    2.005890827078843e-06,
+                    0.0037750339204713677
+                ],
+                [
+                    0.0038138395063917786,
+                    0.0005650471950271953,
+                    0.004630843297858183,
+                    0.0005650471950271951,
+                    0.0038138395063917786
+                ],
+                [
+                    0.003854979449573487,
+                    0.0011422143811144676,
+                    0.004617127703505451,
+                    0.001142214381114467,
+                    0.0038549794495734866
+                ],
+                [
+                    0.0038985895752200106,
+                    0.0017324327418000258,
+                    0.004656554675015667,
+                    0.001732432741800026,
+                    0.0038985895752200106
+                ],
+                [
+                    0.003944813366600422,
+                    0.0023343981543694848,
+                    0.004752309097802983,
+                    0.0023343981543694856,
+                    0.003944813366600421
+                ],
+                [
+                    0.00399380237941779,
+                    0.002946554031351711,
+                    0.0049070209347351745,
+                    0.0029465540313517095,
+                    0.003993802379417789
+                ],
+                [
+                    0.004045716677163785,
+                    0.0035670673989835937,
+                    0.00512259627568399,
+                    0.003567067398983596,
+                    0.004045716677163785
+                ],
+                [
+                    0.0041007252883963384,
+                    0.004193804340340522,
+                    0.0054000301558704816,
+                    0.004193804340340521,
+                    0.004100725288396339
+                ],
+                [
+                    0.00415900668690745,
+                    0.004824305114410908,
+                    0.005739202958724572,
+                    0.00482430511441091,
+                    0.004159006686907452
+                ],
+                [
+                    0.0042207492957785355,
+                    0.005455759349539527,
+                    0.006138663506460439,
+                    0.005455759349539527,
+                    0.004220749295778535
+                ],
+                [
+                    0.004286152016351071,
+                    0.006084981810752446,
+                    0.006595403518747592,
+                    0.006084981810752447,
+                    0.004286152016351072
+                ],
+                [
+                    0.004355424783168093,
+                    0.006708389356594765,
+                    0.0071046300030358205,
+                    0.006708389356594766,
+                    0.004355424783168094
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -1.7553867625614639,
+                    2.724389923115251,
+                    -1.7157626361902598,
+                    0.9553751384122923
+                ],
+                [
+                    1.0,
+                    -1.6385862517680918,
+                    2.623903799046497,
+                    -1.6005272241399187,
+                    0.9540983540377744
+                ],
+                [
+                    1.0,
+                    -1.5166342459393003,
+                    2.5262832812580314,
+                    -1.4803876930522504,
+                    0.9527859706722158
+                ],
+                [
+                    1.0,
+                    -1.3894212843322604,
+                    2.432393607973011,
+                    -1.3552537901092854,
+                    0.9514370512771348
+                ],
+                [
+                    1.0,
+                    -1.256852208621443,
+                    2.3431778474765137,
+                    -1.225050352443997,
+                    0.9500506375051815
+                ],
+                [
+                    1.0,
+                    -1.1188490157915694,
+                    2.25965648295041,
+                    -1.0897200917904586,
+                    0.9486257494267166
+                ],
+                [
+                    1.0,
+                    -0.9753540336950774,
+                    2.1829253931168013,
+                    -0.9492266783718272,
+                    0.9471613852679035
+                ],
+                [
+                    1.0,
+                    -0.8263334419585064,
+                    2.1141518834338817,
+                    -0.8035581428571539,
+                    0.945656521161698
+                ],
+                [
+                    1.0,
+                    -0.6717811603034601,
+                    2.0545683849405245,
+                    -0.6527306141652706,
+                    0.9441101109132004
+                ],
+                [
+                    1.0,
+                    -0.5117231251095429,
+                    2.005463402362871,
+                    -0.4967924092030869,
+                    0.9425210857809354
+                ],
+                [
+                    1.0,
+                    -0.34622197304172686,
+                    1.9681692620796993,
+                    -0.3358284881565856,
+                    0.9408883542757172
+                ],
+                [
+                    1.0,
+                    -0.17538214762132434,
+                    1.9440461869571526,
+                    -0.16996528554408646,
+                    0.9392108019788793
+                ],
+                [
+                    1.0,
+                    0.000644559459303487,
+                    1.9344622126386342,
+                    0.0006240772909393358,
+                    0.9374872913817316
+                ],
+                [
+                    1.0,
+                    0.18165302591994092,
+                    1.940768463213539,
+                    0.17571419843512093,
+                    0.935716661748265
+                ],
+                [
+                    1.0,
+                    0.36737837607666757,
+                    1.9642693288496758,
+                    0.3550214280275982,
+                    0.9338977290031923
+                ],
+                [
+                    1.0,
+                    0.5574891273006334,
+                    2.00618714054459,
+                    0.5381975441270608,
+                    0.9320292856475904
+                ],
+                [
+                    1.0,
+                    0.7515799266277052,
+                    2.0676210252620484,
+                    0.7248231000724787,
+                    0.9301101007045081
+                ],
+                [
+                    1.0,
+                    0.9491639121839499,
+                    2.1494997570041328,
+                    0.9144004853805692,
+                    0.9281389196970659
+                ],
+                [
+                    1.0,
+                    1.1496647508531999,
+                    2.252528605317161,
+                    1.1063467587709506,
+                    0.9261144646616974
+                ],
+                [
+                    1.0,
+                    1.352408423758199,
+                    2.3771304324117963,
+                    1.299986331557005,
+                    0.9240354341993379
+                ],
+                [
+                    1.0,
+                    1.5566148550878451,
+                    2.5233816136868112,
+                    1.49454360273969,
+                    0.9219005035675532
+                ],
+                [
+                    1.0,
+                    1.7613895080203381,
+                    2.6909437636027334,
+                    1.6891356740403825,
+                    0.9197083248167137
+                ],
+                [
+                    1.0,
+                    1.9657151044005783,
+                    2.8789927476181516,
+                    1.8827653041340984,
+                    0.9174575269735186
+                ],
+                [
+                    1.0,
+                    2.1684436628362436,
+                    3.0861470564320843,
+                    2.074314296777946,
+                    0.9151467162753646
+                ]
+            ],
+            [
+                2828.42712474619,
+                2911.3063656843747,
+                2996.614153753362,
+                3084.4216508158815,
+                3174.802103936399,
+                3267.830906482199,
+                3363.585661014858,
+                3462.146244024572,
+                3563.5948725613566,
+                3668.016172818685,
+                3775.4972507267735,
+                3886.1277646144226,
+                4000.0,
+                4117.208946573966,
+                4237.852377437181,
+                4362.030930661031,
+                4489.848193237491,
+                4621.410787489091,
+                4756.828460010885,
+                4896.214173218618,
+                5039.684199579492,
+                5187.3582186040385,
+                5339.359416680136,
+                5495.8145898323555
+            ],
+            [
+                2787.8765268979987,
+                2869.5675446220002,
+                2953.652291878998,
+                3040.2009102982297,
+                3129.285596815548,
+                3220.9806638985083,
+                3315.3626015361747,
+                3412.510141045371,
+                3512.5043207465983,
+                3615.428553564404,
+                3721.3686966085857,
+                3830.413122794294,
+                3942.6527945607504,
+                4058.181339750093,
+                4177.095129709655,
+                4299.493359682786,
+                4425.478131555332,
+                4555.154539026766,
+                4688.630755277006,
+                4826.018123202085,
+                4967.431248293936,
+                5112.988094241722,
+                5262.810081334549,
+                5417.02218774757
+            ],
+            [
+                2869.5675446220007,
+                2953.6522918789988,
+                3040.2009102982292,
+                3129.2855968155486,
+                3220.9806638985087,
+                3315.3626015361747,
+                3412.5101410453713,
+                3512.504320746599,
+                3615.428553564404,
+                3721.3686966085866,
+                3830.4131227942944,
+                3942.65279456075,
+                4058.181339750095,
+                4177.095129709654,
+                4299.493359682786,
+                4425.478131555334,
+                4555.154539026766,
+                4688.630755277005,
+                4826.018123202088,
+                4967.431248293934,
+                5112.988094241722,
+                5262.810081334551,
+                5417.02218774757,
+                5575.7530537959965
+            ]
         ],
-        [
-            22627.41699796952
-        ]
-    ],
-    "12": [
-        [
+        "3": [
             [
-                0.005448187370533621,
-                -0.0010629974182918066,
-                0.0011179842447383624,
-                -0.0010629974182918072,
-                0.005448187370533622
+                [
+                    0.026990867045771517,
+                    -0.0032034342496198897,
+                    -0.04276708675098152,
+                    -0.0032034342496199066,
+                    0.026990867045771506
+                ],
+                [
+                    0.03931608764894222,
+                    0.00010277996263681877,
+                    -0.06899783035578988,
+                    0.00010277996263678658,
+                    0.03931608764894222
+                ],
+                [
+                    0.05734447580635927,
+                    0.003756796515038321,
+                    -0.10416834811276694,
+                    0.0037567965150383403,
+                    0.05734447580635925
+                ]
             ],
             [
-                0.0057294989899974655,
-                -1.3294967024414546e-05,
-                0.00041627290593000075,
-                -1.329496702441709e-05,
-                0.0057294989899974655
+                [
+                    1.0,
+                    -1.1178020717801567,
+                    1.880345018501593,
+                    -0.9082276408980987,
+                    0.6660378566708391
+                ],
+                [
+                    1.0,
+                    0.036755302074405416,
+                    1.4453076775876723,
+                    0.028248453877452645,
+                    0.6013397004865096
+                ],
+                [
+                    1.0,
+                    1.3851825746055437,
+                    1.7962534817746294,
+                    0.9908241640553065,
+                    0.5306534601640142
+                ]
             ],
             [
-                0.006044169365567752,
-                0.0010905231079810897,
-                -0.0001593708003429464,
-                0.0010905231079810856,
-                0.006044169365567752
+                3174.802103936399,
+                4000.0,
+                5039.684199579492
             ],
             [
-                0.006395997270004583,
-                0.0022402651167464202,
-                -0.0005869758405958241,
-                0.002240265116746421,
-                0.006395997270004583
+                2828.42712474619,
+                3563.5948725613575,
+                4489.848193237492
             ],
             [
-                0.00678919046884379,
-                0.0034242005535282225,
-                -0.0008518641001138878,
-                0.003424200553528224,
-                0.006789190468843789
+                3563.594872561357,
+                4489.8481932374925,
+                5656.8542494923795
+            ]
+        ],
+        "6": [
+            [
+                [
+                    0.00827456130492534,
+                    -0.005107618125732183,
+                    -0.0027624238075395486,
+                    -0.005107618125732186,
+                    0.008274561304925336
+                ],
+                [
+                    0.009569169834339161,
+                    -0.003613329738467836,
+                    -0.0066028959320994255,
+                    -0.0036133297384678357,
+                    0.009569169834339161
+                ],
+                [
+                    0.011176087146655564,
+                    -0.0018972383353684128,
+                    -0.010791614669501562,
+                    -0.0018972383353684065,
+                    0.011176087146655564
+                ],
+                [
+                    0.01316594527392442,
+                    2.9149508580533574e-05,
+                    -0.015256894458626949,
+                    2.914950858053796e-05,
+                    0.013165945273924414
+                ],
+                [
+                    0.015623699661359432,
+                    0.0021246376831357107,
+                    -0.019941697830978416,
+                    0.0021246376831357185,
+                    0.015623699661359436
+                ],
+                [
+                    0.01865093897273099,
+                    0.004303823751472653,
+                    -0.024881180792196166,
+                    0.004303823751472656,
+                    0.018650938972730995
+                ]
             ],
             [
-                0.007228405744478006,
-                0.0046263849048229526,
-                -0.000951575004289558,
-                0.004626384904822957,
-                0.007228405744478003
+                [
+                    1.0,
+                    -1.6890547818368462,
+                    2.526417669314818,
+                    -1.5412865572979493,
+                    0.833319293687044
+                ],
+                [
+                    1.0,
+                    -1.2013256214213346,
+                    2.1490452112316887,
+                    -1.0839447607344441,
+                    0.815010157616419
+                ],
+                [
+                    1.0,
+                    -0.6345652607570591,
+                    1.860794662604048,
+                    -0.5653536200330538,
+                    0.7949752811377052
+                ],
+                [
+                    1.0,
+                    0.009815025331133792,
+                    1.7290961884826794,
+                    0.008620742626691352,
+                    0.7731250834571755
+                ],
+                [
+                    1.0,
+                    0.7207587393344392,
+                    1.8257911370951603,
+                    0.622980116931952,
+                    0.7493855888911495
+                ],
+                [
+                    1.0,
+                    1.4722508736299715,
+                    2.2040640591639686,
+                    1.2497262668868425,
+                    0.7237052539849844
+                ]
             ],
             [
-                0.0077187921262151455,
-                0.0058259661540583105,
-                -0.0009017980364783889,
-                0.0058259661540583044,
-                0.0077187921262151455
+                2828.42712474619,
+                3174.802103936399,
+                3563.5948725613566,
+                4000.0,
+                4489.848193237491,
+                5039.684199579492
             ],
             [
-                0.008266037453436747,
-                0.0069965209582132995,
-                -0.0007429596651513413,
-                0.006996520958213299,
-                0.008266037453436747
+                2669.679708340069,
+                2996.614153753363,
+                3363.5856610148576,
+                3775.497250726774,
+                4237.85237743718,
+                4756.828460010884
+            ],
+            [
+                2996.614153753363,
+                3363.5856610148585,
+                3775.4972507267735,
+                4237.8523774371815,
+                4756.828460010883,
+                5339.359416680137
+            ]
+        ]
+    },
+    "192000": {
+        "1": [
+            [
+                [
+                    0.04047225179794953,
+                    -0.008285605540278766,
+                    -0.06419726929053642,
+                    -0.008285605540278792,
+                    0.04047225179794955
+                ]
             ],
             [
-                0.008876418377870737,
-                0.00810549288410933,
-                -0.0005467247118580525,
-                0.008105492884109328,
-                0.00887641837787074
+                [
+                    1.0,
+                    -2.969298060044293,
+                    3.6998355178732094,
+                    -2.270979000153889,
+                    0.5961049734721688
+                ]
             ],
             [
-                0.009556853883505606,
-                0.009113836080170704,
-                -0.00042115515730946286,
-                0.009113836080170705,
-                0.009556853883505608
+                16000.0
             ],
             [
-                0.010314962367991136,
-                0.00997600526841957,
-                -0.0005126578498169293,
-                0.009976005268419566,
-                0.010314962367991138
+                11313.70849898476
             ],
             [
-                0.011159122286706945,
-                0.010640475627171676,
-                -0.0010022551247777344,
-                0.010640475627171674,
-                0.011159122286706943
+                22627.41699796952
             ]
         ],
-        [
+        "12": [
             [
-                1.0,
-                -0.3455757698750249,
-                1.9049040817797995,
-                -0.3251452278403145,
-                0.8854545339631857
+                [
+                    0.003275749943826705,
+                    -0.011613196563090141,
+                    0.016732093656160844,
+                    -0.01161319656309014,
+                    0.003275749943826704
+                ],
+                [
+                    0.0032925150170267812,
+                    -0.011500652263872615,
+                    0.01648807582101372,
+                    -0.011500652263872615,
+                    0.0032925150170267812
+                ],
+                [
+                    0.0033114828105614163,
+                    -0.011375548520253282,
+                    0.016218224809918278,
+                    -0.011375548520253284,
+                    0.003311482810561417
+                ],
+                [
+                    0.0033329280475760743,
+                    -0.011236507186762229,
+                    0.015920153682125928,
+                    -0.011236507186762229,
+                    0.0033329280475760757
+                ],
+                [
+                    0.003357158658690063,
+                    -0.011082011491828633,
+                    0.015591354776873689,
+                    -0.011082011491828633,
+                    0.0033571586586900637
+                ],
+                [
+                    0.0033845196872278275,
+                    -0.010910395742027892,
+                    0.01522922308405716,
+                    -0.01091039574202789,
+                    0.0033845196872278266
+                ],
+                [
+                    0.0034153976381986564,
+                    -0.010719835308452835,
+                    0.014831090365529195,
+                    -0.010719835308452837,
+                    0.0034153976381986564
+                ],
+                [
+                    0.003450225318798385,
+                    -0.01050833728245006,
+                    0.014394272679323373,
+                    -0.010508337282450058,
+                    0.003450225318798384
+                ],
+                [
+                    0.003489487222861911,
+                    -0.01027373231220853,
+                    0.013916134376584049,
+                    -0.010273732312208532,
+                    0.003489487222861912
+                ],
+                [
+                    0.0035337255167096552,
+                    -0.010013668286095878,
+                    0.013394172046136767,
+                    -0.010013668286095878,
+                    0.0035337255167096552
+                ],
+                [
+                    0.003583546689213418,
+                    -0.009725606719020766,
+                    0.012826122228781796,
+                    -0.009725606719020768,
+                    0.003583546689213418
+                ],
+                [
+                    0.003639628934661404,
+                    -0.009406822930900513,
+                    0.012210096942577898,
+                    -0.009406822930900513,
+                    0.0036396289346614036
+                ]
             ],
             [
-                1.0,
-                -0.004329742412907664,
-                1.8673929698533336,
-                -0.004059001899883938,
-                0.8790853374726256
+                [
+                    1.0,
+                    -3.7003645419101745,
+                    5.392899677900443,
+                    -3.6444658690106557,
+                    0.9700190933040072
+                ],
+                [
+                    1.0,
+                    -3.666150035451303,
+                    5.328091577425983,
+                    -3.6075011108305484,
+                    0.9682651421919646
+                ],
+                [
+                    1.0,
+                    -3.6279946836337884,
+                    5.25660822557631,
+                    -3.5665339079178953,
+                    0.9664103975969962
+                ],
+                [
+                    1.0,
+                    -3.5854555192985873,
+                    5.177874125141084,
+                    -3.5211356117053407,
+                    0.9644492899620231
+                ],
+                [
+                    1.0,
+                    -3.538043768219162,
+                    5.091296886343367,
+                    -3.4708357058486228,
+                    0.9623759695266363
+                ],
+                [
+                    1.0,
+                    -3.4852212272669347,
+                    4.996277097777922,
+                    -3.415118916455267,
+                    0.9601842957296597
+                ],
+                [
+                    1.0,
+                    -3.426396675621023,
+                    4.892221877568608,
+                    -3.353422467699895,
+                    0.9578678266900242
+                ],
+                [
+                    1.0,
+                    -3.3609224354347416,
+                    4.77856297360552,
+                    -3.2851336113265193,
+                    0.9554198088508026
+                ],
+                [
+                    1.0,
+                    -3.288091237923144,
+                    4.6547804166722235,
+                    -3.2095875975662667,
+                    0.9528331668849126
+                ],
+                [
+                    1.0,
+                    -3.2071336003854043,
+                    4.520432861550401,
+                    -3.126066303106107,
+                    0.9501004939761852
+                ],
+                [
+                    1.0,
+                    -3.1172159812592533,
+                    4.375195864354018,
+                    -3.0337977905693156,
+                    0.9472140426065426
+                ],
+                [
+                    1.0,
+                    -3.0174400562229193,
+                    4.218909417277941,
+                    -2.931957145286344,
+                    0.9441657159989273
+                ]
             ],
             [
-                1.0,
-                0.355809493563518,
-                1.8910291218906565,
-                0.3322794278490086,
-                0.8723898359431139
+                11313.70849898476,
+                11986.456615013449,
+                12699.208415745596,
+                13454.342644059432,
+                14254.379490245426,
+                15101.989002907094,
+                16000.0,
+                16951.409509748722,
+                17959.392772949963,
+                19027.31384004354,
+                20158.73679831797,
+                21357.437666720543
             ],
             [
-                1.0,
-                0.7323801563221735,
-                1.9851543102328835,
-                0.6811631208248549,
-                0.8653547212752689
+                10991.629179664713,
+                11645.225462737495,
+                12337.686603263526,
+                13071.323625928799,
+                13848.584976098286,
+                14672.064691274738,
+                15544.511058457694,
+                16468.83578629587,
+                17448.12372264412,
+                18485.64314995637,
+                19584.85669287448,
+                20749.432874416147
             ],
             [
-                1.0,
-                1.1217603607809497,
-                2.1570676651028116,
-                1.038812348163675,
-                0.8579665785623407
+                11645.2254627375,
+                12337.686603263524,
+                13071.323625928799,
+                13848.58497609829,
+                14672.064691274738,
+                15544.511058457692,
+                16468.835786295873,
+                17448.123722644123,
+                18485.643149956362,
+                19584.856692874488,
+                20749.432874416154,
+                21983.25835932942
+            ]
+        ],
+        "24": [
+            [
+                [
+                    0.0031789140441697426,
+                    -0.011702445590007585,
+                    0.01710469969407788,
+                    -0.011702445590007585,
+                    0.0031789140441697426
+                ],
+                [
+                    0.0031806194929244985,
+                    -0.011649871513329788,
+                    0.017003096517136364,
+                    -0.011649871513329786,
+                    0.0031806194929244985
+                ],
+                [
+                    0.0031824467557667003,
+                    -0.011594348861945426,
+                    0.01689618568477228,
+                    -0.011594348861945429,
+                    0.003182446755766701
+                ],
+                [
+                    0.003184403621444352,
+                    -0.011535715433004239,
+                    0.0167837258199663,
+                    -0.01153571543300424,
+                    0.0031844036214443527
+                ],
+                [
+                    0.003186498353103067,
+                    -0.011473800681278073,
+                    0.016665469363293207,
+                    -0.011473800681278073,
+                    0.0031864983531030657
+                ],
+                [
+                    0.003188739716401275,
+                    -0.011408425367556957,
+                    0.016541163102203923,
+                    -0.011408425367556957,
+                    0.0031887397164012733
+                ],
+                [
+                    0.003191137009256617,
+                    -0.011339401202579855,
+                    0.016410548825393067,
+                    -0.011339401202579855,
+                    0.0031911370092566177
+                ],
+                [
+                    0.003193700093315968,
+                    -0.011266530488093344,
+                    0.016273364118389855,
+                    -0.01126653048809334,
+                    0.003193700093315967
+                ],
+                [
+                    0.003196439427246577,
+                    -0.01118960575693031,
+                    0.016129343318059583,
+                    -0.011189605756930312,
+                    0.0031964394272465777
+                ],
+                [
+                    0.003199366101951134,
+                    -0.011108409414338521,
+                    0.015978218645336693,
+                    -0.011108409414338518,
+                    0.0031993661019511332
+                ],
+                [
+                    0.0032024918778152394,
+                    -0.011022713383170615,
+                    0.015819721537220208,
+                    -0.011022713383170615,
+                    0.0032024918778152394
+                ],
+                [
+                    0.003205829224101535,
+                    -0.010932278755975359,
+                    0.01565358420083224,
+                    -0.010932278755975357,
+                    0.003205829224101534
+                ],
+                [
+                    0.003209391360611047,
+                    -0.010836855457512397,
+                    0.015479541414156148,
+                    -0.010836855457512397,
+                    0.003209391360611047
+                ],
+                [
+                    0.0032131923017387327,
+                    -0.010736181921752574,
+                    0.015297332599904139,
+                    -0.010736181921752574,
+                    0.0032131923017387335
+                ],
+                [
+                    0.003217246903057055,
+                    -0.01062998478803037,
+                    0.015106704200785588,
+                    -0.010629984788030374,
+                    0.0032172469030570558
+                ],
+                [
+                    0.003221570910568638,
+                    -0.010517978621689702,
+                    0.01490741238621373,
+                    -0.010517978621689702,
+                    0.0032215709105686374
+                ],
+                [
+                    0.003226181012776514,
+                    -0.01039986566531647,
+                    0.014699226122149855,
+                    -0.01039986566531647,
+                    0.003226181012776513
+                ],
+                [
+                    0.0032310948957284128,
+                    -0.01027533562748734,
+                    0.014481930637273627,
+                    -0.01027533562748734,
+                    0.003231094895728412
+                ],
+                [
+                    0.0032363313011998553,
+                    -0.010144065516892523,
+                    0.014255331319908332,
+                    -0.010144065516892523,
+                    0.0032363313011998544
+                ],
+                [
+                    0.003241910088189432,
+                    -0.010005719530718452,
+                    0.014019258081022768,
+                    -0.010005719530718453,
+                    0.003241910088189433
+                ],
+                [
+                    0.003247852297908869,
+                    -0.009859949007311861,
+                    0.013773570219058732,
+                    -0.009859949007311861,
+                    0.003247852297908868
+                ],
+                [
+                    0.003254180222459934,
+                    -0.009706392454399559,
+                    0.013518161822156755,
+                    -0.009706392454399559,
+                    0.0032541802224599348
+                ],
+                [
+                    0.003260917477400308,
+                    -0.009544675665515428,
+                    0.01325296774240282,
+                    -0.009544675665515428,
+                    0.0032609174774003093
+                ],
+                [
+                    0.0032680890784109744,
+                    -0.009374411938797204,
+                    0.0129779701747996,
+                    -0.009374411938797202,
+                    0.003268089078410974
+                ]
             ],
             [
-                1.0,
-                1.5189322950483144,
-                2.410497215174818,
-                1.4001843893218722,
-                0.8502119518960387
+                [
+                    1.0,
+                    -3.7147184205730617,
+                    5.434606364722401,
+                    -3.6865580311503288,
+                    0.9848963810194351
+                ],
+                [
+                    1.0,
+                    -3.698440517291494,
+                    5.403994338946691,
+                    -3.669585168795461,
+                    0.9844572816302635
+                ],
+                [
+                    1.0,
+                    -3.6812347089049986,
+                    5.371793588080813,
+                    -3.6516753691607375,
+                    0.9840055213076726
+                ],
+                [
+                    1.0,
+                    -3.6630493457464115,
+                    5.337933066874084,
+                    -3.632777695823367,
+                    0.9835407412235295
+                ],
+                [
+                    1.0,
+                    -3.6438300883145516,
+                    5.302340084859652,
+                    -3.6128386260115257,
+                    0.9830625727528459
+                ],
+                [
+                    1.0,
+                    -3.6235197912390817,
+                    5.26494049175472,
+                    -3.5918019442656357,
+                    0.9825706372288535
+                ],
+                [
+                    1.0,
+                    -3.6020583854476795,
+                    5.225658903452673,
+                    -3.5696086350732585,
+                    0.9820645456933608
+                ],
+                [
+                    1.0,
+                    -3.5793827590143725,
+                    5.1844189737687465,
+                    -3.546196775006331,
+                    0.9815438986423964
+                ],
+                [
+                    1.0,
+                    -3.555426637261694,
+                    5.141143717594096,
+                    -3.521501424984744,
+                    0.9810082857671449
+                ],
+                [
+                    1.0,
+                    -3.5301204627955896,
+                    5.0957558916332175,
+                    -3.4954545233977705,
+                    0.9804572856902003
+                ],
+                [
+                    1.0,
+                    -3.5033912762721218,
+                    5.048178439443596,
+                    -3.4679847809357662,
+                    0.9798904656971688
+                ],
+                [
+                    1.0,
+                    -3.47516259883049,
+                    4.99833500806023,
+                    -3.439017578120352,
+                    0.9793073814636559
+                ],
+                [
+                    1.0,
+                    -3.4453543172794436,
+                    4.946150544065564,
+                    -3.4084748666736013,
+                    0.9787075767776993
+                ],
+                [
+                    1.0,
+                    -3.413882573295434,
+                    4.891551977549226,
+                    -3.3762750760369227,
+                    0.9780905832576884
+                ],
+                [
+                    1.0,
+                    -3.380659658083001,
+                    4.834469002982369,
+                    -3.3423330265406253,
+                    0.9774559200658802
+                ],
+                [
+                    1.0,
+                    -3.3455939141627318,
+                    4.774834966594434,
+                    -3.306559850936855,
+                    0.9768030936175718
+                ],
+                [
+                    1.0,
+                    -3.308589646192176,
+                    4.71258787037026,
+                    -3.268862926244311,
+                    0.9761315972860489
+                ],
+                [
+                    1.0,
+                    -3.2695470429925084,
+                    4.647671503261614,
+                    -3.2291458181145787,
+                    0.9754409111034337
+                ],
+                [
+                    1.0,
+                    -3.2283621132512046,
+                    4.580036710604507,
+                    -3.1873082402195183,
+                    0.9747305014575574
+                ],
+                [
+                    1.0,
+                    -3.1849266377010776,
+                    4.509642813021487,
+                    -3.143246031479199,
+                    0.9739998207850297
+                ],
+                [
+                    1.0,
+                    -3.1391281409415894,
+                    4.436459186229066,
+                    -3.096851154302742,
+                    0.973248307260671
+                ],
+                [
+                    1.0,
+                    -3.0908498864722995,
+                    4.360467013120594,
+                    -3.0480117174026273,
+                    0.9724753844835048
+                ],
+                [
+                    1.0,
+                    -3.039970898953478,
+                    4.281661219200845,
+                    -2.9966120271689607,
+                    0.9716804611595387
+                ],
+                [
+                    1.0,
+                    -2.9863660181985185,
+                    4.200052601848324,
+                    -2.942532672056309,
+                    0.970862930781563
+                ]
             ],
             [
-                1.0,
-                1.9172347526144586,
-                2.74375546348793,
-                1.7587834241607374,
-                0.8420774207570387
+                11313.70849898476,
+                11645.225462737499,
+                11986.456615013449,
+                12337.686603263526,
+                12699.208415745596,
+                13071.323625928797,
+                13454.342644059432,
+                13848.584976098287,
+                14254.379490245426,
+                14672.06469127474,
+                15101.989002907094,
+                15544.51105845769,
+                16000.0,
+                16468.835786295866,
+                16951.409509748722,
+                17448.123722644123,
+                17959.392772949963,
+                18485.643149956362,
+                19027.31384004354,
+                19584.856692874473,
+                20158.73679831797,
+                20749.432874416154,
+                21357.437666720543,
+                21983.258359329422
             ],
             [
-                1.0,
-                2.308118740748637,
-                3.1476905980234013,
-                2.1064860709639897,
-                0.8335496880481317
+                11151.506107591995,
+                11478.270178488001,
+                11814.609167515991,
+                12160.803641192919,
+                12517.142387262193,
+                12883.922655594033,
+                13261.450406144699,
+                13650.040564181483,
+                14050.017282986393,
+                14461.714214257616,
+                14885.474786434343,
+                15321.652491177176,
+                15770.611178243002,
+                16232.725359000371,
+                16708.38051883862,
+                17197.973438731144,
+                17701.912526221327,
+                18220.618156107063,
+                18754.523021108023,
+                19304.07249280834,
+                19869.724993175743,
+                20451.95237696689,
+                21051.240325338196,
+                21668.08875099028
             ],
             [
-                1.0,
-                2.6809291154259425,
-                3.60366685221627,
-                2.4334052946619655,
-                0.8246156808779896
+                11478.270178488003,
+                11814.609167515995,
+                12160.803641192917,
+                12517.142387262194,
+                12883.922655594035,
+                13261.450406144699,
+                13650.040564181485,
+                14050.017282986397,
+                14461.714214257616,
+                14885.474786434346,
+                15321.652491177178,
+                15770.611178243,
+                16232.72535900038,
+                16708.380518838618,
+                17197.973438731144,
+                17701.912526221335,
+                18220.618156107063,
+                18754.52302110802,
+                19304.07249280835,
+                19869.724993175736,
+                20451.95237696689,
+                21051.240325338204,
+                21668.08875099028,
+                22303.012215183986
+            ]
+        ],
+        "3": [
+            [
+                [
+                    0.0060491479180471465,
+                    -0.010793878427008475,
+                    0.00957507691936986,
+                    -0.010793878427008475,
+                    0.006049147918047148
+                ],
+                [
+                    0.007730533974241439,
+                    -0.010029849954213993,
+                    0.004807057455806967,
+                    -0.01002984995421399,
+                    0.0077305339742414405
+                ],
+                [
+                    0.010336959700420487,
+                    -0.008937080112855409,
+                    -0.002299651074408599,
+                    -0.008937080112855402,
+                    0.010336959700420485
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -3.530288245623739,
+                    4.981577597943711,
+                    -3.2963598776367213,
+                    0.8721446505669149
+                ],
+                [
+                    1.0,
+                    -3.308713802679631,
+                    4.567564139280216,
+                    -3.0347202863307152,
+                    0.8417798786674798
+                ],
+                [
+                    1.0,
+                    -2.9800633081547967,
+                    4.005332809574986,
+                    -2.672242449448751,
+                    0.8051210154866646
+                ]
             ],
             [
-                1.0,
-                3.0227458676372487,
-                4.0819706301906615,
-                2.7278242875840535,
-                0.8152626652452146
+                12699.208415745596,
+                16000.0,
+                20158.73679831797
             ],
             [
-                1.0,
-                3.318331925085023,
-                4.541231919541632,
-                2.9762423529976565,
-                0.8054783758029627
+                11313.70849898476,
+                14254.37949024543,
+                17959.392772949966
             ],
             [
-                1.0,
-                3.550249863168939,
-                4.929638976240041,
-                3.163586225248753,
-                0.7952511619005473
+                14254.379490245428,
+                17959.39277294997,
+                22627.416997969518
             ]
         ],
-        [
-            11313.70849898476,
-            11986.45661501345,
-            12699.208415745596,
-            13454.342644059432,
-            14254.379490245426,
-            15101.989002907094,
-            16000.0,
-            16951.409509748722,
-            17959.392772949963,
-            19027.31384004354,
-            20158.73679831797,
-            21357.437666720543
-        ],
-        [
-            10991.629179664713,
-            11645.225462737497,
-            12337.686603263526,
-            13071.323625928799,
-            13848.584976098286,
-            14672.064691274738,
-            15544.511058457694,
-            16468.83578629587,
-            17448.12372264412,
-            18485.64314995637,
-            19584.85669287448,
-            20749.432874416147
-        ],
-        [
-            11645.2254627375,
-            12337.686603263526,
-            13071.323625928799,
-            13848.58497609829,
-            14672.064691274738,
-            15544.511058457692,
-            16468.835786295873,
-            17448.123722644123,
-            18485.643149956362,
-            19584.856692874488,
-            20749.432874416154,
-            21983.25835932942
+        "6": [
+            [
+                [
+                    0.003703213412678757,
+                    -0.011435618572693136,
+                    0.015521149423008612,
+                    -0.011435618572693136,
+                    0.003703213412678756
+                ],
+                [
+                    0.0038540884306855127,
+                    -0.011180193470124031,
+                    0.014740782940592638,
+                    -0.011180193470124031,
+                    0.0038540884306855123
+                ],
+                [
+                    0.004044592530926376,
+                    -0.010868244144171283,
+                    0.013786273329553917,
+                    -0.010868244144171285,
+                    0.004044592530926376
+                ],
+                [
+                    0.004284736073254209,
+                    -0.01048753026956456,
+                    0.012623094720032717,
+                    -0.010487530269564558,
+                    0.0042847360732542064
+                ],
+                [
+                    0.004586960041609733,
+                    -0.010023549449952365,
+                    0.011212571625503874,
+                    -0.010023549449952367,
+                    0.004586960041609735
+                ],
+                [
+                    0.004966693732599769,
+                    -0.009459368578412631,
+                    0.00951294589426797,
+                    -0.00945936857841263,
+                    0.004966693732599768
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -3.6713333021398147,
+                    5.309413033681749,
+                    -3.561186926387006,
+                    0.9409231835197822
+                ],
+                [
+                    1.0,
+                    -3.5959268137309364,
+                    5.165047881527537,
+                    -3.475048395655783,
+                    0.9339365260492254
+                ],
+                [
+                    1.0,
+                    -3.5027916927128735,
+                    4.991469697601117,
+                    -3.370889439760855,
+                    0.9261576401077016
+                ],
+                [
+                    1.0,
+                    -3.387887221688975,
+                    4.784172553401325,
+                    -3.245009314667756,
+                    0.9175055229674347
+                ],
+                [
+                    1.0,
+                    -3.2463706568987094,
+                    4.538881506320004,
+                    -3.0930786433367707,
+                    0.9078932236503656
+                ],
+                [
+                    1.0,
+                    -3.072512977896621,
+                    4.252242488716963,
+                    -2.910117009065976,
+                    0.8972280667661592
+                ]
+            ],
+            [
+                11313.70849898476,
+                12699.208415745596,
+                14254.379490245426,
+                16000.0,
+                17959.392772949963,
+                20158.73679831797
+            ],
+            [
+                10678.718833360275,
+                11986.456615013452,
+                13454.34264405943,
+                15101.989002907096,
+                16951.40950974872,
+                19027.313840043535
+            ],
+            [
+                11986.456615013452,
+                13454.342644059434,
+                15101.989002907094,
+                16951.409509748726,
+                19027.31384004353,
+                21357.437666720547
+            ]
         ]
-    ],
-    "24": [
-        [
+    },
+    "22050": {
+        "1": [
             [
-                0.0037098446687558015,
-                -0.0011014902648238888,
-                0.004974974185499445,
-                -0.0011014902648238875,
-                0.0037098446687558015
+                [
+                    0.35452765439705625,
+                    0.0031158068113255077,
+                    -0.702810574227857,
+                    0.0031158068113254682,
+                    0.3545276543970561
+                ]
             ],
             [
-                0.0037442760194772297,
-                -0.0005684899734384592,
-                0.0048226223636459765,
-                -0.0005684899734384589,
-                0.003744276019477229
+                [
+                    1.0,
+                    1.6647733399171258,
+                    0.6997737340066014,
+                    0.30583591465201826,
+                    0.2749847272466059
+                ]
             ],
             [
-                0.003780786760163355,
-                -1.9755798404434962e-05,
-                0.004711881905678835,
-                -1.9755798404434542e-05,
-                0.003780786760163355
+                8000.0
             ],
             [
-                0.003819498300633509,
-                0.0005440368442486699,
-                0.004646792750729081,
-                0.0005440368442486697,
-                0.003819498300633509
+                5656.85424949238
             ],
             [
-                0.003860538925204152,
-                0.0011220263148510649,
-                0.004631236897388352,
-                0.0011220263148510649,
-                0.003860538925204152
+                11313.70849898476
+            ]
+        ],
+        "12": [
+            [
+                [
+                    0.0058650420287792646,
+                    0.0004947898110753115,
+                    0.00011652603532646063,
+                    0.0004947898110753129,
+                    0.005865042028779266
+                ],
+                [
+                    0.00619658691730507,
+                    0.0016186356080456214,
+                    -0.0003927585905871336,
+                    0.001618635608045622,
+                    0.00619658691730507
+                ],
+                [
+                    0.00656720163388515,
+                    0.0027833113129549594,
+                    -0.0007465166690948109,
+                    0.0027833113129549568,
+                    0.006567201633885156
+                ],
+                [
+                    0.0069812984358947035,
+                    0.003975236159724,
+                    -0.000935140795918267,
+                    0.003975236159723999,
+                    0.0069812984358947035
+                ],
+                [
+                    0.0074437583724654985,
+                    0.005176301954927438,
+                    -0.000963867916981072,
+                    0.005176301954927434,
+                    0.007443758372465502
+                ],
+                [
+                    0.007959976055832063,
+                    0.006363187740067452,
+                    -0.0008590673300631276,
+                    0.006363187740067449,
+                    0.007959976055832063
+                ],
+                [
+                    0.008535907818279924,
+                    0.007506734364616587,
+                    -0.0006748929224154818,
+                    0.007506734364616586,
+                    0.008535907818279924
+                ],
+                [
+                    0.009178123348729895,
+                    0.008571464792563058,
+                    -0.0004993357724115699,
+                    0.008571464792563061,
+                    0.009178123348729894
+                ],
+                [
+                    0.009893860872248268,
+                    0.009515369987363966,
+                    -0.000458145358451079,
+                    0.009515369987363966,
+                    0.009893860872248268
+                ],
+                [
+                    0.010691085897464737,
+                    0.010290120328322652,
+                    -0.0007144647688116687,
+                    0.01029012032832265,
+                    0.010691085897464734
+                ],
+                [
+                    0.011578553510225569,
+                    0.010841906480881748,
+                    -0.00146150272874111,
+                    0.010841906480881753,
+                    0.01157855351022557
+                ],
+                [
+                    0.01226133244504949,
+                    0.01106531026780431,
+                    -0.0023914319392040477,
+                    0.01106531026780431,
+                    0.012261332445049487
+                ]
             ],
             [
-                0.0039040441670499014,
-                0.0017131439129835016,
-                0.004668826386882121,
-                0.0017131439129835,
-                0.0039040441670499006
+                [
+                    1.0,
+                    0.16165428357366565,
+                    1.87022493930276,
+                    0.15127826963481247,
+                    0.8760021052427854
+                ],
+                [
+                    1.0,
+                    0.5298401519942253,
+                    1.925714726380105,
+                    0.49387489266091866,
+                    0.8691497775116928
+                ],
+                [
+                    1.0,
+                    0.9129241679512498,
+                    2.055442119082021,
+                    0.8473964692990266,
+                    0.8619515856870539
+                ],
+                [
+                    1.0,
+                    1.3066627751118287,
+                    2.2652492448422583,
+                    1.2074973252459222,
+                    0.8543940869129565
+                ],
+                [
+                    1.0,
+                    1.705301622180997,
+                    2.556580532064996,
+                    1.5684791846895911,
+                    0.846463831600574
+                ],
+                [
+                    1.0,
+                    2.101327251966619,
+                    2.924522503605607,
+                    1.923106035607904,
+                    0.8381474451170698
+                ],
+                [
+                    1.0,
+                    2.48523141861576,
+                    3.3557305178161903,
+                    2.262444257793306,
+                    0.8294317216284344
+                ],
+                [
+                    1.0,
+                    2.845315651155745,
+                    3.826547318564801,
+                    2.5757546745326447,
+                    0.8203037312248629
+                ],
+                [
+                    1.0,
+                    3.1675755571780355,
+                    4.301797817116745,
+                    2.850472830677516,
+                    0.8107509414942354
+                ],
+                [
+                    1.0,
+                    3.4357187377450256,
+                    4.734941466826259,
+                    3.072324789194832,
+                    0.800761354733491
+                ],
+                [
+                    1.0,
+                    3.631386508664133,
+                    5.070428815556864,
+                    3.225637222961329,
+                    0.7903236619959558
+                ],
+                [
+                    1.0,
+                    3.7148327917720936,
+                    5.215795280840153,
+                    3.283483900770178,
+                    0.7827150744199838
+                ]
             ],
             [
-                0.003950157201734613,
-                0.0023160918663751875,
-                0.004762772833885405,
-                0.0023160918663751905,
-                0.003950157201734613
+                5656.85424949238,
+                5993.228307506724,
+                6349.604207872798,
+                6727.171322029716,
+                7127.189745122713,
+                7550.994501453547,
+                8000.0,
+                8475.704754874361,
+                8979.696386474981,
+                9513.65692002177,
+                10079.368399158984,
+                10678.718833360272
             ],
             [
-                0.0039990292607874995,
-                0.00292932026550884,
-                0.004915737899204605,
-                0.0029293202655088398,
-                0.003999029260787498
+                5495.814589832356,
+                5822.6127313687475,
+                6168.843301631763,
+                6535.661812964399,
+                6924.292488049143,
+                7336.032345637369,
+                7772.255529228847,
+                8234.417893147935,
+                8724.06186132206,
+                9242.821574978185,
+                9792.42834643724,
+                10374.716437208073
+            ],
+            [
+                5822.61273136875,
+                6168.843301631762,
+                6535.661812964399,
+                6924.292488049145,
+                7336.032345637369,
+                7772.255529228846,
+                8234.417893147936,
+                8724.061861322061,
+                9242.821574978181,
+                9792.428346437244,
+                10374.716437208077,
+                10991.62917966471
+            ]
+        ],
+        "24": [
+            [
+                [
+                    0.003809659025717483,
+                    0.0005052690855152118,
+                    0.004635221472674957,
+                    0.0005052690855152114,
+                    0.003809659025717483
+                ],
+                [
+                    0.0038505476988402653,
+                    0.0010810003073300027,
+                    0.004616130352898197,
+                    0.0010810003073300032,
+                    0.0038505476988402653
+                ],
+                [
+                    0.0038938919452053086,
+                    0.0016699058936523673,
+                    0.004649821602009712,
+                    0.001669905893652365,
+                    0.003893891945205307
+                ],
+                [
+                    0.0039398344251664425,
+                    0.002270706867486537,
+                    0.004739529325535242,
+                    0.0022707068674865365,
+                    0.003939834425166442
+                ],
+                [
+                    0.003988525827048775,
+                    0.0028818742508416404,
+                    0.004887949342434335,
+                    0.002881874250841641,
+                    0.003988525827048775
+                ],
+                [
+                    0.004040125300256983,
+                    0.0035016052247969025,
+                    0.005097072209653109,
+                    0.0035016052247969025,
+                    0.004040125300256983
+                ],
+                [
+                    0.004094800910207007,
+                    0.004127798626084006,
+                    0.005367997888534609,
+                    0.004127798626084006,
+                    0.004094800910207008
+                ],
+                [
+                    0.004152730116044824,
+                    0.004758030083078064,
+                    0.005700733749488718,
+                    0.004758030083078063,
+                    0.004152730116044824
+                ],
+                [
+                    0.00421410027214699,
+                    0.005389527179840421,
+                    0.006093978869760663,
+                    0.005389527179840421,
+                    0.004214100272146989
+                ],
+                [
+                    0.004279109154426728,
+                    0.0060191451364268594,
+                    0.006544899124944788,
+                    0.006019145136426859,
+                    0.004279109154426728
+                ],
+                [
+                    0.004347965512499313,
+                    0.006643343608169892,
+                    0.007048899425566467,
+                    0.006643343608169892,
+                    0.004347965512499313
+                ],
+                [
+                    0.0044208896487887926,
+                    0.00725816533697957,
+                    0.007599401608983153,
+                    0.007258165336979571,
+                    0.004420889648788793
+                ],
+                [
+                    0.004498114025687173,
+                    0.007859217534493158,
+                    0.008187638946349112,
+                    0.007859217534493161,
+                    0.004498114025687175
+                ],
+                [
+                    0.0045798839019019575,
+                    0.008441657040301923,
+                    0.008802480917200243,
+                    0.008441657040301925,
+                    0.004579883901901959
+                ],
+                [
+                    0.004666457999156442,
+                    0.009000180478019882,
+                    0.009430304753379906,
+                    0.009000180478019886,
+                    0.004666457999156446
+                ],
+                [
+                    0.00475810920042855,
+                    0.009529020826308823,
+                    0.010054933121445134,
+                    0.009529020826308823,
+                    0.004758109200428551
+                ],
+                [
+                    0.004855125280937989,
+                    0.010021952028680576,
+                    0.010657659996658318,
+                    0.010021952028680574,
+                    0.004855125280937988
+                ],
+                [
+                    0.004957809673110815,
+                    0.01047230348105373,
+                    0.011217389004564189,
+                    0.01047230348105373,
+                    0.004957809673110813
+                ],
+                [
+                    0.005066482266768309,
+                    0.010872986453907421,
+                    0.011710909903441124,
+                    0.01087298645390742,
+                    0.005066482266768307
+                ],
+                [
+                    0.005181480245801943,
+                    0.01121653471844043,
+                    0.012113338993817124,
+                    0.01121653471844043,
+                    0.005181480245801941
+                ],
+                [
+                    0.0053031589626074205,
+                    0.011495161842631125,
+                    0.012398747515902253,
+                    0.011495161842631128,
+                    0.005303158962607421
+                ],
+                [
+                    0.005431892851558571,
+                    0.011700837789428405,
+                    0.012540997893059376,
+                    0.011700837789428402,
+                    0.005431892851558571
+                ],
+                [
+                    0.005554870172275047,
+                    0.011817307270745637,
+                    0.01252513947104759,
+                    0.011817307270745639,
+                    0.005554870172275049
+                ],
+                [
+                    0.0055548701722750995,
+                    0.011817307270745748,
+                    0.012525139471047705,
+                    0.011817307270745751,
+                    0.0055548701722751
+                ]
             ],
             [
-                0.004050820066229783,
-                0.003551003116045749,
-                0.005129664680647557,
-                0.0035510031160457495,
-                0.004050820066229783
+                [
+                    1.0,
+                    0.16242734436326428,
+                    1.939320898429659,
+                    0.15713288393642733,
+                    0.935904758844665
+                ],
+                [
+                    1.0,
+                    0.3476719609345623,
+                    1.9609578302255775,
+                    0.33601266356640197,
+                    0.9340909524050027
+                ],
+                [
+                    1.0,
+                    0.5373401126482582,
+                    2.000888436268363,
+                    0.5188011077678196,
+                    0.9322277631984702
+                ],
+                [
+                    1.0,
+                    0.7310345527897683,
+                    2.060226885364502,
+                    0.7050865671789497,
+                    0.9303139627140314
+                ],
+                [
+                    1.0,
+                    0.9282773437450496,
+                    2.139922225996255,
+                    0.8943799688251505,
+                    0.9283482989414138
+                ],
+                [
+                    1.0,
+                    1.1285019256668798,
+                    2.240705857961318,
+                    1.0861076697539436,
+                    0.9263294963805363
+                ],
+                [
+                    1.0,
+                    1.331044924386507,
+                    2.3630332124227795,
+                    1.2796041518013297,
+                    0.924256256088576
+                ],
+                [
+                    1.0,
+                    1.5351377913958908,
+                    2.507020177425345,
+                    1.4741046562294802,
+                    0.9221272557676609
+                ],
+                [
+                    1.0,
+                    1.7398983964757462,
+                    2.672375203905951,
+                    1.6687378834601831,
+                    0.9199411498962594
+                ],
+                [
+                    1.0,
+                    1.944322725940661,
+                    2.8583285160723917,
+                    1.8625189137061002,
+                    0.9176965699075847
+                ],
+                [
+                    1.0,
+                    2.147276876926103,
+                    3.063560435277636,
+                    2.054342539261506,
+                    0.9153921244184464
+                ],
+                [
+                    1.0,
+                    2.347489581012205,
+                    3.286131509248174,
+                    2.242977238775591,
+                    0.9130263995122161
+                ],
+                [
+                    1.0,
+                    2.543545539036691,
+                    3.523417913140859,
+                    2.4270600681095704,
+                    0.9105979590796931
+                ],
+                [
+                    1.0,
+                    2.73387990333043,
+                    3.772056440459995,
+                    2.6050927913395414,
+                    0.9081053452219463
+                ],
+                [
+                    1.0,
+                    2.9167743037561342,
+                    4.027904302869278,
+                    2.7754396288690275,
+                    0.9055470787193012
+                ],
+                [
+                    1.0,
+                    3.090354879519288,
+                    4.28601986470373,
+                    2.936327056943826,
+                    0.9029216595709332
+                ],
+                [
+                    1.0,
+                    3.2525928490697718,
+                    4.540671286746368,
+                    3.0858461532453836,
+                    0.900227567609703
+                ],
+                [
+                    1.0,
+                    3.4013082243767254,
+                    4.785380756787097,
+                    3.2219580453512258,
+                    0.8974632631970809
+                ],
+                [
+                    1.0,
+                    3.534177351700748,
+                    5.013012426354524,
+                    3.3425030808002147,
+                    0.894627188003255
+                ],
+                [
+                    1.0,
+                    3.64874503622692,
+                    5.215912208722361,
+                    3.4452143966985114,
+                    0.8917177658777217
+                ],
+                [
+                    1.0,
+                    3.7424420791701745,
+                    5.386107047699733,
+                    3.5277366198243234,
+                    0.8887334038159063
+                ],
+                [
+                    1.0,
+                    3.8126091187330933,
+                    5.515569937698871,
+                    3.587650470619616,
+                    0.8856724930275932
+                ],
+                [
+                    1.0,
+                    3.8535732646246905,
+                    5.591171642298132,
+                    3.6203480925001505,
+                    0.8828336018647609
+                ],
+                [
+                    1.0,
+                    3.85357326462469,
+                    5.59117164229813,
+                    3.6203480925001497,
+                    0.8828336018647606
+                ]
             ],
             [
-                0.0041056982869879044,
-                0.004179013743824133,
-                0.00540559078125582,
-                0.004179013743824133,
-                0.0041056982869879044
+                5656.85424949238,
+                5822.612731368749,
+                5993.228307506724,
+                6168.843301631763,
+                6349.604207872798,
+                6535.661812964398,
+                6727.171322029716,
+                6924.292488049144,
+                7127.189745122713,
+                7336.03234563737,
+                7550.994501453547,
+                7772.255529228845,
+                8000.0,
+                8234.417893147933,
+                8475.704754874361,
+                8724.061861322061,
+                8979.696386474981,
+                9242.821574978181,
+                9513.65692002177,
+                9792.428346437237,
+                10079.368399158984,
+                10374.716437208077,
+                10678.718833360272,
+                10991.629179664711
             ],
             [
-                0.00416384201815884,
-                0.004810899861293473,
-                0.005743444830006586,
-                0.004810899861293471,
-                0.00416384201815884
+                5575.753053795997,
+                5739.1350892440005,
+                5907.304583757996,
+                6080.401820596459,
+                6258.571193631096,
+                6441.961327797017,
+                6630.725203072349,
+                6825.020282090742,
+                7025.008641493197,
+                7230.857107128808,
+                7442.737393217171,
+                7660.826245588588,
+                7885.305589121501,
+                8116.362679500186,
+                8354.19025941931,
+                8598.986719365572,
+                8850.956263110664,
+                9110.309078053531,
+                9377.261510554012,
+                9652.03624640417,
+                9934.862496587872,
+                10225.976188483444,
+                10525.620162669098,
+                10834.04437549514
             ],
             [
-                0.004225439284124329,
-                0.005443858691077347,
-                0.006141829509722515,
-                0.0054438586910773475,
-                0.0042254392841243275
+                5739.135089244001,
+                5907.3045837579975,
+                6080.4018205964585,
+                6258.571193631097,
+                6441.9613277970175,
+                6630.725203072349,
+                6825.0202820907425,
+                7025.008641493198,
+                7230.857107128808,
+                7442.737393217173,
+                7660.826245588589,
+                7885.3055891215,
+                8116.36267950019,
+                8354.190259419309,
+                8598.986719365572,
+                8850.956263110667,
+                9110.309078053531,
+                9377.26151055401,
+                9652.036246404175,
+                9934.862496587868,
+                10225.976188483444,
+                10525.620162669102,
+                10834.04437549514,
+                11151.506107591993
+            ]
+        ],
+        "3": [
+            [
+                [
+                    0.049543786463175414,
+                    0.0023389550306845415,
+                    -0.08926967176810216,
+                    0.0023389550306845593,
+                    0.04954378646317543
+                ],
+                [
+                    0.07209289212124022,
+                    0.005803943876866221,
+                    -0.1317449166886045,
+                    0.005803943876866229,
+                    0.0720928921212402
+                ],
+                [
+                    0.09681485832152628,
+                    0.007576310097799819,
+                    -0.17847313289223835,
+                    0.007576310097799724,
+                    0.09681485832152628
+                ]
             ],
             [
-                0.004290688566539671,
-                0.006074712643113597,
-                0.006597795716078649,
-                0.006074712643113597,
-                0.004290688566539674
+                [
+                    1.0,
+                    0.85154595567767,
+                    1.5460411671091019,
+                    0.6277390926567701,
+                    0.558651783138002
+                ],
+                [
+                    1.0,
+                    2.1883246888857086,
+                    2.448523982301367,
+                    1.4824117236512582,
+                    0.48562377157212233
+                ],
+                [
+                    1.0,
+                    2.956242466905091,
+                    3.366300708547706,
+                    1.835436766848723,
+                    0.426631911417135
+                ]
             ],
             [
-                0.00435979935825286,
-                0.006699886157605847,
-                0.00710661434705972,
-                0.006699886157605846,
-                0.004359799358252859
+                6349.604207872798,
+                8000.0,
+                10079.368399158984
             ],
             [
-                0.004432992744238069,
-                0.007315384457733258,
-                0.007661554406226111,
-                0.007315384457733256,
-                0.00443299274423807
+                5656.85424949238,
+                7127.189745122715,
+                8979.696386474983
             ],
             [
-                0.004510502010656045,
-                0.007916775104293922,
-                0.008253678576296681,
-                0.00791677510429392,
-                0.004510502010656045
+                7127.189745122714,
+                8979.696386474985,
+                11313.708498984759
+            ]
+        ],
+        "6": [
+            [
+                [
+                    0.013671936053411899,
+                    0.0004855670133789607,
+                    -0.01628704305256001,
+                    0.0004855670133789478,
+                    0.013671936053411899
+                ],
+                [
+                    0.016247658576737475,
+                    0.0026090863693560428,
+                    -0.021020309343042026,
+                    0.00260908636935605,
+                    0.016247658576737475
+                ],
+                [
+                    0.01941812312417364,
+                    0.004789472016612542,
+                    -0.02604104711390556,
+                    0.004789472016612542,
+                    0.01941812312417364
+                ],
+                [
+                    0.02330864745167722,
+                    0.0068648361375146915,
+                    -0.03168109719103595,
+                    0.006864836137514686,
+                    0.02330864745167722
+                ],
+                [
+                    0.02806680028681941,
+                    0.008595512177679517,
+                    -0.03870331971193462,
+                    0.008595512177679506,
+                    0.02806680028681942
+                ],
+                [
+                    0.033864958157535444,
+                    0.009663069570317881,
+                    -0.048399268471123406,
+                    0.009663069570317862,
+                    0.033864958157535444
+                ]
             ],
             [
-                0.00459257328317966,
-                0.008499173409327404,
-                0.008871670132195447,
-                0.008499173409327404,
-                0.004592573283179659
+                [
+                    1.0,
+                    0.16375881475741766,
+                    1.7284968961545042,
+                    0.14334072902717085,
+                    0.7679794549053973
+                ],
+                [
+                    1.0,
+                    0.8866858865661119,
+                    1.8849068760482686,
+                    0.7634452212867803,
+                    0.7438092088707028
+                ],
+                [
+                    1.0,
+                    1.6416532574354248,
+                    2.3285067727659325,
+                    1.3874748149916578,
+                    0.7176904652591447
+                ],
+                [
+                    1.0,
+                    2.3755646429890604,
+                    3.0336299835770544,
+                    1.966138948686765,
+                    0.6896104517751955
+                ],
+                [
+                    1.0,
+                    3.0062888717054994,
+                    3.8523396985734446,
+                    2.4299903557307236,
+                    0.6595990793693072
+                ],
+                [
+                    1.0,
+                    3.4200357906114944,
+                    4.485147169305008,
+                    2.6914260155628753,
+                    0.6277404140452657
+                ]
             ],
             [
-                0.004679466195750027,
-                0.009057232946749743,
-                0.009501707924663764,
-                0.009057232946749741,
-                0.004679466195750027
+                5656.85424949238,
+                6349.604207872798,
+                7127.189745122713,
+                8000.0,
+                8979.696386474981,
+                10079.368399158984
             ],
             [
-                0.004771454590950996,
-                0.009585142593745799,
-                0.010127409034568078,
-                0.009585142593745799,
-                0.004771454590950994
+                5339.359416680138,
+                5993.228307506726,
+                6727.171322029715,
+                7550.994501453548,
+                8475.70475487436,
+                9513.656920021767
             ],
             [
-                0.004868827253212928,
-                0.010076631744552133,
-                0.0107298613673249,
-                0.010076631744552136,
-                0.004868827253212928
+                5993.228307506726,
+                6727.171322029717,
+                7550.994501453547,
+                8475.704754874363,
+                9513.656920021765,
+                10678.718833360273
+            ]
+        ]
+    },
+    "44100": {
+        "1": [
+            [
+                [
+                    0.35452765439705625,
+                    0.0031158068113255077,
+                    -0.702810574227857,
+                    0.0031158068113254682,
+                    0.3545276543970561
+                ]
             ],
             [
-                0.004971888676076138,
-                0.010524985554303723,
-                0.011287770642718176,
-                0.010524985554303729,
-                0.00497188867607614
+                [
+                    1.0,
+                    1.6647733399171258,
+                    0.6997737340066014,
+                    0.30583591465201826,
+                    0.2749847272466059
+                ]
             ],
             [
-                0.005080959864762281,
-                0.01092307228891862,
-                0.011777747566357424,
-                0.01092307228891862,
-                0.005080959864762281
+                16000.0
             ],
             [
-                0.005196379175315515,
-                0.01126338506936376,
-                0.012174760978921107,
-                0.01126338506936376,
-                0.005196379175315515
+                11313.70849898476
             ],
             [
-                0.005318503191588221,
-                0.011538100494075746,
-                0.012452780906908935,
-                0.01153810049407575,
-                0.00531850319158822
+                22627.41699796952
             ]
         ],
-        [
+        "12": [
             [
-                1.0,
-                -0.3527940594968014,
-                1.9693875272603392,
-                -0.34221482451688,
-                0.9409517367141373
+                [
+                    0.0058650420287792646,
+                    0.0004947898110753115,
+                    0.00011652603532646063,
+                    0.0004947898110753129,
+                    0.005865042028779266
+                ],
+                [
+                    0.00619658691730507,
+                    0.0016186356080456214,
+                    -0.0003927585905871336,
+                    0.001618635608045622,
+                    0.00619658691730507
+                ],
+                [
+                    0.00656720163388515,
+                    0.0027833113129549594,
+                    -0.0007465166690948109,
+                    0.0027833113129549568,
+                    0.006567201633885156
+                ],
+                [
+                    0.0069812984358947035,
+                    0.003975236159724,
+                    -0.000935140795918267,
+                    0.003975236159723999,
+                    0.0069812984358947035
+                ],
+                [
+                    0.0074437583724654985,
+                    0.005176301954927438,
+                    -0.000963867916981072,
+                    0.005176301954927434,
+                    0.007443758372465502
+                ],
+                [
+                    0.007959976055832063,
+                    0.006363187740067452,
+                    -0.0008590673300631276,
+                    0.006363187740067449,
+                    0.007959976055832063
+                ],
+                [
+                    0.008535907818279924,
+                    0.007506734364616587,
+                    -0.0006748929224154818,
+                    0.007506734364616586,
+                    0.008535907818279924
+                ],
+                [
+                    0.009178123348729895,
+                    0.008571464792563058,
+                    -0.0004993357724115699,
+                    0.008571464792563061,
+                    0.009178123348729894
+                ],
+                [
+                    0.009893860872248268,
+                    0.009515369987363966,
+                    -0.000458145358451079,
+                    0.009515369987363966,
+                    0.009893860872248268
+                ],
+                [
+                    0.010691085897464737,
+                    0.010290120328322652,
+                    -0.0007144647688116687,
+                    0.01029012032832265,
+                    0.010691085897464734
+                ],
+                [
+                    0.011578553510225569,
+                    0.010841906480881748,
+                    -0.00146150272874111,
+                    0.010841906480881753,
+                    0.01157855351022557
+                ],
+                [
+                    0.01226133244504949,
+                    0.01106531026780431,
+                    -0.0023914319392040477,
+                    0.01106531026780431,
+                    0.012261332445049487
+                ]
             ],
             [
-                1.0,
-                -0.18216050979508885,
-                1.9447237165602855,
-                -0.17654041987277513,
-                0.939275922699878
+                [
+                    1.0,
+                    0.16165428357366565,
+                    1.87022493930276,
+                    0.15127826963481247,
+                    0.8760021052427854
+                ],
+                [
+                    1.0,
+                    0.5298401519942253,
+                    1.925714726380105,
+                    0.49387489266091866,
+                    0.8691497775116928
+                ],
+                [
+                    1.0,
+                    0.9129241679512498,
+                    2.055442119082021,
+                    0.8473964692990266,
+                    0.8619515856870539
+                ],
+                [
+                    1.0,
+                    1.3066627751118287,
+                    2.2652492448422583,
+                    1.2074973252459222,
+                    0.8543940869129565
+                ],
+                [
+                    1.0,
+                    1.705301622180997,
+                    2.556580532064996,
+                    1.5684791846895911,
+                    0.846463831600574
+                ],
+                [
+                    1.0,
+                    2.101327251966619,
+                    2.924522503605607,
+                    1.923106035607904,
+                    0.8381474451170698
+                ],
+                [
+                    1.0,
+                    2.48523141861576,
+                    3.3557305178161903,
+                    2.262444257793306,
+                    0.8294317216284344
+                ],
+                [
+                    1.0,
+                    2.845315651155745,
+                    3.826547318564801,
+                    2.5757546745326447,
+                    0.8203037312248629
+                ],
+                [
+                    1.0,
+                    3.1675755571780355,
+                    4.301797817116745,
+                    2.850472830677516,
+                    0.8107509414942354
+                ],
+                [
+                    1.0,
+                    3.4357187377450256,
+                    4.734941466826259,
+                    3.072324789194832,
+                    0.800761354733491
+                ],
+                [
+                    1.0,
+                    3.631386508664133,
+                    5.070428815556864,
+                    3.225637222961329,
+                    0.7903236619959558
+                ],
+                [
+                    1.0,
+                    3.7148327917720936,
+                    5.215795280840153,
+                    3.283483900770178,
+                    0.7827150744199838
+                ]
             ],
             [
-                1.0,
-                -0.0063331874444524094,
-                1.934545646619323,
-                -0.006132156862573429,
-                0.9375541944008867
+                11313.70849898476,
+                11986.456615013449,
+                12699.208415745596,
+                13454.342644059432,
+                14254.379490245426,
+                15101.989002907094,
+                16000.0,
+                16951.409509748722,
+                17959.392772949963,
+                19027.31384004354,
+                20158.73679831797,
+                21357.437666720543
             ],
             [
-                1.0,
-                0.17448498804322346,
-                1.9402056264869356,
-                0.16878671580978263,
-                0.9357853919734934
+                10991.629179664713,
+                11645.225462737495,
+                12337.686603263526,
+                13071.323625928799,
+                13848.584976098286,
+                14672.064691274738,
+                15544.511058457694,
+                16468.83578629587,
+                17448.12372264412,
+                18485.64314995637,
+                19584.85669287448,
+                20749.432874416147
             ],
             [
-                1.0,
-                0.36003160308657306,
-                1.963010498175576,
-                0.3479349417138068,
-                0.9339683322385547
+                11645.2254627375,
+                12337.686603263524,
+                13071.323625928799,
+                13848.58497609829,
+                14672.064691274738,
+                15544.511058457692,
+                16468.835786295873,
+                17448.123722644123,
+                18485.643149956362,
+                19584.856692874488,
+                20749.432874416154,
+                21983.25835932942
+            ]
+        ],
+        "24": [
+            [
+                [
+                    0.003809659025717483,
+                    0.0005052690855152118,
+                    0.004635221472674957,
+                    0.0005052690855152114,
+                    0.003809659025717483
+                ],
+                [
+                    0.0038505476988402653,
+                    0.0010810003073300027,
+                    0.004616130352898197,
+                    0.0010810003073300032,
+                    0.0038505476988402653
+                ],
+                [
+                    0.0038938919452053086,
+                    0.0016699058936523673,
+                    0.004649821602009712,
+                    0.001669905893652365,
+                    0.003893891945205307
+                ],
+                [
+                    0.0039398344251664425,
+                    0.002270706867486537,
+                    0.004739529325535242,
+                    0.0022707068674865365,
+                    0.003939834425166442
+                ],
+                [
+                    0.003988525827048775,
+                    0.0028818742508416404,
+                    0.004887949342434335,
+                    0.002881874250841641,
+                    0.003988525827048775
+                ],
+                [
+                    0.004040125300256983,
+                    0.0035016052247969025,
+                    0.005097072209653109,
+                    0.0035016052247969025,
+                    0.004040125300256983
+                ],
+                [
+                    0.004094800910207007,
+                    0.004127798626084006,
+                    0.005367997888534609,
+                    0.004127798626084006,
+                    0.004094800910207008
+                ],
+                [
+                    0.004152730116044824,
+                    0.004758030083078064,
+                    0.005700733749488718,
+                    0.004758030083078063,
+                    0.004152730116044824
+                ],
+                [
+                    0.00421410027214699,
+                    0.005389527179840421,
+                    0.006093978869760663,
+                    0.005389527179840421,
+                    0.004214100272146989
+                ],
+                [
+                    0.004279109154426728,
+                    0.0060191451364268594,
+                    0.006544899124944788,
+                    0.006019145136426859,
+                    0.004279109154426728
+                ],
+                [
+                    0.004347965512499313,
+                    0.006643343608169892,
+                    0.007048899425566467,
+                    0.006643343608169892,
+                    0.004347965512499313
+                ],
+                [
+                    0.0044208896487887926,
+                    0.00725816533697957,
+                    0.007599401608983153,
+                    0.007258165336979571,
+                    0.004420889648788793
+                ],
+                [
+                    0.004498114025687173,
+                    0.007859217534493158,
+                    0.008187638946349112,
+                    0.007859217534493161,
+                    0.004498114025687175
+                ],
+                [
+                    0.0045798839019019575,
+                    0.008441657040301923,
+                    0.008802480917200243,
+                    0.008441657040301925,
+                    0.004579883901901959
+                ],
+                [
+                    0.004666457999156442,
+                    0.009000180478019882,
+                    0.009430304753379906,
+                    0.009000180478019886,
+                    0.004666457999156446
+                ],
+                [
+                    0.00475810920042855,
+                    0.009529020826308823,
+                    0.010054933121445134,
+                    0.009529020826308823,
+                    0.004758109200428551
+                ],
+                [
+                    0.004855125280937989,
+                    0.010021952028680576,
+                    0.010657659996658318,
+                    0.010021952028680574,
+                    0.004855125280937988
+                ],
+                [
+                    0.004957809673110815,
+                    0.01047230348105373,
+                    0.011217389004564189,
+                    0.01047230348105373,
+                    0.004957809673110813
+                ],
+                [
+                    0.005066482266768309,
+                    0.010872986453907421,
+                    0.011710909903441124,
+                    0.01087298645390742,
+                    0.005066482266768307
+                ],
+                [
+                    0.005181480245801943,
+                    0.01121653471844043,
+                    0.012113338993817124,
+                    0.01121653471844043,
+                    0.005181480245801941
+                ],
+                [
+                    0.0053031589626074205,
+                    0.011495161842631125,
+                    0.012398747515902253,
+                    0.011495161842631128,
+                    0.005303158962607421
+                ],
+                [
+                    0.005431892851558571,
+                    0.011700837789428405,
+                    0.012540997893059376,
+                    0.011700837789428402,
+                    0.005431892851558571
+                ],
+                [
+                    0.005554870172275047,
+                    0.011817307270745637,
+                    0.01252513947104759,
+                    0.011817307270745639,
+                    0.005554870172275049
+                ],
+                [
+                    0.0055548701722750995,
+                    0.011817307270745748,
+                    0.012525139471047705,
+                    0.011817307270745751,
+                    0.0055548701722751
+                ]
             ],
             [
-                1.0,
-                0.5499779130296545,
-                2.0041865332487543,
-                0.5309669460770756,
-                0.9321018085959966
+                [
+                    1.0,
+                    0.16242734436326428,
+                    1.939320898429659,
+                    0.15713288393642733,
+                    0.935904758844665
+                ],
+                [
+                    1.0,
+                    0.3476719609345623,
+                    1.9609578302255775,
+                    0.33601266356640197,
+                    0.9340909524050027
+                ],
+                [
+                    1.0,
+                    0.5373401126482582,
+                    2.000888436268363,
+                    0.5188011077678196,
+                    0.9322277631984702
+                ],
+                [
+                    1.0,
+                    0.7310345527897683,
+                    2.060226885364502,
+                    0.7050865671789497,
+                    0.9303139627140314
+                ],
+                [
+                    1.0,
+                    0.9282773437450496,
+                    2.139922225996255,
+                    0.8943799688251505,
+                    0.9283482989414138
+                ],
+                [
+                    1.0,
+                    1.1285019256668798,
+                    2.240705857961318,
+                    1.0861076697539436,
+                    0.9263294963805363
+                ],
+                [
+                    1.0,
+                    1.331044924386507,
+                    2.3630332124227795,
+                    1.2796041518013297,
+                    0.924256256088576
+                ],
+                [
+                    1.0,
+                    1.5351377913958908,
+                    2.507020177425345,
+                    1.4741046562294802,
+                    0.9221272557676609
+                ],
+                [
+                    1.0,
+                    1.7398983964757462,
+                    2.672375203905951,
+                    1.6687378834601831,
+                    0.9199411498962594
+                ],
+                [
+                    1.0,
+                    1.944322725940661,
+                    2.8583285160723917,
+                    1.8625189137061002,
+                    0.9176965699075847
+                ],
+                [
+                    1.0,
+                    2.147276876926103,
+                    3.063560435277636,
+                    2.054342539261506,
+                    0.9153921244184464
+                ],
+                [
+                    1.0,
+                    2.347489581012205,
+                    3.286131509248174,
+                    2.242977238775591,
+                    0.9130263995122161
+                ],
+                [
+                    1.0,
+                    2.543545539036691,
+                    3.523417913140859,
+                    2.4270600681095704,
+                    0.9105979590796931
+                ],
+                [
+                    1.0,
+                    2.73387990333043,
+                    3.772056440459995,
+                    2.6050927913395414,
+                    0.9081053452219463
+                ],
+                [
+                    1.0,
+                    2.9167743037561342,
+                    4.027904302869278,
+                    2.7754396288690275,
+                    0.9055470787193012
+                ],
+                [
+                    1.0,
+                    3.090354879519288,
+                    4.28601986470373,
+                    2.936327056943826,
+                    0.9029216595709332
+                ],
+                [
+                    1.0,
+                    3.2525928490697718,
+                    4.540671286746368,
+                    3.0858461532453836,
+                    0.900227567609703
+                ],
+                [
+                    1.0,
+                    3.4013082243767254,
+                    4.785380756787097,
+                    3.2219580453512258,
+                    0.8974632631970809
+                ],
+                [
+                    1.0,
+                    3.534177351700748,
+                    5.013012426354524,
+                    3.3425030808002147,
+                    0.894627188003255
+                ],
+                [
+                    1.0,
+                    3.64874503622692,
+                    5.215912208722361,
+                    3.4452143966985114,
+                    0.8917177658777217
+                ],
+                [
+                    1.0,
+                    3.7424420791701745,
+                    5.386107047699733,
+                    3.5277366198243234,
+                    0.8887334038159063
+                ],
+                [
+                    1.0,
+                    3.8126091187330933,
+                    5.515569937698871,
+                    3.587650470619616,
+                    0.8856724930275932
+                ],
+                [
+                    1.0,
+                    3.8535732646246905,
+                    5.591171642298132,
+                    3.6203480925001505,
+                    0.8828336018647609
+                ],
+                [
+                    1.0,
+                    3.85357326462469,
+                    5.59117164229813,
+                    3.6203480925001497,
+                    0.8828336018647606
+                ]
             ],
             [
-                1.0,
-                0.7439215942314029,
-                2.0648385200198103,
-                0.7174661953192853,
-                0.930184590969224
+                11313.70849898476,
+                11645.225462737499,
+                11986.456615013449,
+                12337.686603263526,
+                12699.208415745596,
+                13071.323625928797,
+                13454.342644059432,
+                13848.584976098287,
+                14254.379490245426,
+                14672.06469127474,
+                15101.989002907094,
+                15544.51105845769,
+                16000.0,
+                16468.835786295866,
+                16951.409509748722,
+                17448.123722644123,
+                17959.392772949963,
+                18485.643149956362,
+                19027.31384004354,
+                19584.856692874473,
+                20158.73679831797,
+                20749.432874416154,
+                21357.437666720543,
+                21983.258359329422
             ],
             [
-                1.0,
-                0.9413791193224187,
-                2.145902850797162,
-                0.906938268190278,
-                0.9282154257819328
+                11151.506107591995,
+                11478.270178488001,
+                11814.609167515991,
+                12160.803641192919,
+                12517.142387262193,
+                12883.922655594033,
+                13261.450406144699,
+                13650.040564181483,
+                14050.017282986393,
+                14461.714214257616,
+                14885.474786434343,
+                15321.652491177176,
+                15770.611178243002,
+                16232.725359000371,
+                16708.38051883862,
+                17197.973438731144,
+                17701.912526221327,
+                18220.618156107063,
+                18754.523021108023,
+                19304.07249280834,
+                19869.724993175743,
+                20451.95237696689,
+                21051.240325338196,
+                21668.08875099028
             ],
             [
-                1.0,
-                1.141777806339264,
-                2.2480946022747323,
-                1.0988036964002577,
-                0.9261930359699481
+                11478.270178488003,
+                11814.609167515995,
+                12160.803641192917,
+                12517.142387262194,
+                12883.922655594035,
+                13261.450406144699,
+                13650.040564181485,
+                14050.017282986397,
+                14461.714214257616,
+                14885.474786434346,
+                15321.652491177178,
+                15770.611178243,
+                16232.72535900038,
+                16708.380518838618,
+                17197.973438731144,
+                17701.912526221335,
+                18220.618156107063,
+                18754.52302110802,
+                19304.07249280835,
+                19869.724993175736,
+                20451.95237696689,
+                21051.240325338204,
+                21668.08875099028,
+                22303.012215183986
+            ]
+        ],
+        "3": [
+            [
+                [
+                    0.049543786463175414,
+                    0.0023389550306845415,
+                    -0.08926967176810216,
+                    0.0023389550306845593,
+                    0.04954378646317543
+                ],
+                [
+                    0.07209289212124022,
+                    0.005803943876866221,
+                    -0.1317449166886045,
+                    0.005803943876866229,
+                    0.0720928921212402
+                ],
+                [
+                    0.09681485832152628,
+                    0.007576310097799819,
+                    -0.17847313289223835,
+                    0.007576310097799724,
+                    0.09681485832152628
+                ]
             ],
             [
-                1.0,
-                1.3444476124512956,
-                2.3718488491638388,
-                1.292390652149637,
-                0.9241161210309166
+                [
+                    1.0,
+                    0.85154595567767,
+                    1.5460411671091019,
+                    0.6277390926567701,
+                    0.558651783138002
+                ],
+                [
+                    1.0,
+                    2.1883246888857086,
+                    2.448523982301367,
+                    1.4824117236512582,
+                    0.48562377157212233
+                ],
+                [
+                    1.0,
+                    2.956242466905091,
+                    3.366300708547706,
+                    1.835436766848723,
+                    0.426631911417135
+                ]
             ],
             [
-                1.0,
-                1.5486127667986689,
-                2.5172567716939294,
-                1.4869275829235713,
-                0.9219833571148017
+                12699.208415745596,
+                16000.0,
+                20158.73679831797
             ],
             [
-                1.0,
-                1.7533833650028998,
-                2.6839975213341636,
-                1.6815359206603064,
-                0.9197933971583108
+                11313.70849898476,
+                14254.37949024543,
+                17959.392772949966
             ],
             [
-                1.0,
-                1.9577470806281876,
-                2.871267304150812,
-                1.8752230232603018,
-                0.9175448710665493
+                14254.379490245428,
+                17959.39277294997,
+                22627.416997969518
+            ]
+        ],
+        "6": [
+            [
+                [
+                    0.013671936053411899,
+                    0.0004855670133789607,
+                    -0.01628704305256001,
+                    0.0004855670133789478,
+                    0.013671936053411899
+                ],
+                [
+                    0.016247658576737475,
+                    0.0026090863693560428,
+                    -0.021020309343042026,
+                    0.00260908636935605,
+                    0.016247658576737475
+                ],
+                [
+                    0.01941812312417364,
+                    0.004789472016612542,
+                    -0.02604104711390556,
+                    0.004789472016612542,
+                    0.01941812312417364
+                ],
+                [
+                    0.02330864745167722,
+                    0.0068648361375146915,
+                    -0.03168109719103595,
+                    0.006864836137514686,
+                    0.02330864745167722
+                ],
+                [
+                    0.02806680028681941,
+                    0.008595512177679517,
+                    -0.03870331971193462,
+                    0.008595512177679506,
+                    0.02806680028681942
+                ],
+                [
+                    0.033864958157535444,
+                    0.009663069570317881,
+                    -0.048399268471123406,
+                    0.009663069570317862,
+                    0.033864958157535444
+                ]
             ],
             [
-                1.0,
-                2.160561186671763,
-                3.077707732916177,
-                2.0668755416599707,
-                0.9152363859453709
+                [
+                    1.0,
+                    0.16375881475741766,
+                    1.7284968961545042,
+                    0.14334072902717085,
+                    0.7679794549053973
+                ],
+                [
+                    1.0,
+                    0.8866858865661119,
+                    1.8849068760482686,
+                    0.7634452212867803,
+                    0.7438092088707028
+                ],
+                [
+                    1.0,
+                    1.6416532574354248,
+                    2.3285067727659325,
+                    1.3874748149916578,
+                    0.7176904652591447
+                ],
+                [
+                    1.0,
+                    2.3755646429890604,
+                    3.0336299835770544,
+                    1.966138948686765,
+                    0.6896104517751955
+                ],
+                [
+                    1.0,
+                    3.0062888717054994,
+                    3.8523396985734446,
+                    2.4299903557307236,
+                    0.6595990793693072
+                ],
+                [
+                    1.0,
+                    3.4200357906114944,
+                    4.485147169305008,
+                    2.6914260155628753,
+                    0.6277404140452657
+                ]
             ],
             [
-                1.0,
-                2.360545123398933,
-                3.3013361881248757,
-                2.255253445563559,
-                0.9128665263880712
+                11313.70849898476,
+                12699.208415745596,
+                14254.379490245426,
+                16000.0,
+                17959.392772949963,
+                20158.73679831797
             ],
             [
-                1.0,
-                2.556273897777094,
-                3.539481708334622,
-                2.4389849855161962,
-                0.9104338548202684
+                10678.718833360275,
+                11986.456615013452,
+                13454.34264405943,
+                15101.989002907096,
+                16951.40950974872,
+                19027.313840043535
             ],
             [
-                1.0,
-                2.7461726545280998,
-                3.788730786063357,
-                2.6165629182641204,
-                0.9079369119070112
+                11986.456615013452,
+                13454.342644059434,
+                15101.989002907094,
+                16951.409509748726,
+                19027.31384004353,
+                21357.437666720547
+            ]
+        ]
+    },
+    "48000": {
+        "1": [
+            [
+                [
+                    0.3363033496153395,
+                    0.002908453287506244,
+                    -0.6666756805115625,
+                    0.0029084532875060694,
+                    0.33630334961533936
+                ]
             ],
             [
-                1.0,
-                2.928512819336991,
-                4.044888348397372,
-                2.786342376027754,
-                0.905374217026339
+                [
+                    1.0,
+                    1.5179241189881592,
+                    0.6045458099754184,
+                    0.3215432523572009,
+                    0.2710069897753381
+                ]
             ],
             [
-                1.0,
-                3.10141028068263,
-                4.302960106616497,
-                2.946540817874176,
-                0.9027442688137435
+                16000.0
             ],
             [
-                1.0,
-                3.2628261473839877,
-                4.557163301280205,
-                3.0952405619189216,
-                0.900045545782185
+                11313.70849898476
             ],
             [
-                1.0,
-                3.4105706931042983,
-                4.800973558835779,
-                3.2303944592534473,
-                0.8972765070225422
+                22627.41699796952
+            ]
+        ],
+        "12": [
+            [
+                [
+                    0.0054411083339362554,
+                    -0.0010605044903814653,
+                    0.001103966397347418,
+                    -0.001060504490381464,
+                    0.0054411083339362554
+                ],
+                [
+                    0.005722435670957843,
+                    -1.326378894835501e-05,
+                    0.00040255080257860877,
+                    -1.326378894835501e-05,
+                    0.005722435670957841
+                ],
+                [
+                    0.006037122079595859,
+                    0.0010879658147829262,
+                    -0.00017324983879519435,
+                    0.0010879658147829295,
+                    0.006037122079595859
+                ],
+                [
+                    0.006388966288126959,
+                    0.002235011871460601,
+                    -0.0006015336845886287,
+                    0.002235011871460601,
+                    0.0063889662881269575
+                ],
+                [
+                    0.006782176009421191,
+                    0.003416171413771622,
+                    -0.0008676765940908338,
+                    0.0034161714137716168,
+                    0.00678217600942119
+                ],
+                [
+                    0.007221407964232415,
+                    0.00461553734550084,
+                    -0.0009692453896590252,
+                    0.004615537345500839,
+                    0.007221407964232417
+                ],
+                [
+                    0.007711811110440522,
+                    0.005812306569361682,
+                    -0.0009219166702983477,
+                    0.005812306569361687,
+                    0.007711811110440522
+                ],
+                [
+                    0.008259073205378777,
+                    0.0069801177162002025,
+                    -0.0007660485209492277,
+                    0.006980117716200203,
+                    0.008259073205378775
+                ],
+                [
+                    0.00886947080727253,
+                    0.008086490693466468,
+                    -0.0005731668858570282,
+                    0.00808649069346647,
+                    0.00886947080727253
+                ],
+                [
+                    0.00954992279433242,
+                    0.009092471186320951,
+                    -0.00045111255161878866,
+                    0.00909247118632095,
+                    0.009549922794332416
+                ],
+                [
+                    0.010308047445366968,
+                    0.009952620665900006,
+                    -0.0005459845845076761,
+                    0.00995262066590001,
+                    0.010308047445366968
+                ],
+                [
+                    0.011152223083119342,
+                    0.010615535045105182,
+                    -0.0010384200089815854,
+                    0.010615535045105186,
+                    0.01115222308311934
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -0.3455760204923311,
+                    1.9049069336379845,
+                    -0.32514591119598,
+                    0.8854569601453669
+                ],
+                [
+                    1.0,
+                    -0.00432974574862649,
+                    1.8673959493706889,
+                    -0.0040590109474866465,
+                    0.8790878884411578
+                ],
+                [
+                    1.0,
+                    0.3558097848028303,
+                    1.8910323304743795,
+                    0.33228021342015646,
+                    0.872392516843686
+                ],
+                [
+                    1.0,
+                    0.7323807932946031,
+                    1.9851578823387799,
+                    0.6811648289715935,
+                    0.8653575373024358
+                ],
+                [
+                    1.0,
+                    1.121761397550242,
+                    2.157071770475019,
+                    1.0388151114649224,
+                    0.85796953493505
+                ],
+                [
+                    1.0,
+                    1.518933787033987,
+                    2.4105020579277125,
+                    1.400188340436046,
+                    0.8502150538291299
+                ],
+                [
+                    1.0,
+                    1.9172367542802442,
+                    2.743761276266446,
+                    1.75878868938823,
+                    0.8420806734282995
+                ],
+                [
+                    1.0,
+                    2.3081213023385634,
+                    3.1476976292121437,
+                    2.106492761518522,
+                    0.8335530965604896
+                ],
+                [
+                    1.0,
+                    2.680932278549196,
+                    3.603675344184917,
+                    2.433413495272498,
+                    0.824619250216382
+                ],
+                [
+                    1.0,
+                    3.0227496595165966,
+                    4.081980787121798,
+                    2.727834042128899,
+                    0.8152664002276861
+                ],
+                [
+                    1.0,
+                    3.318336351333477,
+                    4.541243864823925,
+                    2.9762536470476726,
+                    0.8054822810255228
+                ],
+                [
+                    1.0,
+                    3.550254899065085,
+                    4.929652702089733,
+                    3.163598965709055,
+                    0.7952552416753291
+                ]
             ],
             [
-                1.0,
-                3.5423111749420695,
-                5.0272159957243625,
-                3.3498353323499286,
-                0.8944355929895743
+                11313.70849898476,
+                11986.456615013449,
+                12699.208415745596,
+                13454.342644059432,
+                14254.379490245426,
+                15101.989002907094,
+                16000.0,
+                16951.409509748722,
+                17959.392772949963,
+                19027.31384004354,
+                20158.73679831797,
+                21357.437666720543
             ],
             [
-                1.0,
-                3.6555842883297376,
-                5.228208709090527,
-                3.45128985960155,
-                0.8915212263787494
+                10991.629179664713,
+                11645.225462737495,
+                12337.686603263526,
+                13071.323625928799,
+                13848.584976098286,
+                14672.064691274738,
+                15544.511058457694,
+                16468.83578629587,
+                17448.12372264412,
+                18485.64314995637,
+                19584.85669287448,
+                20749.432874416147
             ],
             [
-                1.0,
-                3.7478140913010014,
-                5.395966202487305,
-                3.532397640127616,
-                0.8885318130994614
+                11645.2254627375,
+                12337.686603263524,
+                13071.323625928799,
+                13848.58497609829,
+                14672.064691274738,
+                15544.511058457692,
+                16468.835786295873,
+                17448.123722644123,
+                18485.643149956362,
+                19584.856692874488,
+                20749.432874416154,
+                21983.25835932942
             ]
         ],
-        [
-            11313.70849898476,
-            11645.225462737499,
-            11986.45661501345,
-            12337.686603263526,
-            12699.208415745596,
-            13071.323625928797,
-            13454.342644059432,
-            13848.584976098287,
-            14254.379490245426,
-            14672.06469127474,
-            15101.989002907094,
-            15544.51105845769,
-            16000.0,
-            16468.835786295866,
-            16951.409509748722,
-            17448.123722644123,
-            17959.392772949963,
-            18485.643149956362,
-            19027.31384004354,
-            19584.856692874473,
-            20158.73679831797,
-            20749.432874416154,
-            21357.437666720543,
-            21983.258359329422
-        ],
-        [
-            11151.506107591995,
-            11478.270178488001,
-            11814.609167515993,
-            12160.803641192919,
-            12517.142387262193,
-            12883.922655594033,
-            13261.450406144699,
-            13650.040564181483,
-            14050.017282986393,
-            14461.714214257616,
-            14885.474786434343,
-            15321.652491177176,
-            15770.611178243002,
-            16232.725359000371,
-            16708.38051883862,
-            17197.973438731144,
-            17701.912526221327,
-            18220.618156107063,
-            18754.523021108023,
-            19304.07249280834,
-            19869.724993175743,
-            20451.95237696689,
-            21051.240325338196,
-            21668.08875099028
-        ],
-        [
-            11478.270178488003,
-            11814.609167515995,
-            12160.803641192919,
-            12517.142387262194,
-            12883.922655594035,
-            13261.450406144699,
-            13650.040564181485,
-            14050.017282986397,
-            14461.714214257616,
-            14885.474786434346,
-            15321.652491177178,
-            15770.611178243,
-            16232.72535900038,
-            16708.380518838618,
-            17197.973438731144,
-            17701.912526221335,
-            18220.618156107063,
-            18754.52302110802,
-            19304.07249280835,
-            19869.724993175736,
-            20451.95237696689,
-            21051.240325338204,
-            21668.08875099028,
-            22303.012215183986
-        ]
-    ],
-    "3": [
-        [
+        "24": [
             [
-                0.043140032193149457,
-                0.0009913017706948664,
-                -0.07667939614588672,
-                0.0009913017706948963,
-                0.04314003219314946
+                [
+                    0.003702609627159013,
+                    -0.0010989062943538518,
+                    0.004960367802425206,
+                    -0.0010989062943538522,
+                    0.0037026096271590148
+                ],
+                [
+                    0.003737046185269829,
+                    -0.0005671563724107402,
+                    0.004808201672506836,
+                    -0.0005671563724107394,
+                    0.003737046185269828
+                ],
+                [
+                    0.003773562244027174,
+                    -1.9709454372458008e-05,
+                    0.004697539319452905,
+                    -1.9709454372458424e-05,
+                    0.0037735622440271733
+                ],
+                [
+                    0.0038122792141830567,
+                    0.0005427606301319766,
+                    0.004632410636968335,
+                    0.0005427606301319756,
+                    0.0038122792141830593
+                ],
+                [
+                    0.0038533253808925223,
+                    0.0011193942647162087,
+                    0.004616687917208741,
+                    0.0011193942647162076,
+                    0.003853325380892523
+                ],
+                [
+                    0.0038968362780660228,
+                    0.001709125257985346,
+                    0.004653974095001787,
+                    0.0017091252579853448,
+                    0.0038968362780660223
+                ],
+                [
+                    0.003942955081891472,
+                    0.00231065888404079,
+                    0.004747472582891365,
+                    0.0023106588840407912,
+                    0.00394295508189147
+                ],
+                [
+                    0.003991833024400751,
+                    0.002922448871159703,
+                    0.004899838092640652,
+                    0.002922448871159705,
+                    0.0039918330244007524
+                ],
+                [
+                    0.004043629827986288,
+                    0.0035426735103577197,
+                    0.005113008419562192,
+                    0.003542673510357719,
+                    0.004043629827986286
+                ],
+                [
+                    0.00409851416180363,
+                    0.004169211118036629,
+                    0.005388017947057764,
+                    0.00416921111803663,
+                    0.00409851416180363
+                ],
+                [
+                    0.0041566641210255845,
+                    0.004799615160854701,
+                    0.00572479464230092,
+                    0.004799615160854704,
+                    0.004156664121025585
+                ],
+                [
+                    0.004218267729944693,
+                    0.005431089437583128,
+                    0.006121943590623718,
+                    0.00543108943758313,
+                    0.004218267729944694
+                ],
+                [
+                    0.004283523469949686,
+                    0.00606046381323238,
+                    0.006576521681639655,
+                    0.006060463813232381,
+                    0.004283523469949686
+                ],
+                [
+                    0.0043526408334316905,
+                    0.006684171116245769,
+                    0.0070838099311999955,
+                    0.006684171116245771,
+                    0.004352640833431689
+                ],
+                [
+                    0.00442584090470414,
+                    0.007298225940961537,
+                    0.00763709210216389,
+                    0.007298225940961537,
+                    0.004425840904704139
+                ],
+                [
+                    0.004503356969048996,
+                    0.00789820624542594,
+                    0.00822745075431348,
+                    0.007898206245425943,
+                    0.004503356969048997
+                ],
+                [
+                    0.004585435151027468,
+                    0.008479238799123245,
+                    0.008843594560023758,
+                    0.008479238799123247,
+                    0.004585435151027468
+                ],
+                [
+                    0.004672335083220544,
+                    0.009035989715752233,
+                    0.009471733577543036,
+                    0.009035989715752235,
+                    0.004672335083220545
+                ],
+                [
+                    0.004764330606587514,
+                    0.00956266150143178,
+                    0.0100955220360428,
+                    0.009562661501431783,
+                    0.0047643306065875135
+                ],
+                [
+                    0.0048617105036527055,
+                    0.010052998256119232,
+                    0.010696090849635452,
+                    0.010052998256119232,
+                    0.004861710503652707
+                ],
+                [
+                    0.004964779265751502,
+                    0.010500300881559248,
+                    0.01125219425829016,
+                    0.010500300881559246,
+                    0.004964779265751501
+                ],
+                [
+                    0.005073857895583499,
+                    0.010897454366870639,
+                    0.011740496321440702,
+                    0.010897454366870637,
+                    0.0050738578955835
+                ],
+                [
+                    0.005189284746334779,
+                    0.011236969434750247,
+                    0.012136022999961736,
+                    0.011236969434750244,
+                    0.00518928474633478
+                ],
+                [
+                    0.005311416398643936,
+                    0.011511041026246673,
+                    0.01241280369417367,
+                    0.011511041026246675,
+                    0.005311416398643938
+                ]
             ],
             [
-                0.06287596977873822,
-                0.0046286568564018115,
-                -0.1145356290930384,
-                0.004628656856401808,
-                0.06287596977873819
+                [
+                    1.0,
+                    -0.3527941842716257,
+                    1.9693889416738615,
+                    -0.34221518077909596,
+                    0.9409530287667749
+                ],
+                [
+                    1.0,
+                    -0.18216057616075979,
+                    1.9447251566127672,
+                    -0.1765406090985662,
+                    0.9392772501817404
+                ],
+                [
+                    1.0,
+                    -0.006333189821313118,
+                    1.9345471232667164,
+                    -0.006132163629913798,
+                    0.9375555582085321
+                ],
+                [
+                    1.0,
+                    0.17448505550218374,
+                    1.9402071526466014,
+                    0.1687869075948702,
+                    0.9357867930216013
+                ],
+                [
+                    1.0,
+                    0.3600317464806731,
+                    1.963012088867095,
+                    0.3479353487658613,
+                    0.9339697714599987
+                ],
+                [
+                    1.0,
+                    0.5499781386892546,
+                    2.0041882057131337,
+                    0.5309675856620597,
+                    0.9321032869418907
+                ],
+                [
+                    1.0,
+                    0.74392190868938,
+                    2.0648402938075288,
+                    0.7174670851649776,
+                    0.9301861094089499
+                ],
+                [
+                    1.0,
+                    0.9413795292772692,
+                    2.1459047478137965,
+                    0.9069394263732546,
+                    0.9282169853031318
+                ],
+                [
+                    1.0,
+                    1.1417783186086101,
+                    2.2480966467712498,
+                    1.0988051412062907,
+                    0.9261946375784936
+                ],
+                [
+                    1.0,
+                    1.3444482339144677,
+                    2.371851067656928,
+                    1.292392401904104,
+                    0.9241177657508457
+                ],
+                [
+                    1.0,
+                    1.5486135043269502,
+                    2.5172591928002914,
+                    1.4869296557883078,
+                    0.92198504598822
+                ],
+                [
+                    1.0,
+                    1.7533842253759362,
+                    2.6840001755014358,
+                    1.6815383343931773,
+                    0.9197951312452566
+                ],
+                [
+                    1.0,
+                    1.9577480704350139,
+                    2.8712702232671488,
+                    1.8752257949337108,
+                    0.9175466514448232
+                ],
+                [
+                    1.0,
+                    2.1605623121948447,
+                    3.07771094978049,
+                    2.066878687334504,
+                    0.9152382137103172
+                ],
+                [
+                    1.0,
+                    2.3605463904796617,
+                    3.301339735760866,
+                    2.255256979913141,
+                    0.9128684026523192
+                ],
+                [
+                    1.0,
+                    2.5562753116611976,
+                    3.539485619134116,
+                    2.438988921401362,
+                    0.9104357807134231
+                ],
+                [
+                    1.0,
+                    2.7461742196895704,
+                    3.788735090748669,
+                    2.6165672662505024,
+                    0.9079388885752948
+                ],
+                [
+                    1.0,
+                    2.92851453927934,
+                    4.04489307479879,
+                    2.7863471438475633,
+                    0.9053762456321759
+                ],
+                [
+                    1.0,
+                    3.101412157716556,
+                    4.302965278269912,
+                    2.946546009829423,
+                    0.9027463505352856
+                ],
+                [
+                    1.0,
+                    3.2628281823810266,
+                    4.557168935861959,
+                    3.0952461782264695,
+                    0.9000476818127766
+                ],
+                [
+                    1.0,
+                    3.4105728852265575,
+                    4.800979666467094,
+                    3.2304004953336682,
+                    0.8972786985701191
+                ],
+                [
+                    1.0,
+                    3.5423135213489374,
+                    5.02722257719664,
+                    3.349841778062943,
+                    0.8944378412759912
+                ],
+                [
+                    1.0,
+                    3.655586783863421,
+                    5.22821575408525,
+                    3.4512966984377162,
+                    0.8915235326390315
+                ],
+                [
+                    1.0,
+                    3.7478167281539707,
+                    5.395973687889837,
+                    3.5324048483623205,
+                    0.8885341785809783
+                ]
             ],
             [
-                0.09108072445676865,
-                0.007350607974862103,
-                -0.1674186233495754,
-                0.007350607974862224,
-                0.09108072445676862
+                11313.70849898476,
+                11645.225462737499,
+                11986.456615013449,
+                12337.686603263526,
+                12699.208415745596,
+                13071.323625928797,
+                13454.342644059432,
+                13848.584976098287,
+                14254.379490245426,
+                14672.06469127474,
+                15101.989002907094,
+                15544.51105845769,
+                16000.0,
+                16468.835786295866,
+                16951.409509748722,
+                17448.123722644123,
+                17959.392772949963,
+                18485.643149956362,
+                19027.31384004354,
+                19584.856692874473,
+                20158.73679831797,
+                20749.432874416154,
+                21357.437666720543,
+                21983.258359329422
+            ],
+            [
+                11151.506107591995,
+                11478.270178488001,
+                11814.609167515991,
+                12160.803641192919,
+                12517.142387262193,
+                12883.922655594033,
+                13261.450406144699,
+                13650.040564181483,
+                14050.017282986393,
+                14461.714214257616,
+                14885.474786434343,
+                15321.652491177176,
+                15770.611178243002,
+                16232.725359000371,
+                16708.38051883862,
+                17197.973438731144,
+                17701.912526221327,
+                18220.618156107063,
+                18754.523021108023,
+                19304.07249280834,
+                19869.724993175743,
+                20451.95237696689,
+                21051.240325338196,
+                21668.08875099028
+            ],
+            [
+                11478.270178488003,
+                11814.609167515995,
+                12160.803641192917,
+                12517.142387262194,
+                12883.922655594035,
+                13261.450406144699,
+                13650.040564181485,
+                14050.017282986397,
+                14461.714214257616,
+                14885.474786434346,
+                15321.652491177178,
+                15770.611178243,
+                16232.72535900038,
+                16708.380518838618,
+                17197.973438731144,
+                17701.912526221335,
+                18220.618156107063,
+                18754.52302110802,
+                19304.07249280835,
+                19869.724993175736,
+                20451.95237696689,
+                21051.240325338204,
+                21668.08875099028,
+                22303.012215183986
             ]
         ],
-        [
+        "3": [
+            [
+                [
+                    0.043133180296769054,
+                    0.0009889818711902078,
+                    -0.07668816037058931,
+                    0.0009889818711901646,
+                    0.043133180296769054
+                ],
+                [
+                    0.06286900918183483,
+                    0.00461783207041342,
+                    -0.11454793886949446,
+                    0.0046178320704134326,
+                    0.06286900918183481
+                ],
+                [
+                    0.09107358397574383,
+                    0.007333432037306018,
+                    -0.1674387914905324,
+                    0.007333432037306081,
+                    0.09107358397574382
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    0.35611436094734483,
+                    1.4444084909429904,
+                    0.2693726945679191,
+                    0.5844843680220935
+                ],
+                [
+                    1.0,
+                    1.7173338781953773,
+                    2.025906187944451,
+                    1.2032395607401003,
+                    0.5127076520493832
+                ],
+                [
+                    1.0,
+                    2.8395208379262433,
+                    3.2123440388454516,
+                    1.7985488228609574,
+                    0.4388529911370751
+                ]
+            ],
             [
-                1.0,
-                0.3561130837789026,
-                1.4443960481721407,
-                0.26937000887611384,
-                0.584477620820897
+                12699.208415745596,
+                16000.0,
+                20158.73679831797
             ],
             [
-                1.0,
-                1.7173260282150693,
-                2.0258851827233904,
-                1.2032241926844989,
-                0.5127005259240065
+                11313.70849898476,
+                14254.37949024543,
+                17959.392772949966
             ],
             [
-                1.0,
-                2.8395043889825993,
-                3.212304944135884,
-                1.7985192128394694,
-                0.43884589651843153
+                14254.379490245428,
+                17959.39277294997,
+                22627.416997969518
             ]
         ],
-        [
-            12699.208415745596,
-            16000.0,
-            20158.73679831797
-        ],
-        [
-            11313.70849898476,
-            14254.37949024543,
-            17959.392772949966
-        ],
-        [
-            14254.379490245428,
-            17959.39277294997,
-            22627.416997969518
-        ]
-    ],
-    "6": [
-        [
+        "6": [
             [
-                0.012105688508488586,
-                -0.0009797415605366504,
-                -0.012937935296941714,
-                -0.0009797415605366571,
-                0.012105688508488583
+                [
+                    0.012098804535988503,
+                    -0.0009774452669669685,
+                    -0.012950589760434412,
+                    -0.0009774452669669765,
+                    0.012098804535988512
+                ],
+                [
+                    0.014306445577478724,
+                    0.0010393575248365066,
+                    -0.017527312908190797,
+                    0.0010393575248365146,
+                    0.01430644557747873
+                ],
+                [
+                    0.017029555585410246,
+                    0.0031899229842500664,
+                    -0.022322405055845422,
+                    0.003189922984250055,
+                    0.017029555585410246
+                ],
+                [
+                    0.02037877212387702,
+                    0.005361170671951351,
+                    -0.027460963708708222,
+                    0.005361170671951344,
+                    0.020378772123877016
+                ],
+                [
+                    0.024485089035415443,
+                    0.00737150051799962,
+                    -0.03337337181559836,
+                    0.007371500517999609,
+                    0.024485089035415436
+                ],
+                [
+                    0.029502439152902887,
+                    0.00895952847365931,
+                    -0.04096082538845119,
+                    0.008959528473659316,
+                    0.029502439152902894
+                ]
             ],
             [
-                0.014313301761881182,
-                0.0010417989052842998,
-                -0.01751498600433224,
-                0.001041798905284295,
-                0.014313301761881178
+                [
+                    1.0,
+                    -0.32796781637807093,
+                    1.7721241643869212,
+                    -0.2902228499753226,
+                    0.7844956268504282
+                ],
+                [
+                    1.0,
+                    0.3512135026590967,
+                    1.7438403687131991,
+                    0.3061339136845813,
+                    0.7617272752666735
+                ],
+                [
+                    1.0,
+                    1.0864538189891375,
+                    1.974431275215766,
+                    0.93103061916119,
+                    0.7370410799189633
+                ],
+                [
+                    1.0,
+                    1.8421007248141257,
+                    2.4943485557930565,
+                    1.5486013248382018,
+                    0.7103994037323602
+                ],
+                [
+                    1.0,
+                    2.5578510524526363,
+                    3.2503433901344474,
+                    2.1042952295453325,
+                    0.6817998089551857
+                ],
+                [
+                    1.0,
+                    3.143138486535201,
+                    4.054745087164861,
+                    2.523364861043847,
+                    0.651285456779766
+                ]
             ],
             [
-                0.017036388510423252,
-                0.0031974146486836697,
-                -0.022308506772127996,
-                0.003197414648683661,
-                0.017036388510423255
+                11313.70849898476,
+                12699.208415745596,
+                14254.379490245426,
+                16000.0,
+                17959.392772949963,
+                20158.73679831797
             ],
             [
-                0.020385588043752862,
-                0.005373759246137571,
-                -0.02744337382455276,
-                0.005373759246137564,
-                0.020385588043752866
+                10678.718833360275,
+                11986.456615013452,
+                13454.34264405943,
+                15101.989002907096,
+                16951.40950974872,
+                19027.313840043535
+            ],
+            [
+                11986.456615013452,
+                13454.342644059434,
+                15101.989002907094,
+                16951.409509748726,
+                19027.31384004353,
+                21357.437666720547
+            ]
+        ]
+    },
+    "96000": {
+        "1": [
+            [
+                [
+                    0.12298211613598735,
+                    -0.0033825678719252715,
+                    -0.23725122891625058,
+                    -0.0033825678719253465,
+                    0.12298211613598735
+                ]
             ],
             [
-                0.024491896152489895,
-                0.007388805923494939,
-                -0.03335037083741435,
-                0.00738880592349492,
-                0.024491896152489895
+                [
+                    1.0,
+                    -1.365108752181857,
+                    1.375603711468117,
+                    -0.7742150108966762,
+                    0.37968987500974644
+                ]
             ],
             [
-                0.02950924778886837,
-                0.008980557013039462,
-                -0.040932092208741125,
-                0.008980557013039465,
-                0.02950924778886837
+                16000.0
+            ],
+            [
+                11313.70849898476
+            ],
+            [
+                22627.41699796952
             ]
         ],
-        [
+        "12": [
+            [
+                [
+                    0.0037027303431252725,
+                    -0.009054411388451674,
+                    0.011544751048658892,
+                    -0.009054411388451674,
+                    0.003702730343125272
+                ],
+                [
+                    0.0037736979795154188,
+                    -0.008665297920078247,
+                    0.010829485097884948,
+                    -0.008665297920078249,
+                    0.0037736979795154188
+                ],
+                [
+                    0.0038534779393338565,
+                    -0.008236260915310826,
+                    0.010064686329239342,
+                    -0.008236260915310824,
+                    0.0038534779393338565
+                ],
+                [
+                    0.003943126476266577,
+                    -0.007763964090512544,
+                    0.009252008669358583,
+                    -0.007763964090512545,
+                    0.003943126476266577
+                ],
+                [
+                    0.004043822304153442,
+                    -0.007245003944301632,
+                    0.008394689555150835,
+                    -0.007245003944301634,
+                    0.004043822304153443
+                ],
+                [
+                    0.004156880183471158,
+                    -0.006675975637692645,
+                    0.0074978967243541465,
+                    -0.006675975637692646,
+                    0.004156880183471158
+                ],
+                [
+                    0.004283765910180636,
+                    -0.006053561706284681,
+                    0.006569091260325956,
+                    -0.00605356170628468,
+                    0.004283765910180635
+                ],
+                [
+                    0.0044261128325162455,
+                    -0.005374648724481844,
+                    0.0056183835391854856,
+                    -0.005374648724481843,
+                    0.004426112832516245
+                ],
+                [
+                    0.004585740028896247,
+                    -0.00463647775735167,
+                    0.004658845701106801,
+                    -0.00463647775735167,
+                    0.004585740028896247
+                ],
+                [
+                    0.004764672287442084,
+                    -0.0038368350925726117,
+                    0.003706727345694297,
+                    -0.0038368350925726143,
+                    0.004764672287442086
+                ],
+                [
+                    0.004965162034402151,
+                    -0.0029742902470956526,
+                    0.0027815001239252708,
+                    -0.002974290247095652,
+                    0.00496516203440215
+                ],
+                [
+                    0.005189713364837003,
+                    -0.002048488448059904,
+                    0.001905632171095078,
+                    -0.002048488448059905,
+                    0.005189713364837002
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -2.90684355114485,
+                    4.05163606208979,
+                    -2.8196690207901263,
+                    0.9409470603866865
+                ],
+                [
+                    1.0,
+                    -2.7844031800153806,
+                    3.873730784682261,
+                    -2.6960124262580125,
+                    0.9375492583033653
+                ],
+                [
+                    1.0,
+                    -2.649040370561897,
+                    3.6859235907444043,
+                    -2.5600284085991794,
+                    0.9339631231125873
+                ],
+                [
+                    1.0,
+                    -2.4996306194842384,
+                    3.4894150910769204,
+                    -2.4107314200712278,
+                    0.930179095026014
+                ],
+                [
+                    1.0,
+                    -2.335017504934418,
+                    3.2859844723648246,
+                    -2.24712531924495,
+                    0.9261872388884159
+                ],
+                [
+                    1.0,
+                    -2.1540325965307217,
+                    3.0781077549620943,
+                    -2.0682251272500385,
+                    0.921977244042879
+                ],
+                [
+                    1.0,
+                    -1.9555227412105336,
+                    2.869082075218473,
+                    -1.873085848436429,
+                    0.9175384266261559
+                ],
+                [
+                    1.0,
+                    -1.7383864615134483,
+                    2.6631486868681957,
+                    -1.6608398570228333,
+                    0.912859734684347
+                ],
+                [
+                    1.0,
+                    -1.50162147111538,
+                    2.4656032614794072,
+                    -1.4307445356727744,
+                    0.9079297565424453
+                ],
+                [
+                    1.0,
+                    -1.244385572537669,
+                    2.282876721374814,
+                    -1.182242007260819,
+                    0.9027367329079083
+                ],
+                [
+                    1.0,
+                    -0.9660734248029783,
+                    2.1225631932274465,
+                    -0.9150328958464736,
+                    0.8972685732382202
+                ],
+                [
+                    1.0,
+                    -0.6664118098679761,
+                    1.9933638546201773,
+                    -0.6291660414145905,
+                    0.8915128769552997
+                ]
+            ],
+            [
+                11313.70849898476,
+                11986.456615013449,
+                12699.208415745596,
+                13454.342644059432,
+                14254.379490245426,
+                15101.989002907094,
+                16000.0,
+                16951.409509748722,
+                17959.392772949963,
+                19027.31384004354,
+                20158.73679831797,
+                21357.437666720543
+            ],
             [
-                1.0,
-                -0.3279673214072805,
-                1.7721184363152322,
-                -0.2902216089499693,
-                0.7844913672620322
+                10991.629179664713,
+                11645.225462737495,
+                12337.686603263526,
+                13071.323625928799,
+                13848.584976098286,
+                14672.064691274738,
+                15544.511058457694,
+                16468.83578629587,
+                17448.12372264412,
+                18485.64314995637,
+                19584.85669287448,
+                20749.432874416147
             ],
             [
-                1.0,
-                0.3512129030186812,
-                1.7438339316667815,
-                0.3061324386980487,
-                0.7617226485362805
+                11645.2254627375,
+                12337.686603263524,
+                13071.323625928799,
+                13848.58497609829,
+                14672.064691274738,
+                15544.511058457692,
+                16468.835786295873,
+                17448.123722644123,
+                18485.643149956362,
+                19584.856692874488,
+                20749.432874416154,
+                21983.25835932942
+            ]
+        ],
+        "24": [
+            [
+                [
+                    0.003275721522288696,
+                    -0.009195202413968867,
+                    0.012693205870545832,
+                    -0.00919520241396887,
+                    0.0032757215222886968
+                ],
+                [
+                    0.003283842872498568,
+                    -0.009006636545127091,
+                    0.012398774009615851,
+                    -0.009006636545127091,
+                    0.003283842872498569
+                ],
+                [
+                    0.003292482849533655,
+                    -0.008808292728910705,
+                    0.012094844751259947,
+                    -0.008808292728910703,
+                    0.0032924828495336546
+                ],
+                [
+                    0.003301672926341275,
+                    -0.008599739109755467,
+                    0.011781668472535475,
+                    -0.008599739109755467,
+                    0.0033016729263412757
+                ],
+                [
+                    0.00331144642908854,
+                    -0.0083805345862282,
+                    0.011459585693926522,
+                    -0.0083805345862282,
+                    0.00331144642908854
+                ],
+                [
+                    0.003321838643553463,
+                    -0.008150230044896532,
+                    0.01112903767705868,
+                    -0.008150230044896534,
+                    0.0033218386435534637
+                ],
+                [
+                    0.003332886927442249,
+                    -0.007908369850823565,
+                    0.010790577661957705,
+                    -0.007908369850823563,
+                    0.003332886927442248
+                ],
+                [
+                    0.0033446308289481474,
+                    -0.007654493626576553,
+                    0.010444882689677084,
+                    -0.007654493626576553,
+                    0.0033446308289481474
+                ],
+                [
+                    0.003357112211882902,
+                    -0.007388138354597543,
+                    0.010092765929819865,
+                    -0.007388138354597541,
+                    0.003357112211882901
+                ],
+                [
+                    0.0033703753877278764,
+                    -0.007108840840888025,
+                    0.009735189400854981,
+                    -0.007108840840888025,
+                    0.0033703753877278764
+                ],
+                [
+                    0.003384467254968735,
+                    -0.006816140581188403,
+                    0.00937327693349355,
+                    -0.006816140581188405,
+                    0.003384467254968735
+                ],
+                [
+                    0.0033994374460951647,
+                    -0.0065095830741571745,
+                    0.009008327183046788,
+                    -0.006509583074157173,
+                    0.003399437446095164
+                ],
+                [
+                    0.0034153384826651227,
+                    -0.006188723629434925,
+                    0.008641826444945606,
+                    -0.006188723629434924,
+                    0.0034153384826651227
+                ],
+                [
+                    0.0034322259388520865,
+                    -0.005853131721862184,
+                    0.008275460967809928,
+                    -0.005853131721862184,
+                    0.0034322259388520873
+                ],
+                [
+                    0.003450158613913328,
+                    -0.005502395946440545,
+                    0.007911128390049522,
+                    -0.005502395946440544,
+                    0.0034501586139133265
+                ],
+                [
+                    0.0034691987140375302,
+                    -0.005136129631798651,
+                    0.00755094784853481,
+                    -0.005136129631798654,
+                    0.003469198714037532
+                ],
+                [
+                    0.003489412044050996,
+                    -0.004753977172841311,
+                    0.00719726822118985,
+                    -0.00475397717284131,
+                    0.003489412044050996
+                ],
+                [
+                    0.0035108682094835923,
+                    -0.004355621145790678,
+                    0.006852673869536762,
+                    -0.004355621145790678,
+                    0.0035108682094835923
+                ],
+                [
+                    0.0035336408295180777,
+                    -0.0039407902708117485,
+                    0.006519987142797134,
+                    -0.003940790270811748,
+                    0.0035336408295180777
+                ],
+                [
+                    0.003557807761369253,
+                    -0.0035092682886555013,
+                    0.0062022667932382786,
+                    -0.0035092682886555013,
+                    0.003557807761369252
+                ],
+                [
+                    0.0035834513366639615,
+                    -0.0030609038180190173,
+                    0.005902801334892726,
+                    -0.003060903818019018,
+                    0.0035834513366639624
+                ],
+                [
+                    0.003610658610417102,
+                    -0.0025956212593327074,
+                    0.005625096257381537,
+                    -0.0025956212593327087,
+                    0.003610658610417102
+                ],
+                [
+                    0.003639521623224222,
+                    -0.0021134328081111892,
+                    0.005372853887324717,
+                    -0.0021134328081111884,
+                    0.003639521623224222
+                ],
+                [
+                    0.003670137677317606,
+                    -0.001614451636459106,
+                    0.0051499445771702665,
+                    -0.0016144516364591068,
+                    0.003670137677317607
+                ]
             ],
             [
-                1.0,
-                1.0864517200453219,
-                1.9744231155784162,
-                0.9310255629390407,
-                0.7370360765300357
+                [
+                    1.0,
+                    -2.9299059899395914,
+                    4.1156701629015195,
+                    -2.8856506449444286,
+                    0.97002217130626
+                ],
+                [
+                    1.0,
+                    -2.8704575989949364,
+                    4.02856365262064,
+                    -2.8258395089873627,
+                    0.9691575448288849
+                ],
+                [
+                    1.0,
+                    -2.8078838511061215,
+                    3.9388063310690815,
+                    -2.7629696130654535,
+                    0.9682683972558876
+                ],
+                [
+                    1.0,
+                    -2.7420442104086726,
+                    3.8464979502754657,
+                    -2.6969083636025295,
+                    0.9673540579757908
+                ],
+                [
+                    1.0,
+                    -2.6727949002519207,
+                    3.7517679570503617,
+                    -2.627520560207655,
+                    0.9664138395287447
+                ],
+                [
+                    1.0,
+                    -2.599989275894933,
+                    3.6547789118969467,
+                    -2.5546688033469507,
+                    0.9654470372751651
+                ],
+                [
+                    1.0,
+                    -2.5234782784756784,
+                    3.555730113911719,
+                    -2.478213983046019,
+                    0.9644529290639281
+                ],
+                [
+                    1.0,
+                    -2.4431109805796236,
+                    3.4548614147425427,
+                    -2.398015858465228,
+                    0.9634307749006149
+                ],
+                [
+                    1.0,
+                    -2.358735234719889,
+                    3.3524571963645817,
+                    -2.313933739075505,
+                    0.9623798166163571
+                ],
+                [
+                    1.0,
+                    -2.270198437080447,
+                    3.2488504774439457,
+                    -2.225827279086109,
+                    0.961299277537861
+                ],
+                [
+                    1.0,
+                    -2.177348419960901,
+                    3.144427101168362,
+                    -2.13355739773094,
+                    0.960188362159266
+                ],
+                [
+                    1.0,
+                    -2.0800344874876475,
+                    3.039629943412463,
+                    -2.0369873389958375,
+                    0.9590462558164934
+                ],
+                [
+                    1.0,
+                    -1.9781086103104024,
+                    2.9349630637545787,
+                    -1.9359838853532425,
+                    0.9578721243648598
+                ],
+                [
+                    1.0,
+                    -1.8714267961691504,
+                    2.830995702965839,
+                    -1.8304187410443813,
+                    0.9566651138607123
+                ],
+                [
+                    1.0,
+                    -1.7598506543745922,
+                    2.728366008972888,
+                    -1.7201701013914033,
+                    0.955424350247979
+                ],
+                [
+                    1.0,
+                    -1.6432491733688352,
+                    2.6277843488184534,
+                    -1.6051244255043073,
+                    0.9541489390505086
+                ],
+                [
+                    1.0,
+                    -1.5215007315893807,
+                    2.5300360367446073,
+                    -1.4851784305359192,
+                    0.9528379650712264
+                ],
+                [
+                    1.0,
+                    -1.3944953628078178,
+                    2.435983278235506,
+                    -1.3602413262903532,
+                    0.9514904920991283
+                ],
+                [
+                    1.0,
+                    -1.2621372979042504,
+                    2.3465660968487683,
+                    -1.2302373094551255,
+                    0.9501055626252483
+                ],
+                [
+                    1.0,
+                    -1.1243478056080023,
+                    2.262801975287675,
+                    -1.0951083369425205,
+                    0.9486821975688133
+                ],
+                [
+                    1.0,
+                    -0.981068355010505,
+                    2.1857839050060623,
+                    -0.9548171977186226,
+                    0.9472193960148635
+                ],
+                [
+                    1.0,
+                    -0.8322641225482236,
+                    2.1166765005800547,
+                    -0.8093509019809633,
+                    0.9457161349647024
+                ],
+                [
+                    1.0,
+                    -0.6779278655561244,
+                    2.0567097973872484,
+                    -0.6587244055152628,
+                    0.9441713691006721
+                ],
+                [
+                    1.0,
+                    -0.5180841832809632,
+                    2.0071703155270644,
+                    -0.5029846853984197,
+                    0.9425840305667633
+                ]
             ],
             [
-                1.0,
-                1.8420966973795174,
-                2.4943371847553397,
-                1.5485918414914146,
-                0.710394020295732
+                11313.70849898476,
+                11645.225462737499,
+                11986.456615013449,
+                12337.686603263526,
+                12699.208415745596,
+                13071.323625928797,
+                13454.342644059432,
+                13848.584976098287,
+                14254.379490245426,
+                14672.06469127474,
+                15101.989002907094,
+                15544.51105845769,
+                16000.0,
+                16468.835786295866,
+                16951.409509748722,
+                17448.123722644123,
+                17959.392772949963,
+                18485.643149956362,
+                19027.31384004354,
+                19584.856692874473,
+                20158.73679831797,
+                20749.432874416154,
+                21357.437666720543,
+                21983.258359329422
             ],
             [
-                1.0,
-                2.5578447237108595,
-                3.2503270745529127,
-                2.1042806922617907,
-                0.681794050106052
+                11151.506107591995,
+                11478.270178488001,
+                11814.609167515991,
+                12160.803641192919,
+                12517.142387262193,
+                12883.922655594033,
+                13261.450406144699,
+                13650.040564181483,
+                14050.017282986393,
+                14461.714214257616,
+                14885.474786434343,
+                15321.652491177176,
+                15770.611178243002,
+                16232.725359000371,
+                16708.38051883862,
+                17197.973438731144,
+                17701.912526221327,
+                18220.618156107063,
+                18754.523021108023,
+                19304.07249280834,
+                19869.724993175743,
+                20451.95237696689,
+                21051.240325338196,
+                21668.08875099028
             ],
             [
-                1.0,
-                3.1431296868521974,
-                4.054722532464942,
-                2.5233451852172704,
-                0.6512793373366625
+                11478.270178488003,
+                11814.609167515995,
+                12160.803641192917,
+                12517.142387262194,
+                12883.922655594035,
+                13261.450406144699,
+                13650.040564181485,
+                14050.017282986397,
+                14461.714214257616,
+                14885.474786434346,
+                15321.652491177178,
+                15770.611178243,
+                16232.72535900038,
+                16708.380518838618,
+                17197.973438731144,
+                17701.912526221335,
+                18220.618156107063,
+                18754.52302110802,
+                19304.07249280835,
+                19869.724993175736,
+                20451.95237696689,
+                21051.240325338204,
+                21668.08875099028,
+                22303.012215183986
             ]
         ],
-        [
-            11313.70849898476,
-            12699.208415745596,
-            14254.379490245426,
-            16000.0,
-            17959.392772949963,
-            20158.73679831797
-        ],
-        [
-            10678.718833360275,
-            11986.456615013452,
-            13454.34264405943,
-            15101.989002907096,
-            16951.40950974872,
-            19027.313840043535
-        ],
-        [
-            11986.456615013452,
-            13454.342644059434,
-            15101.989002907094,
-            16951.409509748726,
-            19027.31384004353,
-            21357.437666720547
-        ]
-    ],
-    "dec": [
-        [
-            0.011536697475707477,
-            0.03863239409987755,
-            0.10808835129075559,
-            0.20611576754172498,
-            0.32963659619400776,
-            0.42517932605498265,
-            0.4661693965957637,
-            0.4251793260549823,
-            0.3296365961940077,
-            0.20611576754172484,
-            0.10808835129075547,
-            0.03863239409987752,
-            0.011536697475707474
+        "3": [
+            [
+                [
+                    0.01434183730094565,
+                    -0.007392864766291711,
+                    -0.012723517491178022,
+                    -0.00739286476629171,
+                    0.01434183730094566
+                ],
+                [
+                    0.02043231055952851,
+                    -0.00526275689818769,
+                    -0.02766931016205111,
+                    -0.0052627568981876835,
+                    0.020432310559528506
+                ],
+                [
+                    0.029582370650330207,
+                    -0.002449538817138425,
+                    -0.04849120090529056,
+                    -0.002449538817138437,
+                    0.029582370650330213
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -2.4984220079218575,
+                    3.28566007195005,
+                    -2.1772362110961794,
+                    0.7613847564485605
+                ],
+                [
+                    1.0,
+                    -1.808528463264761,
+                    2.462723186036089,
+                    -1.519931250742431,
+                    0.7100005197953891
+                ],
+                [
+                    1.0,
+                    -0.8594789712644383,
+                    1.7244383788321158,
+                    -0.6897454045659834,
+                    0.6508314558861724
+                ]
+            ],
+            [
+                12699.208415745596,
+                16000.0,
+                20158.73679831797
+            ],
+            [
+                11313.70849898476,
+                14254.37949024543,
+                17959.392772949966
+            ],
+            [
+                14254.379490245428,
+                17959.39277294997,
+                22627.416997969518
+            ]
         ],
-        [
-            1.0,
-            -2.217799581317487,
-            6.050876867187728,
-            -8.921323656714186,
-            13.006330216820826,
-            -13.58725771157039,
-            12.99339017045834,
-            -9.673218888416496,
-            6.243626997073957,
-            -3.1439412347242843,
-            1.2640695988464932,
-            -0.35467961675541876,
-            0.060088025064203764
+        "6": [
+            [
+                [
+                    0.00544302813717747,
+                    -0.008775609903837023,
+                    0.007481516891354652,
+                    -0.008775609903837026,
+                    0.00544302813717747
+                ],
+                [
+                    0.006039524175221577,
+                    -0.007950721224069618,
+                    0.00507825455890187,
+                    -0.007950721224069618,
+                    0.006039524175221575
+                ],
+                [
+                    0.006785176134191125,
+                    -0.006961726860184574,
+                    0.0022712094462889274,
+                    -0.006961726860184571,
+                    0.006785176134191124
+                ],
+                [
+                    0.007715551003614068,
+                    -0.005785746667657159,
+                    -0.0009563085874660552,
+                    -0.005785746667657157,
+                    0.00771555100361407
+                ],
+                [
+                    0.008874123402318645,
+                    -0.004402683686473998,
+                    -0.004597708630474789,
+                    -0.0044026836864739915,
+                    0.008874123402318645
+                ],
+                [
+                    0.01031382285251956,
+                    -0.002799605553699841,
+                    -0.008617010711219748,
+                    -0.0027996055536998387,
+                    0.01031382285251956
+                ]
+            ],
+            [
+                [
+                    1.0,
+                    -2.8596557679740573,
+                    3.92292451139166,
+                    -2.690527262677181,
+                    0.8854121179515013
+                ],
+                [
+                    1.0,
+                    -2.6002503417623384,
+                    3.5532726074336773,
+                    -2.4282272800580484,
+                    0.872342962462691
+                ],
+                [
+                    1.0,
+                    -2.2860436915129947,
+                    3.151626788586426,
+                    -2.1169389737181703,
+                    0.8579148826619082
+                ],
+                [
+                    1.0,
+                    -1.9085087268678318,
+                    2.7353110512795897,
+                    -1.750718760037343,
+                    0.8420205354069985
+                ],
+                [
+                    1.0,
+                    -1.4596597233561588,
+                    2.334012062752463,
+                    -1.3248419299487364,
+                    0.8245532459820906
+                ],
+                [
+                    1.0,
+                    -0.9334459423863253,
+                    1.9926862225403883,
+                    -0.8371800775633409,
+                    0.8054100499987691
+                ]
+            ],
+            [
+                11313.70849898476,
+                12699.208415745596,
+                14254.379490245426,
+                16000.0,
+                17959.392772949963,
+                20158.73679831797
+            ],
+            [
+                10678.718833360275,
+                11986.456615013452,
+                13454.34264405943,
+                15101.989002907096,
+                16951.40950974872,
+                19027.313840043535
+            ],
+            [
+                11986.456615013452,
+                13454.342644059434,
+                15101.989002907094,
+                16951.409509748726,
+                19027.31384004353,
+                21357.437666720547
+            ]
         ]
-    ]
+    }
 }
 """
 
@@ -22,7 +22,7 @@ import logging
 from PyQt5 import QtGui, QtCore, QtWidgets
 import numpy as np
 import sounddevice
-from friture.audiobackend import SAMPLING_RATE, AudioBackend
+from friture.audiobackend import AudioBackend
 from friture.generators.sweep import SweepGenerator
 from friture.generators.sine import SineGenerator
 from friture.generators.burst import BurstGenerator
@@ -77,22 +77,11 @@ class Generator_Widget(QtWidgets.QWidget):
 
         self.stream_stop_ramp_finished.connect(self.stop_stream_after_ramp)
 
-        self.device = None
+        # the output stream is only opened when the generator is first started,
+        # so that creating the widget does not probe the output devices
         self.stream = None
-
-        # we will try to open all the output devices until one
-        # works, starting by the default input device
-        for device in AudioBackend().output_devices:
-            self.logger.info("Opening the stream for device '%s'", device['name'])
-            try:
-                self.stream = AudioBackend().open_output_stream(device, self.audio_callback)
-                self.stream.start()
-                self.stream.stop()
-                self.device = device
-                self.logger.info("Stream opened successfully")
-                break
-            except Exception:
-                self.logger.exception("Failed to open stream")
+        output_devices = AudioBackend().output_devices
+        self.device = output_devices[0] if len(output_devices) > 0 else None
 
         self.start_stop_button = QtWidgets.QPushButton(self)
 
@@ -127,6 +116,8 @@ class Generator_Widget(QtWidgets.QWidget):
 
         self.settings_dialog.combobox_output_device.currentIndexChanged.connect(self.device_changed)
 
+        AudioBackend().samplerate_changed.connect(self.samplerate_changed)
+
 #        channels = AudioBackend().get_readable_current_output_channels()
 #        for channel in channels:
 #            self.settings_dialog.comboBox_firstChannel.addItem(channel)
@@ -140,9 +131,42 @@ class Generator_Widget(QtWidgets.QWidget):
 #        second_channel = AudioBackend().get_current_second_channel()
 #        self.settings_dialog.comboBox_secondChannel.setCurrentIndex(second_channel)
 
+    # method
+    def open_stream(self):
+        # we will try to open all the output devices until one
+        # works, starting by the selected one
+        output_devices = AudioBackend().output_devices
+        if self.device in output_devices:
+            first = output_devices.index(self.device)
+            output_devices = output_devices[first:] + output_devices[:first]
+
+        for device in output_devices:
+            self.logger.info("Opening the stream for device '%s'", device['name'])
+            try:
+                self.stream = AudioBackend().open_output_stream(device, self.audio_callback)
+                self.device = device
+                self.logger.info("Stream opened successfully")
+                break
+            except Exception:
+                self.logger.exception("Failed to open stream")
+
+        if self.stream is not None:
+            # show the device that was actually opened, without reopening it
+            combobox = self.settings_dialog.combobox_output_device
+            combobox.blockSignals(True)
+            combobox.setCurrentIndex(AudioBackend().output_devices.index(self.device))
+            combobox.blockSignals(False)
+
+        return self.stream is not None
+
     def device_changed(self, index):
         device = AudioBackend().output_devices[index]
 
+        if self.stream is None:
+            # the stream will be opened on the next start
+            self.device = device
+            return
+
         # save current stream in case we need to restore it
         previous_stream = self.stream
         previous_device = self.device
@@ -167,10 +191,18 @@ class Generator_Widget(QtWidgets.QWidget):
             return
 
         self.logger.info("Success")
-        previous_stream.stop()
+        if previous_stream is not None:
+            previous_stream.stop()
 
         self.settings_dialog.combobox_output_device.setCurrentIndex(AudioBackend().output_devices.index(self.device))
 
+    # slot
+    def samplerate_changed(self, samplerate):
+        # the output stream is opened at the sample rate of the input stream,
+        # reopen it at the new rate
+        if self.stream is not None:
+            self.device_changed(AudioBackend().output_devices.index(self.device))
+
     def on_device_change_error(self, previous_stream, previous_device, message):
         self.logger.exception(message)
 
@@ -200,6 +232,10 @@ class Generator_Widget(QtWidgets.QWidget):
     def start_stop_button_toggle(self, checked):
         if checked:
             self.start_stop_button.setText("Stop")
+            if self.stream is None and not self.open_stream():
+                self.logger.error("No output device could be opened")
+                self.start_stop_button.setChecked(False)
+                return
             if self.state == STOPPED or self.state == STOPPING:
                 self.state = STARTING
                 self.t_start = 0.
@@ -212,7 +248,8 @@ class Generator_Widget(QtWidgets.QWidget):
                 # will stop at the end of the ramp
 
     def stop_stream_after_ramp(self):
-        self.stream.stop()
+        if self.stream is not None:
+            self.stream.stop()
 
     def handle_new_data(self, floatdata):
         # we do not make anything of the input data in the generator...
@@ -232,7 +269,9 @@ class Generator_Widget(QtWidgets.QWidget):
         if N == 0:
             return
 
-        t = self.t + np.arange(0, N / float(SAMPLING_RATE), 1. / float(SAMPLING_RATE))
+        samplerate = float(self.stream.samplerate)
+
+        t = self.t + np.arange(0, N / samplerate, 1. / samplerate)
 
         name = self.combobox_generator_kind.currentText()
 
@@ -254,20 +293,20 @@ class Generator_Widget(QtWidgets.QWidget):
         # add smooth ramps at start/stop to avoid undesirable bursts
         if self.state == STARTING:
             # add a ramp at the start
-            t_ramp = self.t_start + np.arange(0, N / float(SAMPLING_RATE), 1. / float(SAMPLING_RATE))
+            t_ramp = self.t_start + np.arange(0, N / samplerate, 1. / samplerate)
             t_ramp = np.clip(t_ramp, 0., RAMP_LENGTH)
             floatdata *= t_ramp / RAMP_LENGTH
-            self.t_start += N / float(SAMPLING_RATE)
+            self.t_start += N / samplerate
             if self.t_start > RAMP_LENGTH:
                 self.state = PLAYING
 
         if self.state == STOPPING:
             self.logger.info("stopping %f %d", self.t_stop, N)
             # add a ramp at the end
-            t_ramp = self.t_stop - np.arange(0, N / float(SAMPLING_RATE), 1. / float(SAMPLING_RATE))
+            t_ramp = self.t_stop - np.arange(0, N / samplerate, 1. / samplerate)
             t_ramp = np.clip(t_ramp, 0., RAMP_LENGTH)
             floatdata *= t_ramp / RAMP_LENGTH
-            self.t_stop -= N / float(SAMPLING_RATE)
+            self.t_stop -= N / samplerate
 
             if self.t_stop < 0.:
                 self.state = STOPPED
@@ -283,7 +322,7 @@ class Generator_Widget(QtWidgets.QWidget):
         intdata = (np.clip(floatdata, int16info.min, int16info.max) * norm_coeff).astype(np.int16)
 
         # update the time counter
-        self.t += N / float(SAMPLING_RATE)
+        self.t += N / samplerate
 
         # data copy
         out_data[:] = intdata
@@ -19,7 +19,7 @@
 
 import numpy as np
 from PyQt5 import QtWidgets
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 
 DEFAULT_BURST_PERIOD_S = 1.
 
@@ -41,7 +41,8 @@ class BurstGenerator:
 
     def signal(self, t):
         floatdata = np.zeros(t.shape)
-        i = (t * SAMPLING_RATE) % (self.T * SAMPLING_RATE)
+        samplerate = AudioBackend().get_samplerate()
+        i = (t * samplerate) % (self.T * samplerate)
         n = 1
         ind_plus = np.where(i < n)
         floatdata[ind_plus] = 1.
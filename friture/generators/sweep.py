@@ -25,6 +25,30 @@ DEFAULT_SWEEP_STOPFREQUENCY = 22000.
 DEFAULT_SWEEP_PERIOD_S = 1.
 
 
+def sweep_params(f1, f2, T):
+    # adjust T so that we have an integer number of periods
+    # we want phase_max to be a multiple of 2*np.pi
+    # phase_max = 2*np.pi*f1*T/np.log(f2/f1)*(f2/f1 - 1.)
+    # phase_max = N*2*np.pi
+    # N = f1*T/np.log(f2/f1)*(f2/f1 - 1.)
+    Tmult = np.log(f2 / f1) / (f1 * (f2 / f1 - 1.))
+    if T >= Tmult:
+        T = np.round(T / Tmult) * Tmult
+    else:
+        T = np.ceil(T / Tmult) * Tmult
+
+    w1 = 2 * np.pi * f1
+    w2 = 2 * np.pi * f2
+    K = w1 * T / np.log(w2 / w1)
+    L = T / np.log(w2 / w1)
+    return L, K, T
+
+
+def log_sweep(t, L, K, T, timeoffset=0.):
+    # https://ccrma.stanford.edu/realsimple/imp_meas/Sine_Sweep_Measurement_Theory.html
+    return np.cos(K * (np.exp((t - timeoffset) % T / L) - 1.))
+
+
 class SweepGenerator:
     name = "Sweep"
 
@@ -45,22 +69,7 @@ class SweepGenerator:
         return self.settings
 
     def computeParams(self, f1, f2, T):
-        # adjust T so that we have an integer number of periods
-        # we want phase_max to be a multiple of 2*np.pi
-        # phase_max = 2*np.pi*f1*T/np.log(f2/f1)*(f2/f1 - 1.)
-        # phase_max = N*2*np.pi
-        # N = f1*T/np.log(f2/f1)*(f2/f1 - 1.)
-        Tmult = np.log(f2 / f1) / (f1 * (f2 / f1 - 1.))
-        if T >= Tmult:
-            T = np.round(T / Tmult) * Tmult
-        else:
-            T = np.ceil(T / Tmult) * Tmult
-
-        w1 = 2 * np.pi * f1
-        w2 = 2 * np.pi * f2
-        K = w1 * T / np.log(w2 / w1)
-        L = T / np.log(w2 / w1)
-        return L, K, T
+        return sweep_params(f1, f2, T)
 
     def setf1(self, f1):
         if self.f1 != f1:
@@ -81,12 +90,10 @@ class SweepGenerator:
             self.nextParams = [L, K, T]
 
     def signal(self, t):
-        # https://ccrma.stanford.edu/realsimple/imp_meas/Sine_Sweep_Measurement_Theory.html
-
         # f = (self.f2 - self.f1)*(1. + np.sin(2*np.pi*t/self.T))/2. + self.f1
         # return np.sin(2*np.pi*t*f)
 
-        result = np.cos(self.K * (np.exp((t - self.timeoffset) % self.T / self.L) - 1.))
+        result = log_sweep(t, self.L, self.K, self.T, self.timeoffset)
 
         if self.nextParams is not None:
             # we have new params to put in place
@@ -105,7 +112,7 @@ class SweepGenerator:
                 [self.L, self.K, self.T] = self.nextParams
                 self.nextParams = None
                 self.timeoffset = t[firstmaxpos]
-                result[firstmaxpos:] = np.cos(self.K * (np.exp((t[firstmaxpos:] - self.timeoffset) % self.T / self.L) - 1.))
+                result[firstmaxpos:] = log_sweep(t[firstmaxpos:], self.L, self.K, self.T, self.timeoffset)
 
         return result
 
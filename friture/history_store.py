@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Disk-backed ring store of the captured audio, for hours of history.
+
+The file holds a small header followed by a fixed number of interleaved float32
+frames, used as a ring. The samples are staged in memory and written to the file
+in large sequential chunks. They are read back through a read-only memory map,
+so that only the pages that are accessed are loaded in memory.
+
+The header records the total number of frames written, so that the history
+survives a restart of the application."""
+
+import logging
+import os
+import threading
+
+import numpy as np
+
+MAGIC = b"FRTHIST1"
+
+HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                         ('channels', '<u4'),
+                         ('samplerate', '<u4'),
+                         ('capacity', '<i8'),
+                         ('offset', '<i8'),
+                         ('padding', 'S32')])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+SAMPLE_DTYPE = np.dtype('<f4')
+
+DEFAULT_HISTORY_SECONDS = 4 * 3600
+# duration of the chunks that are written at once
+DEFAULT_CHUNK_SECONDS = 1.
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        header = np.frombuffer(f.read(HEADER_SIZE), dtype=HEADER_DTYPE)
+    if header.shape[0] != 1 or header[0]['magic'] != MAGIC:
+        raise ValueError("Not a Friture history file: %s" % (path))
+    return header[0]
+
+
+class HistoryStore:
+    '''Bounded history of (channels, samples) blocks, indexed by absolute sample offset
+    like RingBuffer.data_indexed.'''
+
+    def __init__(self, path, channels, samplerate, seconds=DEFAULT_HISTORY_SECONDS, chunk_seconds=DEFAULT_CHUNK_SECONDS, writable=True):
+        self.logger = logging.getLogger(__name__)
+
+        self.path = path
+        self.channels = channels
+        self.samplerate = samplerate
+        self.capacity = int(seconds * samplerate)
+        self.writable = writable
+
+        # the capture thread writes while the GUI thread reads
+        self.lock = threading.Lock()
+
+        offset = 0
+        if os.path.exists(path):
+            try:
+                header = read_header(path)
+                if (int(header['channels']), int(header['samplerate']), int(header['capacity'])) == (channels, samplerate, self.capacity):
+                    offset = int(header['offset'])
+                    self.logger.info("Resuming the history in %s, %.1f s available", path, min(offset, self.capacity) / samplerate)
+            except (OSError, ValueError):
+                pass
+
+        if writable:
+            if offset == 0:
+                self.create()
+            self.file = open(path, 'r+b', buffering=0)
+        else:
+            self.file = None
+
+        # (frames, channels), nothing is read before it is accessed
+        self.data = np.memmap(path, dtype=SAMPLE_DTYPE, mode='r', offset=HEADER_SIZE, shape=(self.capacity, channels))
+
+        # frames written to the file, and frames waiting to be written
+        self.flushed = offset
+        self.staging = np.zeros((max(1, int(chunk_seconds * samplerate)), channels), dtype=SAMPLE_DTYPE)
+        self.staged = 0
+
+    @classmethod
+    def open(cls, path):
+        '''Open an existing history file for reading.'''
+        header = read_header(path)
+        samplerate = int(header['samplerate'])
+        return cls(path, int(header['channels']), samplerate, int(header['capacity']) / samplerate, writable=False)
+
+    def create(self):
+        self.logger.info("Creating a history of %.1f h in %s", self.capacity / self.samplerate / 3600., self.path)
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['channels'] = self.channels
+        header['samplerate'] = self.samplerate
+        header['capacity'] = self.capacity
+
+        with open(self.path, 'wb') as f:
+            f.write(header.tobytes())
+            # sparse where supported, the disk space is used as the history fills
+            f.truncate(HEADER_SIZE + self.capacity * self.channels * SAMPLE_DTYPE.itemsize)
+
+    @property
+    def offset(self):
+        return self.flushed + self.staged
+
+    def first_offset(self):
+        '''Oldest sample that is still in the history.'''
+        return max(0, self.offset - self.capacity)
+
+    def push(self, floatdata):
+        if floatdata.shape[0] != self.channels:
+            raise ValueError("The history has %d channels, got %d" % (self.channels, floatdata.shape[0]))
+
+        with self.lock:
+            done = 0
+            while done < floatdata.shape[1]:
+                count = min(floatdata.shape[1] - done, self.staging.shape[0] - self.staged)
+                self.staging[self.staged:self.staged + count] = floatdata[:, done:done + count].T
+                self.staged += count
+                done += count
+
+                if self.staged == self.staging.shape[0]:
+                    self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if self.staged == 0:
+            return
+
+        # one sequential write, or two at the end of the ring
+        start = self.flushed % self.capacity
+        direct = min(self.staged, self.capacity - start)
+        frame_size = self.channels * SAMPLE_DTYPE.itemsize
+
+        self.file.seek(HEADER_SIZE + start * frame_size)
+        self.file.write(self.staging[:direct].tobytes())
+        if direct < self.staged:
+            self.file.seek(HEADER_SIZE)
+            self.file.write(self.staging[direct:self.staged].tobytes())
+
+        self.flushed += self.staged
+        self.staged = 0
+
+        # the offset is updated after the samples, a crash loses at most one chunk
+        self.file.seek(HEADER_DTYPE.fields['offset'][1])
+        self.file.write(np.int64(self.flushed).astype('<i8').tobytes())
+
+    def data_indexed(self, start, length):
+        '''Return the (channels, length) samples that end at the absolute offset `start`.
+        The result is a read-only view on the file when possible, a copy otherwise.'''
+        with self.lock:
+            stop = start
+            first = stop - length
+
+            if stop > self.offset or first < self.offset - self.capacity:
+                raise ValueError("Samples %d to %d are not in the history (%d to %d)" % (first, stop, self.first_offset(), self.offset))
+
+            pieces = []
+
+            # from the file, in at most two parts around the end of the ring
+            position = first
+            while position < min(stop, self.flushed):
+                index = position % self.capacity
+                count = min(min(stop, self.flushed) - position, self.capacity - index)
+                pieces.append(self.data[index:index + count])
+                position += count
+
+            # then from the staging buffer
+            if stop > self.flushed:
+                pieces.append(self.staging[max(first, self.flushed) - self.flushed:stop - self.flushed].copy())
+
+            if len(pieces) == 1:
+                return pieces[0].T
+            elif len(pieces) == 0:
+                return np.zeros((self.channels, 0), dtype=SAMPLE_DTYPE)
+            return np.concatenate(pieces).T
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
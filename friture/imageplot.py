@@ -17,18 +17,25 @@
 # You should have received a copy of the GNU General Public License
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5 import QtCore, QtGui, QtWidgets
+import logging
+
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtQuickWidgets import QQuickWidget
 from fractions import Fraction
 import numpy as np
 from friture.audiobackend import AudioBackend
 from friture.spectrogram_image import CanvasScaledSpectrogram
+from friture.spectrogram_history import SpectrogramHistory
+from friture.spectrogram_archive import MAXIMUM
 from friture.signal.online_linear_2D_resampler import Online_Linear_2D_resampler
 from friture.signal.frequency_resampler import Frequency_Resampler
 from friture.plotting.scaleWidget import VerticalScaleWidget, HorizontalScaleWidget, ColorScaleWidget
 from friture.plotting.scaleDivision import ScaleDivision
 from friture.plotting.coordinateTransform import CoordinateTransform
 from friture.plotting.canvasWidget import CanvasWidget
+from friture.qml_tools import qml_url, raise_if_error
 import friture.plotting.frequency_scales as fscales
+from friture_extensions.spectrogram_column import pyx_spectrogram_columns
 
 
 def tickFormatter(value, digits):
@@ -56,35 +63,129 @@ class PlotImage:
         self.frequency_resampler = Frequency_Resampler()
         self.resampler = Online_Linear_2D_resampler()
 
+        self.spec_min = -140.
+        self.spec_max = 0.
+        self.weighting = None
+        self.offsets = None
+
+        # raw columns of the visible time range
+        self.history = SpectrogramHistory()
+        self.freq = None
+
+        # optional disk-backed archive, for the time ranges beyond the history
+        self.archive = None
+        self.reduction = MAXIMUM
+
         self.timer = QtCore.QElapsedTimer()
         self.timer.start()
 
         self.last_time = 0.
 
-    def addData(self, freq, xyzs, freqscale, last_data_time):
+    def addData(self, freq, power, weighting, freqscale, last_data_time):
+        '''Add the (freq, frames) power spectra, weighted by the `weighting` dB curve.'''
         self.frequency_resampler.setfreqscale(freqscale)
 
-        # Note: both the frequency and the time resampler work
-        # only on 1D arrays, so we loop on the columns of data.
-        # However, we reassemble the 2D output before drawing
-        # on the widget's pixmap, because the drawing operation
-        # seems to have a costly warmup phase, so it is better
-        # to invoke it the fewer number of times possible.
+        # keep the raw columns, to render them again when the display settings change
+        self.history.push(power)
+        if self.archive is not None:
+            self.archive.push(power)
+        self.freq = freq
+
+        if weighting is not self.weighting:
+            self.weighting = weighting
+            self.offsets = None
+            self.rerender()
+        else:
+            self.render(power)
+
+        self.last_data_time = last_data_time
+
+    def render(self, data, decibels=False):
+        '''Render the (freq, frames) power spectra, or their dB values, to new columns.'''
+        # the conversion to dB, the weighting, the color scaling, the resampling
+        # in frequency and in time, and the colormap are done in a single pass,
+        # that writes the colors directly in the image memory
+        # the frequency resampling matrix is only recomputed when the scale, the range or the height change
+        indptr, indices, weights = self.frequency_resampler.tables(self.freq)
+        gain, offsets = self.color_scaling(self.freq, self.weighting)
+        colors = self.canvasscaledspectrogram.colors
+
+        # the previous frame is kept in color scale units
+        if self.resampler.old_data.dtype != np.float64:
+            self.resampler.old_data = self.resampler.old_data.astype(np.float64)
+
+        n = self.resampler.processable(data.shape[1])
+        pixels = self.canvasscaledspectrogram.column_image(n, len(indptr) - 1)
+
+        self.resampler.orig_index, self.resampler.resampled_index, n = pyx_spectrogram_columns(
+            data, indptr, indices, weights, offsets, gain, colors, self.resampler.old_data,
+            self.resampler.orig_index, self.resampler.resampled_index, self.resampler.resampling_ratio, pixels,
+            decibels)
+
+        if n > 0:
+            self.canvasscaledspectrogram.addColumns(n)
+
+    def rerender(self):
+        '''Render the whole image again from the history, in one pass.'''
+        if self.freq is None or self.weighting is None:
+            return
+
+        self.resampler.reset()
+        self.canvasscaledspectrogram.erase()
+
+        columns = self.visible_columns()
+        archive = self.archive
+        if archive is not None and archive.nbins == len(self.freq) and self.history.count < min(columns, archive.count()):
+            # the time range goes beyond the history, the archive level that has
+            # about one column per pixel is read instead
+            self.render_segments(archive.read(columns, self.canvasscaledspectrogram.canvas_width, self.reduction))
+        else:
+            self.render(self.history.data(), decibels=True)
+
+    def render_segments(self, segments):
+        '''Render (factor, dB data) segments, where each column stands for `factor` STFT columns.'''
+        ratio = self.resampler.resampling_ratio
+        for factor, data in segments:
+            # the time resampling is done in units of the segment columns
+            self.resampler.orig_index /= factor
+            self.resampler.resampled_index /= factor
+            self.resampler.resampling_ratio = ratio / factor
+
+            self.render(data, decibels=True)
 
-        n = self.resampler.processable(xyzs.shape[1])
-        resampled_data = np.zeros((self.frequency_resampler.nsamples, n))
+            self.resampler.orig_index *= factor
+            self.resampler.resampled_index *= factor
+        self.resampler.resampling_ratio = ratio
 
-        i = 0
-        for j in range(xyzs.shape[1]):
-            freq_resampled_data = self.frequency_resampler.process(freq, xyzs[:, j])
-            data = self.resampler.process(freq_resampled_data)
-            resampled_data[:, i:i + data.shape[1]] = data
-            i += data.shape[1]
+    def color_scaling(self, freq, weighting):
+        # 10*log10(p) + w in [spec_min..spec_max] dB is mapped to [0..top] colors,
+        # as gain*log(p) + offsets, with the constants of the dB conversion folded in
+        top = len(self.canvasscaledspectrogram.colors) - 1
+        scale = top / (self.spec_max - self.spec_min)
+        gain = 10. / np.log(10.) * scale
 
-        self.canvasscaledspectrogram.addData(resampled_data)
+        if self.offsets is None or len(self.offsets) != len(freq):
+            # a writable copy, the kernel does not take read-only buffers
+            self.offsets = np.array(np.broadcast_to((weighting - self.spec_min) * scale, freq.shape), dtype=np.float64)
 
-        if i > 0:
-            self.last_data_time = last_data_time
+        return gain, self.offsets
+
+    def visible_columns(self):
+        # enough columns to fill the canvas, which also shows the jitter margin
+        return int(np.ceil((self.T + self.jitter_s) / self.dT)) + 2
+
+    def update_history_capacity(self):
+        if self.dT > 0.:
+            self.history.set_capacity(self.visible_columns())
+
+    def set_archive(self, archive):
+        if archive is not self.archive:
+            self.archive = archive
+            self.rerender()
+
+    def setreduction(self, reduction):
+        self.reduction = reduction
+        self.rerender()
 
     def pause(self):
         self.isPlaying = False
@@ -95,6 +196,8 @@ class PlotImage:
         self.timer.restart()
 
     def draw(self, painter, xMap, yMap, rect):
+        geometry = (self.canvasscaledspectrogram.ring.shape, self.resampler.resampling_ratio)
+
         # update the spectrogram according to possibly new canvas dimensions
         self.frequency_resampler.setnsamples(rect.height())
         self.resampler.set_height(rect.height())
@@ -106,11 +209,14 @@ class PlotImage:
         screen_rate_frac = Fraction(rect.width(), int(self.T * 1000))
         self.resampler.set_ratio(self.sfft_rate_frac, screen_rate_frac)
 
+        # render crisply for the new geometry or time scale, instead of rescaling the pixels
+        if (self.canvasscaledspectrogram.ring.shape, self.resampler.resampling_ratio) != geometry:
+            self.rerender()
+
         # time advance
         # This function is meant to be called at paintevent time, for better time sync.
 
-        pixmap = self.canvasscaledspectrogram.getpixmap()
-        offset = self.canvasscaledspectrogram.getpixmapoffset(delay=jitter_pix / 2)
+        offset = self.canvasscaledspectrogram.getoffset(delay=jitter_pix / 2)
 
         if self.isPlaying:
             delta_t = self.timer.nsecsElapsed() * 1e-9
@@ -126,39 +232,37 @@ class PlotImage:
 
             offset += pixel_delay
 
-        rolling = True
-        if rolling:
-            # draw the whole canvas with a selected portion of the pixmap
-
-            hints = painter.renderHints()
-            # enable bilinear pixmap transformation
-            painter.setRenderHints(hints | QtGui.QPainter.SmoothPixmapTransform)
-            # Note: nstead of a generic bilinear transformation, a specialized one could be more efficient,
-            # since no transformation is needed in y, and the sampling rate is already known to be ok in x.
-            sw = rect.width()
-            sh = rect.height()
-
-            source_rect = QtCore.QRectF(offset, 0, sw, sh)
-            # QRectF since the offset and width may be non-integer
-            painter.drawPixmap(QtCore.QRectF(rect), pixmap, source_rect)
-        else:
-            sw = rect.width()
-            sh = rect.height()
-            source_rect = QtCore.QRectF(0, 0, sw, sh)
-            painter.drawPixmap(QtCore.QRectF(rect), pixmap, source_rect)
+        # the canvas shows the portion of the ring that starts at the offset,
+        # the scene graph scrolls the textures without repainting them
+        # (the offset may be non-integer, the textures are filtered bilinearly)
+        self.canvasscaledspectrogram.setdisplayoffset(offset)
 
     def settimerange(self, timerange_seconds, dT):
+        if dT != self.dT:
+            # the columns of the history were computed with another hop
+            self.history.clear()
+
         self.T = timerange_seconds
         self.dT = dT
+        self.update_history_capacity()
 
     def setfreqrange(self, minfreq, maxfreq):
         self.frequency_resampler.setfreqrange(minfreq, maxfreq)
+        self.rerender()
 
     def set_sfft_rate(self, rate_frac):
         self.sfft_rate_frac = rate_frac
 
     def setfreqscale(self, scale):
         self.frequency_resampler.setfreqscale(scale)
+        self.rerender()
+
+    def setspecrange(self, spec_min, spec_max):
+        self.spec_min = spec_min
+        self.spec_max = spec_max
+        # recompute the color offsets
+        self.offsets = None
+        self.rerender()
 
     def erase(self):
         self.canvasscaledspectrogram.erase()
@@ -168,14 +272,17 @@ class PlotImage:
 
     def set_jitter(self, jitter_s):
         self.jitter_s = jitter_s
+        self.update_history_capacity()
         # print jitter_s
 
 
 class ImagePlot(QtWidgets.QWidget):
 
-    def __init__(self, parent):
+    def __init__(self, parent, engine):
         super(ImagePlot, self).__init__(parent)
 
+        self.logger = logging.getLogger(__name__)
+
         self.verticalScaleDivision = ScaleDivision(20, 20000)
         self.verticalScaleTransform = CoordinateTransform(20, 20000, 100, 0, 0)
 
@@ -195,14 +302,29 @@ class ImagePlot(QtWidgets.QWidget):
         self.colorScale = ColorScaleWidget(self, self.colorScaleDivision, self.colorScaleTransform)
         self.colorScale.setTitle("PSD (dB A)")
 
-        self.canvasWidget = CanvasWidget(self, self.verticalScaleTransform, self.horizontalScaleTransform)
+        # the spectrogram is drawn by the scene graph
+        self.quickWidget = QQuickWidget(engine, self)
+        self.quickWidget.statusChanged.connect(self.on_status_changed)
+        self.quickWidget.setResizeMode(QQuickWidget.SizeRootObjectToView)
+        self.quickWidget.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding, QtWidgets.QSizePolicy.MinimumExpanding)
+        self.quickWidget.setSource(qml_url("Spectrogram.qml"))
+
+        raise_if_error(self.quickWidget)
+
+        # the canvas is a transparent overlay for the time updates, the border and the tracker
+        self.canvasWidget = CanvasWidget(self.quickWidget, self.verticalScaleTransform, self.horizontalScaleTransform)
         self.canvasWidget.setTrackerFormatter(lambda x, y: "%.2f s, %d Hz" % (x, y))
 
+        overlayLayout = QtWidgets.QGridLayout(self.quickWidget)
+        overlayLayout.setSpacing(0)
+        overlayLayout.setContentsMargins(0, 0, 0, 0)
+        overlayLayout.addWidget(self.canvasWidget)
+
         plotLayout = QtWidgets.QGridLayout()
         plotLayout.setSpacing(0)
         plotLayout.setContentsMargins(0, 0, 0, 0)
         plotLayout.addWidget(self.verticalScale, 0, 0)
-        plotLayout.addWidget(self.canvasWidget, 0, 1)
+        plotLayout.addWidget(self.quickWidget, 0, 1)
         plotLayout.addWidget(self.colorScale, 0, 2)
         plotLayout.addWidget(self.horizontalScale, 1, 1)
 
@@ -213,6 +335,7 @@ class ImagePlot(QtWidgets.QWidget):
         # attach a plot image
         self.plotImage = PlotImage()
         self.canvasWidget.attach(self.plotImage)
+        self.quickWidget.rootObject().setProperty("spectrogram", self.plotImage.canvasscaledspectrogram)
 
         self.setfreqscale(fscales.Linear)
 
@@ -221,8 +344,20 @@ class ImagePlot(QtWidgets.QWidget):
         # need to replot here for the size Hints to be computed correctly (depending on axis scales...)
         self.update()
 
-    def addData(self, freq, xyzs, last_data_time):
-        self.plotImage.addData(freq, xyzs, self.freqscale, last_data_time)
+    def on_status_changed(self, status):
+        if status == QQuickWidget.Error:
+            for error in self.quickWidget.errors():
+                self.logger.error("QML error: " + error.toString())
+
+    def addData(self, freq, power, weighting, last_data_time):
+        self.plotImage.addData(freq, power, weighting, self.freqscale, last_data_time)
+
+    def setarchive(self, archive):
+        self.plotImage.set_archive(archive)
+
+    def setarchivereduction(self, reduction):
+        # maximum or mean of the archived columns, for the time ranges beyond the history
+        self.plotImage.setreduction(reduction)
 
     def draw(self):
         if self.needfullreplot:
@@ -259,8 +394,8 @@ class ImagePlot(QtWidgets.QWidget):
 
     def setfreqscale(self, scale):
         self.freqscale = scale
-        
-        self.plotImage.erase()
+
+        # the image is rendered again from the history with the new scale
         self.plotImage.setfreqscale(scale)
 
         self.verticalScaleTransform.setScale(scale)
@@ -300,6 +435,8 @@ class ImagePlot(QtWidgets.QWidget):
         self.update()
 
     def setspecrange(self, spec_min, spec_max):
+        self.plotImage.setspecrange(spec_min, spec_max)
+
         self.colorScaleTransform.setRange(spec_min, spec_max)
         self.colorScaleDivision.setRange(spec_min, spec_max)
 
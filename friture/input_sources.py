@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from PyQt5 import QtCore
+
+from friture.audiobuffer import AudioBuffer
+
+MAIN_INPUT_NAME = "Main input"
+
+
+class InputSources(QtCore.QObject):
+    '''The audio buffers that the docks can pick from: the one of the main input,
+    and one per additional input device opened in the audio backend.'''
+
+    sources_changed = QtCore.pyqtSignal()
+
+    def __init__(self, backend, main_audiobuffer):
+        super().__init__()
+
+        self.logger = logging.getLogger(__name__)
+
+        self.names = [MAIN_INPUT_NAME]
+        self.audiobuffers = [main_audiobuffer]
+        self.sources = [None]
+
+        backend.input_opened.connect(self.input_opened)
+        backend.input_closed.connect(self.input_closed)
+
+    # slot
+    def input_opened(self, source):
+        audiobuffer = AudioBuffer()
+        source.new_data_available.connect(audiobuffer.handle_new_data)
+
+        self.names.append(source.name)
+        self.audiobuffers.append(audiobuffer)
+        self.sources.append(source)
+
+        self.logger.info("New input source: %s", source.name)
+        self.sources_changed.emit()
+
+    # slot
+    def input_closed(self, source):
+        if source not in self.sources:
+            return
+
+        index = self.sources.index(source)
+        source.new_data_available.disconnect(self.audiobuffers[index].handle_new_data)
+
+        del self.names[index]
+        del self.audiobuffers[index]
+        del self.sources[index]
+
+        self.logger.info("Input source removed: %s", source.name)
+        self.sources_changed.emit()
+
+    # method
+    def main_audiobuffer(self):
+        return self.audiobuffers[0]
+
+    # method
+    def index_of(self, audiobuffer):
+        return self.audiobuffers.index(audiobuffer) if audiobuffer in self.audiobuffers else 0
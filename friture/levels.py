@@ -17,7 +17,9 @@
 # You should have received a copy of the GNU General Public License
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Level widget that displays peak and RMS levels for 1 or 2 ports."""
+"""Level widget that displays peak and RMS levels for 1 or 2 ports.
+
+The levels are computed for all the input channels at once."""
 
 from PyQt5 import QtWidgets
 from PyQt5.QtQml import QQmlComponent
@@ -29,8 +31,8 @@ from friture.levels_settings import Levels_Settings_Dialog  # settings dialog
 from friture.audioproc import audioproc
 from friture.level_view_model import LevelViewModel
 from friture.iec import dB_to_IEC
-from friture_extensions.exp_smoothing_conv import pyx_exp_smoothed_value
-from friture.audiobackend import SAMPLING_RATE
+from friture_extensions.exp_smoothing_conv import pyx_exp_smoothed_recursive
+from friture.audiobackend import AudioBackend
 from friture.qml_tools import qml_url, raise_if_error
 
 SMOOTH_DISPLAY_TIMER_PERIOD_MS = 25
@@ -81,20 +83,13 @@ class Levels_Widget(QtWidgets.QWidget):
         # time = 0.125 #FAST setting for a sound level meter
         # time = 1. #SLOW setting for a sound level meter
         self.response_time = 0.300  # 300ms is a common value for VU meters
-        # an exponential smoothing filter is a simple IIR filter
-        # s_i = alpha*x_i + (1-alpha)*s_{i-1}
-        # we compute alpha so that the n most recent samples represent 100*w percent of the output
+        self.update_smoothing(AudioBackend().get_samplerate())
+        AudioBackend().samplerate_changed.connect(self.update_smoothing)
+
         w = 0.65
-        n = self.response_time * SAMPLING_RATE
-        N = 5*n
-        self.alpha = 1. - (1. - w) ** (1. / (n + 1))
-        self.kernel = (1. - self.alpha) ** (np.arange(0, N)[::-1])
-        # first channel
-        self.old_rms = 1e-30
-        self.old_max = 1e-30
-        # second channel
-        self.old_rms_2 = 1e-30
-        self.old_max_2 = 1e-30
+        # one value per channel
+        self.old_rms = np.full(1, 1e-30)
+        self.old_max = np.full(1, 1e-30)
 
         response_time_peaks = 0.025  # 25ms for instantaneous peaks
         n2 = response_time_peaks / (SMOOTH_DISPLAY_TIMER_PERIOD_MS / 1000.)
@@ -104,6 +99,15 @@ class Levels_Widget(QtWidgets.QWidget):
 
         self.i = 0
 
+    # slot
+    def update_smoothing(self, samplerate):
+        # an exponential smoothing filter is a simple IIR filter
+        # s_i = alpha*x_i + (1-alpha)*s_{i-1}
+        # we compute alpha so that the n most recent samples represent 100*w percent of the output
+        w = 0.65
+        n = self.response_time * samplerate
+        self.alpha = 1. - (1. - w) ** (1. / (n + 1))
+
     def onWidthChanged(self):
         self.quickWidget.setFixedWidth(int(self.qmlObject.width()))
 
@@ -112,53 +116,39 @@ class Levels_Widget(QtWidgets.QWidget):
         self.audiobuffer = buffer
 
     def handle_new_data(self, floatdata):
-        if floatdata.shape[0] > 1 and not self.two_channels:
+        nchannels = floatdata.shape[0]
+
+        if nchannels != self.old_rms.shape[0]:
+            self.old_rms = np.full(nchannels, 1e-30)
+            self.old_max = np.full(nchannels, 1e-30)
+
+        if nchannels > 1 and not self.two_channels:
             self.two_channels = True
             self.level_view_model.two_channels = True
-        elif floatdata.shape[0] == 1 and self.two_channels:
+        elif nchannels == 1 and self.two_channels:
             self.two_channels = False
             self.level_view_model.two_channels = False
 
-        # first channel
-        y1 = floatdata[0, :]
+        # exponential smoothing for max, for all the channels at once
+        if floatdata.shape[1] > 0:
+            value_max = np.abs(floatdata).max(axis=1)
+            self.old_max = np.where(value_max > self.old_max * (1. - self.alpha2), value_max, self.old_max * (1. - self.alpha2))
 
-        # exponential smoothing for max
-        if len(y1) > 0:
-            value_max = np.abs(y1).max()
-            if value_max > self.old_max * (1. - self.alpha2):
-                self.old_max = value_max
-            else:
-                # exponential decrease
-                self.old_max *= (1. - self.alpha2)
+        # exponential smoothing for RMS, for all the channels at once, in place
+        pyx_exp_smoothed_recursive(self.alpha, floatdata ** 2, self.old_rms)
 
-        # exponential smoothing for RMS
-        value_rms = pyx_exp_smoothed_value(self.kernel, self.alpha, y1 ** 2, self.old_rms)
-        self.old_rms = value_rms
+        level_rms = 10. * np.log10(self.old_rms + 0. * 1e-80)
+        level_max = 20. * np.log10(self.old_max + 0. * 1e-80)
 
-        self.level_view_model.level_data.level_rms = 10. * np.log10(value_rms + 0. * 1e-80)
-        self.level_view_model.level_data.level_max = 20. * np.log10(self.old_max + 0. * 1e-80)
-        self.level_view_model.level_data_ballistic.peak_iec = dB_to_IEC(max(self.level_view_model.level_data.level_max, self.level_view_model.level_data.level_rms))
+        # the meters display the first two channels
+        self.level_view_model.level_data.level_rms = level_rms[0]
+        self.level_view_model.level_data.level_max = level_max[0]
+        self.level_view_model.level_data_ballistic.peak_iec = dB_to_IEC(max(level_max[0], level_rms[0]))
 
         if self.two_channels:
-            # second channel
-            y2 = floatdata[1, :]
-
-            # exponential smoothing for max
-            if len(y2) > 0:
-                value_max = np.abs(y2).max()
-                if value_max > self.old_max_2 * (1. - self.alpha2):
-                    self.old_max_2 = value_max
-                else:
-                    # exponential decrease
-                    self.old_max_2 *= (1. - self.alpha2)
-
-            # exponential smoothing for RMS
-            value_rms = pyx_exp_smoothed_value(self.kernel, self.alpha, y2 ** 2, self.old_rms_2)
-            self.old_rms_2 = value_rms
-
-            self.level_view_model.level_data_2.level_rms = 10. * np.log10(value_rms + 0. * 1e-80)
-            self.level_view_model.level_data_2.level_max = 20. * np.log10(self.old_max_2 + 0. * 1e-80)
-            self.level_view_model.level_data_ballistic_2.peak_iec = dB_to_IEC(max(self.level_view_model.level_data_2.level_max, self.level_view_model.level_data_2.level_rms))
+            self.level_view_model.level_data_2.level_rms = level_rms[1]
+            self.level_view_model.level_data_2.level_max = level_max[1]
+            self.level_view_model.level_data_ballistic_2.peak_iec = dB_to_IEC(max(level_max[1], level_rms[1]))
 
     # method
     def canvasUpdate(self):
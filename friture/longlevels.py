@@ -30,15 +30,15 @@ from friture.longlevels_settings import (LongLevels_Settings_Dialog,
                                          DEFAULT_MAXTIME,
                                          DEFAULT_RESPONSE_TIME)
 from friture.audioproc import audioproc
-from .signal.decimate import decimate
+from .signal.decimate import decimate_fir, decimate_fir_filtic
 from .ringbuffer import RingBuffer
-from friture_extensions.lfilter import pyx_lfilter_float64_1D
+from friture_extensions.lfilter import pyx_lfilter_1D
 from friture.scope_data import Scope_Data
 from friture.curve import Curve
 from friture.store import GetStore
 from friture.qml_tools import qml_url, raise_if_error
 
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 
 # signal > square > low-pass filter > filter for screen > log
 
@@ -59,16 +59,10 @@ class Subsampler:
 
         # to maintain non-negativeness of the subsampled signal, we use a gaussian filter here
         # (IIR ringing produces negative values)
-        #[self.bdec, self.adec] = generated_filters.PARAMS['dec']
         self.bdec = np.array(gauss(11, 2.))
-        self.adec = np.zeros(self.bdec.shape)
-        self.adec[0] = 1.
 
         # build a proper array of zero initial conditions to start the subsampler
-        self.zfs = []
-        for i in range(self.Ndec):
-            l = max(len(self.bdec), len(self.adec)) - 1
-            self.zfs += [np.zeros(l)]
+        self.zfs = [decimate_fir_filtic(self.bdec) for i in range(self.Ndec)]
 
     def push(self, x):
         # FIXME problems when x is smaller than filter coeff
@@ -79,12 +73,13 @@ class Subsampler:
 
         x_dec = x
 
-        # if we do not have enough samples, we need to buffer until we have enough
-        # we need 2**self.Ndec samples in input for one in output
+        # the decimators keep the samples of the incomplete pairs,
+        # 2**self.Ndec samples in input give one in output
 
         zfs = []
         for i, zi in zip(list(range(self.Ndec)), self.zfs):
-            x_dec, zf = decimate(self.bdec, self.adec, x_dec, zi=zi)
+            # only the kept samples are filtered
+            x_dec, zf = decimate_fir(self.bdec, x_dec, zi)
             # zf can be reused to restart the filter
             zfs.append(zf)
 
@@ -152,7 +147,8 @@ class LongLevelWidget(QtWidgets.QWidget):
 
         self.i = 0
 
-        self.old_index = 0
+        # cursor on the ring buffer of the audio buffer
+        self.reader = None
 
         #Set the initial timespan and response time
         self.length_seconds = DEFAULT_MAXTIME
@@ -161,39 +157,42 @@ class LongLevelWidget(QtWidgets.QWidget):
         # ringbuffer for the subsampled data
         self.ringbuffer = RingBuffer()
 
+        AudioBackend().samplerate_changed.connect(self.samplerate_changed)
+
     # method
     def set_buffer(self, buffer):
-        self.audiobuffer = buffer
+        if self.reader is not None:
+            self.audiobuffer.ringbuffer.remove_reader(self.reader)
+            self.reader = None
 
-    def handle_new_data(self, floatdata):
-        # we need to maintain an index of where we are in the buffer
-        index = self.audiobuffer.ringbuffer.offset
-        self.last_data_time = self.audiobuffer.lastDataTime
-
-        available = index - self.old_index
+        self.audiobuffer = buffer
+        self.reset_reader()
 
-        if available < 0:
-            # ringbuffer must have grown or something...
-            available = 0
-            self.old_index = index
+    def reset_reader(self):
+        if self.reader is not None:
+            self.audiobuffer.ringbuffer.remove_reader(self.reader)
 
-        # if we have enough data to add a frequency column in the time-frequency plane, compute it
+        # one subsampled level for every 2**Ndec samples
         needed = int(2**self.Ndec)
-        realizable = int(np.floor(available / needed))
+        self.reader = self.audiobuffer.ringbuffer.add_reader(needed, needed)
 
-        if realizable > 0:
-            for i in range(realizable):
-                floatdata = self.audiobuffer.data_indexed(self.old_index, needed)
+    def handle_new_data(self, floatdata):
+        self.last_data_time = self.audiobuffer.lastDataTime
+
+        # all the blocks of 2**Ndec samples received since the previous call
+        windows = self.reader.windows()
 
+        if windows.shape[1] > 0:
+            for i in range(windows.shape[1]):
                 # first channel
-                y0 = floatdata[0, :]
+                y0 = windows[0, i]
 
                 y0_squared = y0**2
 
                 # subsample
                 y0_squared_dec = self.subsampler.push(y0_squared)
 
-                self.level, self.zf = pyx_lfilter_float64_1D(self.b, self.a, y0_squared_dec, self.zf)
+                self.level, self.zf = pyx_lfilter_1D(self.b, self.a, y0_squared_dec, self.zf)
 
                 self.level_rms = 10. * np.log10(max(self.level, 1e-150))
 
@@ -202,8 +201,6 @@ class LongLevelWidget(QtWidgets.QWidget):
 
                 self.ringbuffer.push(l)
 
-                self.old_index += needed
-
             self.time = np.arange(self.length_samples) / self.subsampled_sampling_rate
 
             levels = self.ringbuffer.data(self.length_samples)
@@ -238,7 +235,8 @@ class LongLevelWidget(QtWidgets.QWidget):
     def setresptime(self, value):
         self.response_time = value
         # how many times we should decimate to end up with 100 points in the kernel
-        self.Ndec = int(max(0, np.floor((np.log2(self.response_time * SAMPLING_RATE/100.)))))
+        samplerate = AudioBackend().get_samplerate()
+        self.Ndec = int(max(0, np.floor((np.log2(self.response_time * samplerate/100.)))))
 
         Ngauss = 4
         self.b = np.array(gauss(10*Ngauss+1, 2.*Ngauss))
@@ -246,12 +244,20 @@ class LongLevelWidget(QtWidgets.QWidget):
         self.a[0] = 1.
         self.zf = np.zeros(max(len(self.b), len(self.a)) - 1)
 
-        self.subsampled_sampling_rate = SAMPLING_RATE / 2 ** (self.Ndec)
+        self.subsampled_sampling_rate = samplerate / 2 ** (self.Ndec)
         self.subsampler = Subsampler(self.Ndec)
 
         if self.length_seconds: 
             self.setduration(self.length_seconds)
 
+        if self.reader is not None:
+            self.reset_reader()
+
+    # slot
+    def samplerate_changed(self, samplerate):
+        # the decimation depends on the sample rate
+        self.setresptime(self.response_time)
+
     # slot
     def settings_called(self, checked):
         self.settings_dialog.show()
@@ -17,45 +17,96 @@
 # You should have received a copy of the GNU General Public License
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
-from numpy import log10, array, where
+import logging
 
-from friture.filter import (octave_filter_bank_decimation, octave_frequencies,
-                            octave_filter_bank_decimation_filtic, NOCTAVE)
+from numpy import log10, log2, array, where
+
+from friture.filter import (octave_frequencies,
+                            octave_filter_bank_decimation_energies,
+                            octave_filter_bank_decimation_energies_filtic, NOCTAVE)
 from friture import generated_filters
 import friture.renard as renard
 
+# sample rate of the coefficients used when the filters cannot be designed for the current one
+DESIGN_SAMPLING_RATE = 48000
+
+# coefficients designed at runtime, for the sample rates that are not in generated_filters
+__designedParams = {}
+
+
+def octave_filters_params(samplerate, bandsperoctave):
+    '''Coefficients of the filters of the highest octave designed for the given sample rate,
+    with their center and edge frequencies, or None if scipy is not available to design them.'''
+    params = generated_filters.PARAMS.get('%d' % samplerate)
+
+    if params is None:
+        params = __designedParams.get(samplerate)
+
+    if params is None:
+        try:
+            from friture.filter_design import filters_params
+        except ImportError:
+            return None
+        params = filters_params(samplerate)
+        __designedParams[samplerate] = params
+
+    return params['%d' % bandsperoctave]
+
+
 class Octave_Filters():
 
-    def __init__(self, bandsperoctave):
-        [self.bdec, self.adec] = generated_filters.PARAMS['dec']
+    def __init__(self, bandsperoctave, samplerate=DESIGN_SAMPLING_RATE):
+        self.logger = logging.getLogger(__name__)
 
-        self.bdec = array(self.bdec)
-        self.adec = array(self.adec)
+        self.samplerate = samplerate
 
         self.setbandsperoctave(bandsperoctave)
 
-    def filter(self, floatdata):
-        y, dec, zfs = octave_filter_bank_decimation(self.bdec, self.adec,
-                                                    self.boct, self.aoct,
-                                                    floatdata, zis=self.zfs)
+    def smoothed_energies(self, floatdata, alphas, energies):
+        '''Update in place the (bands, channels) exponentially smoothed energies
+        of the bands, for a (channels, samples) array, without storing the band signals.'''
+        nchannels = floatdata.shape[0]
+        if self.energy_zfs is None or self.energy_zfs[0].shape[1] != nchannels:
+            self.energy_zfs = octave_filter_bank_decimation_energies_filtic(self.boct_bank, self.aoct_bank, nchannels)
 
-        self.zfs = zfs
-
-        return y, dec
+        self.energy_zfs = octave_filter_bank_decimation_energies(self.boct_bank, self.aoct_bank,
+                                                                 floatdata, self.energy_zfs, alphas, energies)
 
     def get_decs(self):
         decs = [2 ** j for j in range(0, NOCTAVE)[::-1] for i in range(0, self.bandsperoctave)]
 
         return decs
 
+    def setsamplerate(self, samplerate):
+        self.samplerate = samplerate
+        self.setbandsperoctave(self.bandsperoctave)
+
     def setbandsperoctave(self, bandsperoctave):
         self.bandsperoctave = bandsperoctave
         self.nbands = NOCTAVE * self.bandsperoctave
+
         self.fi, self.flow, self.fhigh = octave_frequencies(self.nbands, self.bandsperoctave)
-        [self.boct, self.aoct, fi, flow, fhigh] = generated_filters.PARAMS['%d' % bandsperoctave]
 
-        self.boct = [array(f) for f in self.boct]
-        self.aoct = [array(f) for f in self.aoct]
+        params = octave_filters_params(self.samplerate, bandsperoctave)
+
+        if params is not None:
+            [self.boct, self.aoct, fi, flow, fhigh] = params
+            # at low sample rates, the bands are moved down by whole octaves
+            ratio = 2. ** round(log2(fi[-1] / self.fi[-1]))
+        else:
+            self.logger.warning("Cannot design the octave filters at %d Hz without scipy, using the %d Hz filters",
+                                self.samplerate, DESIGN_SAMPLING_RATE)
+            [self.boct, self.aoct, fi, flow, fhigh] = generated_filters.PARAMS['%d' % DESIGN_SAMPLING_RATE]['%d' % bandsperoctave]
+            # the same digital filters have their frequencies scaled by the ratio of the sample rates
+            ratio = self.samplerate / DESIGN_SAMPLING_RATE
+
+        self.fi = self.fi * ratio
+        self.flow = self.flow * ratio
+        self.fhigh = self.fhigh * ratio
+
+        # the bands of an octave are filtered together, they have the same order
+        self.boct_bank = array(self.boct)
+        self.aoct_bank = array(self.aoct)
 
         # [self.b_nodec, self.a_nodec, fi, fl, fh] = octave_filters(self.nbands, self.bandsperoctave)
 
@@ -66,9 +117,13 @@ class Octave_Filters():
         self.C = 0.06 + 20. * log10(Rc)
         self.B = 0.17 + 20. * log10(Rb)
         self.A = 2.0 + 20. * log10(Ra)
-        self.zfs = octave_filter_bank_decimation_filtic(self.bdec, self.adec, self.boct, self.aoct)
+        self.energy_zfs = None
 
-        if bandsperoctave == 1:
+        # the bands are shifted by a whole number of bands when the ratio is a power of 2,
+        # so that they still match the nominal frequencies
+        shift = log2(ratio) * bandsperoctave
+
+        if bandsperoctave == 1 or shift != round(shift):
             # with 1 band per octave, we would need the "R3.33" Renard series, but it does not exist.
             # However, that is not really a problem, since the numbers simply round up.
             self.f_nominal = ["%.1fk" % (f/1000) if f >= 10000
@@ -77,31 +132,45 @@ class Octave_Filters():
                               for f in self.fi]
         else:
             # with more than 1 band per octave, use the preferred numbers from the Renard series
-            if bandsperoctave == 3:
-                basis = renard.R10
-            elif bandsperoctave == 6:
-                basis = renard.R20
-            elif bandsperoctave == 12:
-                basis = renard.R40
-            elif bandsperoctave == 24:
-                basis = renard.R80
-            else:
-                raise Exception("Unknown bandsperoctave: %d" % (bandsperoctave))
-
-            # search the index of 1 kHz, the reference
-            i = where(self.fi == 1000.)[0][0]
-
-            # build the frequency scale
-            self.f_nominal = []
-
-            k = 0
-            while len(self.f_nominal) < len(self.fi) - i:
-                self.f_nominal += ["{0:.{width}f}k".format(10 ** k * f, width=2 - k) for f in basis]
-                k += 1
-            self.f_nominal = self.f_nominal[:len(self.fi) - i]
-
-            k = 0
-            while len(self.f_nominal) < len(self.fi):
-                self.f_nominal = ["%d" % (10 ** (2 - k) * f) for f in basis] + self.f_nominal
-                k += 1
-            self.f_nominal = self.f_nominal[-len(self.fi):]
+            shift = int(round(shift))
+
+            # extend the bands on both sides so that they include the shifted bands,
+            # 1 kHz stays at the center
+            fi_extended, flow_unused, fhigh_unused = octave_frequencies(self.nbands + 2 * abs(shift), self.bandsperoctave)
+
+            f_nominal = renard_nominal_frequencies(fi_extended, bandsperoctave)
+
+            self.f_nominal = f_nominal[abs(shift) + shift:abs(shift) + shift + self.nbands]
+
+
+def renard_nominal_frequencies(fi, bandsperoctave):
+    if bandsperoctave == 3:
+        basis = renard.R10
+    elif bandsperoctave == 6:
+        basis = renard.R20
+    elif bandsperoctave == 12:
+        basis = renard.R40
+    elif bandsperoctave == 24:
+        basis = renard.R80
+    else:
+        raise Exception("Unknown bandsperoctave: %d" % (bandsperoctave))
+
+    # search the index of 1 kHz, the reference
+    i = where(fi == 1000.)[0][0]
+
+    # build the frequency scale
+    f_nominal = []
+
+    k = 0
+    while len(f_nominal) < len(fi) - i:
+        f_nominal += ["{0:.{width}f}k".format(10 ** k * f, width=2 - k) for f in basis]
+        k += 1
+    f_nominal = f_nominal[:len(fi) - i]
+
+    k = 0
+    while len(f_nominal) < len(fi):
+        f_nominal = ["%d" % (10 ** (2 - k) * f) for f in basis] + f_nominal
+        k += 1
+    f_nominal = f_nominal[-len(fi):]
+
+    return f_nominal
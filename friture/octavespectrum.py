@@ -18,10 +18,11 @@
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
 from PyQt5 import QtWidgets
-from numpy import log10, array, arange
+from numpy import log10
 
 from friture.histplot import HistPlot
-from friture.octavefilters import Octave_Filters
+from friture.analysis_processors import OctaveSpectrumProcessor
+from friture.analysis_workers import GetAnalysisWorkerPool
 from friture.octavespectrum_settings import (OctaveSpectrum_Settings_Dialog,  # settings dialog
                                              DEFAULT_SPEC_MIN,
                                              DEFAULT_SPEC_MAX,
@@ -29,11 +30,7 @@ from friture.octavespectrum_settings import (OctaveSpectrum_Settings_Dialog,  #
                                              DEFAULT_BANDSPEROCTAVE,
                                              DEFAULT_RESPONSE_TIME)
 
-from friture.filter import NOCTAVE
-
-from friture_extensions.exp_smoothing_conv import pyx_exp_smoothed_value
-
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 
 SMOOTH_DISPLAY_TIMER_PERIOD_MS = 25
 
@@ -60,52 +57,48 @@ class OctaveSpectrum_Widget(QtWidgets.QWidget):
         self.PlotZoneSpect.setspecrange(self.spec_min, self.spec_max)
         self.PlotZoneSpect.setweighting(self.weighting)
 
-        self.filters = Octave_Filters(DEFAULT_BANDSPEROCTAVE)
-        self.dispbuffers = [0] * DEFAULT_BANDSPEROCTAVE * NOCTAVE
-
-        # set kernel and parameters for the smoothing filter
-        self.setresponsetime(self.response_time)
+        # filter bank and smoothing, run in a worker process when the pool is enabled
+        self.processor = OctaveSpectrumProcessor(DEFAULT_BANDSPEROCTAVE, AudioBackend().get_samplerate(), self.response_time)
+        self.filters = self.processor.filters
+        self.job = None
 
         # initialize the settings dialog
         self.settings_dialog = OctaveSpectrum_Settings_Dialog(self)
 
+        AudioBackend().samplerate_changed.connect(self.samplerate_changed)
+
     # method
     def set_buffer(self, buffer):
         self.audiobuffer = buffer
+        self.restart_job()
 
-    def compute_kernels(self, alphas, Ns):
-        kernels = []
-        for alpha, N in zip(alphas, Ns):
-            kernels += [(1. - alpha) ** arange(N - 1, -1, -1)]
-        return kernels
-
-    def exp_smoothed_value(self, kernel, alpha, data, previous):
-        N = len(data)
-        if N == 0:
-            return previous
-        else:
-            value = alpha * (kernel[-N:] * data).sum() + previous * (1. - alpha) ** N
-            return value
-
-    def handle_new_data(self, floatdata):
-        # the behaviour of the filters functions is sometimes
-        # unexpected when they are called on empty arrays
-        if floatdata.shape[1] == 0:
-            return
+    def restart_job(self):
+        # the processor of the worker is a copy, so it is replaced after each settings change
+        self.release_job()
+        if self.audiobuffer is not None:
+            self.job = GetAnalysisWorkerPool().submit(self.processor, self.audiobuffer)
 
-        # for now, take the first channel only
-        floatdata = floatdata[0, :]
+    def release_job(self):
+        if self.job is not None:
+            self.job.unsubscribe()
+            self.job = None
 
-        # compute the filters' output
-        y, decs_unused = self.filters.filter(floatdata)
+    def closeEvent(self, event):
+        self.release_job()
+        super().closeEvent(event)
 
-        # compute the widget data
-        sp = [pyx_exp_smoothed_value(kernel, alpha, bankdata ** 2, old) for bankdata, kernel, alpha, old in zip(y, self.kernels, self.alphas, self.dispbuffers)]
+    def handle_new_data(self, floatdata):
+        # smoothed band energies, (bands, channels)
+        if self.job is not None:
+            sp = self.job.fetch()
+        else:
+            sp = self.processor.process(floatdata)
 
-        # store result for next computation
-        self.dispbuffers = sp
+        if sp is None:
+            return
 
-        sp = array(sp)
+        # display the first channel
+        sp = sp[:, 0]
 
         if self.weighting == 0:
             w = 0.
@@ -140,29 +133,18 @@ class OctaveSpectrum_Widget(QtWidgets.QWidget):
         self.PlotZoneSpect.setweighting(weighting)
 
     def setresponsetime(self, response_time):
-        # time = SMOOTH_DISPLAY_TIMER_PERIOD_MS/1000. #DISPLAY
-        # time = 0.025 #IMPULSE setting for a sound level meter
-        # time = 0.125 #FAST setting for a sound level meter
-        # time = 1. #SLOW setting for a sound level meter
         self.response_time = response_time
-
-        # an exponential smoothing filter is a simple IIR filter
-        # s_i = alpha*x_i + (1-alpha)*s_{i-1}
-        # we compute alpha so that the N most recent samples represent 100*w percent of the output
-        w = 0.65
-        decs = self.filters.get_decs()
-        ns = [self.response_time * SAMPLING_RATE / dec for dec in decs]
-        Ns = [2 * 4096 / dec for dec in decs]
-        self.alphas = [1. - (1. - w) ** (1. / (n + 1)) for n in ns]
-        # print(ns, Ns)
-        self.kernels = self.compute_kernels(self.alphas, Ns)
+        self.processor.setresponsetime(response_time)
+        self.restart_job()
 
     def setbandsperoctave(self, bandsperoctave):
-        self.filters.setbandsperoctave(bandsperoctave)
-        # recreate the ring buffers
-        self.dispbuffers = [0] * bandsperoctave * NOCTAVE
-        # reset kernel and parameters for the smoothing filter
-        self.setresponsetime(self.response_time)
+        self.processor.setbandsperoctave(bandsperoctave)
+        self.restart_job()
+
+    # slot
+    def samplerate_changed(self, samplerate):
+        self.processor.setsamplerate(samplerate)
+        self.restart_job()
 
     def settings_called(self, checked):
         self.settings_dialog.show()
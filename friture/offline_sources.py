@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Sources that replace the capture from an input device: audio files,
+read through a memory map, the recorded history, and deterministic synthetic signals.
+
+They are read block by block by the audio backend, either at the pace of
+the sample rate or as fast as the analysis can go."""
+
+import struct
+
+import numpy as np
+
+from friture.generators.pink import pinknoise
+from friture.generators.sweep import sweep_params, log_sweep
+from friture.history_store import HistoryStore
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+SYNTHETIC_KINDS = ["sine", "white", "pink", "sweep"]
+
+
+class FileSource:
+    '''Samples of a memory-mapped file of interleaved frames.'''
+
+    def __init__(self, path, samplerate, nchannels, dtype, offset=0, frames=None, loop=False):
+        self.path = path
+        self.samplerate = samplerate
+        self.nchannels = nchannels
+        self.loop = loop
+
+        dtype = np.dtype(dtype)
+        if dtype.kind not in "iuf":
+            raise ValueError("Unsupported sample type: %s" % (dtype))
+        self.dtype = dtype
+
+        if frames is None:
+            frames = (np.memmap(path, dtype=np.uint8, mode='r').shape[0] - offset) // (dtype.itemsize * nchannels)
+
+        # (frames, channels), nothing is read before it is accessed
+        self.data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(frames, nchannels))
+
+        self.position = 0
+
+    @property
+    def frames(self):
+        return self.data.shape[0]
+
+    def exhausted(self):
+        return not self.loop and self.position >= self.frames
+
+    def convert(self, block):
+        '''Convert a block of frames to floats in [-1, 1], as (channels, frames).'''
+        if self.dtype.kind == 'f':
+            return block.T.astype(np.float64)
+        elif self.dtype.kind == 'u':
+            # unsigned 8-bit samples are offset by half the range
+            half = 2 ** (8 * self.dtype.itemsize - 1)
+            return (block.T.astype(np.float64) - half) / half
+        else:
+            return block.T.astype(np.float64) / 2 ** (8 * self.dtype.itemsize - 1)
+
+    def read(self, count):
+        '''Return up to count frames, as a (channels, frames) array.'''
+        if self.frames == 0:
+            return np.zeros((self.nchannels, 0))
+
+        blocks = []
+        while count > 0 and not self.exhausted():
+            if self.position >= self.frames:
+                self.position = 0
+            block = self.data[self.position:self.position + count]
+            blocks.append(self.convert(block))
+            self.position += block.shape[0]
+            count -= block.shape[0]
+
+        if len(blocks) == 0:
+            return np.zeros((self.nchannels, 0))
+
+        return np.concatenate(blocks, axis=1) if len(blocks) > 1 else blocks[0]
+
+
+class Int24FileSource(FileSource):
+    '''24-bit samples, mapped as bytes and assembled on read.'''
+
+    def __init__(self, path, samplerate, nchannels, offset=0, frames=None, loop=False):
+        if frames is None:
+            frames = (np.memmap(path, dtype=np.uint8, mode='r').shape[0] - offset) // (3 * nchannels)
+
+        self.path = path
+        self.samplerate = samplerate
+        self.nchannels = nchannels
+        self.loop = loop
+        self.dtype = np.dtype(np.int32)
+        self.data = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(frames, nchannels, 3))
+        self.position = 0
+
+    def convert(self, block):
+        block = block.astype(np.int32)
+        # little-endian bytes, shifted to the top of a 32-bit integer to get the sign
+        samples = (block[..., 0] << 8) | (block[..., 1] << 16) | (block[..., 2] << 24)
+        return samples.T.astype(np.float64) / 2 ** 31
+
+
+def open_wav_file(path, loop=False):
+    '''Parse the header of a WAV file and map its data chunk.'''
+    with open(path, 'rb') as f:
+        riff, size, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError("Not a WAV file: %s" % (path))
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("No data chunk in WAV file: %s" % (path))
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                # chunks are aligned on 2 bytes
+                f.seek(chunk_size % 2, 1)
+            elif chunk_id == b'data':
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+
+    if fmt is None:
+        raise ValueError("No format chunk in WAV file: %s" % (path))
+
+    audio_format, nchannels, samplerate, byte_rate, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+
+    if audio_format == WAVE_FORMAT_EXTENSIBLE:
+        # the actual format is the start of the sub-format GUID
+        audio_format = struct.unpack('<H', fmt[24:26])[0]
+
+    frames = chunk_size // block_align
+
+    if audio_format == WAVE_FORMAT_PCM and bits == 24:
+        return Int24FileSource(path, samplerate, nchannels, offset, frames, loop)
+    elif audio_format == WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        dtype = {8: np.uint8, 16: '<i2', 32: '<i4'}[bits]
+    elif audio_format == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        dtype = {32: '<f4', 64: '<f8'}[bits]
+    else:
+        raise ValueError("Unsupported WAV format %d with %d bits: %s" % (audio_format, bits, path))
+
+    return FileSource(path, samplerate, nchannels, dtype, offset, frames, loop)
+
+
+class HistorySource:
+    '''Replay of a history file, from some time before its end.'''
+
+    def __init__(self, path, seconds_ago):
+        self.store = HistoryStore.open(path)
+        self.samplerate = self.store.samplerate
+        self.nchannels = self.store.channels
+        self.loop = False
+
+        self.position = max(self.store.first_offset(), self.store.offset - int(seconds_ago * self.samplerate))
+        self.stop = self.store.offset
+
+    def exhausted(self):
+        return self.position >= self.stop
+
+    def read(self, count):
+        count = min(count, self.stop - self.position)
+        self.position += count
+        return self.store.data_indexed(self.position, count).astype(np.float64)
+
+
+class SyntheticSource:
+    '''Deterministic test signals: the same seed gives the same samples.'''
+
+    def __init__(self, kind, samplerate, nchannels=1, frequency=1000., amplitude=0.5, seed=0):
+        if kind not in SYNTHETIC_KINDS:
+            raise ValueError("Unknown synthetic signal: %s" % (kind))
+
+        self.kind = kind
+        self.samplerate = samplerate
+        self.nchannels = nchannels
+        self.frequency = frequency
+        self.amplitude = amplitude
+
+        self.rng = np.random.default_rng(seed)
+        self.position = 0
+
+        # one second sweep over the audio band
+        self.sweep_params = sweep_params(20., min(20000., 0.45 * samplerate), 1.)
+
+    def exhausted(self):
+        return False
+
+    def read(self, count):
+        t = (self.position + np.arange(count)) / self.samplerate
+        self.position += count
+
+        if self.kind == "sine":
+            signal = np.sin(2. * np.pi * self.frequency * t)
+        elif self.kind == "white":
+            signal = self.rng.standard_normal(count)
+        elif self.kind == "pink":
+            signal = pinknoise(count, rvs=self.rng.standard_normal)
+        else:
+            L, K, T = self.sweep_params
+            signal = log_sweep(t, L, K, T)
+
+        # the same signal on all channels
+        return np.tile(self.amplitude * signal, (self.nchannels, 1))
+
+
+def open_source(spec, samplerate, loop=False):
+    '''Open a source from a command-line specification: the path of a WAV file,
+    raw:PATH:SAMPLERATE:CHANNELS:DTYPE for raw PCM, history:PATH:SECONDS_AGO
+    for the recorded history, or synthetic:KIND[:FREQUENCY].'''
+    if spec.startswith("synthetic:"):
+        fields = spec.split(":")
+        frequency = float(fields[2]) if len(fields) > 2 else 1000.
+        return SyntheticSource(fields[1], samplerate, frequency=frequency)
+    elif spec.startswith("raw:"):
+        # the path may contain colons, the format is at the end
+        path, raw_samplerate, nchannels, dtype = spec[4:].rsplit(":", 3)
+        return FileSource(path, int(raw_samplerate), int(nchannels), dtype, loop=loop)
+    elif spec.startswith("history:"):
+        path, seconds_ago = spec[8:].rsplit(":", 1)
+        return HistorySource(path, float(seconds_ago))
+    else:
+        return open_wav_file(spec, loop)
@@ -21,28 +21,125 @@
 
 import logging
 
-from numpy import zeros
+from numpy import zeros, float64
+from numpy.lib.stride_tricks import as_strided
+
+# number of samples that a reader can lag behind the writer before it loses windows,
+# about 1.4 s at 48 kHz
+DEFAULT_READER_LAG = 2 ** 16
+
+
+def frames_view(samples, frame_size, hop):
+    '''Return a read-only (channels, frames, frame_size) view on all the
+    overlapping frames of a (channels, length) array, without copying.'''
+    channels, length = samples.shape
+    count = max(0, (length - frame_size) // hop + 1)
+    channel_stride, sample_stride = samples.strides
+    return as_strided(samples,
+                      shape=(channels, count, frame_size),
+                      strides=(channel_stride, hop * sample_stride, sample_stride),
+                      writeable=False)
+
+
+class RingBufferReader():
+    '''Cursor of a consumer that reads windows of a fixed length, every hop samples.'''
+
+    def __init__(self, ringbuffer, window, hop):
+        self.ringbuffer = ringbuffer
+        self.window = window
+        self.hop = hop
+
+        # ring buffer index where the next window ends
+        self.next_stop = ringbuffer.offset + hop
+
+        # number of windows lost because the reader lagged too much
+        self.dropped = 0
+
+    def pending(self):
+        available = self.ringbuffer.offset - self.next_stop
+        return available // self.hop + 1 if available >= 0 else 0
+
+    def windows(self):
+        '''Return all the windows that ended since the previous call, as a read-only
+        (channels, windows, window) view on the ring buffer, without copying.
+        The view is only valid until the next push.'''
+        count = self.pending()
+
+        # the windows that have already been overwritten are skipped
+        overflow = self.ringbuffer.offset - self.next_stop + self.window - self.ringbuffer.buffer_length
+        if overflow > 0:
+            skipped = min(count, -(-overflow // self.hop))
+            self.dropped += skipped
+            self.next_stop += skipped * self.hop
+            count -= skipped
+            self.ringbuffer.logger.debug("Ringbuffer reader lagging, %d windows dropped", skipped)
+
+        if count == 0:
+            return self.empty()
+
+        last_stop = self.next_stop + (count - 1) * self.hop
+        samples = self.read(last_stop, self.window + (count - 1) * self.hop)
+
+        self.next_stop += count * self.hop
+
+        if samples is None:
+            # the samples were overwritten while they were read
+            self.dropped += count
+            return self.empty()
+
+        return frames_view(samples, self.window, self.hop)
+
+    def read(self, stop, length):
+        return self.ringbuffer.data_indexed(stop, length)
+
+    def empty(self):
+        return frames_view(self.ringbuffer.buffer[:, :0], self.window, self.hop)
 
 
 class RingBuffer():
 
-    def __init__(self):
+    def __init__(self, dtype=float64):
         self.logger = logging.getLogger(__name__)
 
         # buffer length is dynamic based on the needs
         self.buffer_length = 10000
-        self.buffer = zeros((1, 2 * self.buffer_length))
+        self.buffer = self.allocate(1, self.buffer_length, dtype)
         self.offset = 0
 
+        self.readers = []
+
+    def add_reader(self, window, hop, lag=DEFAULT_READER_LAG):
+        '''Register a reader of windows of the given length, every hop samples.
+        The capacity is reserved once, so that the reader never makes the buffer grow.'''
+        self.grow_if_needed(window + max(hop, lag))
+
+        reader = RingBufferReader(self, window, hop)
+        self.readers.append(reader)
+        return reader
+
+    def remove_reader(self, reader):
+        if reader in self.readers:
+            self.readers.remove(reader)
+
+    def allocate(self, channels, length, dtype):
+        '''Return the zeroed storage of a buffer of the given length, mirrored once.'''
+        return zeros((channels, 2 * length), dtype=dtype)
+
+    def buffer_changed(self):
+        '''Called when the storage has been replaced, after the data has been copied.'''
+        pass
+
     def push(self, floatdata):
         # update the circular buffer
 
         dim = floatdata.shape[0]
         l = floatdata.shape[1]
 
-        if dim != self.buffer.shape[0]:
-            # switched from single to dual channels or vice versa
-            self.buffer = zeros((dim, 2 * self.buffer_length))
+        if dim != self.buffer.shape[0] or floatdata.dtype != self.buffer.dtype:
+            # switched from single to dual channels or vice versa,
+            # or between the float32 and float64 pipelines
+            self.buffer = self.allocate(dim, self.buffer_length, floatdata.dtype)
+            self.buffer_changed()
 
         self.grow_if_needed(l)
 
@@ -104,7 +201,7 @@ class RingBuffer():
             self.logger.info("Ringbuffer: growing buffer for length %d", new_length)
 
             # create new buffer
-            newbuffer = zeros((self.buffer.shape[0], 2 * new_length))
+            newbuffer = self.allocate(self.buffer.shape[0], new_length, self.buffer.dtype)
             # copy existing data so that self.offset does not have to be changed
             old_offset_mod = self.offset % old_length
             new_offset_mod = self.offset % new_length
@@ -121,3 +218,4 @@ class RingBuffer():
             # assign self.butter to the new larger buffer
             self.buffer = newbuffer
             self.buffer_length = new_length
+            self.buffer_changed()
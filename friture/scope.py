@@ -25,7 +25,7 @@ from PyQt5.QtQuickWidgets import QQuickWidget
 from numpy import log10, where, sign, arange, zeros
 
 from friture.store import GetStore
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 from friture.scope_data import Scope_Data
 from friture.curve import Curve
 from friture.qml_tools import qml_url, raise_if_error
@@ -94,7 +94,8 @@ class Scope_Widget(QtWidgets.QWidget):
 
     def handle_new_data(self, floatdata):
         time = self.timerange * 1e-3
-        width = int(time * SAMPLING_RATE)
+        samplerate = AudioBackend().get_samplerate()
+        width = int(time * samplerate)
         # basic trigger capability on leading edge
         floatdata = self.audiobuffer.data(2 * width)
 
@@ -143,7 +144,7 @@ class Scope_Widget(QtWidgets.QWidget):
             else:
                 self.y2 = None
 
-        self.time = (arange(len(self.y)) - datarange // 2) / float(SAMPLING_RATE)
+        self.time = (arange(len(self.y)) - datarange // 2) / float(samplerate)
 
         scaled_t = (self.time * 1e3 + self.timerange/2.) / self.timerange
         scaled_y = 1. - (self.y + 1) / 2.
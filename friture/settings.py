@@ -21,7 +21,7 @@ import sys
 import logging
 
 from PyQt5 import QtCore, QtWidgets
-from friture.audiobackend import AudioBackend
+from friture.audiobackend import AudioBackend, SAMPLING_RATES, DEFAULT_SAMPLING_RATE
 from friture.ui_settings import Ui_Settings_Dialog
 
 no_input_device_title = "No audio input device found"
@@ -57,11 +57,22 @@ class Settings_Dialog(QtWidgets.QDialog, Ui_Settings_Dialog):
         for device in devices:
             self.comboBox_inputDevice.addItem(device)
 
+            item = QtWidgets.QListWidgetItem(device, self.listWidget_extraInputs)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Unchecked)
+
+        # the sources opened by each row of the list of additional inputs
+        self.extra_inputs = {}
+
         channels = AudioBackend().get_readable_current_channels()
         for channel in channels:
             self.comboBox_firstChannel.addItem(channel)
             self.comboBox_secondChannel.addItem(channel)
 
+        for samplerate in SAMPLING_RATES:
+            self.comboBox_samplerate.addItem("%d Hz" % (samplerate), samplerate)
+        self.show_samplerate(AudioBackend().get_samplerate())
+
         current_device = AudioBackend().get_readable_current_device()
         self.comboBox_inputDevice.setCurrentIndex(current_device)
 
@@ -72,10 +83,16 @@ class Settings_Dialog(QtWidgets.QDialog, Ui_Settings_Dialog):
 
         # signals
         self.comboBox_inputDevice.currentIndexChanged.connect(self.input_device_changed)
+        self.comboBox_samplerate.activated.connect(self.samplerate_changed)
         self.comboBox_firstChannel.activated.connect(self.first_channel_changed)
         self.comboBox_secondChannel.activated.connect(self.second_channel_changed)
         self.radioButton_single.toggled.connect(self.single_input_type_selected)
         self.radioButton_duo.toggled.connect(self.duo_input_type_selected)
+        self.radioButton_all.toggled.connect(self.all_input_type_selected)
+        self.checkBox_float32.toggled.connect(self.float32_pipeline_toggled)
+        self.listWidget_extraInputs.itemChanged.connect(self.extra_input_changed)
+        AudioBackend().input_closed.connect(self.extra_input_closed)
+        AudioBackend().samplerate_changed.connect(self.show_samplerate)
 
     # slot
     # used when no audio input device has been found, to exit immediately
@@ -114,6 +131,68 @@ class Settings_Dialog(QtWidgets.QDialog, Ui_Settings_Dialog):
 
         self.parent().ui.actionStart.setChecked(True)
 
+    # slot
+    def extra_input_changed(self, item):
+        row = self.listWidget_extraInputs.row(item)
+
+        if item.checkState() == QtCore.Qt.Checked:
+            success, source = AudioBackend().open_extra_input(row)
+
+            if success:
+                self.extra_inputs[row] = source
+            else:
+                self.set_extra_input_checked(row, False)
+
+                error_message = QtWidgets.QErrorMessage(self)
+                error_message.setWindowTitle("Input device error")
+                error_message.showMessage("Impossible to capture the selected device in addition to the main input device")
+        elif row in self.extra_inputs:
+            AudioBackend().close_extra_input(self.extra_inputs.pop(row))
+
+    # slot
+    def extra_input_closed(self, source):
+        for row, extra_input in list(self.extra_inputs.items()):
+            if extra_input is source:
+                del self.extra_inputs[row]
+                self.set_extra_input_checked(row, False)
+
+    # method
+    def set_extra_input_checked(self, row, checked):
+        self.listWidget_extraInputs.blockSignals(True)
+        self.listWidget_extraInputs.item(row).setCheckState(QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked)
+        self.listWidget_extraInputs.blockSignals(False)
+
+    # slot
+    # select the sample rate in use, a rate that is not offered in the settings
+    # (set by an offline source) is shown as an additional item
+    def show_samplerate(self, samplerate):
+        while self.comboBox_samplerate.count() > len(SAMPLING_RATES):
+            self.comboBox_samplerate.removeItem(len(SAMPLING_RATES))
+
+        index = self.comboBox_samplerate.findData(samplerate)
+        if index < 0:
+            self.comboBox_samplerate.addItem("%d Hz (source)" % (samplerate), samplerate)
+            index = len(SAMPLING_RATES)
+
+        self.comboBox_samplerate.setCurrentIndex(index)
+
+    # slot
+    def samplerate_changed(self, index):
+        self.parent().ui.actionStart.setChecked(False)
+
+        success, samplerate = AudioBackend().select_samplerate(self.comboBox_samplerate.itemData(index))
+
+        self.show_samplerate(samplerate)
+
+        if not success:
+            # Note: the error message is a child of the settings dialog, so that
+            # that dialog remains on top when the error message is closed
+            error_message = QtWidgets.QErrorMessage(self)
+            error_message.setWindowTitle("Sample rate error")
+            error_message.showMessage("Impossible to use the selected sample rate with the current input device, reverting to the previous one")
+
+        self.parent().ui.actionStart.setChecked(True)
+
     # slot
     def first_channel_changed(self, index):
         self.parent().ui.actionStart.setChecked(False)
@@ -162,14 +241,30 @@ class Settings_Dialog(QtWidgets.QDialog, Ui_Settings_Dialog):
             AudioBackend().set_duo_input()
             self.logger.info("Switching to difference between two inputs")
 
+    # slot
+    def all_input_type_selected(self, checked):
+        if checked:
+            self.groupBox_second.setEnabled(False)
+            success, channels = AudioBackend().set_all_inputs()
+            self.logger.info("Switching to all %d inputs", len(channels))
+
+    # slot
+    def float32_pipeline_toggled(self, checked):
+        AudioBackend().set_float32_pipeline(checked)
+        self.logger.info("Switching to %s processing", "float32" if checked else "float64")
+
     # method
     def saveState(self, settings):
         # for the input device, we search by name instead of index, since
         # we do not know if the device order stays the same between sessions
         settings.setValue("deviceName", self.comboBox_inputDevice.currentText())
+        # the rate of an offline source is not a setting of the device
+        settings.setValue("samplerate", AudioBackend().get_device_samplerate())
         settings.setValue("firstChannel", self.comboBox_firstChannel.currentIndex())
         settings.setValue("secondChannel", self.comboBox_secondChannel.currentIndex())
         settings.setValue("duoInput", self.inputTypeButtonGroup.checkedId())
+        settings.setValue("float32Pipeline", self.checkBox_float32.isChecked())
+        settings.setValue("extraInputs", [self.listWidget_extraInputs.item(row).text() for row in sorted(self.extra_inputs)])
 
     # method
     def restoreState(self, settings):
@@ -184,3 +279,20 @@ class Settings_Dialog(QtWidgets.QDialog, Ui_Settings_Dialog):
             self.comboBox_secondChannel.setCurrentIndex(channel)
             duo_input_id = settings.value("duoInput", 0, type=int)
             self.inputTypeButtonGroup.button(duo_input_id).setChecked(True)
+        samplerate = settings.value("samplerate", DEFAULT_SAMPLING_RATE, type=int)
+        if samplerate in SAMPLING_RATES and samplerate != AudioBackend().get_device_samplerate():
+            samplerate_index = self.comboBox_samplerate.findData(samplerate)
+            self.comboBox_samplerate.setCurrentIndex(samplerate_index)
+            self.samplerate_changed(samplerate_index)
+        float32_pipeline = settings.value("float32Pipeline", False, type=bool)
+        self.checkBox_float32.setChecked(float32_pipeline)
+        # the additional inputs are opened after the sample rate is set
+        extra_inputs = settings.value("extraInputs", [])
+        if extra_inputs is None:
+            extra_inputs = []
+        elif isinstance(extra_inputs, str):
+            extra_inputs = [extra_inputs]
+        for name in extra_inputs:
+            items = self.listWidget_extraInputs.findItems(name, QtCore.Qt.MatchExactly)
+            if len(items) > 0:
+                items[0].setCheckState(QtCore.Qt.Checked)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Ring buffer in shared memory, written by the GUI process and read by the analysis workers.
+
+The writer and the readers do not share any lock. The writer publishes its
+progress in a small control block:
+- before writing a block of samples, it announces the end of the write,
+- after writing it, it publishes the new offset,
+- when the storage is replaced (growth, channel count or dtype change),
+  the generation is odd while the new storage is being set up.
+
+A reader copies the samples of its windows, then checks that the writer did
+not wrap around them nor replace the storage in the meantime. Otherwise the
+copy is discarded."""
+
+import logging
+import sys
+import weakref
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from numpy import ndarray, zeros, dtype as numpy_dtype, float64, int64, uint8
+
+from friture.ringbuffer import RingBuffer, RingBufferReader, DEFAULT_READER_LAG
+
+# fields of the control block
+OFFSET = 0
+WRITE_END = 1
+GENERATION = 2
+CHANNELS = 3
+LENGTH = 4
+DTYPE = 5
+CONTROL_FIELDS = 8
+
+# the name of the storage segment follows the fields
+NAME_SIZE = 64
+CONTROL_SIZE = CONTROL_FIELDS * 8 + NAME_SIZE
+
+
+def attach_shared_memory(name):
+    # the segments are owned by the GUI process, and the workers share its resource
+    # tracker, so they must not be tracked again on attach
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+
+    # before Python 3.13, attaching registers the segment (bpo-39959). Unregistering
+    # it afterwards would also drop the registration of the GUI process from the
+    # shared tracker, so the registration is skipped instead
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def release_segments(segments, unlink):
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:
+            # still referenced by an array, the mapping is released with it
+            pass
+        if unlink:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+    segments.clear()
+
+
+class ControlBlock:
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.fields = ndarray((CONTROL_FIELDS,), dtype=int64, buffer=memory.buf)
+        self.name = ndarray((NAME_SIZE,), dtype=uint8, buffer=memory.buf, offset=CONTROL_FIELDS * 8)
+
+    def get_name(self):
+        return bytes(self.name).rstrip(b"\0").decode()
+
+    def set_name(self, name):
+        encoded = name.encode()
+        self.name[:] = 0
+        self.name[:len(encoded)] = memoryview(encoded)
+
+
+class SharedRingBuffer(RingBuffer):
+    '''RingBuffer whose storage lives in shared memory, with a single writer.
+
+    The worker processes attach to it by name, with SharedRingBufferView.'''
+
+    def __init__(self, dtype=float64):
+        control_memory = SharedMemory(create=True, size=CONTROL_SIZE)
+        self.control = ControlBlock(control_memory)
+        self.control.fields[:] = 0
+
+        # storage that is being set up, and storage of the published generation
+        self.pending_memory = None
+        self.memory = None
+
+        # segments to release on close, including the retired storages that were still referenced
+        self.segments = [control_memory]
+        self.finalizer = weakref.finalize(self, release_segments, self.segments, True)
+
+        super().__init__(dtype)
+
+        # publish the initial storage
+        self.buffer_changed()
+
+    @property
+    def name(self):
+        return self.control.memory.name
+
+    @property
+    def offset(self):
+        return int(self.control.fields[OFFSET])
+
+    @offset.setter
+    def offset(self, value):
+        # published after the samples, so that the readers never see an offset ahead of the data
+        self.control.fields[OFFSET] = value
+
+    def allocate(self, channels, length, dtype):
+        dtype = numpy_dtype(dtype)
+
+        # the readers pause until the new storage is published
+        if self.control.fields[GENERATION] % 2 == 0:
+            self.control.fields[GENERATION] += 1
+
+        # new segments are zero-filled
+        self.pending_memory = SharedMemory(create=True, size=max(1, channels * 2 * length * dtype.itemsize))
+        self.segments.append(self.pending_memory)
+
+        return ndarray((channels, 2 * length), dtype=dtype, buffer=self.pending_memory.buf)
+
+    def buffer_changed(self):
+        fields = self.control.fields
+        self.control.set_name(self.pending_memory.name)
+        fields[CHANNELS] = self.buffer.shape[0]
+        fields[LENGTH] = self.buffer_length
+        fields[DTYPE] = ord(self.buffer.dtype.char)
+
+        retired, self.memory, self.pending_memory = self.memory, self.pending_memory, None
+
+        fields[GENERATION] += 1
+
+        if retired is not None:
+            self.segments.remove(retired)
+            release_segments([retired], True)
+            if retired.buf is not None:
+                # closing failed, keep it for the finalizer
+                self.segments.append(retired)
+
+    def push(self, floatdata):
+        # announce the samples that are about to be overwritten
+        self.control.fields[WRITE_END] = self.offset + floatdata.shape[1]
+        super().push(floatdata)
+
+    def close(self):
+        self.buffer = zeros((0, 0))
+        self.finalizer()
+
+
+class SharedRingBufferReader(RingBufferReader):
+    '''Cursor on a SharedRingBufferView, that returns copies of the windows.'''
+
+    def windows(self):
+        if not self.ringbuffer.refresh():
+            # the storage is being replaced
+            return self.empty()
+        return super().windows()
+
+    def read(self, stop, length):
+        ringbuffer = self.ringbuffer
+        generation = ringbuffer.generation
+
+        samples = ringbuffer.data_indexed(stop, length).copy()
+
+        # the copy is valid if the storage was not replaced,
+        # and if the writer did not reach the oldest copied sample
+        fields = ringbuffer.control.fields
+        if int(fields[GENERATION]) != generation or int(fields[WRITE_END]) - (stop - length) > ringbuffer.buffer_length:
+            return None
+
+        return samples
+
+
+class SharedRingBufferView(RingBuffer):
+    '''Read-only access to a SharedRingBuffer of another process.'''
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(__name__)
+
+        self.control = ControlBlock(attach_shared_memory(name))
+        self.memory = None
+        self.generation = None
+
+        self.buffer_length = 0
+        self.buffer = zeros((1, 0))
+        self.readers = []
+
+        self.refresh()
+
+    @property
+    def offset(self):
+        return int(self.control.fields[OFFSET])
+
+    def refresh(self):
+        '''Attach to the current storage of the writer.
+        Return False while the writer is replacing it.'''
+        fields = self.control.fields
+
+        generation = int(fields[GENERATION])
+        if generation == self.generation:
+            return True
+        if generation % 2 == 1:
+            return False
+
+        name = self.control.get_name()
+        channels = int(fields[CHANNELS])
+        length = int(fields[LENGTH])
+        dtype = chr(int(fields[DTYPE]))
+
+        if int(fields[GENERATION]) != generation:
+            return False
+
+        try:
+            memory = attach_shared_memory(name)
+        except FileNotFoundError:
+            # replaced in the meantime
+            return False
+
+        retired, self.memory = self.memory, memory
+        self.buffer = ndarray((channels, 2 * length), dtype=dtype, buffer=memory.buf)
+        self.buffer_length = length
+        self.generation = generation
+
+        if retired is not None:
+            release_segments([retired], False)
+
+        return True
+
+    def add_reader(self, window, hop, lag=DEFAULT_READER_LAG):
+        # the capacity is reserved by the writer
+        reader = SharedRingBufferReader(self, window, hop)
+        self.readers.append(reader)
+        return reader
+
+    def grow_if_needed(self, length):
+        # only the writer can resize the storage
+        pass
+
+    def push(self, floatdata):
+        raise RuntimeError("A shared ring buffer can only be written by its owner")
+
+    def close(self):
+        self.buffer = zeros((0, 0))
+        release_segments([segment for segment in (self.memory, self.control.memory) if segment is not None], False)
+        self.memory = None
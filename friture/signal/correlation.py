@@ -18,14 +18,15 @@
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy
-from numpy.fft import rfft, irfft
+from friture.signal.fft_backend import rfft, irfft
 
 
 def generalized_cross_correlation(d0, d1):
     # substract the means
     # (in order to get a normalized cross-correlation at the end)
-    d0 -= d0.mean()
-    d1 -= d1.mean()
+    # not in place, the inputs can be read-only views on a ring buffer
+    d0 = d0 - d0.mean()
+    d1 = d1 - d1.mean()
 
     # Hann window to mitigate non-periodicity effects
     window = numpy.hanning(len(d0))
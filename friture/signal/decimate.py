@@ -17,48 +17,108 @@
 # You should have received a copy of the GNU General Public License
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
+from math import ceil, cos, log, pi, sin, sqrt, tan
+
 import numpy
-from friture_extensions.lfilter import pyx_lfilter_float64_1D
+from friture_extensions.decimator import pyx_halfband_decimate, pyx_fir_decimate
 
+# the half-band filter is flat up to 0.24 of the input sample rate,
+# and attenuates by more than 70 dB from 0.26
+HALFBAND_ATTENUATION = 70.
+HALFBAND_TRANSITION = 0.01
 
-def decimate(bdec, adec, x, zi):
-    if len(x) == 0:
-        raise Exception("Filter input is too small")
 
-    # could use a polyphase decimator here
-    x_dec, zf = pyx_lfilter_float64_1D(bdec, adec, x, zi)
+def halfband_coefficients(attenuation, transition):
+    '''Coefficients of the all-pass sections of a polyphase IIR half-band filter,
+    with the given stopband attenuation in dB and transition bandwidth (relative to the sample rate).
 
-    x_dec = x_dec[::2]
-    return x_dec, zf
+    This is the closed-form elliptic design of the HIIR library by Laurent de Soras.'''
+    k = tan((1. - 2. * transition) * pi / 4.) ** 2
+    kksqrt = (1. - k * k) ** 0.25
+    e = 0.5 * (1. - kksqrt) / (1. + kksqrt)
+    e4 = e ** 4
+    q = e * (1. + e4 * (2. + e4 * (15. + 150. * e4)))
 
+    # the smallest odd order that reaches the attenuation
+    attn_p2 = 10. ** (-attenuation / 10.)
+    a = attn_p2 / (1. - attn_p2)
+    order = max(3, int(ceil(log(a * a / 16.) / log(q))))
+    if order % 2 == 0:
+        order += 1
 
-def decimate_multiple(Ndec, bdec, adec, x, zis):
-    '''decimate Ndec times'''
-    x_dec = x
+    coefs = []
+    for c in range(1, (order - 1) // 2 + 1):
+        num = 0.
+        i = 0
+        while True:
+            term = (-1) ** i * q ** (i * (i + 1)) * sin((2 * i + 1) * c * pi / order)
+            num += term
+            i += 1
+            if abs(term) <= 1e-100:
+                break
+
+        den = 0.
+        i = 1
+        while True:
+            term = (-1) ** i * q ** (i * i) * cos(2 * i * c * pi / order)
+            den += term
+            i += 1
+            if abs(term) <= 1e-100:
+                break
+
+        ww = (num * q ** 0.25 / (den + 0.5)) ** 2
+        x = sqrt((1. - ww * k) * (1. - ww / k)) / (1. + ww)
+        coefs += [(1. - x) / (1. + x)]
+
+    return numpy.array(coefs)
+
+
+HALFBAND_COEFS = halfband_coefficients(HALFBAND_ATTENUATION, HALFBAND_TRANSITION)
+
+
+def decimate(x, zi):
+    '''decimate by 2 a 1D signal, or each row of a (channels, samples) array,
+    with the polyphase half-band filter, that only computes the output samples.
+    zi is updated in place and returned, the chunks can have any length'''
+    if x.ndim == 2:
+        return pyx_halfband_decimate(HALFBAND_COEFS, x, zi), zi
+    return pyx_halfband_decimate(HALFBAND_COEFS, x[numpy.newaxis], zi)[0], zi
 
-    # FIXME problems when x is smaller than filter coeff
 
+def decimate_filtic(nchannels=None):
+    '''build a proper array of zero initial conditions to start the half-band decimator'''
+    return numpy.zeros((1 if nchannels is None else nchannels, 2 * len(HALFBAND_COEFS) + 2))
+
+
+def decimate_fir(b, x, zi):
+    '''decimate by 2 a 1D signal, or each row of a (channels, samples) array, with the FIR filter b,
+    only computing the output samples that are kept.
+    zi is updated in place and returned, the chunks can have any length'''
+    if x.ndim == 2:
+        return pyx_fir_decimate(b, x, zi), zi
+    return pyx_fir_decimate(b, x[numpy.newaxis], zi)[0], zi
+
+
+def decimate_fir_filtic(b, nchannels=None):
+    '''build a proper array of zero initial conditions to start the FIR decimator'''
+    return numpy.zeros((1 if nchannels is None else nchannels, len(b)))
+
+
+def decimate_multiple(Ndec, x, zis):
+    '''decimate Ndec times'''
     # do not run on empty arrays, otherwise output contains artifacts
     if x.size == 0:
         return x, zis
 
-    if zis is None:
-        for i in range(Ndec):
-            x_dec, zf = decimate(bdec, adec, x_dec)
-        return x_dec, None
-    else:
-        zfs = []
-        for i, zi in zip(list(range(Ndec)), zis):
-            x_dec, zf = decimate(bdec, adec, x_dec, zi=zi)
-            # zf can be reused to restart the filter
-            zfs += [zf]
-        return x_dec, zfs
+    x_dec = x
+    zfs = []
+    for zi in zis[:Ndec]:
+        x_dec, zf = decimate(x_dec, zi)
+        # zf can be reused to restart the filter
+        zfs += [zf]
+    return x_dec, zfs
 
 
-def decimate_multiple_filtic(Ndec, bdec, adec):
+def decimate_multiple_filtic(Ndec, nchannels=None):
     '''build a proper array of zero initial conditions to start the subsampler'''
-    zfs = []
-    for i in range(Ndec):
-        l = max(len(bdec), len(adec)) - 1
-        zfs += [numpy.zeros(l)]
-    return zfs
+    return [decimate_filtic(nchannels) for i in range(Ndec)]
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""FFT backends: numpy by default, scipy.fft and pyFFTW when installed.
+
+The fastest available backend is selected once, with a quick benchmark
+on transforms of the sizes used by the analysis widgets."""
+
+import logging
+import os
+from collections import OrderedDict
+from time import perf_counter
+
+import numpy
+import numpy.fft
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+
+__backend = None
+
+
+class NumpyFFT:
+    name = "numpy"
+
+    def rfft(self, x, n=None, axis=-1):
+        return numpy.fft.rfft(x, n=n, axis=axis)
+
+    def irfft(self, x, n=None, axis=-1):
+        return numpy.fft.irfft(x, n=n, axis=axis)
+
+    def fft(self, x, n=None, axis=-1):
+        return numpy.fft.fft(x, n=n, axis=axis)
+
+    def ifft(self, x, n=None, axis=-1):
+        return numpy.fft.ifft(x, n=n, axis=axis)
+
+
+class ScipyFFT:
+    '''pocketfft through scipy.fft, multithreaded over the leading axes'''
+
+    name = "scipy.fft"
+
+    def __init__(self, workers=None):
+        self.workers = workers if workers is not None else os.cpu_count()
+
+    def rfft(self, x, n=None, axis=-1):
+        return scipy_fft.rfft(x, n=n, axis=axis, workers=self.workers)
+
+    def irfft(self, x, n=None, axis=-1):
+        return scipy_fft.irfft(x, n=n, axis=axis, workers=self.workers)
+
+    def fft(self, x, n=None, axis=-1):
+        return scipy_fft.fft(x, n=n, axis=axis, workers=self.workers)
+
+    def ifft(self, x, n=None, axis=-1):
+        return scipy_fft.ifft(x, n=n, axis=axis, workers=self.workers)
+
+
+class PyFFTW:
+    '''FFTW through pyFFTW, with plans cached per transform shape.
+
+    Each plan owns aligned input and output arrays. The input is copied into
+    the aligned array on each call, and the output is copied out of it, since
+    it would otherwise be overwritten by the next transform of the same shape.'''
+
+    name = "pyfftw"
+
+    # the number of frames per batch varies, so keep a few plans around
+    max_plans = 32
+
+    def __init__(self, threads=None):
+        self.threads = threads if threads is not None else os.cpu_count()
+        self.plans = OrderedDict()
+
+    def plan(self, builder, x, n, axis):
+        key = (builder, x.shape, x.dtype.str, n, axis)
+
+        plan = self.plans.get(key)
+        if plan is None:
+            # the plans are made on the analysis path, when the batch shape changes,
+            # FFTW_MEASURE would run trial transforms there
+            plan = getattr(pyfftw.builders, builder)(
+                x, n=n, axis=axis, threads=self.threads,
+                planner_effort='FFTW_ESTIMATE')
+            self.plans[key] = plan
+            if len(self.plans) > self.max_plans:
+                self.plans.popitem(last=False)
+        else:
+            self.plans.move_to_end(key)
+
+        return plan
+
+    def execute(self, builder, x, n, axis):
+        x = numpy.asarray(x)
+        return self.plan(builder, x, n, axis)(x).copy()
+
+    def rfft(self, x, n=None, axis=-1):
+        return self.execute('rfft', x, n, axis)
+
+    def irfft(self, x, n=None, axis=-1):
+        return self.execute('irfft', x, n, axis)
+
+    def fft(self, x, n=None, axis=-1):
+        return self.execute('fft', x, n, axis)
+
+    def ifft(self, x, n=None, axis=-1):
+        return self.execute('ifft', x, n, axis)
+
+
+def available_backends():
+    backends = [NumpyFFT()]
+    if scipy_fft is not None:
+        backends.append(ScipyFFT())
+    if pyfftw is not None:
+        backends.append(PyFFTW())
+    return backends
+
+
+def benchmark(backend, repeat=5):
+    '''Return the best time of a few typical transforms: a batch of
+    overlapped frames of a large FFT, and a smaller single FFT.'''
+    batch = numpy.random.rand(1, 4, 32768)
+    single = numpy.random.rand(1, 4096)
+
+    # warm up, so that the plans are created before measuring
+    backend.rfft(batch, axis=-1)
+    backend.rfft(single, axis=-1)
+
+    best = float("inf")
+    for i in range(repeat):
+        t0 = perf_counter()
+        backend.rfft(batch, axis=-1)
+        backend.rfft(single, axis=-1)
+        best = min(best, perf_counter() - t0)
+
+    return best
+
+
+def select_fft_backend(name=None):
+    '''Select the FFT backend, by name, or the fastest one when name is None.'''
+    global __backend
+
+    logger = logging.getLogger(__name__)
+
+    backends = available_backends()
+
+    if name is not None:
+        for backend in backends:
+            if backend.name == name:
+                __backend = backend
+                logger.info("Using the %s FFT backend", backend.name)
+                return __backend
+        logger.warning("FFT backend %s is not available", name)
+
+    timings = []
+    for backend in backends:
+        try:
+            timings.append((benchmark(backend), backend))
+        except Exception:
+            logger.exception("Failed to benchmark the %s FFT backend", backend.name)
+
+    for timing, backend in timings:
+        logger.info("FFT backend %s: %.3f ms", backend.name, timing * 1e3)
+
+    __backend = min(timings, key=lambda item: item[0])[1] if len(timings) > 0 else NumpyFFT()
+
+    logger.info("Using the %s FFT backend", __backend.name)
+
+    return __backend
+
+
+def get_fft_backend():
+    global __backend
+    if __backend is None:
+        # the benchmark is only run when explicitly requested at startup
+        __backend = NumpyFFT()
+    return __backend
+
+
+def rfft(x, n=None, axis=-1):
+    return get_fft_backend().rfft(x, n=n, axis=axis)
+
+
+def irfft(x, n=None, axis=-1):
+    return get_fft_backend().irfft(x, n=n, axis=axis)
+
+
+def fft(x, n=None, axis=-1):
+    return get_fft_backend().fft(x, n=n, axis=axis)
+
+
+def ifft(x, n=None, axis=-1):
+    return get_fft_backend().ifft(x, n=n, axis=axis)
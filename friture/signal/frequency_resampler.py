@@ -34,6 +34,12 @@ class Frequency_Resampler:
         self.nsamples = nsamples
         self.update_xscale()
 
+        # sparse resampling matrix, for the current frequency bins
+        self.table_freq = None
+        self.indptr = np.zeros(1, dtype=np.intp)
+        self.indices = np.zeros(0, dtype=np.intp)
+        self.weights = np.zeros(0)
+
     def setfreqrange(self, minfreq, maxfreq):
         self.logger.info("freq range changed %f %f", minfreq, maxfreq)
         self.minfreq = minfreq
@@ -42,6 +48,7 @@ class Frequency_Resampler:
 
     def update_xscale(self):
         self.xscaled = self.scale.inverse(np.linspace(self.scale.transform(self.minfreq), self.scale.transform(self.maxfreq), self.nsamples))
+        self.table_freq = None
         
     def setnsamples(self, nsamples):
         if self.nsamples != nsamples:
@@ -56,12 +63,62 @@ class Frequency_Resampler:
             self.update_xscale()
 
     def process(self, freq, data):
-        # f = interp1d(freq, data) # construct an interpolant
-        # return f(self.xscaled)
-        # s = UnivariateSpline(freq, data, s=0, k=1) # construct the spline
-        # return s(self.xscaled)
-        # Note : interp1d and UnivariateSpline are both slower than interp
-        # interp is still not optimal because it involved a search whereas
-        # the data is already completely sorted so an running interpolation
-        # could be done faster
-        return np.interp(self.xscaled, freq, data)
+        '''Resample the (freq, ...) data to the nsamples output rows, all the columns at once.'''
+        indptr, indices, weights = self.tables(freq)
+        if self.nsamples == 0:
+            return np.zeros((0,) + data.shape[1:])
+        if data.ndim == 1:
+            return np.add.reduceat(weights * data[indices], indptr[:-1])
+        # one sparse matrix product for the whole block
+        return np.add.reduceat(weights[:, np.newaxis] * data[indices], indptr[:-1], axis=0)
+
+    def tables(self, freq):
+        '''Return the resampling matrix for the given frequency bins, in compressed sparse row format:
+        output row r is the sum of weights[k] * data[indices[k]] for k in indptr[r]:indptr[r + 1].
+
+        Each row averages the bins that fall in its pixel, or interpolates linearly
+        between the two nearest bins, like np.interp, when there are fewer than two.
+        The matrix is computed once for each scale, range, number of samples and frequency bins.'''
+        if self.table_freq is freq:
+            return self.indptr, self.indices, self.weights
+
+        n = self.nsamples
+
+        # linear interpolation, outside of the frequency bins np.interp holds the first and last values
+        bins = np.searchsorted(freq, self.xscaled, side='right') - 1
+        bins = np.clip(bins, 0, len(freq) - 2)
+        fractions = np.clip((self.xscaled - freq[bins]) / (freq[bins + 1] - freq[bins]), 0., 1.)
+
+        # pixel edges, half-way between the rows in the scale coordinates
+        if n > 1:
+            tmin = self.scale.transform(self.minfreq)
+            tmax = self.scale.transform(self.maxfreq)
+            step = (tmax - tmin) / (n - 1)
+            edges = self.scale.inverse(np.linspace(tmin - step / 2., tmax + step / 2., n + 1))
+            first = np.searchsorted(freq, np.minimum(edges[:-1], edges[1:]))
+            last = np.searchsorted(freq, np.maximum(edges[:-1], edges[1:]))
+            averaged = last - first >= 2
+        else:
+            first = last = np.zeros(n, dtype=np.intp)
+            averaged = np.zeros(n, dtype=bool)
+
+        counts = np.where(averaged, last - first, 2)
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(counts, out=indptr[1:])
+
+        # position of each entry in its row
+        rows = np.repeat(np.arange(n), counts)
+        positions = np.arange(indptr[-1]) - indptr[rows]
+
+        entry_averaged = averaged[rows]
+        indices = np.where(entry_averaged, first[rows], bins[rows]) + positions
+        weights = np.where(entry_averaged, 1. / counts[rows], np.where(positions == 0, 1. - fractions[rows], fractions[rows]))
+
+        self.indptr = indptr
+        self.indices = np.ascontiguousarray(indices, dtype=np.intp)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.table_freq = freq
+
+        self.logger.info("Frequency resampling matrix updated, %d rows, %d averaged", n, np.count_nonzero(averaged))
+
+        return self.indptr, self.indices, self.weights
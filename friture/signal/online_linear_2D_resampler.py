@@ -8,7 +8,6 @@ Created on Sat Apr 21 16:12:12 2012
 import numpy as np
 
 from .scipy_resample import resample
-from friture_extensions.linear_interp import pyx_linear_interp_2D
 
 
 class Online_Linear_2D_resampler:
@@ -25,8 +24,6 @@ class Online_Linear_2D_resampler:
 
         self.old_data = np.zeros((self.height))
 
-        self.resampled_data = np.zeros((self.height, 1))
-
     def set_ratio(self, interp_factor_L, decim_factor_M):
         if self.interp_factor_L != interp_factor_L or self.decim_factor_M != decim_factor_M:
             self.interp_factor_L = interp_factor_L
@@ -36,6 +33,12 @@ class Online_Linear_2D_resampler:
             self.orig_index = 0.
             self.resampled_index = 0.
 
+    def reset(self):
+        '''Restart from an empty history.'''
+        self.orig_index = 0.
+        self.resampled_index = 0.
+        self.old_data = np.zeros((self.height))
+
     def set_height(self, height):
         if self.height != height:
             self.height = height
@@ -46,22 +49,51 @@ class Online_Linear_2D_resampler:
             # we resample here instead of just restarting with zeros to avoid black vertical lines
             # in the spectrogram
             self.old_data = resample(self.old_data, self.height)
-            self.resampled_data = resample(self.resampled_data, self.height)  # resample on the first axis
 
     def processable(self, m):
-        return int(np.ceil((self.orig_index + m - (self.resampled_index + self.resampling_ratio)) / self.resampling_ratio))
+        '''Number of output columns for m input columns.'''
+        # stepped column by column, like process and the spectrogram kernel,
+        # so that the float rounding gives exactly the same count
+        orig_index = self.orig_index
+        resampled_index = self.resampled_index
+        count = 0
+        for j in range(m):
+            orig_index += 1.
+            n = int(np.ceil((orig_index - (resampled_index + self.resampling_ratio)) / self.resampling_ratio))
+            for i in range(n):
+                resampled_index += self.resampling_ratio
+            count += max(n, 0)
+        return count
 
     # will return as much resampled data as possible
     def process(self, data):
-        self.orig_index += 1.
-        n = int(np.ceil((self.orig_index - (self.resampled_index + self.resampling_ratio)) / self.resampling_ratio))
-
-        if self.resampled_data.shape[1] < n:
-            self.resampled_data = np.zeros((self.height, n))
-
-        self.resampled_index = pyx_linear_interp_2D(self.resampled_data, data, self.old_data, self.orig_index, self.resampled_index, self.resampling_ratio, n)
+        '''Resample a (height,) column or a (height, m) block of consecutive columns.'''
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+
+        # the output columns, as the input column that they follow
+        # and their interpolation weight towards the previous input column
+        sources = []
+        weights = []
+        for j in range(data.shape[1]):
+            self.orig_index += 1.
+            n = int(np.ceil((self.orig_index - (self.resampled_index + self.resampling_ratio)) / self.resampling_ratio))
+            for i in range(n):
+                self.resampled_index += self.resampling_ratio
+                sources.append(j)
+                weights.append(self.orig_index - self.resampled_index)
+
+        if data.shape[1] == 0:
+            return np.zeros((self.height, 0))
+
+        # each input column is preceded by the previous one, or by the last column of the previous block
+        block = np.hstack((self.old_data[:, np.newaxis], data))
+        sources = np.array(sources, dtype=np.intp)
+        a = np.array(weights)
+
+        resampled_data = (1. - a) * block[:, sources + 1] + a * block[:, sources]
 
         # shift
-        self.old_data = data
+        self.old_data = data[:, -1].copy()
 
-        return self.resampled_data[:, :n]
+        return resampled_data
@@ -20,12 +20,19 @@
 """Spectrogram widget, that displays a rolling 2D image of the time-frequency spectrum."""
 
 from PyQt5 import QtWidgets
-from numpy import log10, floor, zeros, float64, tile, array
+from numpy import array, zeros
 from friture.imageplot import ImagePlot
-from friture.audioproc import audioproc  # audio processing class
+from friture.stft_service import GetSTFTService  # shared FFT computation
+from friture.analysis_processors import STFTProcessor
+from friture.analysis_workers import GetAnalysisWorkerPool
+from friture.spectrogram_archive import GetSpectrogramArchives
 from friture.spectrogram_settings import (Spectrogram_Settings_Dialog,  # settings dialog
                                           DEFAULT_FFT_SIZE,
                                           DEFAULT_FREQ_SCALE,
+                                          DEFAULT_OVERLAP,
+                                          OVERLAPS,
+                                          MAX_AUTOMATIC_OVERLAP,
+                                          MIN_AUTOMATIC_OVERLAP,
                                           DEFAULT_MAXFREQ,
                                           DEFAULT_MINFREQ,
                                           DEFAULT_SPEC_MIN,
@@ -34,61 +41,59 @@ from friture.spectrogram_settings import (Spectrogram_Settings_Dialog,  # settin
                                           DEFAULT_WEIGHTING)
 import friture.plotting.frequency_scales as fscales
 
-from friture.audiobackend import SAMPLING_RATE, FRAMES_PER_BUFFER, AudioBackend
+from friture.audiobackend import FRAMES_PER_BUFFER, AudioBackend
 from fractions import Fraction
 
 
 class Spectrogram_Widget(QtWidgets.QWidget):
 
-    def __init__(self, parent):
+    def __init__(self, parent, engine):
         super().__init__(parent)
 
         self.setObjectName("Spectrogram_Widget")
         self.gridLayout = QtWidgets.QGridLayout(self)
         self.gridLayout.setObjectName("gridLayout")
-        self.PlotZoneImage = ImagePlot(self)
+        self.PlotZoneImage = ImagePlot(self, engine)
         self.PlotZoneImage.setObjectName("PlotZoneImage")
         self.gridLayout.addWidget(self.PlotZoneImage, 0, 1, 1, 1)
 
         self.audiobuffer = None
 
-        # initialize the class instance that will do the fft
-        self.proc = audioproc()
+        # the fft is computed by the shared STFT service, or by a worker process
+        # when the pool is enabled, once the buffer is known
+        self.stft = None
 
         self.maxfreq = DEFAULT_MAXFREQ
-        self.proc.set_maxfreq(self.maxfreq)
         self.minfreq = DEFAULT_MINFREQ
         self.fft_size = 2 ** DEFAULT_FFT_SIZE * 32
-        self.proc.set_fftsize(self.fft_size)
         self.spec_min = DEFAULT_SPEC_MIN
         self.spec_max = DEFAULT_SPEC_MAX
         self.weighting = DEFAULT_WEIGHTING
 
-        self.update_weighting()
-        self.freq = self.proc.get_freq_scale()
+        self.freq = zeros(0)
+        self.freq_weighting = (zeros(0), zeros(0), zeros(0))
+        self.w = array([0.])
 
         self.timerange_s = DEFAULT_TIMERANGE
         self.canvas_width = 100.
 
-        self.old_index = 0
-        self.overlap = 3. / 4.
-        self.overlap_frac = Fraction(3, 4)
-        self.dT_s = self.fft_size * (1. - self.overlap) / float(SAMPLING_RATE)
+        # the hop between the FFT windows is chosen from the overlap in the settings
+        # or, in automatic mode, from the column rate of the screen
+        self.overlap_setting = DEFAULT_OVERLAP
+        self.hop = self.choose_hop()
 
         self.PlotZoneImage.setfreqscale(fscales.Mel) # matches DEFAULT_FREQ_SCALE = 2 # Mel
         self.PlotZoneImage.setfreqrange(self.minfreq, self.maxfreq)
         self.PlotZoneImage.setspecrange(self.spec_min, self.spec_max)
         self.PlotZoneImage.setweighting(self.weighting)
-        self.PlotZoneImage.settimerange(self.timerange_s, self.dT_s)
-        self.update_jitter()
-
-        sfft_rate_frac = Fraction(SAMPLING_RATE, self.fft_size) / (Fraction(1) - self.overlap_frac) / 1000
-        self.PlotZoneImage.set_sfft_rate(sfft_rate_frac)
+        self.update_timing()
 
         # initialize the settings dialog
         self.settings_dialog = Spectrogram_Settings_Dialog(self)
 
         AudioBackend().underflow.connect(self.PlotZoneImage.plotImage.canvasscaledspectrogram.syncOffsets)
+        self.PlotZoneImage.plotImage.canvasscaledspectrogram.canvasWidthChanged.connect(self.canvasWidthChanged)
+        AudioBackend().samplerate_changed.connect(self.samplerate_changed)
 
         self.last_data_time = 0.
 
@@ -97,53 +102,60 @@ class Spectrogram_Widget(QtWidgets.QWidget):
     # method
     def set_buffer(self, buffer):
         self.audiobuffer = buffer
-        self.old_index = self.audiobuffer.ringbuffer.offset
+        self.update_stft()
 
-    def log_spectrogram(self, sp):
-        # Note: implementing the log10 of the array in Cython did not bring
-        # any speedup.
-        # Idea: Instead of computing the log of the data, I could pre-compute
-        # a list of values associated with the colormap, and then do a search...
-        epsilon = 1e-30
-        return 10. * log10(sp + epsilon)
+    def update_stft(self):
+        # release the previous configuration first, so that it can be evicted
+        # if no other dock uses it
+        self.release_stft()
 
-    # scale the db spectrum from [- spec_range db ... 0 db] to [0..1] (do not clip, will be down after resampling)
-    def scale_spectrogram(self, sp):
-        return (sp - self.spec_min) / (self.spec_max - self.spec_min)
+        if self.audiobuffer is None:
+            return
 
-    def handle_new_data(self, floatdata):
-        # we need to maintain an index of where we are in the buffer
-        index = self.audiobuffer.ringbuffer.offset
-        self.last_data_time = self.audiobuffer.lastDataTime
+        hop = self.hop
+        samplerate = AudioBackend().get_samplerate()
 
-        available = index - self.old_index
+        if GetAnalysisWorkerPool().enabled():
+            processor = STFTProcessor((0,), self.fft_size, hop, samplerate)
+            self.stft = GetAnalysisWorkerPool().submit(processor, self.audiobuffer)
+            self.freq = processor.get_freq_scale()
+            self.freq_weighting = processor.get_freq_weighting()
 
-        if available < 0:
-            # ringbuffer must have grown or something...
-            available = 0
-            self.old_index = index
+        if self.stft is None:
+            self.stft = GetSTFTService().subscribe(self.audiobuffer, (0,), self.fft_size, hop, samplerate)
+            self.freq = self.stft.get_freq_scale()
+            self.freq_weighting = self.stft.get_freq_weighting()
+        self.update_weighting()
 
-        # if we have enough data to add a frequency column in the time-frequency plane, compute it
-        needed = self.fft_size * (1. - self.overlap)
-        realizable = int(floor(available / needed))
+    def release_stft(self):
+        if self.stft is not None:
+            self.stft.unsubscribe()
+            self.stft = None
 
-        if realizable > 0:
-            spn = zeros((len(self.freq), realizable), dtype=float64)
+    def closeEvent(self, event):
+        self.release_stft()
+        super().closeEvent(event)
 
-            for i in range(realizable):
-                floatdata = self.audiobuffer.data_indexed(self.old_index, self.fft_size)
+    def handle_new_data(self, floatdata):
+        if self.stft is None:
+            return
 
-                # for now, take the first channel only
-                floatdata = floatdata[0, :]
+        self.last_data_time = self.audiobuffer.lastDataTime
 
-                # FFT transform
-                spn[:, i] = self.proc.analyzelive(floatdata)
+        # power spectra of the new frames, for the first channel only,
+        # shared with the other docks that use the same FFT settings
+        # (None when the worker has not returned new frames yet)
+        spn = self.stft.fetch()
+        realizable = 0 if spn is None else spn.shape[2]
 
-                self.old_index += int(needed)
+        if realizable > 0:
+            # the archive of this dock for the current FFT settings, when the archives are enabled
+            archive = GetSpectrogramArchives().get(self.parent().objectName(), self.freq.shape[0], self.dT_s)
+            self.PlotZoneImage.setarchive(archive)
 
-            w = tile(self.w, (1, realizable))
-            norm_spectrogram = self.scale_spectrogram(self.log_spectrogram(spn) + w)
-            self.PlotZoneImage.addData(self.freq, norm_spectrogram, self.last_data_time)
+            # the dB conversion, weighting and color scaling are done by the image,
+            # together with the resampling to the screen pixels
+            self.PlotZoneImage.addData(self.freq, spn[0], self.w, self.last_data_time)
 
             if self.mustRestart:
                 self.PlotZoneImage.restart()
@@ -163,9 +175,23 @@ class Spectrogram_Widget(QtWidgets.QWidget):
 
         self.PlotZoneImage.draw()
 
+    def update_timing(self):
+        # the duration of a column and the column rate depend on the hop
+        # and the sample rate
+        samplerate = AudioBackend().get_samplerate()
+
+        self.dT_s = self.hop / float(samplerate)
+        self.PlotZoneImage.settimerange(self.timerange_s, self.dT_s)
+
+        sfft_rate_frac = Fraction(samplerate, self.hop) / 1000
+        self.PlotZoneImage.set_sfft_rate(sfft_rate_frac)
+
+        self.update_jitter()
+
     def update_jitter(self):
-        audio_jitter = 2 * float(FRAMES_PER_BUFFER) / SAMPLING_RATE
-        analysis_jitter = self.fft_size * (1. - self.overlap) / SAMPLING_RATE
+        samplerate = AudioBackend().get_samplerate()
+        audio_jitter = 2 * float(FRAMES_PER_BUFFER) / samplerate
+        analysis_jitter = self.hop / samplerate
         canvas_jitter = audio_jitter + analysis_jitter
         # print audio_jitter, analysis_jitter, canvas_jitter
         self.PlotZoneImage.plotImage.set_jitter(canvas_jitter)
@@ -184,24 +210,55 @@ class Spectrogram_Widget(QtWidgets.QWidget):
     def setmaxfreq(self, freq):
         self.maxfreq = freq
         self.PlotZoneImage.setfreqrange(self.minfreq, self.maxfreq)
-        self.proc.set_maxfreq(freq)
-        self.update_weighting()
-        self.freq = self.proc.get_freq_scale()
 
     def setfftsize(self, fft_size):
         self.fft_size = fft_size
+        self.update_analysis()
+
+    def setoverlap(self, index):
+        self.overlap_setting = index
+        self.update_analysis()
+
+    def choose_hop(self):
+        if self.overlap_setting > 0:
+            return int(self.fft_size * (1 - OVERLAPS[self.overlap_setting - 1]))
+
+        min_hop = int(self.fft_size * (1 - MAX_AUTOMATIC_OVERLAP))
+        max_hop = int(self.fft_size * (1 - MIN_AUTOMATIC_OVERLAP))
+
+        # the archived columns must keep the same duration,
+        # the archive itself reduces them for the long time ranges
+        if GetSpectrogramArchives().enabled():
+            return min_hop
+
+        # the largest power of 2 that computes at least one column per pixel,
+        # the canvas also shows the jitter margin. The windows keep overlapping
+        # so that every sample is analysed, the time resampling of the image
+        # reduces the extra columns of the long time ranges
+        samplerate = AudioBackend().get_samplerate()
+        pixel_rate = self.canvas_width / (self.timerange_s + self.PlotZoneImage.plotImage.jitter_s)
+        hop = min_hop
+        while 2 * hop <= max_hop and samplerate / (2 * hop) >= pixel_rate:
+            hop *= 2
+        return hop
+
+    def update_analysis(self):
+        # the hop depends on the FFT size and the overlap
+        self.hop = self.choose_hop()
+
+        self.update_stft()
+        self.update_timing()
+
+    def update_hop(self):
+        # only restart the analysis when the automatic hop changes
+        if self.choose_hop() != self.hop:
+            self.update_analysis()
 
-        self.proc.set_fftsize(fft_size)
-        self.update_weighting()
-        self.freq = self.proc.get_freq_scale()
-
-        self.dT_s = self.fft_size * (1. - self.overlap) / float(SAMPLING_RATE)
-        self.PlotZoneImage.settimerange(self.timerange_s, self.dT_s)
-
-        sfft_rate_frac = Fraction(SAMPLING_RATE, self.fft_size) / (Fraction(1) - self.overlap_frac) / 1000
-        self.PlotZoneImage.set_sfft_rate(sfft_rate_frac)
-
-        self.update_jitter()
+    # slot
+    def samplerate_changed(self, samplerate):
+        # the frequency scale, the weighting and the column timing depend on the sample rate
+        self.update_analysis()
+        self.settings_dialog.set_samplerate(samplerate)
 
     def setmin(self, value):
         self.spec_min = value
@@ -217,16 +274,20 @@ class Spectrogram_Widget(QtWidgets.QWidget):
         self.update_weighting()
 
     def update_weighting(self):
-        A, B, C = self.proc.get_freq_weighting()
+        if self.stft is None:
+            return
+
+        A, B, C = self.freq_weighting
         if self.weighting == 0:
-            self.w = array([0.])
+            w = array([0.])
         elif self.weighting == 1:
-            self.w = A
+            w = A
         elif self.weighting == 2:
-            self.w = B
+            w = B
         else:
-            self.w = C
-        self.w.shape = (len(self.w), 1)
+            w = C
+        # the weighting arrays are shared with the other docks, they are not modified
+        self.w = w
 
     def settings_called(self, checked):
         self.settings_dialog.show()
@@ -241,7 +302,9 @@ class Spectrogram_Widget(QtWidgets.QWidget):
     def timerangechanged(self, value):
         self.timerange_s = value
         self.PlotZoneImage.settimerange(self.timerange_s, self.dT_s)
+        self.update_hop()
 
     # slot
     def canvasWidthChanged(self, width):
         self.canvas_width = width
+        self.update_hop()
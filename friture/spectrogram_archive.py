@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Disk-backed archive of the spectrogram columns, for hours of scrollback.
+
+The archive is a pyramid of levels. Level 0 holds the STFT columns as float16 dB,
+each following level holds one column for `factor` columns of the previous one,
+as two planes: their maximum and their mean (computed on the powers). Each level
+is a ring in its own memory-mapped file, so that the total size is bounded, and
+the coarse levels go back much further than the full-resolution one.
+
+The columns are read by tiles, that are kept in a bounded LRU cache, so that a
+zoomed-out view only reads the few tiles of a coarse level.
+
+The headers record the number of columns written to each level, so that the
+archive survives a restart of the application. The gaps between the sessions
+are not represented.
+
+The byte budget is shared by the archives of all the docks: when an archive is
+opened, the rings of the others shrink, keeping their latest columns."""
+
+import glob
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+MAGIC = b"FRTSPEC1"
+
+HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                         ('nbins', '<u4'),
+                         ('planes', '<u4'),
+                         ('capacity', '<i8'),
+                         ('written', '<i8'),
+                         ('period', '<f8'),
+                         ('padding', 'S24')])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+COLUMN_DTYPE = np.dtype('<f2')
+
+# planes of the reduced levels, level 0 only has one
+MAXIMUM = 0
+MEAN = 1
+
+DEFAULT_ARCHIVE_BYTES = 1024 ** 3
+# with a factor of 4, the coarsest level has one column for 4096 STFT columns
+DEFAULT_LEVELS = 7
+DEFAULT_FACTOR = 4
+# columns read at once from the files, and memory of the tiles kept in the cache
+DEFAULT_TILE_COLUMNS = 256
+DEFAULT_CACHE_BYTES = 32 * 1024 ** 2
+
+EPSILON = 1e-30
+
+
+class ArchiveLevel:
+    '''Ring of (planes, capacity, nbins) float16 dB columns in a memory-mapped file.'''
+
+    def __init__(self, path, nbins, planes, capacity, period):
+        self.logger = logging.getLogger(__name__)
+
+        self.path = path
+        self.nbins = nbins
+        self.planes = planes
+        self.capacity = capacity
+        self.period = period
+
+        written = 0
+        if os.path.exists(path):
+            try:
+                written, self.capacity = self.read_header()
+            except (OSError, ValueError) as error:
+                self.logger.warning("Replacing the spectrogram archive: %s", error)
+
+        if written == 0:
+            self.capacity = capacity
+            self.create()
+
+        self.open()
+
+        self.written = written
+
+        # columns of the previous level that are not reduced yet
+        self.pending_maxima = np.zeros((0, nbins), dtype=np.float32)
+        self.pending_powers = np.zeros((0, nbins))
+
+        # the file of a previous session may have another share of the budget
+        self.resize(capacity)
+
+    def read_header(self):
+        '''Return the number of columns written and the capacity of the file.'''
+        with open(self.path, 'rb') as f:
+            header = np.frombuffer(f.read(HEADER_SIZE), dtype=HEADER_DTYPE)
+        if header.shape[0] != 1 or header[0]['magic'] != MAGIC:
+            raise ValueError("Not a Friture spectrogram archive: %s" % (self.path))
+
+        header = header[0]
+        if (int(header['nbins']), int(header['planes'])) != (self.nbins, self.planes) or not np.isclose(header['period'], self.period):
+            raise ValueError("The spectrogram archive %s has other settings" % (self.path))
+
+        return int(header['written']), int(header['capacity'])
+
+    def open(self):
+        self.header = np.memmap(self.path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        # nothing is read before it is accessed
+        self.data = np.memmap(self.path, dtype=COLUMN_DTYPE, mode='r+', offset=HEADER_SIZE,
+                              shape=(self.planes, self.capacity, self.nbins))
+
+    def create(self):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['nbins'] = self.nbins
+        header['planes'] = self.planes
+        header['capacity'] = self.capacity
+        header['period'] = self.period
+
+        with open(self.path, 'wb') as f:
+            f.write(header.tobytes())
+            # sparse where supported, the disk space is used as the archive fills
+            f.truncate(self.file_size(self.capacity))
+
+    def file_size(self, capacity):
+        return HEADER_SIZE + self.planes * capacity * self.nbins * COLUMN_DTYPE.itemsize
+
+    def resize(self, capacity):
+        '''Change the capacity of the ring, keeping the latest columns.'''
+        if capacity == self.capacity:
+            return
+
+        self.close()
+
+        if self.written <= min(capacity, self.capacity):
+            # the ring has not wrapped, the columns stay in place
+            del self.header, self.data
+            with open(self.path, 'r+b') as f:
+                f.truncate(self.file_size(capacity))
+            self.capacity = capacity
+            self.open()
+            self.header['capacity'] = capacity
+            return
+
+        # the latest columns are copied, by tiles, to a new ring
+        path = self.path + ".tmp"
+        if os.path.exists(path):
+            os.remove(path)
+        resized = ArchiveLevel(path, self.nbins, self.planes, capacity, self.period)
+
+        start = max(self.first(), self.written - capacity)
+        resized.written = start
+        for a in range(start, self.written, DEFAULT_TILE_COLUMNS):
+            b = min(a + DEFAULT_TILE_COLUMNS, self.written)
+            for plane in range(self.planes):
+                resized.append(plane, self.read(plane, a, b))
+            resized.commit(b - a)
+
+        resized.close()
+        del resized.header, resized.data, self.header, self.data
+        os.replace(path, self.path)
+
+        self.capacity = capacity
+        self.open()
+
+    def first(self):
+        '''Oldest column that is still in the ring.'''
+        return max(0, self.written - self.capacity)
+
+    def append(self, plane, columns):
+        '''Write (m, nbins) columns to a plane, the written count is advanced by commit.'''
+        # only the last columns fit when there are more than the ring can hold
+        skipped = max(0, columns.shape[0] - self.capacity)
+        columns = columns[skipped:]
+        count = columns.shape[0]
+
+        start = (self.written + skipped) % self.capacity
+        direct = min(count, self.capacity - start)
+        self.data[plane, start:start + direct] = columns[:direct]
+        self.data[plane, :count - direct] = columns[direct:]
+
+    def commit(self, count):
+        self.written += count
+        # the count is updated after the columns, a crash loses at most one batch
+        self.header['written'] = self.written
+
+    def reset(self):
+        self.written = 0
+        self.header['written'] = 0
+        self.pending_maxima = self.pending_maxima[:0]
+        self.pending_powers = self.pending_powers[:0]
+
+    def read(self, plane, start, stop):
+        '''Return the (stop - start, nbins) columns of a plane, from the file.'''
+        index = start % self.capacity
+        if index + stop - start <= self.capacity:
+            return np.array(self.data[plane, index:index + stop - start])
+        return np.concatenate((self.data[plane, index:], self.data[plane, :stop - start - (self.capacity - index)]))
+
+    def close(self):
+        self.header.flush()
+        self.data.flush()
+
+
+class SpectrogramArchive:
+    '''Pyramid of archived spectrogram columns, see the module documentation.'''
+
+    def __init__(self, directory, name, nbins, period, max_bytes=DEFAULT_ARCHIVE_BYTES, levels=DEFAULT_LEVELS,
+                 factor=DEFAULT_FACTOR, tile_columns=DEFAULT_TILE_COLUMNS, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.logger = logging.getLogger(__name__)
+
+        self.nbins = nbins
+        self.period = period
+        self.factor = factor
+        self.tile_columns = tile_columns
+        self.cache_bytes = cache_bytes
+
+        os.makedirs(directory, exist_ok=True)
+
+        # the files are keyed on the FFT size and the column period (in microseconds),
+        # the ones of the other settings are removed, to keep the total size bounded
+        prefix = os.path.join(directory, name)
+        key = "%s-%dbins-%dus" % (prefix, nbins, round(period * 1e6))
+        for path in glob.glob(glob.escape(prefix) + "-*bins-*level*.frsa"):
+            if not path.startswith(key + "-"):
+                self.logger.warning("Removing the spectrogram archive %s, of other FFT settings", path)
+                os.remove(path)
+
+        self.levels = []
+        for i, capacity in enumerate(self.capacities(max_bytes, levels)):
+            planes = 1 if i == 0 else 2
+            path = "%s-level%d.frsa" % (key, i)
+            self.levels.append(ArchiveLevel(path, nbins, planes, capacity, period * factor ** i))
+
+        self.resume()
+
+        # (level, plane, tile) -> (tile_columns, nbins) float16 columns, the most recent at the end
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+
+        self.logger.info("Spectrogram archive of %d columns (%.1f h at full resolution, %.1f h in total) in %s",
+                         self.count(), self.levels[0].capacity * period / 3600.,
+                         self.levels[-1].capacity * self.levels[-1].period / 3600., directory)
+
+    def capacities(self, max_bytes, levels):
+        # the budget is split equally between the levels,
+        # the rings are made of whole tiles
+        level_bytes = max_bytes // levels
+        capacities = []
+        for i in range(levels):
+            planes = 1 if i == 0 else 2
+            capacity = level_bytes // (planes * self.nbins * COLUMN_DTYPE.itemsize)
+            capacities.append(max(1, capacity // self.tile_columns) * self.tile_columns)
+        return capacities
+
+    def resize(self, max_bytes):
+        '''Change the size of the archive, keeping the latest columns of each level.'''
+        for level, capacity in zip(self.levels, self.capacities(max_bytes, len(self.levels))):
+            level.resize(capacity)
+
+        # the tiles that are no longer in the rings must not be served
+        self.cache.clear()
+        self.cached_bytes = 0
+
+    def resume(self):
+        # the columns that were not reduced when the archive was closed are read back from the previous levels
+        for previous, level in zip(self.levels[:-1], self.levels[1:]):
+            start = level.written * self.factor
+            if not (start <= previous.written < start + self.factor and start >= previous.first()):
+                self.logger.warning("The spectrogram archive is inconsistent, restarting it")
+                for archived in self.levels:
+                    archived.reset()
+                return
+
+            maxima = previous.read(MAXIMUM, start, previous.written).astype(np.float32)
+            means = previous.read(min(MEAN, previous.planes - 1), start, previous.written).astype(np.float64)
+            level.pending_maxima = maxima
+            level.pending_powers = 10. ** (means / 10.)
+
+    def count(self):
+        '''Number of STFT columns written.'''
+        return self.levels[0].written
+
+    def push(self, power):
+        '''Archive the (freq, frames) power spectra.'''
+        if power.shape[0] != self.nbins:
+            raise ValueError("The archive has %d bins, got %d" % (self.nbins, power.shape[0]))
+
+        powers = power.T
+        maxima = (10. * np.log10(powers + EPSILON)).astype(np.float32)
+
+        self.levels[0].append(0, maxima)
+        self.levels[0].commit(maxima.shape[0])
+
+        for level in self.levels[1:]:
+            maxima = np.concatenate((level.pending_maxima, maxima))
+            powers = np.concatenate((level.pending_powers, powers))
+
+            groups = maxima.shape[0] // self.factor
+            used = groups * self.factor
+            level.pending_maxima = maxima[used:]
+            level.pending_powers = powers[used:]
+
+            if groups == 0:
+                break
+
+            maxima = maxima[:used].reshape(groups, self.factor, self.nbins).max(axis=1)
+            powers = powers[:used].reshape(groups, self.factor, self.nbins).mean(axis=1)
+
+            level.append(MAXIMUM, maxima)
+            level.append(MEAN, 10. * np.log10(powers + EPSILON))
+            level.commit(groups)
+
+    def choose_level(self, columns, max_columns):
+        '''Finest level that has at most `max_columns` columns for the latest `columns` STFT columns.'''
+        for i in range(len(self.levels)):
+            if columns <= max_columns * self.factor ** i:
+                return i
+        return len(self.levels) - 1
+
+    def read(self, columns, max_columns, plane=MAXIMUM):
+        '''Return the latest `columns` STFT columns, as a list of (factor, (nbins, n) float32 dB) segments,
+        from the oldest to the latest.
+
+        The oldest columns are read from the finest level that has at most `max_columns` columns
+        for them, the latest ones, that are not reduced yet, from the finer levels.'''
+        i = self.choose_level(columns, max_columns)
+        first = self.count() - columns
+
+        segments = []
+        for i in range(i, -1, -1):
+            level = self.levels[i]
+            factor = self.factor ** i
+            start = max(first // factor, level.first())
+            if i > 0:
+                # the following columns are read from the finer levels
+                first = max(first, level.written * factor)
+            if start < level.written:
+                segments.append((factor, self.read_columns(i, min(plane, level.planes - 1), start, level.written).T))
+
+        return segments
+
+    def read_columns(self, i, plane, start, stop):
+        level = self.levels[i]
+        pieces = []
+        for tile in range(start // self.tile_columns, (stop - 1) // self.tile_columns + 1):
+            tile_start = tile * self.tile_columns
+            tile_stop = tile_start + self.tile_columns
+            a = max(start, tile_start)
+            b = min(stop, tile_stop)
+
+            if tile_stop <= level.written and tile_start >= level.first():
+                # complete tiles do not change until they are overwritten, they are cached
+                pieces.append(self.tile(i, plane, tile)[a - tile_start:b - tile_start])
+            else:
+                pieces.append(level.read(plane, a, b))
+
+        return np.concatenate(pieces).astype(np.float32)
+
+    def tile(self, i, plane, tile):
+        key = (i, plane, tile)
+        columns = self.cache.get(key)
+        if columns is not None:
+            self.cache.move_to_end(key)
+            return columns
+
+        start = tile * self.tile_columns
+        columns = self.levels[i].read(plane, start, start + self.tile_columns)
+
+        self.cache[key] = columns
+        self.cached_bytes += columns.nbytes
+
+        # evict the least recently used tiles
+        while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+            key, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted.nbytes
+
+        return columns
+
+    def close(self):
+        for level in self.levels:
+            level.close()
+        self.cache.clear()
+        self.cached_bytes = 0
+
+
+class SpectrogramArchives:
+    '''Archives of the spectrogram docks, enabled by set_directory.
+    The byte budget is split equally between the archives.'''
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+        self.directory = None
+        self.max_bytes = DEFAULT_ARCHIVE_BYTES
+        self.archives = {}
+
+    def set_directory(self, directory, max_bytes=DEFAULT_ARCHIVE_BYTES):
+        self.close()
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def enabled(self):
+        return self.directory is not None
+
+    def get(self, name, nbins, period):
+        '''Return the archive of a dock for the given FFT settings, or None when the archives are disabled.'''
+        if self.directory is None:
+            return None
+
+        archive = self.archives.get(name)
+        if archive is not None and archive.nbins == nbins and np.isclose(archive.period, period):
+            return archive
+
+        if archive is not None:
+            archive.close()
+            del self.archives[name]
+
+        # a file name for the dock name
+        filename = "".join(c if c.isalnum() else "_" for c in name).lower()
+
+        max_bytes = self.max_bytes // (len(self.archives) + 1)
+
+        try:
+            # the other archives make room for the new one
+            for other in self.archives.values():
+                other.resize(max_bytes)
+            archive = SpectrogramArchive(self.directory, filename, nbins, period, max_bytes)
+        except OSError:
+            self.logger.exception("Failed to open the spectrogram archive in %s", self.directory)
+            self.close()
+            self.directory = None
+            return None
+
+        self.archives[name] = archive
+        return archive
+
+    def close(self):
+        for archive in self.archives.values():
+            archive.close()
+        self.archives = {}
+
+
+__spectrogramArchivesInstance = None
+
+
+def GetSpectrogramArchives():
+    global __spectrogramArchivesInstance
+    if __spectrogramArchivesInstance is None:
+        __spectrogramArchivesInstance = SpectrogramArchives()
+    return __spectrogramArchivesInstance
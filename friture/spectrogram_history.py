@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+import numpy as np
+
+# float16 holds the dB values down to the epsilon with a resolution
+# better than 0.25 dB, finer than the steps of the colormap
+HISTORY_DTYPE = np.float16
+
+# upper bound on the number of stored values (64 MB), for the longest time ranges
+# the latest columns only can be rendered again
+MAX_HISTORY_VALUES = 2 ** 25
+
+
+class SpectrogramHistory:
+    '''Ring of the last STFT columns of the spectrogram, as unweighted float16 dB,
+    so that the image can be rendered again when the display settings change.'''
+
+    def __init__(self, capacity=1):
+        self.logger = logging.getLogger(__name__)
+
+        # one row per column, so that each column is written contiguously
+        self.requested_capacity = capacity
+        self.columns = np.zeros((capacity, 0), dtype=HISTORY_DTYPE)
+        self.offset = 0
+        self.count = 0
+
+    def bounded_capacity(self, nbins):
+        return max(1, min(self.requested_capacity, MAX_HISTORY_VALUES // max(nbins, 1)))
+
+    def capacity(self):
+        return self.columns.shape[0]
+
+    def nbins(self):
+        return self.columns.shape[1]
+
+    def set_capacity(self, capacity):
+        self.requested_capacity = max(1, int(capacity))
+        capacity = self.bounded_capacity(self.nbins())
+        if capacity == self.capacity():
+            return
+
+        # keep the latest columns
+        kept = self.latest(min(self.count, capacity))
+        self.columns = np.zeros((capacity, self.nbins()), dtype=HISTORY_DTYPE)
+        self.columns[:kept.shape[0]] = kept
+        self.offset = kept.shape[0]
+        self.count = kept.shape[0]
+
+        self.logger.info("Spectrogram history: %d columns", capacity)
+
+    def clear(self, nbins=None):
+        if nbins is None:
+            nbins = self.nbins()
+        self.columns = np.zeros((self.bounded_capacity(nbins), nbins), dtype=HISTORY_DTYPE)
+        self.offset = 0
+        self.count = 0
+
+    def push(self, power):
+        '''Store the (freq, frames) power spectra.'''
+        if power.shape[0] != self.nbins():
+            # the FFT size has changed, the previous columns cannot be rendered with the new bins
+            self.clear(power.shape[0])
+
+        capacity = self.capacity()
+        db = 10. * np.log10(power[:, -capacity:].T + 1e-30)
+
+        start = self.offset % capacity
+        direct = min(db.shape[0], capacity - start)
+        self.columns[start:start + direct] = db[:direct]
+        self.columns[:db.shape[0] - direct] = db[direct:]
+
+        self.offset += db.shape[0]
+        self.count = min(self.count + db.shape[0], capacity)
+
+    def latest(self, count):
+        start = (self.offset - count) % self.capacity()
+        stop = start + count
+        if stop <= self.capacity():
+            return self.columns[start:stop]
+        return np.concatenate((self.columns[start:], self.columns[:stop - self.capacity()]))
+
+    def data(self):
+        '''Return the stored columns as (freq, count) float32 dB, from the oldest to the latest.'''
+        return self.latest(self.count).astype(np.float32).T
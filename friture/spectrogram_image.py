@@ -22,11 +22,17 @@ import logging
 import numpy
 from PyQt5 import QtCore, QtGui
 from friture.plotting import generated_cmrmap
-from friture_extensions.lookup_table import pyx_color_from_float_2D
 
 
 class CanvasScaledSpectrogram(QtCore.QObject):
+    '''Ring of the RGB32 colors of the spectrogram columns, displayed by a SpectrogramItem.'''
+
     canvasWidthChanged = QtCore.pyqtSignal(int)
+    # start and number of the columns written in the ring
+    columnsAdded = QtCore.pyqtSignal(int, int)
+    # the ring was erased or resized
+    ringChanged = QtCore.pyqtSignal()
+    displayOffsetChanged = QtCore.pyqtSignal()
 
     def __init__(self, canvas_height=2, canvas_width=2):
         super().__init__()
@@ -36,13 +42,17 @@ class CanvasScaledSpectrogram(QtCore.QObject):
         self.canvas_height = canvas_height
         self.canvas_width = canvas_width
 
-        self.pixmap = QtGui.QPixmap(2 * self.canvas_width, self.canvas_height)
-        # print("pixmap info : hasAlpha =", self.pixmap.hasAlpha(), ", depth =", self.pixmap.depth(), ", default depth =", self.pixmap.defaultDepth())
-        self.pixmap.fill(QtGui.QColor("black"))
-        self.painter = QtGui.QPainter()
+        self.black = QtGui.QColor("black").rgb()
+        self.ring = numpy.full((self.canvas_height, self.canvas_width), self.black, dtype=numpy.uint32)
         self.offset = 0
         self.time_offset = 0
 
+        # first visible column of the ring, drawn twice side by side
+        self.display_offset = 0.
+
+        # pixels of the new columns, reused from one batch to the next
+        self.pixels = numpy.zeros((0, 0), dtype=numpy.uint32)
+
         # prepare a custom colormap
         self.prepare_palette()
 
@@ -54,19 +64,24 @@ class CanvasScaledSpectrogram(QtCore.QObject):
         self.resetBound = 20
 
     def erase(self):
-        self.pixmap = QtGui.QPixmap(2 * self.canvas_width, self.canvas_height)
-        self.pixmap.fill(QtGui.QColor("black"))
+        self.ring = numpy.full((self.canvas_height, self.canvas_width), self.black, dtype=numpy.uint32)
         self.offset = 0
         self.time_offset = 0
+        self.ringChanged.emit()
 
-    # resize the pixmap and update the offsets accordingly
+    # resize the ring and update the offsets accordingly
     def resize(self, width, height):
-        oldWidth = int(self.pixmap.width() / 2)
+        oldHeight, oldWidth = self.ring.shape
         if width != oldWidth:
             self.offset = (self.offset % oldWidth) * width / oldWidth
-            self.offset = self.offset % width  # to handle negative values
+            self.offset = int(self.offset % width)  # to handle negative values
             self.time_offset = (self.time_offset % oldWidth) * width / oldWidth
-        self.pixmap = self.pixmap.scaled(2 * width, height, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+
+        # nearest-neighbour rescaling of the existing columns
+        rows = (numpy.arange(height) * oldHeight) // height
+        columns = (numpy.arange(width) * oldWidth) // width
+        self.ring = numpy.ascontiguousarray(self.ring[rows][:, columns])
+        self.ringChanged.emit()
 
     def setcanvas_height(self, canvas_height):
         if self.canvas_height != int(canvas_height):
@@ -88,57 +103,41 @@ class CanvasScaledSpectrogram(QtCore.QObject):
         alpha = 0.98
         self.time_offset = alpha * self.time_offset + (1. - alpha) * self.offset
 
-    def addData(self, xyzs):
-        # revert the frequency axis so that the larger frequencies
-        # are at the top of the widget
-        xyzs = xyzs[::-1, :]
-
-        width = xyzs.shape[1]
+    def column_image(self, width, height):
+        '''Return a (height, columns) uint32 array with at least `width` columns,
+        to be filled with RGB32 colors before calling addColumns.'''
+        if self.pixels.shape[0] != height or self.pixels.shape[1] < width:
+            self.pixels = numpy.zeros((height, max(width, self.pixels.shape[1], 1)), dtype=numpy.uint32)
 
-        # convert the data to colors, and then to a data string
-        # that QImage can understand
-        byteString = self.floats_to_bytes(xyzs)
+        return self.pixels
 
-        myimage = self.prepare_image(byteString, width, xyzs.shape[0])
+    def addColumns(self, width):
+        # copy the first columns of the pixels to the ring, only they will be uploaded for display
+        columns = self.pixels[:, :width]
 
-        # Now, draw the image onto the widget pixmap, which has
-        # the structure of a 2D ringbuffer
+        height, ring_width = self.ring.shape
+        if columns.shape[0] != height:
+            # the canvas was resized before the columns were computed
+            columns = columns[(numpy.arange(height) * columns.shape[0]) // height]
 
-        offset = self.offset % self.canvas_width
+        # only the last columns are visible when there are more than the ring can hold
+        skipped = max(0, width - ring_width)
+        columns = columns[:, skipped:]
+        count = columns.shape[1]
 
-        # first copy, always complete
-        source1 = QtCore.QRectF(0, 0, width, xyzs.shape[0])
-        target1 = QtCore.QRectF(offset, 0, width, xyzs.shape[0])
-        # second copy, can be folded
-        direct = min(width, self.canvas_width - offset)
-        folded = width - direct
-        source2a = QtCore.QRectF(0, 0, direct, xyzs.shape[0])
-        target2a = QtCore.QRectF(offset + self.canvas_width, 0, direct, xyzs.shape[0])
-        source2b = QtCore.QRectF(direct, 0, folded, xyzs.shape[0])
-        target2b = QtCore.QRectF(0, 0, folded, xyzs.shape[0])
-
-        self.painter.begin(self.pixmap)
-        self.painter.drawImage(target1, myimage, source1)
-        self.painter.drawImage(target2a, myimage, source2a)
-        self.painter.drawImage(target2b, myimage, source2b)
-        self.painter.end()
+        start = (self.offset + skipped) % ring_width
+        direct = min(count, ring_width - start)
+        self.ring[:, start:start + direct] = columns[:, :direct]
+        self.ring[:, :count - direct] = columns[:, direct:]
 
         # updating the offset
         self.offset += width
 
-    def floats_to_bytes(self, data):
-        # dat1 = (255. * data).astype(numpy.uint8)
-        # dat4 = dat1.repeat(4)
-
-        dat4 = self.color_from_float(data)
-        return dat4.tostring()
+        self.columnsAdded.emit(start, count)
 
-    # defined as a separate function so that it appears in the profiler
-    # NOTE: QImage with a colormap is slower (by a factor of 2) than the custom
-    # colormap code here.
-    def prepare_image(self, byteString, width, height):
-        myimage = QtGui.QImage(byteString, width, height, QtGui.QImage.Format_RGB32)
-        return myimage
+    def setdisplayoffset(self, display_offset):
+        self.display_offset = display_offset
+        self.displayOffsetChanged.emit()
 
     def prepare_palette(self):
         self.logger.info("palette preparation")
@@ -152,13 +151,6 @@ class CanvasScaledSpectrogram(QtCore.QObject):
                                           int(cmap[i, 1] * 255),
                                           int(cmap[i, 2] * 255)).rgb()
 
-    def color_from_float(self, v):
-        # clip in [0..1] before using the fast lookup function
-        v = numpy.clip(v, 0., 1.)
-        return pyx_color_from_float_2D(self.colors, v)
-        # d = (v*255).astype(numpy.uint8)
-        # return self.colors[d]
-
     # def interpolate_colors(colors, flat=False, num_colors=256):
         # colors =
         # """ given a list of colors, create a larger list of colors interpolating
@@ -189,10 +181,7 @@ class CanvasScaledSpectrogram(QtCore.QObject):
 
         # return palette
 
-    def getpixmap(self):
-        return self.pixmap
-
-    def getpixmapoffset(self, delay=0):
+    def getoffset(self, delay=0):
         return self.offset % self.canvas_width
 
     # this is used when there is an underflow in the audio input
@@ -200,8 +189,8 @@ class CanvasScaledSpectrogram(QtCore.QObject):
         self.time_offset = self.offset
 
 # plan :
-# 1. quickly convert each piece of data to a pixmap, with the right pixel size
-# as QImage to QPixmap conversion is slow, and scaling is slow too
-# 2. use a cache of size M=2*N
-# 3. write in the cache at the position j and j+N
-# 4. the data part that is to be drawn can be read contiguously from j+1 to j+1+N
+# 1. convert each batch of data to colors, with the right pixel size
+# 2. write the colors in a ring of N columns, at the position j
+# 3. the ring is drawn twice side by side by the scene graph, and the part
+# that is visible starts at j+1, so it is contiguous from j+1 to j+1+N
+# 4. only the textures of the columns that changed are uploaded again
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from PyQt5 import sip
+from PyQt5.QtCore import pyqtSignal, pyqtProperty, QRectF
+from PyQt5.QtGui import QImage, QMatrix4x4, QOpenGLContext, QOpenGLVersionProfile
+from PyQt5.QtQuick import QQuickItem, QSGRendererInterface, QSGSimpleTextureNode, QSGTexture, QSGTransformNode
+
+from friture.spectrogram_image import CanvasScaledSpectrogram
+
+# the ring of columns is drawn with textures of this width, that are updated in place
+# with the new columns. Each texture has one more column on each side, copied from the
+# neighbouring tiles, so that the linear filtering does not show seams between them
+TILE_WIDTH = 64
+
+GL_TEXTURE_2D = 0x0DE1
+GL_RGBA = 0x1908
+GL_UNSIGNED_BYTE = 0x1401
+
+
+class SpectrogramItem(QQuickItem):
+    '''Scene-graph view of the ring of colors of a CanvasScaledSpectrogram.
+
+    The ring is drawn twice side by side, one column per unit of the item,
+    and scrolled by translating the textures, without repainting them.'''
+
+    spectrogramChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setFlag(QQuickItem.ItemHasContents, True)
+
+        self._spectrogram = None
+
+        # columns to upload at the next update, and whether the node tree must be rebuilt
+        self.dirty_columns = set()
+        self.rebuild = True
+
+        # one texture per tile, shared by the two copies of the ring
+        self.textures = []
+        self.nodes = []
+
+        # OpenGL functions of the render thread, None to upload whole tiles instead
+        self.gl = None
+
+    @pyqtProperty(CanvasScaledSpectrogram, notify=spectrogramChanged)
+    def spectrogram(self):
+        return self._spectrogram
+
+    @spectrogram.setter
+    def spectrogram(self, spectrogram):
+        if spectrogram != self._spectrogram:
+            if self._spectrogram is not None:
+                self._spectrogram.columnsAdded.disconnect(self.columns_added)
+                self._spectrogram.ringChanged.disconnect(self.ring_changed)
+                self._spectrogram.displayOffsetChanged.disconnect(self.update)
+
+            self._spectrogram = spectrogram
+
+            if self._spectrogram is not None:
+                self._spectrogram.columnsAdded.connect(self.columns_added)
+                self._spectrogram.ringChanged.connect(self.ring_changed)
+                self._spectrogram.displayOffsetChanged.connect(self.update)
+
+            self.ring_changed()
+            self.spectrogramChanged.emit()
+
+    # slot
+    def columns_added(self, start, count):
+        width = self._spectrogram.ring.shape[1]
+        columns = np.arange(start, start + min(count, width)) % width
+        self.dirty_columns.update(columns.tolist())
+        self.update()
+
+    # slot
+    def ring_changed(self):
+        self.rebuild = True
+        self.update()
+
+    def updatePaintNode(self, root, update_data):
+        if root is None:
+            # new scene graph, the previous nodes and textures were released with it
+            root = QSGTransformNode()
+            self.nodes = []
+            self.textures = []
+            self.gl = self.gl_functions()
+            self.rebuild = True
+
+        if self._spectrogram is None:
+            return root
+
+        ring = self._spectrogram.ring
+        height, width = ring.shape
+
+        if self.rebuild:
+            self.rebuild = False
+            self.dirty_columns.clear()
+            self.build_nodes(root, ring)
+
+        if len(self.dirty_columns) > 0:
+            dirty = np.fromiter(self.dirty_columns, dtype=int)
+            for tile in range(len(self.textures)):
+                self.update_tile(ring, tile, dirty)
+            self.dirty_columns.clear()
+
+        # the visible part of the ring starts at the display offset, in columns
+        matrix = QMatrix4x4()
+        matrix.translate(-self._spectrogram.display_offset, 0.)
+        matrix.scale(1., self.height() / max(height, 1))
+        root.setMatrix(matrix)
+
+        return root
+
+    def build_nodes(self, root, ring):
+        for node in self.nodes:
+            root.removeChildNode(node)
+            sip.delete(node)
+
+        height, width = ring.shape
+        ntiles = (width + TILE_WIDTH - 1) // TILE_WIDTH
+
+        self.textures = [self.create_texture(ring, tile) for tile in range(ntiles)]
+        self.nodes = []
+
+        # each tile is drawn in the two copies of the ring, without its overlapping columns
+        for tile, texture in enumerate(self.textures):
+            start = tile * TILE_WIDTH
+            stop = min(start + TILE_WIDTH, width)
+            for copy in range(2):
+                node = QSGSimpleTextureNode()
+                node.setRect(QRectF(start + copy * width, 0, stop - start, height))
+                node.setSourceRect(QRectF(1, 0, stop - start, height))
+                node.setFiltering(QSGTexture.Linear)
+                node.setTexture(texture)
+                root.appendChildNode(node)
+                self.nodes.append(node)
+
+    def tile_columns(self, ring, tile):
+        '''Columns of the ring in the texture of a tile, with the overlapping ones.'''
+        width = ring.shape[1]
+        start = tile * TILE_WIDTH
+        stop = min(start + TILE_WIDTH, width)
+        # the ring wraps around, the last tile is followed by the first one
+        return np.arange(start - 1, stop + 1) % width
+
+    def update_tile(self, ring, tile, dirty):
+        columns = self.tile_columns(ring, tile)
+        changed = np.flatnonzero(np.isin(columns, dirty))
+        if len(changed) == 0:
+            return
+
+        if self.gl is None:
+            # without the OpenGL functions, the whole tile is uploaded to a new texture
+            texture = self.create_texture(ring, tile)
+            for node in self.nodes[2 * tile:2 * tile + 2]:
+                node.setTexture(texture)
+            # the previous texture is released with its last reference
+            self.textures[tile] = texture
+            return
+
+        # only the range of the texture that changed is uploaded
+        x0, x1 = changed[0], changed[-1] + 1
+        height = ring.shape[0]
+        # the RGB32 pixels are BGRA bytes, they are uploaded as RGBA, that OpenGL ES also accepts
+        pixels = ring[:, columns[x0:x1]].view(np.uint8).reshape(height, x1 - x0, 4)
+        pixels = np.ascontiguousarray(pixels[:, :, [2, 1, 0, 3]])
+
+        # binding the texture uploads its initial image first, if it has not been yet
+        self.textures[tile].bind()
+        self.gl.glTexSubImage2D(GL_TEXTURE_2D, 0, int(x0), 0, int(x1 - x0), height, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+    def create_texture(self, ring, tile):
+        height = ring.shape[0]
+        columns = self.tile_columns(ring, tile)
+
+        # the image is copied so that it owns its pixels until the texture is uploaded
+        pixels = ring[:, columns].tobytes()
+        image = QImage(pixels, len(columns), height, len(columns) * 4, QImage.Format_RGB32).copy()
+
+        return self.window().createTextureFromImage(image)
+
+    def gl_functions(self):
+        '''OpenGL functions of the render thread, or None when the scene graph does not use OpenGL.'''
+        if self.window().rendererInterface().graphicsApi() != QSGRendererInterface.OpenGL:
+            return None
+
+        context = QOpenGLContext.currentContext()
+        if context is None:
+            return None
+
+        try:
+            if context.isOpenGLES():
+                return context.versionFunctions()
+
+            profile = QOpenGLVersionProfile()
+            profile.setVersion(2, 0)
+            return context.versionFunctions(profile)
+        except ImportError:
+            return None
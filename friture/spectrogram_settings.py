@@ -18,20 +18,35 @@
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from fractions import Fraction
 
 from PyQt5 import QtWidgets
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend, DEFAULT_SAMPLING_RATE
+from friture.spectrogram_archive import GetSpectrogramArchives
 import friture.plotting.frequency_scales as fscales
 
 # shared with spectrogram.py
 DEFAULT_FFT_SIZE = 7  # 4096 points
 DEFAULT_FREQ_SCALE = 2  # Mel
-DEFAULT_MAXFREQ = SAMPLING_RATE / 2
+DEFAULT_MAXFREQ = DEFAULT_SAMPLING_RATE / 2
 DEFAULT_MINFREQ = 20
 DEFAULT_SPEC_MIN = -140
 DEFAULT_SPEC_MAX = 0
 DEFAULT_TIMERANGE = 10.
 DEFAULT_WEIGHTING = 0  # None
+DEFAULT_ARCHIVE_REDUCTION = 0  # Maximum
+DEFAULT_OVERLAP = 0  # Automatic
+# overlaps of the consecutive FFT windows, after the automatic mode in the settings
+OVERLAPS = [Fraction(1, 2), Fraction(3, 4), Fraction(7, 8)]
+# the automatic mode follows the column rate of the screen, with at most 75% overlap
+# so that it never computes more than the former fixed overlap, and at least 50% overlap
+# so that no sample is skipped. For long time ranges, the columns are then reduced by
+# the time resampling of the image
+MAX_AUTOMATIC_OVERLAP = Fraction(3, 4)
+MIN_AUTOMATIC_OVERLAP = Fraction(1, 2)
+MAX_TIMERANGE = 1000.
+# the longest time ranges are only rendered completely with the spectrogram archive
+MAX_ARCHIVED_TIMERANGE = 8 * 3600.
 
 
 class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
@@ -48,7 +63,7 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.doubleSpinBox_timerange = QtWidgets.QDoubleSpinBox(self)
         self.doubleSpinBox_timerange.setDecimals(1)
         self.doubleSpinBox_timerange.setMinimum(0.1)
-        self.doubleSpinBox_timerange.setMaximum(1000.0)
+        self.doubleSpinBox_timerange.setMaximum(MAX_ARCHIVED_TIMERANGE if GetSpectrogramArchives().enabled() else MAX_TIMERANGE)
         self.doubleSpinBox_timerange.setProperty("value", DEFAULT_TIMERANGE)
         self.doubleSpinBox_timerange.setObjectName("doubleSpinBox_timerange")
         self.doubleSpinBox_timerange.setSuffix(" s")
@@ -67,6 +82,13 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.comboBox_fftsize.addItem("16384 points")
         self.comboBox_fftsize.setCurrentIndex(DEFAULT_FFT_SIZE)
 
+        self.comboBox_overlap = QtWidgets.QComboBox(self)
+        self.comboBox_overlap.setObjectName("comboBox_overlap")
+        self.comboBox_overlap.addItem("Automatic")
+        for overlap in OVERLAPS:
+            self.comboBox_overlap.addItem("%g %%" % (100. * overlap))
+        self.comboBox_overlap.setCurrentIndex(DEFAULT_OVERLAP)
+
         self.comboBox_freqscale = QtWidgets.QComboBox(self)
         self.comboBox_freqscale.setObjectName("comboBox_freqscale")
         for scale in fscales.ALL:
@@ -75,7 +97,7 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
 
         self.spinBox_minfreq = QtWidgets.QSpinBox(self)
         self.spinBox_minfreq.setMinimum(20)
-        self.spinBox_minfreq.setMaximum(SAMPLING_RATE // 2)
+        self.spinBox_minfreq.setMaximum(AudioBackend().get_samplerate() // 2)
         self.spinBox_minfreq.setSingleStep(10)
         self.spinBox_minfreq.setValue(DEFAULT_MINFREQ)
         self.spinBox_minfreq.setObjectName("spinBox_minfreq")
@@ -83,7 +105,7 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
 
         self.spinBox_maxfreq = QtWidgets.QSpinBox(self)
         self.spinBox_maxfreq.setMinimum(20)
-        self.spinBox_maxfreq.setMaximum(SAMPLING_RATE // 2)
+        self.spinBox_maxfreq.setMaximum(AudioBackend().get_samplerate() // 2)
         self.spinBox_maxfreq.setSingleStep(1000)
         self.spinBox_maxfreq.setProperty("value", DEFAULT_MAXFREQ)
         self.spinBox_maxfreq.setObjectName("spinBox_maxfreq")
@@ -113,18 +135,27 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.comboBox_weighting.addItem("C")
         self.comboBox_weighting.setCurrentIndex(DEFAULT_WEIGHTING)
 
+        self.comboBox_reduction = QtWidgets.QComboBox(self)
+        self.comboBox_reduction.setObjectName("comboBox_reduction")
+        self.comboBox_reduction.addItem("Maximum")
+        self.comboBox_reduction.addItem("Mean")
+        self.comboBox_reduction.setCurrentIndex(DEFAULT_ARCHIVE_REDUCTION)
+
         self.formLayout.addRow("Time range:", self.doubleSpinBox_timerange)
         self.formLayout.addRow("FFT Size:", self.comboBox_fftsize)
+        self.formLayout.addRow("Overlap:", self.comboBox_overlap)
         self.formLayout.addRow("Frequency scale:", self.comboBox_freqscale)
         self.formLayout.addRow("Min frequency:", self.spinBox_minfreq)
         self.formLayout.addRow("Max frequency:", self.spinBox_maxfreq)
         self.formLayout.addRow("Min color:", self.spinBox_specmin)
         self.formLayout.addRow("Max color:", self.spinBox_specmax)
         self.formLayout.addRow("Middle-ear weighting:", self.comboBox_weighting)
+        self.formLayout.addRow("Archived columns:", self.comboBox_reduction)
 
         self.setLayout(self.formLayout)
 
         self.comboBox_fftsize.currentIndexChanged.connect(self.fftsizechanged)
+        self.comboBox_overlap.currentIndexChanged.connect(self.parent().setoverlap)
         self.comboBox_freqscale.currentIndexChanged.connect(self.freqscalechanged)
         self.spinBox_minfreq.valueChanged.connect(self.parent().setminfreq)
         self.spinBox_maxfreq.valueChanged.connect(self.parent().setmaxfreq)
@@ -132,6 +163,7 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.spinBox_specmax.valueChanged.connect(self.parent().setmax)
         self.doubleSpinBox_timerange.valueChanged.connect(self.parent().timerangechanged)
         self.comboBox_weighting.currentIndexChanged.connect(self.parent().setweighting)
+        self.comboBox_reduction.currentIndexChanged.connect(self.parent().PlotZoneImage.setarchivereduction)
 
     # slot
     def fftsizechanged(self, index):
@@ -144,16 +176,24 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.logger.info("freq_scale slot %d %s", index, fscales.ALL[index])
         self.parent().PlotZoneImage.setfreqscale(fscales.ALL[index])
         
+    # method
+    def set_samplerate(self, samplerate):
+        # the displayed range cannot go beyond the Nyquist frequency
+        self.spinBox_minfreq.setMaximum(samplerate // 2)
+        self.spinBox_maxfreq.setMaximum(samplerate // 2)
+
     # method
     def saveState(self, settings):
         settings.setValue("timeRange", self.doubleSpinBox_timerange.value())
         settings.setValue("fftSize", self.comboBox_fftsize.currentIndex())
+        settings.setValue("overlap", self.comboBox_overlap.currentIndex())
         settings.setValue("freqScale", self.comboBox_freqscale.currentIndex())
         settings.setValue("freqMin", self.spinBox_minfreq.value())
         settings.setValue("freqMax", self.spinBox_maxfreq.value())
         settings.setValue("colorMin", self.spinBox_specmin.value())
         settings.setValue("colorMax", self.spinBox_specmax.value())
         settings.setValue("weighting", self.comboBox_weighting.currentIndex())
+        settings.setValue("archiveReduction", self.comboBox_reduction.currentIndex())
 
     # method
     def restoreState(self, settings):
@@ -161,6 +201,8 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.doubleSpinBox_timerange.setValue(timeRange)
         fft_size = settings.value("fftSize", DEFAULT_FFT_SIZE, type=int)  # 7th index is 1024 points
         self.comboBox_fftsize.setCurrentIndex(fft_size)
+        overlap = settings.value("overlap", DEFAULT_OVERLAP, type=int)
+        self.comboBox_overlap.setCurrentIndex(overlap)
         freqscale = settings.value("freqScale", DEFAULT_FREQ_SCALE, type=int)
         self.comboBox_freqscale.setCurrentIndex(freqscale)
         freqMin = settings.value("freqMin", DEFAULT_MINFREQ, type=int)
@@ -173,3 +215,5 @@ class Spectrogram_Settings_Dialog(QtWidgets.QDialog):
         self.spinBox_specmax.setValue(colorMax)
         weighting = settings.value("weighting", DEFAULT_WEIGHTING, type=int)
         self.comboBox_weighting.setCurrentIndex(weighting)
+        reduction = settings.value("archiveReduction", DEFAULT_ARCHIVE_REDUCTION, type=int)
+        self.comboBox_reduction.setCurrentIndex(reduction)
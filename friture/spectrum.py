@@ -18,8 +18,8 @@
 # along with Friture.  If not, see <http://www.gnu.org/licenses/>.
 
 from PyQt5 import QtWidgets
-from numpy import log10, argmax, zeros, arange, floor, float64
-from friture.audioproc import audioproc  # audio processing class
+from numpy import log10, argmax, zeros, ascontiguousarray
+from friture.stft_service import GetSTFTService  # shared FFT computation
 from friture.spectrum_settings import (Spectrum_Settings_Dialog,  # settings dialog
                                        DEFAULT_FFT_SIZE,
                                        DEFAULT_FREQ_SCALE,
@@ -32,9 +32,9 @@ from friture.spectrum_settings import (Spectrum_Settings_Dialog,  # settings dia
                                        DEFAULT_SHOW_FREQ_LABELS)
 import friture.plotting.frequency_scales as fscales
 
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 from friture.spectrumPlotWidget import SpectrumPlotWidget
-from friture_extensions.exp_smoothing_conv import pyx_exp_smoothed_value_numpy
+from friture_extensions.exp_smoothing_conv import pyx_exp_smoothed_recursive
 
 
 class Spectrum_Widget(QtWidgets.QWidget):
@@ -52,29 +52,26 @@ class Spectrum_Widget(QtWidgets.QWidget):
         self.PlotZoneSpect.setObjectName("PlotZoneSpect")
         self.gridLayout.addWidget(self.PlotZoneSpect, 0, 0, 1, 1)
 
-        # initialize the class instance that will do the fft
-        self.proc = audioproc()
+        # the fft is computed by the shared STFT service, once the buffer is known
+        self.stft = None
 
         self.maxfreq = DEFAULT_MAXFREQ
-        self.proc.set_maxfreq(self.maxfreq)
         self.minfreq = DEFAULT_MINFREQ
         self.fft_size = 2 ** DEFAULT_FFT_SIZE * 32
-        self.proc.set_fftsize(self.fft_size)
         self.spec_min = DEFAULT_SPEC_MIN
         self.spec_max = DEFAULT_SPEC_MAX
         self.weighting = DEFAULT_WEIGHTING
         self.dual_channels = False
         self.response_time = DEFAULT_RESPONSE_TIME
 
-        self.update_weighting()
-        self.freq = self.proc.get_freq_scale()
+        self.freq = zeros(0)
+        self.w = zeros((1, 0))
 
-        self.old_index = 0
         self.overlap = 3. / 4.
 
         self.update_display_buffers()
 
-        # set kernel and parameters for the smoothing filter
+        # set the parameter of the smoothing filter
         self.setresponsetime(self.response_time)
 
         self.PlotZoneSpect.setfreqscale(fscales.Mel) # matches DEFAULT_FREQ_SCALE = 2 #Mel
@@ -88,10 +85,40 @@ class Spectrum_Widget(QtWidgets.QWidget):
         # initialize the settings dialog
         self.settings_dialog = Spectrum_Settings_Dialog(self)
 
+        AudioBackend().samplerate_changed.connect(self.samplerate_changed)
+
     # method
     def set_buffer(self, buffer):
         self.audiobuffer = buffer
-        self.old_index = self.audiobuffer.ringbuffer.offset
+        self.update_stft()
+
+    def update_stft(self):
+        # release the previous configuration first, so that it can be evicted
+        # if no other dock uses it
+        self.release_stft()
+
+        if self.audiobuffer is None:
+            return
+
+        hop = int(self.fft_size * (1. - self.overlap))
+        samplerate = AudioBackend().get_samplerate()
+        # only the channels that are drawn are analyzed, and smoothed together,
+        # the first one is shared with the spectrogram docks that use the same FFT settings
+        channels = (0, 1) if self.dual_channels else (0,)
+        self.stft = GetSTFTService().subscribe(self.audiobuffer, channels, self.fft_size, hop, samplerate)
+
+        self.freq = self.stft.get_freq_scale()
+        self.update_display_buffers()
+        self.update_weighting()
+
+    def release_stft(self):
+        if self.stft is not None:
+            self.stft.unsubscribe()
+            self.stft = None
+
+    def closeEvent(self, event):
+        self.release_stft()
+        super().closeEvent(event)
 
     def log_spectrogram(self, sp):
         # Note: implementing the log10 of the array in Cython did not bring
@@ -102,52 +129,29 @@ class Spectrum_Widget(QtWidgets.QWidget):
         return 10. * log10(sp + epsilon)
 
     def handle_new_data(self, floatdata):
-        # we need to maintain an index of where we are in the buffer
-        index = self.audiobuffer.ringbuffer.offset
-
-        available = index - self.old_index
+        if self.stft is None:
+            return
 
-        if available < 0:
-            # ringbuffer must have grown or something...
-            available = 0
-            self.old_index = index
-
-        # if we have enough data to add a frequency column in the time-frequency plane, compute it
-        needed = self.fft_size * (1. - self.overlap)
-        realizable = int(floor(available / needed))
+        # power spectra of the new frames, shared with the other docks
+        # that use the same FFT settings
+        spn = self.stft.fetch()
+        nchannels, nfreq, realizable = spn.shape
 
         if realizable > 0:
-            sp1n = zeros((len(self.freq), realizable), dtype=float64)
-            sp2n = zeros((len(self.freq), realizable), dtype=float64)
-
-            for i in range(realizable):
-                floatdata = self.audiobuffer.data_indexed(self.old_index, self.fft_size)
-
-                # first channel
-                # FFT transform
-                sp1n[:, i] = self.proc.analyzelive(floatdata[0, :])
+            if self.dispbuffers.shape != (nchannels, nfreq):
+                self.dispbuffers = zeros((nchannels, nfreq))
 
-                if self.dual_channels and floatdata.shape[0] > 1:
-                    # second channel for comparison
-                    sp2n[:, i] = self.proc.analyzelive(floatdata[1, :])
+            # smooth all the channels at once, as a (channels * frequencies, frames) array,
+            # the display buffers are the state of the smoother, updated in place
+            pyx_exp_smoothed_recursive(self.alpha, ascontiguousarray(spn.reshape((nchannels * nfreq, realizable))), self.dispbuffers.reshape(nchannels * nfreq))
 
-                self.old_index += int(needed)
-
-            # compute the widget data
-            sp1 = pyx_exp_smoothed_value_numpy(self.kernel, self.alpha, sp1n, self.dispbuffers1)
-            sp2 = pyx_exp_smoothed_value_numpy(self.kernel, self.alpha, sp2n, self.dispbuffers2)
-            # store result for next computation
-            self.dispbuffers1 = sp1
-            self.dispbuffers2 = sp2
-
-            sp1.shape = self.freq.shape
-            sp2.shape = self.freq.shape
             self.w.shape = self.freq.shape
 
-            if self.dual_channels and floatdata.shape[0] > 1:
-                dB_spectrogram = self.log_spectrogram(sp2) - self.log_spectrogram(sp1)
+            if self.dual_channels and nchannels > 1:
+                # second channel for comparison
+                dB_spectrogram = self.log_spectrogram(self.dispbuffers[1]) - self.log_spectrogram(self.dispbuffers[0])
             else:
-                dB_spectrogram = self.log_spectrogram(sp1) + self.w
+                dB_spectrogram = self.log_spectrogram(self.dispbuffers[0]) + self.w
 
             # the log operation and the weighting could be deffered
             # to the post-weedening !
@@ -179,18 +183,12 @@ class Spectrum_Widget(QtWidgets.QWidget):
         # we compute alpha so that the N most recent samples represent 100*w percent of the output
         w = 0.65
         delta_n = self.fft_size * (1. - self.overlap)
-        n = self.response_time * SAMPLING_RATE / delta_n
-        N = 2 * 4096
+        n = self.response_time * AudioBackend().get_samplerate() / delta_n
         self.alpha = 1. - (1. - w) ** (1. / (n + 1))
-        self.kernel = self.compute_kernel(self.alpha, N)
-
-    def compute_kernel(self, alpha, N):
-        kernel = (1. - alpha) ** arange(N - 1, -1, -1)
-        return kernel
 
     def update_display_buffers(self):
-        self.dispbuffers1 = zeros(len(self.freq))
-        self.dispbuffers2 = zeros(len(self.freq))
+        # smoothed spectra, (channels, frequencies)
+        self.dispbuffers = zeros((0, len(self.freq)))
 
     def setminfreq(self, minfreq):
         self.setMinMaxFreq(minfreq, self.maxfreq)
@@ -205,25 +203,23 @@ class Spectrum_Widget(QtWidgets.QWidget):
         realmin = min(self.minfreq, self.maxfreq)
         realmax = max(self.minfreq, self.maxfreq)
 
-        self.proc.set_maxfreq(realmax)
-
-        self.freq = self.proc.get_freq_scale()
-        self.update_display_buffers()
-        self.update_weighting()
-        # reset kernel and parameters for the smoothing filter
-        self.setresponsetime(self.response_time)
-
+        # the frequency bins do not depend on the displayed range,
+        # so there is nothing to recompute here
         self.PlotZoneSpect.setfreqrange(realmin, realmax)
 
     def setfftsize(self, fft_size):
         self.fft_size = fft_size
-        self.proc.set_fftsize(self.fft_size)
-        self.freq = self.proc.get_freq_scale()
-        self.update_display_buffers()
-        self.update_weighting()
-        # reset kernel and parameters for the smoothing filter
+        self.update_stft()
+        # reset the parameter of the smoothing filter
         self.setresponsetime(self.response_time)
 
+    # slot
+    def samplerate_changed(self, samplerate):
+        # the frequency scale, the weighting and the smoothing depend on the sample rate
+        self.update_stft()
+        self.setresponsetime(self.response_time)
+        self.settings_dialog.set_samplerate(samplerate)
+
     def setmin(self, value):
         self.spec_min = value
         self.PlotZoneSpect.setspecrange(self.spec_min, self.spec_max)
@@ -238,20 +234,26 @@ class Spectrum_Widget(QtWidgets.QWidget):
         self.update_weighting()
 
     def update_weighting(self):
-        A, B, C = self.proc.get_freq_weighting()
+        if self.stft is None:
+            return
+
+        A, B, C = self.stft.get_freq_weighting()
         if self.weighting == 0:
-            self.w = zeros(A.shape)
+            w = zeros(A.shape)
         elif self.weighting == 1:
-            self.w = A
+            w = A
         elif self.weighting == 2:
-            self.w = B
+            w = B
         else:
-            self.w = C
+            w = C
 
-        self.w.shape = (1, self.w.size)
+        # reshape instead of setting the shape in place, since the weighting
+        # arrays are shared with the other docks
+        self.w = w.reshape((1, w.size))
 
     def setdualchannels(self, dual_enabled):
         self.dual_channels = dual_enabled
+        self.update_stft()
         if dual_enabled:
             self.PlotZoneSpect.set_peaks_enabled(False)
             self.PlotZoneSpect.set_baseline_dataUnits(0.)
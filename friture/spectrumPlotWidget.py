@@ -10,7 +10,7 @@ from PyQt5.QtQuickWidgets import QQuickWidget
 from numpy import zeros, ones, log10
 import numpy as np
 
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 from friture.plotting.coordinateTransform import CoordinateTransform
 from friture.spectrum_data import Spectrum_Data
 from friture.filled_curve import CurveType, FilledCurve
@@ -22,6 +22,12 @@ PEAK_DECAY_RATE = 1.0 - 3E-6
 # Number of cycles the peak stays on hold before fall-off.
 PEAK_FALLOFF_COUNT = 32  # default : 16
 
+# The bins that share a screen column are reduced to their maximum (peak-preserving)
+# or to their mean power.
+DECIMATION_MAX = "max"
+DECIMATION_MEAN = "mean"
+DEFAULT_DECIMATION = DECIMATION_MAX
+
 class Baseline(Enum):
     PLOT_BOTTOM = 1,
     DATA_ZERO = 2
@@ -64,6 +70,15 @@ class SpectrumPlotWidget(QtWidgets.QWidget):
         self.normVerticalScaleTransform = CoordinateTransform(0, 1, 1, 0, 0)
         self.normHorizontalScaleTransform = CoordinateTransform(0, 22000, 1, 0, 0)
 
+        # bin-to-column table, recomputed when the width, the scale, the range or the bins change
+        self.decimation = DEFAULT_DECIMATION
+        self.columns_key = None
+        self.columns_range = (0, 0)
+        self.column_offsets = zeros(0, dtype=int)
+        self.column_counts = zeros(0)
+        self.column_x_left = zeros(0)
+        self.column_x_right = zeros(0)
+
         plotLayout = QtWidgets.QGridLayout(self)
         plotLayout.setSpacing(0)
         plotLayout.setContentsMargins(0, 0, 0, 0)
@@ -88,11 +103,13 @@ class SpectrumPlotWidget(QtWidgets.QWidget):
                 self.logger.error("QML error: " + error.toString())
 
     def setfreqscale(self, scale):
+        self.columns_key = None
         self.normHorizontalScaleTransform.setScale(scale)
         self._spectrum_data.horizontal_axis.scale_division.setScale(scale)
         self._spectrum_data.horizontal_axis.coordinate_transform.setScale(scale)
 
     def setfreqrange(self, minfreq, maxfreq):
+        self.columns_key = None
         self.xmin = minfreq
         self.xmax = maxfreq
 
@@ -129,6 +146,9 @@ class SpectrumPlotWidget(QtWidgets.QWidget):
         else:
             self._spectrum_data.remove_plot_item(self._curve_peak)
 
+    def set_decimation(self, decimation):
+        self.decimation = decimation
+
     def set_baseline_displayUnits(self, baseline):
         self._baseline = Baseline.PLOT_BOTTOM
 
@@ -143,19 +163,17 @@ class SpectrumPlotWidget(QtWidgets.QWidget):
                 text = "%d Hz" % (np.rint(fmax))
             self._spectrum_data.setFmax(text, self.normHorizontalScaleTransform.toScreen(fmax))
 
-            M = np.max(y)
+            # one value per screen column, so that the number of vertices
+            # depends on the plot width instead of the FFT size
+            self.update_columns(x)
+            y = self.decimate(y)
+            scaled_x_left = self.column_x_left
+            scaled_x_right = self.column_x_right
+
+            M = np.max(y) if len(y) > 0 else 0.
             m = self.normVerticalScaleTransform.coord_min
             y_int = (y-m)/(np.abs(M-m)+1e-3)
 
-            x_left = zeros(x.shape)
-            x_right = zeros(x.shape)
-            x_left[0] = 1e-10
-            x_left[1:] = (x[1:] + x[:-1]) / 2.
-            x_right[:-1] = x_left[1:]
-            x_right[-1] = float(SAMPLING_RATE / 2)
-            scaled_x_left = self.normHorizontalScaleTransform.toScreen(x_left)
-            scaled_x_right = self.normHorizontalScaleTransform.toScreen(x_right)
-
             baseline = 1. if self._baseline == Baseline.PLOT_BOTTOM else (1. - self.normVerticalScaleTransform.toScreen(0.))
 
             scaled_y = 1. - self.normVerticalScaleTransform.toScreen(y)
@@ -168,6 +186,67 @@ class SpectrumPlotWidget(QtWidgets.QWidget):
                 z_peak = self.peak_int
                 self._curve_peak.setData(scaled_x_left, scaled_x_right, scaled_peak, z_peak, baseline)
 
+    def update_columns(self, x):
+        # the quick widget is a bit wider than the plot area, so there is at most one column per pixel
+        width = max(1, self.quickWidget.width())
+        samplerate = AudioBackend().get_samplerate()
+
+        key = (width, x.shape[0], x[-1] if x.shape[0] > 0 else 0., samplerate)
+        if key == self.columns_key:
+            return
+        self.columns_key = key
+
+        x_left = zeros(x.shape)
+        x_right = zeros(x.shape)
+        if x.shape[0] > 0:
+            x_left[0] = 1e-10
+            x_left[1:] = (x[1:] + x[:-1]) / 2.
+            x_right[:-1] = x_left[1:]
+            x_right[-1] = float(samplerate / 2)
+        scaled_x_left = self.normHorizontalScaleTransform.toScreen(x_left)
+        scaled_x_right = self.normHorizontalScaleTransform.toScreen(x_right)
+
+        # the screen transform is monotonic, so the visible bins are contiguous,
+        # and so are the bins of each column
+        visible = np.flatnonzero((scaled_x_right > 0.) & (scaled_x_left < 1.))
+
+        # the peaks are per column
+        self.peak = zeros((0,))
+
+        if len(visible) == 0:
+            self.columns_range = (0, 0)
+            self.column_offsets = zeros(0, dtype=int)
+            self.column_counts = zeros(0)
+            self.column_x_left = zeros(0)
+            self.column_x_right = zeros(0)
+            return
+
+        i0, i1 = visible[0], visible[-1] + 1
+
+        centers = (scaled_x_left[i0:i1] + scaled_x_right[i0:i1]) / 2.
+        columns = np.clip(np.floor(centers * width), 0, width - 1)
+
+        offsets = np.flatnonzero(np.diff(columns, prepend=-1.))
+        ends = np.append(offsets[1:], i1 - i0)
+
+        self.columns_range = (i0, i1)
+        self.column_offsets = offsets
+        self.column_counts = ends - offsets
+        self.column_x_left = scaled_x_left[i0 + offsets]
+        self.column_x_right = scaled_x_right[i0 + ends - 1]
+
+    def decimate(self, y):
+        i0, i1 = self.columns_range
+        y = y[i0:i1]
+
+        if len(y) == 0:
+            return y
+        elif self.decimation == DECIMATION_MEAN:
+            power = np.add.reduceat(10. ** (0.1 * y), self.column_offsets) / self.column_counts
+            return 10. * log10(power)
+        else:
+            return np.maximum.reduceat(y, self.column_offsets)
+
     def draw(self):
         return
 
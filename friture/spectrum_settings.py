@@ -20,8 +20,9 @@
 import logging
 
 from PyQt5 import QtWidgets
-from friture.audiobackend import SAMPLING_RATE
+from friture.audiobackend import AudioBackend
 import friture.plotting.frequency_scales as fscales
+from friture.spectrumPlotWidget import DECIMATION_MAX, DECIMATION_MEAN
 
 # shared with spectrum_settings.py
 DEFAULT_FFT_SIZE = 8  # 8192 points
@@ -34,6 +35,7 @@ DEFAULT_WEIGHTING = 1  # A
 DEFAULT_SHOW_FREQ_LABELS = True
 DEFAULT_RESPONSE_TIME = 0.025
 DEFAULT_RESPONSE_TIME_INDEX = 0
+DEFAULT_DECIMATION_INDEX = 0  # maximum, matches the default of SpectrumPlotWidget
 
 
 class Spectrum_Settings_Dialog(QtWidgets.QDialog):
@@ -75,7 +77,7 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
 
         self.spinBox_minfreq = QtWidgets.QSpinBox(self)
         self.spinBox_minfreq.setMinimum(20)
-        self.spinBox_minfreq.setMaximum(SAMPLING_RATE / 2)
+        self.spinBox_minfreq.setMaximum(AudioBackend().get_samplerate() // 2)
         self.spinBox_minfreq.setSingleStep(10)
         self.spinBox_minfreq.setValue(DEFAULT_MINFREQ)
         self.spinBox_minfreq.setObjectName("spinBox_minfreq")
@@ -83,7 +85,7 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
 
         self.spinBox_maxfreq = QtWidgets.QSpinBox(self)
         self.spinBox_maxfreq.setMinimum(20)
-        self.spinBox_maxfreq.setMaximum(SAMPLING_RATE / 2)
+        self.spinBox_maxfreq.setMaximum(AudioBackend().get_samplerate() // 2)
         self.spinBox_maxfreq.setSingleStep(1000)
         self.spinBox_maxfreq.setProperty("value", DEFAULT_MAXFREQ)
         self.spinBox_maxfreq.setObjectName("spinBox_maxfreq")
@@ -121,6 +123,13 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
         self.comboBox_response_time.addItem("1s (Slow)")
         self.comboBox_response_time.setCurrentIndex(DEFAULT_RESPONSE_TIME_INDEX)
 
+        # how the bins that fall in the same screen column are combined
+        self.comboBox_decimation = QtWidgets.QComboBox(self)
+        self.comboBox_decimation.setObjectName("decimation")
+        self.comboBox_decimation.addItem("Maximum (peaks)", DECIMATION_MAX)
+        self.comboBox_decimation.addItem("Mean power", DECIMATION_MEAN)
+        self.comboBox_decimation.setCurrentIndex(DEFAULT_DECIMATION_INDEX)
+
         self.checkBox_showFreqLabels = QtWidgets.QCheckBox(self)
         self.checkBox_showFreqLabels.setObjectName("showFreqLabels")
         self.checkBox_showFreqLabels.setChecked(DEFAULT_SHOW_FREQ_LABELS)
@@ -134,6 +143,7 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
         self.formLayout.addRow("Max:", self.spinBox_specmax)
         self.formLayout.addRow("Middle-ear weighting:", self.comboBox_weighting)
         self.formLayout.addRow("Response time:", self.comboBox_response_time)
+        self.formLayout.addRow("Bins per pixel:", self.comboBox_decimation)
         self.formLayout.addRow("Display max-frequency label:", self.checkBox_showFreqLabels)
 
         self.setLayout(self.formLayout)
@@ -147,6 +157,7 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
         self.spinBox_specmax.valueChanged.connect(self.parent().setmax)
         self.comboBox_weighting.currentIndexChanged.connect(self.parent().setweighting)
         self.comboBox_response_time.currentIndexChanged.connect(self.responsetimechanged)
+        self.comboBox_decimation.currentIndexChanged.connect(self.decimationchanged)
         self.checkBox_showFreqLabels.toggled.connect(self.parent().setShowFreqLabel)
 
     # slot
@@ -181,6 +192,16 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
         self.logger.info("responsetimechanged slot %d %d", index, response_time)
         self.parent().setresponsetime(response_time)
 
+    # slot
+    def decimationchanged(self, index):
+        self.parent().PlotZoneSpect.set_decimation(self.comboBox_decimation.itemData(index))
+
+    # method
+    def set_samplerate(self, samplerate):
+        # the displayed range cannot go beyond the Nyquist frequency
+        self.spinBox_minfreq.setMaximum(samplerate // 2)
+        self.spinBox_maxfreq.setMaximum(samplerate // 2)
+
     # method
     def saveState(self, settings):
         settings.setValue("fftSize", self.comboBox_fftsize.currentIndex())
@@ -191,6 +212,7 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
         settings.setValue("Max", self.spinBox_specmax.value())
         settings.setValue("weighting", self.comboBox_weighting.currentIndex())
         settings.setValue("responseTime", self.comboBox_response_time.currentIndex())
+        settings.setValue("decimation", self.comboBox_decimation.currentIndex())
         settings.setValue("showFreqLabels", self.checkBox_showFreqLabels.isChecked())
 
     # method
@@ -211,5 +233,7 @@ class Spectrum_Settings_Dialog(QtWidgets.QDialog):
         self.comboBox_weighting.setCurrentIndex(weighting)
         responseTime = settings.value("responseTime", DEFAULT_RESPONSE_TIME_INDEX, type=int)
         self.comboBox_response_time.setCurrentIndex(responseTime)
+        decimation = settings.value("decimation", DEFAULT_DECIMATION_INDEX, type=int)
+        self.comboBox_decimation.setCurrentIndex(decimation)
         showFreqLabels = settings.value("showFreqLabels", DEFAULT_SHOW_FREQ_LABELS, type=bool)
         self.checkBox_showFreqLabels.setChecked(showFreqLabels)
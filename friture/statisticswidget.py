@@ -64,4 +64,17 @@ class StatisticsWidget(QtWidgets.QWidget):
             % (AudioBackend().chunk_number,
                AudioBackend().xruns)
 
+        summary = AudioBackend().telemetry.summary()
+        if summary is not None:
+            label += "\n\nCapture over the last %.0f s:\n"\
+                "Drain time: %.2f ms (median), %.2f ms (99th percentile), %.2f ms (max)\n"\
+                "Max backlog: %d frames\n"\
+                "Audio age: %.1f ms (99th percentile), %.1f ms (max)\n"\
+                "Overflows per minute: %.1f"\
+                % (summary["span_s"],
+                   summary["drain_p50_ms"], summary["drain_p99_ms"], summary["drain_max_ms"],
+                   summary["backlog_max_frames"],
+                   summary["chunk_age_p99_ms"], summary["chunk_age_max_ms"],
+                   summary["overflows_per_minute"])
+
         self.LabelStats.setText(label)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2021 Timothée Lecomte
+
+# This file is part of Friture.
+#
+# Friture is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# Friture is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Friture.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Process-wide STFT service, so that docks with identical FFT settings
+share the computation of each frame."""
+
+import logging
+
+from numpy import empty, float64
+
+from friture.audioproc import audioproc
+
+HANN = "hann"
+
+__stftServiceInstance = None
+
+
+def GetSTFTService():
+    global __stftServiceInstance
+    if __stftServiceInstance is None:
+        __stftServiceInstance = STFTService()
+    return __stftServiceInstance
+
+
+def channels_text(channels):
+    return "all" if channels is None else ", ".join(str(channel) for channel in channels)
+
+
+class STFTConfig:
+    """The STFT of a set of channels of an audio buffer, for a given FFT size, window, hop and sample rate.
+
+    The frames are read with a cursor on the ring buffer of the audio buffer,
+    as a zero-copy view, and all the channels are analyzed in a single batch. The channels are a tuple
+    of indices, or None for all the channels of the buffer. The channels that are not in the buffer
+    (second channel of a single channel input) are left out.
+
+    The frames are computed lazily, on the first fetch that follows new data.
+    The spectra of the last batch are kept so that the other subscribers
+    can fetch them without recomputing them."""
+
+    def __init__(self, audiobuffer, channels, fft_size, window, hop, samplerate):
+        self.audiobuffer = audiobuffer
+        self.channels = channels
+        self.fft_size = fft_size
+        self.window = window
+        self.hop = hop
+        self.samplerate = samplerate
+
+        self.proc = audioproc()
+        self.proc.set_samplerate(samplerate)
+        self.proc.set_fftsize(fft_size)
+
+        self.reader = audiobuffer.ringbuffer.add_reader(fft_size, hop)
+
+        # ring buffer index where the next frame ends
+        self.next_stop = self.reader.next_stop
+
+        # spectra of the last computed batch, (channels, frequencies, frames),
+        # and ring buffer index where the first of them ends
+        self.spectra = empty((0, len(self.proc.get_freq_scale()), 0), dtype=float64)
+        self.first_stop = self.next_stop
+
+        self.refcount = 0
+
+    def update(self):
+        if self.reader.pending() == 0:
+            # keep the last batch for the subscribers that have not fetched it yet
+            return
+
+        # all the frames of the batch, (channels, frames, fft_size)
+        frames = self.reader.windows()
+
+        if frames.shape[1] == 0:
+            # the frames were overwritten before they could be read
+            self.spectra = self.spectra[:, :, :0]
+        elif self.channels is None:
+            self.spectra = self.proc.analyze_frames(frames)
+        else:
+            channels = tuple(channel for channel in self.channels if channel < frames.shape[0])
+            if len(channels) > 0:
+                self.spectra = self.proc.analyze_frames(self.select_channels(frames, channels))
+            else:
+                # the channels are not available in the buffer
+                self.spectra = self.spectra[:0, :, :0]
+
+        self.next_stop = self.reader.next_stop
+        self.first_stop = self.next_stop - frames.shape[1] * self.hop
+
+    def select_channels(self, frames, channels):
+        first = channels[0]
+        if channels == tuple(range(first, first + len(channels))):
+            # contiguous channels are selected without a copy
+            return frames[first:first + len(channels)]
+        return frames[list(channels)]
+
+    def close(self):
+        self.audiobuffer.ringbuffer.remove_reader(self.reader)
+
+    def fetch(self, subscription):
+        self.update()
+
+        # only return the frames that the subscriber has not received yet
+        skipped = max(0, (subscription.next_stop - self.first_stop) // self.hop)
+        subscription.next_stop = self.next_stop
+
+        return self.spectra[:, :, skipped:]
+
+
+class STFTSubscription:
+    """Handle given to a dock that uses a shared STFT configuration."""
+
+    def __init__(self, service, key, config):
+        self.service = service
+        self.key = key
+        self.config = config
+
+        # frames that ended before the subscription are not delivered
+        self.next_stop = config.next_stop
+
+    def fetch(self):
+        '''Return the power spectra of the frames computed since the previous fetch,
+        as a (channels, frequencies, frames) array.
+        The array is owned by the service and is only valid until the next batch.'''
+        return self.config.fetch(self)
+
+    def get_freq_scale(self):
+        return self.config.proc.get_freq_scale()
+
+    def get_freq_weighting(self):
+        return self.config.proc.get_freq_weighting()
+
+    def unsubscribe(self):
+        if self.config is not None:
+            self.service.release(self.key)
+            self.config = None
+
+
+class STFTService:
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.configs = {}
+
+    def subscribe(self, audiobuffer, channels, fft_size, hop, samplerate, window=HANN):
+        if window != HANN:
+            raise ValueError("Unsupported STFT window: %s" % (window))
+
+        if channels is not None:
+            channels = tuple(channels)
+
+        key = (audiobuffer, channels, fft_size, window, hop, samplerate)
+
+        config = self.configs.get(key)
+        if config is None:
+            self.logger.info("New STFT configuration: channels %s, %d points, %s window, hop %d, %d Hz", channels_text(channels), fft_size, window, hop, samplerate)
+            config = STFTConfig(audiobuffer, channels, fft_size, window, hop, samplerate)
+            self.configs[key] = config
+
+        config.refcount += 1
+
+        return STFTSubscription(self, key, config)
+
+    def release(self, key):
+        config = self.configs[key]
+        config.refcount -= 1
+
+        if config.refcount == 0:
+            # no dock needs this configuration any more
+            channels, fft_size, window, hop, samplerate = key[1:]
+            self.logger.info("Releasing STFT configuration: channels %s, %d points, %s window, hop %d, %d Hz", channels_text(channels), fft_size, window, hop, samplerate)
+            config.close()
+            del self.configs[key]
+
+    def config_count(self):
+        return len(self.configs)
@@ -0,0 +1,23 @@
+import numpy as np
+
+import sys
+sys.path.insert(0, '.')
+
+
+def spectra(nbins, frames, seed=0):
+    '''Random (nbins, frames) power spectra, log-uniform from -120 dB to 0 dB.'''
+    return 10. ** np.random.default_rng(seed).uniform(-12., 0., (nbins, frames))
+
+
+def decibels(power):
+    return 10. * np.log10(power + 1e-30)
+
+
+def push_in_chunks(target, data, max_length, seed=0):
+    '''Push the (rows, columns) data to target.push in chunks of random lengths, from 1 to max_length - 1.'''
+    rng = np.random.default_rng(seed)
+    position = 0
+    while position < data.shape[1]:
+        length = int(rng.integers(1, max_length))
+        target.push(data[:, position:position + length])
+        position += length
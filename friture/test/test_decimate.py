@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from scipy.signal import firwin, freqz, lfilter
+
+import sys
+sys.path.insert(0, '.')
+
+from friture.signal.decimate import (HALFBAND_COEFS, decimate, decimate_filtic, decimate_fir, decimate_fir_filtic,
+                                     decimate_multiple)
+
+
+def halfband_filter():
+    '''Full-rate transfer function of the half-band filter, (A0(z^2) + z^-1 A1(z^2)) / 2,
+    with the even and the odd coefficients as first-order all-pass sections.'''
+    branches = []
+    for coefs in (HALFBAND_COEFS[0::2], HALFBAND_COEFS[1::2]):
+        b, a = np.ones(1), np.ones(1)
+        for c in coefs:
+            b = np.convolve(b, [c, 0., 1.])
+            a = np.convolve(a, [1., 0., c])
+        branches.append((b, a))
+    (b0, a0), (b1, a1) = branches
+
+    # coefficients in increasing delays, z^-1 B1 is B1 shifted by one
+    first = np.convolve(b0, a1)
+    second = np.convolve(np.append(0., b1), a0)
+    b = np.zeros(max(len(first), len(second)))
+    b[:len(first)] += first
+    b[:len(second)] += second
+    return 0.5 * b, np.convolve(a0, a1)
+
+
+def test_halfband_is_the_polyphase_filter():
+    x = np.random.default_rng(0).standard_normal((2, 1001))
+
+    b, a = halfband_filter()
+    expected = lfilter(b, a, x, axis=1)[:, 1::2]
+
+    # the expanded polynomials of the reference are less accurate than the sections
+    y, zf = decimate(x, decimate_filtic(2))
+    np.testing.assert_allclose(y, expected, atol=1e-8)
+
+
+def test_halfband_response():
+    b, a = halfband_filter()
+    f, h = freqz(b, a, worN=np.linspace(0., 0.5, 1001), fs=1.)
+    gain = 20. * np.log10(np.abs(h) + 1e-30)
+
+    assert np.all(np.abs(gain[f <= 0.24]) < 0.01)
+    assert np.all(gain[f >= 0.26] < -70.)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_halfband_chunks(dtype):
+    x = np.random.default_rng(1).standard_normal((3, 4000)).astype(dtype)
+
+    whole, zf = decimate(x, decimate_filtic(3))
+    assert whole.dtype == dtype
+    assert whole.shape == (3, 2000)
+
+    zi = decimate_filtic(3)
+    chunks = []
+    for start in range(0, 4000, 333):
+        y, zi = decimate(x[:, start:start + 333], zi)
+        chunks.append(y)
+
+    # odd chunk lengths are carried over by the state
+    np.testing.assert_allclose(np.hstack(chunks), whole, rtol=1e-6 if dtype == np.float32 else 1e-12)
+
+
+def test_halfband_1D_and_2D():
+    x = np.random.default_rng(2).standard_normal(999)
+
+    y1, zf1 = decimate(x, decimate_filtic())
+    y2, zf2 = decimate(x[np.newaxis], decimate_filtic(1))
+
+    np.testing.assert_array_equal(y1, y2[0])
+    np.testing.assert_array_equal(zf1, zf2)
+
+
+def test_decimate_multiple():
+    x = np.random.default_rng(3).standard_normal(4096)
+
+    y, zfs = decimate_multiple(3, x, [decimate_filtic() for i in range(5)])
+
+    expected = x
+    for i in range(3):
+        expected, zf = decimate(expected, decimate_filtic())
+
+    assert len(zfs) == 3
+    np.testing.assert_array_equal(y, expected)
+
+
+def test_fir_matches_the_filter_then_the_decimation():
+    b = firwin(31, 0.5)
+    x = np.random.default_rng(4).standard_normal((2, 1000))
+
+    y, zf = decimate_fir(b, x, decimate_fir_filtic(b, 2))
+
+    np.testing.assert_allclose(y, lfilter(b, 1., x, axis=1)[:, ::2], atol=1e-12)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_fir_chunks(dtype):
+    b = firwin(31, 0.5)
+    x = np.random.default_rng(5).standard_normal(5000).astype(dtype)
+
+    whole, zf = decimate_fir(b, x, decimate_fir_filtic(b))
+    assert whole.dtype == dtype
+
+    # empty and odd chunks included
+    zi = decimate_fir_filtic(b)
+    chunks = []
+    position = 0
+    rng = np.random.default_rng(6)
+    while position < len(x):
+        length = int(rng.integers(0, 200))
+        y, zi = decimate_fir(b, x[position:position + length], zi)
+        chunks.append(y)
+        position += length
+
+    np.testing.assert_allclose(np.concatenate(chunks), whole, rtol=1e-6 if dtype == np.float32 else 1e-12)
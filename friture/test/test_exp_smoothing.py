@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+import sys
+sys.path.insert(0, '.')
+
+from friture_extensions.exp_smoothing_conv import pyx_exp_smoothed_recursive
+
+
+def reference(alpha, data, state):
+    # s_i = alpha*x_i + (1-alpha)*s_{i-1}, as an IIR filter
+    smoothed, zf = lfilter([alpha], [1., alpha - 1.], data, axis=1, zi=(1. - alpha) * state[:, None])
+    return smoothed[:, -1]
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_matches_the_iir_filter(dtype):
+    rng = np.random.default_rng(0)
+    data = rng.random((5, 10000)).astype(dtype)
+    state = rng.random(5)
+    alpha = 1e-3
+
+    expected = reference(alpha, data.astype(np.float64), state)
+    result = pyx_exp_smoothed_recursive(alpha, data, state)
+
+    # the state is updated in place, and accumulated in float64
+    assert np.shares_memory(result, state)
+    np.testing.assert_allclose(state, expected, rtol=1e-12)
+
+
+def test_chunks_give_the_same_result():
+    rng = np.random.default_rng(1)
+    data = rng.random((3, 5000))
+    alpha = 0.01
+
+    whole = np.zeros(3)
+    pyx_exp_smoothed_recursive(alpha, data, whole)
+
+    chunked = np.zeros(3)
+    for start in range(0, 5000, 333):
+        pyx_exp_smoothed_recursive(alpha, np.ascontiguousarray(data[:, start:start + 333]), chunked)
+
+    np.testing.assert_allclose(chunked, whole, rtol=1e-12)
+
+
+def test_matches_the_previous_convolution():
+    # the truncated kernel of the previous implementation, long enough here
+    rng = np.random.default_rng(2)
+    data = rng.random((2, 100))
+    state = rng.random(2)
+    alpha = 0.2
+
+    N = data.shape[1]
+    kernel = (1. - alpha) ** np.arange(N)[::-1]
+    expected = alpha * (data * kernel).sum(axis=1) + (1. - alpha) ** N * state
+
+    np.testing.assert_allclose(pyx_exp_smoothed_recursive(alpha, data, state.copy()), expected, rtol=1e-12)
+
+
+def test_state_must_match_the_rows():
+    with pytest.raises(ValueError):
+        pyx_exp_smoothed_recursive(0.1, np.zeros((3, 10)), np.zeros(2))
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from scipy.signal import butter, lfilter
+
+import sys
+sys.path.insert(0, '.')
+
+from friture.filter import octave_filter_bank_decimation, octave_filter_bank_decimation_filtic
+from friture.octavefilters import Octave_Filters
+from friture_extensions.filter_bank import pyx_filter_bank_smoothed_energies
+
+
+def bank(n_filters=3, order=3):
+    filters = [butter(order, [0.05 * (i + 1), 0.05 * (i + 2)], btype='bandpass') for i in range(n_filters)]
+    return np.array([b for b, a in filters]), np.array([a for b, a in filters])
+
+
+def smoothed(alpha, y, state):
+    # s_i = alpha*y_i**2 + (1-alpha)*s_{i-1}
+    energies, zf = lfilter([alpha], [1., alpha - 1.], y ** 2, axis=-1, zi=(1. - alpha) * state[..., None])
+    return energies[..., -1]
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_matches_the_filters_and_the_smoothing(dtype):
+    rng = np.random.default_rng(0)
+    b, a = bank()
+    x = rng.standard_normal((2, 5000)).astype(dtype)
+    alphas = np.array([1e-2, 1e-3, 1e-4])
+
+    z = rng.standard_normal((3, 2, b.shape[1] - 1)) * 0.1
+    energies = rng.random((3, 2))
+
+    expected_z = np.empty_like(z)
+    expected_energies = np.empty_like(energies)
+    for f in range(3):
+        y, expected_z[f] = lfilter(b[f], a[f], x.astype(np.float64), axis=1, zi=z[f])
+        expected_energies[f] = smoothed(alphas[f], y, energies[f])
+
+    result = pyx_filter_bank_smoothed_energies(b, a, x, z, alphas, energies)
+
+    assert np.shares_memory(result, energies)
+    np.testing.assert_allclose(z, expected_z, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(energies, expected_energies, rtol=1e-9)
+
+
+def test_chunks_give_the_same_energies():
+    rng = np.random.default_rng(1)
+    b, a = bank()
+    x = rng.standard_normal((1, 4000))
+    alphas = np.full(3, 1e-3)
+
+    z = np.zeros((3, 1, b.shape[1] - 1))
+    whole = np.zeros((3, 1))
+    pyx_filter_bank_smoothed_energies(b, a, x, z, alphas, whole)
+
+    z = np.zeros((3, 1, b.shape[1] - 1))
+    chunked = np.zeros((3, 1))
+    for start in range(0, 4000, 377):
+        pyx_filter_bank_smoothed_energies(b, a, x[:, start:start + 377], z, alphas, chunked)
+
+    np.testing.assert_allclose(chunked, whole, rtol=1e-12)
+
+
+def test_refuses_inconsistent_shapes():
+    b, a = bank()
+    x = np.zeros((2, 10))
+    with pytest.raises(ValueError):
+        pyx_filter_bank_smoothed_energies(b, a, x, np.zeros((3, 1, b.shape[1] - 1)), np.ones(3), np.zeros((3, 2)))
+    with pytest.raises(ValueError):
+        pyx_filter_bank_smoothed_energies(b, a, x, np.zeros((3, 2, b.shape[1] - 1)), np.ones(2), np.zeros((3, 2)))
+
+
+def test_octave_bank_matches_the_band_signals():
+    # the energies of the whole bank, against the band signals of the design-time filter bank
+    rng = np.random.default_rng(2)
+    x = rng.standard_normal((2, 2 ** 14))
+
+    filters = Octave_Filters(3)
+    alphas = np.linspace(1e-2, 1e-4, filters.nbands)
+    energies = np.zeros((filters.nbands, 2))
+    for start in range(0, x.shape[1], 1024):
+        filters.smoothed_energies(x[:, start:start + 1024], alphas, energies)
+
+    forward, feedback = list(filters.boct_bank), list(filters.aoct_bank)
+    zis = octave_filter_bank_decimation_filtic(forward, feedback, nchannels=2)
+    y, dec, zfs = octave_filter_bank_decimation(forward, feedback, x, zis)
+
+    assert dec == filters.get_decs()
+    for k in range(filters.nbands):
+        np.testing.assert_allclose(energies[k], smoothed(alphas[k], y[k], np.zeros(2)), rtol=1e-8)
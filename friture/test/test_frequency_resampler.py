@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import sys
+sys.path.insert(0, '.')
+
+import friture.plotting.frequency_scales as fscales
+from friture.signal.frequency_resampler import Frequency_Resampler
+
+
+@pytest.mark.parametrize("scale", [fscales.Linear, fscales.Logarithmic, fscales.Mel])
+def test_interpolates_like_the_previous_path(scale):
+    # fewer than two bins per pixel everywhere: linear interpolation, like np.interp
+    freq = np.linspace(0., 24000., 257)
+    data = np.random.default_rng(0).standard_normal(257)
+
+    resampler = Frequency_Resampler(scale, 20., 5000., 1000)
+
+    np.testing.assert_allclose(resampler.process(freq, data), np.interp(resampler.xscaled, freq, data), atol=1e-12)
+
+
+def test_averages_the_bins_of_a_pixel():
+    freq = np.linspace(0., 24000., 8193)
+    data = np.random.default_rng(1).standard_normal(8193)
+
+    resampler = Frequency_Resampler(fscales.Logarithmic, 20., 20000., 200)
+    result = resampler.process(freq, data)
+
+    # each pixel covers the frequencies half-way to its neighbours in the log scale
+    t = np.log10(resampler.xscaled)
+    step = t[1] - t[0]
+    edges = 10. ** np.append(t - step / 2., t[-1] + step / 2.)
+    first = np.searchsorted(freq, edges[:-1])
+    last = np.searchsorted(freq, edges[1:])
+
+    averaged = last - first >= 2
+    assert averaged.any() and not averaged.all()
+
+    for row in np.flatnonzero(averaged):
+        assert result[row] == pytest.approx(data[first[row]:last[row]].mean())
+    np.testing.assert_allclose(result[~averaged], np.interp(resampler.xscaled, freq, data)[~averaged], atol=1e-12)
+
+
+def test_blocks_are_resampled_like_columns():
+    freq = np.linspace(0., 24000., 2049)
+    data = np.random.default_rng(2).standard_normal((2049, 7))
+
+    resampler = Frequency_Resampler(fscales.Mel, 20., 20000., 300)
+    block = resampler.process(freq, data)
+
+    assert block.shape == (300, 7)
+    for j in range(7):
+        np.testing.assert_allclose(block[:, j], resampler.process(freq, data[:, j]), atol=1e-12)
+
+
+def test_tables_are_cached_per_bins():
+    freq = np.linspace(0., 24000., 513)
+
+    resampler = Frequency_Resampler(fscales.Mel, 20., 20000., 100)
+    tables = resampler.tables(freq)
+    assert resampler.tables(freq)[0] is tables[0]
+
+    resampler.setnsamples(50)
+    indptr, indices, weights = resampler.tables(freq)
+    assert len(indptr) == 51
+    # each row is a weighted average
+    np.testing.assert_allclose(np.add.reduceat(weights, indptr[:-1]), 1.)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import sys
+sys.path.insert(0, '.')
+
+from conftest import push_in_chunks
+from friture.history_store import HistoryStore
+
+SAMPLERATE = 1000
+
+
+def test_reads_across_the_ring_and_the_staging(tmp_path):
+    # 5 s of history, written by chunks of 0.25 s
+    store = HistoryStore(str(tmp_path / "history.frh"), 2, SAMPLERATE, seconds=5., chunk_seconds=0.25)
+    signal = np.random.default_rng(1).standard_normal((2, 12345)).astype(np.float32)
+    push_in_chunks(store, signal, 700)
+
+    assert store.offset == signal.shape[1]
+    assert store.first_offset() == signal.shape[1] - 5000
+    assert store.staged > 0
+
+    for stop, length in [(12345, 5000), (12345, 10), (11000, 3000), (10000, 1), (9000, 1600)]:
+        np.testing.assert_array_equal(store.data_indexed(stop, length), signal[:, stop - length:stop])
+
+    store.close()
+
+
+def test_refuses_the_samples_out_of_the_history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.frh"), 1, SAMPLERATE, seconds=1.)
+    store.push(np.zeros((1, 3000), dtype=np.float32))
+
+    with pytest.raises(ValueError):
+        store.data_indexed(3000, 1001)
+    with pytest.raises(ValueError):
+        store.data_indexed(3001, 1)
+
+    store.close()
+
+
+def test_resumes_after_a_restart(tmp_path):
+    path = str(tmp_path / "history.frh")
+    signal = np.random.default_rng(2).standard_normal((1, 4321)).astype(np.float32)
+
+    store = HistoryStore(path, 1, SAMPLERATE, seconds=3.)
+    push_in_chunks(store, signal, 700)
+    store.close()
+
+    store = HistoryStore(path, 1, SAMPLERATE, seconds=3.)
+    assert store.offset == signal.shape[1]
+    np.testing.assert_array_equal(store.data_indexed(4321, 3000), signal[:, -3000:])
+    store.close()
+
+    reader = HistoryStore.open(path)
+    assert (reader.channels, reader.samplerate, reader.capacity) == (1, SAMPLERATE, 3000)
+    np.testing.assert_array_equal(reader.data_indexed(4000, 100), signal[:, 3900:4000])
+    with pytest.raises(ValueError):
+        reader.push(np.zeros((2, 1), dtype=np.float32))
+    reader.close()
+
+
+def test_restarts_with_other_settings(tmp_path):
+    path = str(tmp_path / "history.frh")
+
+    store = HistoryStore(path, 1, SAMPLERATE, seconds=3.)
+    store.push(np.ones((1, 2000), dtype=np.float32))
+    store.close()
+
+    store = HistoryStore(path, 2, SAMPLERATE, seconds=3.)
+    assert store.offset == 0
+    store.close()
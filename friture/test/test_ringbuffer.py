@@ -0,0 +1,94 @@
+import numpy as np
+
+import sys
+sys.path.insert(0, '.')
+
+from friture.ringbuffer import RingBuffer, frames_view
+
+
+def expected_windows(signal, stops, window):
+    return np.array([signal[:, stop - window:stop] for stop in stops]).transpose(1, 0, 2)
+
+
+def test_frames_view():
+    samples = np.arange(20.).reshape(2, 10)
+    frames = frames_view(samples, 4, 3)
+
+    assert frames.shape == (2, 3, 4)
+    assert not frames.flags.writeable
+    assert np.shares_memory(frames, samples)
+    np.testing.assert_array_equal(frames[1, 2], samples[1, 6:10])
+
+
+def test_reader_windows_follow_pushes():
+    window, hop = 256, 100
+    signal = np.arange(2 * 5000.).reshape(2, 5000)
+
+    ringbuffer = RingBuffer()
+    ringbuffer.push(signal[:, :window])
+    reader = ringbuffer.add_reader(window, hop)
+
+    rng = np.random.default_rng(0)
+    position = window
+    windows = []
+    while position < signal.shape[1]:
+        length = min(int(rng.integers(1, 400)), signal.shape[1] - position)
+        ringbuffer.push(signal[:, position:position + length])
+        position += length
+
+        pending = reader.pending()
+        frames = reader.windows()
+        assert frames.shape[1] == pending
+        windows += [np.array(frames)]
+
+    windows = np.concatenate(windows, axis=1)
+    stops = window + hop * (1 + np.arange(windows.shape[1]))
+
+    assert stops[-1] <= position < stops[-1] + hop
+    np.testing.assert_array_equal(windows, expected_windows(signal, stops, window))
+    assert reader.dropped == 0
+
+
+def test_reader_drops_overwritten_windows():
+    window, hop = 256, 128
+    signal = np.arange(60000.).reshape(1, 60000)
+
+    ringbuffer = RingBuffer()
+    ringbuffer.push(signal[:, :window])
+    reader = ringbuffer.add_reader(window, hop, lag=1000)
+
+    # much more than the buffer holds, without reading
+    for position in range(window, 40000, 1000):
+        ringbuffer.push(signal[:, position:min(position + 1000, 40000)])
+
+    pending = reader.pending()
+    frames = reader.windows()
+
+    assert reader.dropped > 0
+    assert frames.shape[1] + reader.dropped == pending
+    # the windows that are returned are still intact
+    first_stop = window + hop * (1 + reader.dropped)
+    stops = first_stop + hop * np.arange(frames.shape[1])
+    np.testing.assert_array_equal(frames, expected_windows(signal, stops, window))
+
+    # the reader goes on from the last window
+    ringbuffer.push(signal[:, 40000:41000])
+    frames = reader.windows()
+    stops = stops[-1] + hop * (1 + np.arange(frames.shape[1]))
+    assert stops[-1] <= 41000 < stops[-1] + hop
+    np.testing.assert_array_equal(frames, expected_windows(signal, stops, window))
+
+
+def test_reader_keeps_its_capacity():
+    ringbuffer = RingBuffer()
+    reader = ringbuffer.add_reader(4096, 1024, lag=30000)
+    length = ringbuffer.buffer_length
+
+    assert length >= 4096 + 30000
+
+    for i in range(20):
+        ringbuffer.push(np.ones((1, 1000)))
+        reader.windows()
+
+    assert ringbuffer.buffer_length == length
+    assert reader.dropped == 0
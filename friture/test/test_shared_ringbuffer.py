@@ -0,0 +1,175 @@
+import multiprocessing
+import time
+
+import numpy as np
+
+import sys
+sys.path.insert(0, '.')
+
+from friture.analysis_workers import AnalysisWorkerPool
+from friture.ringbuffer import RingBuffer
+from friture.shared_ringbuffer import SharedRingBuffer, SharedRingBufferView
+
+
+class SumProcessor:
+    '''Sum of each window, (channels, frames).'''
+
+    window = 64
+    hop = 32
+
+    def process_frames(self, frames):
+        return frames.sum(axis=2)
+
+    def merge(self, results):
+        return np.concatenate(results, axis=1)
+
+
+class WorkerOnlyFailure(SumProcessor):
+    '''Fails in the worker processes only.'''
+
+    def process_frames(self, frames):
+        if multiprocessing.current_process().name != "MainProcess":
+            raise RuntimeError("failure in the worker")
+        return super().process_frames(frames)
+
+
+class AudioBuffer:
+
+    def __init__(self, ringbuffer):
+        self.ringbuffer = ringbuffer
+
+
+def test_view_reads_the_same_windows():
+    signal = np.random.default_rng(0).standard_normal((2, 30000))
+
+    ringbuffer = RingBuffer()
+    shared = SharedRingBuffer()
+    view = SharedRingBufferView(shared.name)
+    try:
+        for target in (ringbuffer, shared):
+            target.push(signal[:, :256])
+        reader = ringbuffer.add_reader(256, 100)
+        shared_reader = view.add_reader(256, 100)
+
+        for position in range(256, signal.shape[1], 700):
+            for target in (ringbuffer, shared):
+                target.push(signal[:, position:position + 700])
+            np.testing.assert_array_equal(shared_reader.windows(), reader.windows())
+
+        assert shared_reader.dropped == 0
+    finally:
+        view.close()
+        shared.close()
+
+
+def test_view_follows_the_storage_changes():
+    shared = SharedRingBuffer()
+    view = SharedRingBufferView(shared.name)
+    try:
+        shared.push(np.ones((1, 100)))
+        reader = view.add_reader(10, 10)
+
+        # the storage is replaced when it grows and when the channels change
+        shared.grow_if_needed(50000)
+        shared.push(np.arange(40.).reshape(2, 20).astype(np.float32))
+
+        frames = reader.windows()
+        assert view.buffer_length == shared.buffer_length
+        assert frames.dtype == np.float32
+        np.testing.assert_array_equal(frames[:, -1], np.arange(40.).reshape(2, 20)[:, 10:])
+    finally:
+        view.close()
+        shared.close()
+
+
+def test_reader_discards_overwritten_copies():
+    shared = SharedRingBuffer()
+    view = SharedRingBufferView(shared.name)
+    try:
+        shared.push(np.zeros((1, 100)))
+        reader = view.add_reader(10, 10)
+
+        # the writer announces a write that reaches the samples being read
+        shared.push(np.zeros((1, 10)))
+        shared.control.fields[1] = shared.offset + shared.buffer_length
+
+        assert reader.windows().shape[1] == 0
+        assert reader.dropped == 1
+    finally:
+        view.close()
+        shared.close()
+
+
+def fetch_until(job, count, timeout=30.):
+    results = []
+    deadline = time.monotonic() + timeout
+    while sum(result.shape[1] for result in results) < count and time.monotonic() < deadline:
+        result = job.fetch()
+        if result is not None:
+            results.append(result)
+        time.sleep(0.01)
+    return np.concatenate(results, axis=1) if len(results) > 0 else np.zeros((1, 0))
+
+
+def test_worker_round_trip():
+    signal = np.random.default_rng(1).standard_normal((1, 3200))
+
+    pool = AnalysisWorkerPool()
+    ringbuffer = SharedRingBuffer()
+    pool.start(1)
+    try:
+        ringbuffer.push(signal[:, :64])
+        job = pool.submit(SumProcessor(), AudioBuffer(ringbuffer))
+        assert job is not None
+
+        reference = RingBuffer()
+        reference.push(signal[:, :64])
+        reader = reference.add_reader(64, 32)
+
+        # the worker registers its reader when it receives the job
+        time.sleep(1.)
+        ringbuffer.push(signal[:, 64:])
+        reference.push(signal[:, 64:])
+
+        expected = SumProcessor().process_frames(reader.windows())
+        result = fetch_until(job, expected.shape[1])
+
+        np.testing.assert_allclose(result, expected)
+        job.unsubscribe()
+    finally:
+        pool.stop()
+        ringbuffer.close()
+
+
+def test_failed_job_runs_in_the_gui_process():
+    signal = np.random.default_rng(2).standard_normal((1, 6400))
+
+    pool = AnalysisWorkerPool()
+    ringbuffer = SharedRingBuffer()
+    pool.start(1)
+    try:
+        ringbuffer.push(signal[:, :64])
+        job = pool.submit(WorkerOnlyFailure(), AudioBuffer(ringbuffer))
+
+        time.sleep(1.)
+        ringbuffer.push(signal[:, 64:3200])
+
+        deadline = time.monotonic() + 30.
+        while job.reader is None and time.monotonic() < deadline:
+            job.fetch()
+            time.sleep(0.01)
+
+        assert job.reader is not None
+        assert job.job_id not in pool.jobs
+        assert pool.workers[job.worker][2] == 0
+
+        # the results now come from the GUI process, from the next samples on
+        ringbuffer.push(signal[:, 3200:])
+        result = job.fetch()
+        assert result is not None and result.shape[1] == 100
+
+        job.unsubscribe()
+        assert job.reader is None
+    finally:
+        pool.stop()
+        ringbuffer.close()
@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+import pytest
+
+import sys
+sys.path.insert(0, '.')
+
+from conftest import decibels, push_in_chunks, spectra
+from friture.spectrogram_archive import MAXIMUM, MEAN, SpectrogramArchive, SpectrogramArchives
+
+NBINS = 8
+PERIOD = 0.01
+# 64 columns at level 0, 32 columns at levels 1 and 2, with tiles of 16 columns
+MAX_BYTES = 3 * 1024
+
+
+def open_archive(directory, max_bytes=MAX_BYTES, **kwargs):
+    return SpectrogramArchive(str(directory), "spectrogram", NBINS, PERIOD, max_bytes, levels=3, factor=4,
+                              tile_columns=16, **kwargs)
+
+
+def reduced(power, factor):
+    '''Expected (maximum, mean) dB planes of a level.'''
+    groups = power.shape[1] // factor
+    blocks = power[:, :groups * factor].reshape(NBINS, groups, factor)
+    return decibels(blocks).max(axis=2), decibels(blocks.mean(axis=2))
+
+
+def test_levels_reduce_the_columns(tmp_path):
+    power = spectra(NBINS, 1000)
+    archive = open_archive(tmp_path)
+    push_in_chunks(archive, power, 30)
+
+    assert [level.capacity for level in archive.levels] == [64, 32, 32]
+    assert [level.written for level in archive.levels] == [1000, 250, 62]
+
+    level = archive.levels[0]
+    np.testing.assert_allclose(level.read(0, 1000 - 64, 1000).T, decibels(power[:, -64:]), atol=0.25)
+
+    for i, level in enumerate(archive.levels[1:], 1):
+        maxima, means = reduced(power, 4 ** i)
+        start = level.first()
+        np.testing.assert_allclose(level.read(MAXIMUM, start, level.written).T, maxima[:, start:], atol=0.25)
+        np.testing.assert_allclose(level.read(MEAN, start, level.written).T, means[:, start:], atol=0.25)
+
+    archive.close()
+
+
+def test_reads_the_latest_columns_across_the_levels(tmp_path):
+    power = spectra(NBINS, 1003, seed=1)
+    archive = open_archive(tmp_path)
+    push_in_chunks(archive, power, 30)
+
+    # 500 columns do not fit in 64 pixels at level 1, they are read from level 2,
+    # and the latest ones, not reduced yet, from the finer levels
+    segments = archive.read(500, 64)
+    assert [factor for factor, data in segments] == [16, 4, 1]
+    assert [data.shape[1] for factor, data in segments] == [31, 2, 3]
+
+    maxima, means = reduced(power, 16)
+    np.testing.assert_allclose(segments[0][1], maxima[:, 31:62], atol=0.25)
+    np.testing.assert_allclose(segments[1][1], reduced(power, 4)[0][:, 248:250], atol=0.25)
+    np.testing.assert_allclose(segments[2][1], decibels(power[:, 1000:]), atol=0.25)
+
+    # the mean plane is read the same way
+    segments = archive.read(500, 64, plane=MEAN)
+    np.testing.assert_allclose(segments[0][1], means[:, 31:62], atol=0.25)
+
+    # the columns beyond the coarsest ring are not available
+    segments = archive.read(1003, 64)
+    assert segments[0][0] == 16 and segments[0][1].shape[1] == 32
+
+    archive.close()
+
+
+def test_cache_is_bounded(tmp_path):
+    power = spectra(NBINS, 1000, seed=2)
+    # two tiles of level 0
+    archive = open_archive(tmp_path, cache_bytes=2 * 16 * NBINS * 2)
+    uncached = open_archive(tmp_path / "uncached", cache_bytes=0)
+    push_in_chunks(archive, power, 30)
+    push_in_chunks(uncached, power, 30)
+
+    for columns, pixels in [(64, 64), (40, 10), (600, 64), (1000, 16), (64, 64)]:
+        for (factor, data), (factor_uncached, data_uncached) in zip(archive.read(columns, pixels), uncached.read(columns, pixels)):
+            assert factor == factor_uncached
+            np.testing.assert_array_equal(data, data_uncached)
+        assert archive.cached_bytes <= archive.cache_bytes
+        assert archive.cached_bytes == sum(tile.nbytes for tile in archive.cache.values())
+
+    archive.close()
+    uncached.close()
+
+
+def test_resumes_after_a_restart(tmp_path):
+    power = spectra(NBINS, 1000, seed=3)
+
+    archive = open_archive(tmp_path)
+    push_in_chunks(archive, power[:, :517], 30)
+    archive.close()
+
+    archive = open_archive(tmp_path)
+    assert archive.count() == 517
+    push_in_chunks(archive, power[:, 517:], 30)
+
+    continuous = open_archive(tmp_path / "continuous")
+    push_in_chunks(continuous, power, 30)
+
+    # the pending means are read back from float16, they can differ by the last bit
+    for level, expected in zip(archive.levels, continuous.levels):
+        assert level.written == expected.written
+        for plane in range(level.planes):
+            np.testing.assert_allclose(level.read(plane, level.first(), level.written),
+                                       expected.read(plane, expected.first(), expected.written), atol=0.02)
+
+    archive.close()
+    continuous.close()
+
+
+def test_resize_keeps_the_latest_columns(tmp_path):
+    power = spectra(NBINS, 1000, seed=4)
+    archive = open_archive(tmp_path)
+    push_in_chunks(archive, power, 30)
+    before = [[level.read(plane, level.written - 16, level.written) for plane in range(level.planes)] for level in archive.levels]
+
+    archive.resize(MAX_BYTES // 2)
+    assert [level.capacity for level in archive.levels] == [32, 16, 16]
+    for level, planes in zip(archive.levels, before):
+        assert os.path.getsize(level.path) == level.file_size(level.capacity)
+        for plane, expected in enumerate(planes):
+            np.testing.assert_array_equal(level.read(plane, level.written - 16, level.written), expected)
+
+    # and goes on from there
+    archive.push(power[:, :4])
+    assert archive.count() == 1004
+
+    archive.close()
+
+
+def test_archives_share_the_budget(tmp_path):
+    archives = SpectrogramArchives()
+    # 1024 columns of 256 bins at level 0, with the default levels and tiles
+    archives.set_directory(str(tmp_path), 7 * 1024 * 256 * 2)
+
+    first = archives.get("Spectrogram", 256, PERIOD)
+    assert first.levels[0].capacity == 1024
+    power = spectra(256, 2000, seed=5)
+    first.push(power)
+
+    second = archives.get("Spectrogram (2)", 256, PERIOD)
+    assert second.levels[0].capacity == 512
+    assert first.levels[0].capacity == 512
+    assert first.count() == 2000
+    np.testing.assert_allclose(first.levels[0].read(0, 1488, 2000).T, decibels(power[:, -512:]), atol=0.25)
+
+    # the same settings give the same archive
+    assert archives.get("Spectrogram", 256, PERIOD) is first
+
+    archives.close()
+
+
+def test_other_settings_are_removed(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.push(spectra(NBINS, 10))
+    archive.close()
+    paths = [level.path for level in archive.levels]
+
+    archive = SpectrogramArchive(str(tmp_path), "spectrogram", NBINS, 2 * PERIOD, MAX_BYTES, levels=3, factor=4,
+                                 tile_columns=16)
+    assert archive.count() == 0
+    assert not any(os.path.exists(path) for path in paths)
+    archive.close()
+
+
+def test_refuses_other_bins(tmp_path):
+    archive = open_archive(tmp_path)
+    with pytest.raises(ValueError):
+        archive.push(spectra(NBINS, 10)[:4])
+    archive.close()
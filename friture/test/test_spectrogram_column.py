@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import sys
+sys.path.insert(0, '.')
+
+from conftest import spectra
+import friture.plotting.frequency_scales as fscales
+from friture.signal.frequency_resampler import Frequency_Resampler
+from friture.signal.online_linear_2D_resampler import Online_Linear_2D_resampler
+from friture_extensions.spectrogram_column import pyx_spectrogram_columns
+
+HEIGHT = 120
+GAIN = 10. / np.log(10.) * 255. / 120.
+LUT = np.arange(256, dtype=np.uint32)
+
+
+def inputs(frames, seed=0):
+    '''Bins, power spectra and color offsets, with a weighting of +-10 dB.'''
+    freq = np.linspace(0., 24000., 1025)
+    offsets = 255. + 255. / 120. * np.random.default_rng(seed + 100).uniform(-10., 10., 1025)
+    return freq, spectra(1025, frames, seed), offsets
+
+
+def previous_path(freq, power, offsets, frequency_resampler, resampler):
+    # dB and color scale, then the frequency and the time resampling, then the colormap
+    x = GAIN * np.log(power + 1e-30) + offsets[:, np.newaxis]
+    x = resampler.process(frequency_resampler.process(freq, x))
+    return np.flipud(LUT[np.clip(x, 0., 255.).astype(np.intp)])
+
+
+def kernel(freq, power, offsets, frequency_resampler, resampler, decibels=False):
+    indptr, indices, weights = frequency_resampler.tables(freq)
+    image = np.zeros((HEIGHT, resampler.processable(power.shape[1])), dtype=np.uint32)
+    resampler.orig_index, resampler.resampled_index, n = pyx_spectrogram_columns(
+        power, indptr, indices, weights, offsets, GAIN, LUT, resampler.old_data,
+        resampler.orig_index, resampler.resampled_index, resampler.resampling_ratio, image, decibels)
+    assert n == image.shape[1]
+    return image
+
+
+def assert_same_colors(image, expected):
+    # float rounding can move a pixel that is right on a color boundary
+    assert image.shape == expected.shape
+    difference = np.abs(image.astype(np.int64) - expected.astype(np.int64))
+    assert difference.max() <= 1
+    assert np.count_nonzero(difference) < 1e-3 * difference.size
+
+
+@pytest.mark.parametrize("scale", [fscales.Linear, fscales.Logarithmic])
+@pytest.mark.parametrize("ratio", [(1, 1), (3, 7), (5, 2)])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_matches_the_previous_path(scale, ratio, dtype):
+    freq, power, offsets = inputs(200)
+    power = power.astype(dtype)
+
+    frequency_resampler = Frequency_Resampler(scale, 20., 20000., HEIGHT)
+    expected = previous_path(freq, power.astype(np.float64), offsets, frequency_resampler, Online_Linear_2D_resampler(*ratio, height=HEIGHT))
+
+    resampler = Online_Linear_2D_resampler(*ratio, height=HEIGHT)
+    assert_same_colors(kernel(freq, power, offsets, frequency_resampler, resampler), expected)
+
+
+def test_decibels_input():
+    freq, power, offsets = inputs(50, seed=1)
+    frequency_resampler = Frequency_Resampler(fscales.Mel, 20., 20000., HEIGHT)
+
+    from_power = kernel(freq, power, offsets, frequency_resampler, Online_Linear_2D_resampler(2, 3, HEIGHT))
+    from_decibels = kernel(freq, 10. * np.log10(power), offsets, frequency_resampler, Online_Linear_2D_resampler(2, 3, HEIGHT), decibels=True)
+
+    assert_same_colors(from_decibels, from_power)
+
+
+def test_chunks_give_the_same_image():
+    freq, power, offsets = inputs(300, seed=2)
+    frequency_resampler = Frequency_Resampler(fscales.Logarithmic, 20., 20000., HEIGHT)
+
+    whole = kernel(freq, power, offsets, frequency_resampler, Online_Linear_2D_resampler(3, 7, HEIGHT))
+
+    resampler = Online_Linear_2D_resampler(3, 7, HEIGHT)
+    chunks = [kernel(freq, np.ascontiguousarray(power[:, start:start + 17]), offsets, frequency_resampler, resampler)
+              for start in range(0, 300, 17)]
+
+    np.testing.assert_array_equal(np.hstack(chunks), whole)
+
+
+def test_refuses_a_small_image():
+    freq, power, offsets = inputs(10)
+    indptr, indices, weights = Frequency_Resampler(fscales.Linear, 20., 20000., HEIGHT).tables(freq)
+    image = np.zeros((HEIGHT, 8), dtype=np.uint32)
+
+    with pytest.raises(ValueError):
+        pyx_spectrogram_columns(power, indptr, indices, weights, offsets, GAIN, LUT, np.zeros(HEIGHT),
+                                0., 0., 1., image)
+    assert not image.any()
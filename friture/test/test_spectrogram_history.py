@@ -0,0 +1,89 @@
+import numpy as np
+
+import sys
+sys.path.insert(0, '.')
+
+from conftest import decibels, push_in_chunks, spectra
+import friture.plotting.frequency_scales as fscales
+import friture.spectrogram_history as spectrogram_history
+from friture.signal.frequency_resampler import Frequency_Resampler
+from friture.signal.online_linear_2D_resampler import Online_Linear_2D_resampler
+from friture.spectrogram_history import SpectrogramHistory
+from friture_extensions.spectrogram_column import pyx_spectrogram_columns
+
+
+def test_keeps_the_latest_columns():
+    power = spectra(65, 1000)
+
+    history = SpectrogramHistory(300)
+    push_in_chunks(history, power, 40)
+
+    assert history.count == 300
+    data = history.data()
+    assert data.shape == (65, 300)
+    assert data.dtype == np.float32
+    # float16 dB, better than 0.25 dB over the range of the power
+    np.testing.assert_allclose(data, decibels(power[:, -300:]), atol=0.25)
+
+
+def test_capacity_changes_keep_the_latest_columns():
+    power = spectra(33, 500, seed=1)
+
+    history = SpectrogramHistory(200)
+    push_in_chunks(history, power, 40)
+    expected = history.data()
+
+    history.set_capacity(50)
+    np.testing.assert_array_equal(history.data(), expected[:, -50:])
+
+    history.set_capacity(400)
+    assert history.capacity() == 400
+    np.testing.assert_array_equal(history.data(), expected[:, -50:])
+
+    history.push(power[:, :10])
+    assert history.count == 60
+
+
+def test_new_bins_clear_the_history():
+    history = SpectrogramHistory(100)
+    history.push(spectra(33, 80))
+    history.push(spectra(65, 5))
+
+    assert history.data().shape == (65, 5)
+
+
+def test_capacity_is_bounded(monkeypatch):
+    monkeypatch.setattr(spectrogram_history, "MAX_HISTORY_VALUES", 1000)
+
+    history = SpectrogramHistory(100)
+    history.push(spectra(65, 3))
+
+    assert history.capacity() == 1000 // 65
+
+
+def render(data, decibels):
+    freq = np.linspace(0., 24000., data.shape[0])
+    height = 100
+    gain = 10. / np.log(10.) * 255. / 120.
+    offsets = np.full(data.shape[0], 255.)
+    lut = np.arange(256, dtype=np.uint32)
+
+    indptr, indices, weights = Frequency_Resampler(fscales.Logarithmic, 20., 20000., height).tables(freq)
+    resampler = Online_Linear_2D_resampler(3, 7, height)
+    image = np.zeros((height, resampler.processable(data.shape[1])), dtype=np.uint32)
+    pyx_spectrogram_columns(data, indptr, indices, weights, offsets, gain, lut, resampler.old_data,
+                            0., 0., resampler.resampling_ratio, image, decibels)
+    return image
+
+
+def test_render_again_like_the_live_columns():
+    power = spectra(513, 400, seed=2)
+
+    history = SpectrogramHistory(400)
+    push_in_chunks(history, power, 40)
+
+    live = render(power, decibels=False)
+    again = render(history.data(), decibels=True)
+
+    # the float16 rounding is below the step of the colormap
+    assert np.abs(again.astype(np.int64) - live.astype(np.int64)).max() <= 1
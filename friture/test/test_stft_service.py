@@ -0,0 +1,135 @@
+import numpy as np
+
+import sys
+sys.path.insert(0, '.')
+
+from friture.audioproc import audioproc
+from friture.ringbuffer import RingBuffer, frames_view
+from friture.stft_service import STFTService
+
+FFT_SIZE = 256
+HOP = 128
+SAMPLERATE = 48000
+
+
+class AudioBuffer:
+
+    def __init__(self, signal):
+        self.ringbuffer = RingBuffer()
+        self.signal = signal
+        self.position = 0
+
+    def push(self, length):
+        self.ringbuffer.push(self.signal[:, self.position:self.position + length])
+        self.position += length
+
+
+def expected_spectra(signal, first_stop, count):
+    '''Power spectra of the count frames that end at first_stop, first_stop + HOP, ...'''
+    proc = audioproc()
+    proc.set_samplerate(SAMPLERATE)
+    proc.set_fftsize(FFT_SIZE)
+    frames = frames_view(signal[:, first_stop - FFT_SIZE:first_stop + (count - 1) * HOP], FFT_SIZE, HOP)
+    return np.array(proc.analyze_frames(frames))
+
+
+def test_subscribers_share_the_frames():
+    signal = np.random.default_rng(0).standard_normal((2, 20000))
+    audiobuffer = AudioBuffer(signal)
+    audiobuffer.push(FFT_SIZE)
+
+    service = STFTService()
+    first = service.subscribe(audiobuffer, [0, 1], FFT_SIZE, HOP, SAMPLERATE)
+    second = service.subscribe(audiobuffer, (0, 1), FFT_SIZE, HOP, SAMPLERATE)
+    other = service.subscribe(audiobuffer, (0,), FFT_SIZE, HOP, SAMPLERATE)
+
+    assert first.config is second.config
+    assert service.config_count() == 2
+
+    audiobuffer.push(1000)
+    spectra = np.array(first.fetch())
+    # the second subscriber gets the same batch, without computing it again, and only once
+    assert np.shares_memory(second.fetch(), first.config.spectra)
+    assert second.fetch().shape[2] == 0
+
+    assert spectra.shape == (2, FFT_SIZE // 2 + 1, 7)
+    np.testing.assert_allclose(spectra, expected_spectra(signal, FFT_SIZE + HOP, 7))
+    np.testing.assert_allclose(other.fetch(), spectra[:1])
+
+
+def test_subscribers_receive_each_frame_once():
+    signal = np.random.default_rng(1).standard_normal((1, 20000))
+    audiobuffer = AudioBuffer(signal)
+    audiobuffer.push(FFT_SIZE)
+
+    service = STFTService()
+    first = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+    second = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+
+    # the docks fetch once per delivery of the audio buffer, in any order
+    received = {first: [], second: []}
+    rng = np.random.default_rng(2)
+    for i in range(40):
+        audiobuffer.push(int(rng.integers(1, 500)))
+        for subscription in (first, second) if i % 2 == 0 else (second, first):
+            received[subscription].append(np.array(subscription.fetch()))
+
+    for subscription, batches in received.items():
+        spectra = np.concatenate(batches, axis=2)
+        np.testing.assert_allclose(spectra, expected_spectra(signal, FFT_SIZE + HOP, spectra.shape[2]))
+
+
+def test_late_subscriber_starts_with_the_next_frames():
+    signal = np.random.default_rng(3).standard_normal((1, 20000))
+    audiobuffer = AudioBuffer(signal)
+    audiobuffer.push(FFT_SIZE)
+
+    service = STFTService()
+    first = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+    audiobuffer.push(1000)
+    first.fetch()
+
+    second = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+    assert second.fetch().shape[2] == 0
+
+    audiobuffer.push(HOP)
+    np.testing.assert_allclose(second.fetch(), expected_spectra(signal, FFT_SIZE + 8 * HOP, 1))
+
+
+def test_configs_are_evicted_with_their_last_subscriber():
+    signal = np.random.default_rng(4).standard_normal((1, 20000))
+    audiobuffer = AudioBuffer(signal)
+    audiobuffer.push(FFT_SIZE)
+
+    service = STFTService()
+    first = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+    second = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+    audiobuffer.push(3 * HOP)
+    first.fetch()
+
+    # the batch of this delivery is still there for the remaining subscriber
+    first.unsubscribe()
+    first.unsubscribe()
+    assert service.config_count() == 1
+    np.testing.assert_allclose(second.fetch(), expected_spectra(signal, FFT_SIZE + HOP, 3))
+
+    # which goes on with the following frames
+    audiobuffer.push(2 * HOP)
+    np.testing.assert_allclose(second.fetch(), expected_spectra(signal, FFT_SIZE + 4 * HOP, 2))
+
+    second.unsubscribe()
+    assert service.config_count() == 0
+    assert len(audiobuffer.ringbuffer.readers) == 0
+
+    # a new configuration delivers all the frames that follow, without a gap
+    third = service.subscribe(audiobuffer, None, FFT_SIZE, HOP, SAMPLERATE)
+    assert service.config_count() == 1
+    batches = []
+    for i in range(5):
+        audiobuffer.push(300)
+        batches.append(np.array(third.fetch()))
+    spectra = np.concatenate(batches, axis=2)
+
+    first_stop = FFT_SIZE + 6 * HOP
+    assert spectra.shape[2] == (audiobuffer.position - first_stop) // HOP + 1
+    np.testing.assert_allclose(spectra, expected_spectra(signal, first_stop, spectra.shape[2]))
@@ -27,6 +27,18 @@ class Ui_Settings_Dialog(object):
         self.comboBox_inputDevice = QtWidgets.QComboBox(Settings_Dialog)
         self.comboBox_inputDevice.setObjectName("comboBox_inputDevice")
         self.verticalLayout_5.addWidget(self.comboBox_inputDevice)
+        self.label_samplerate = QtWidgets.QLabel(Settings_Dialog)
+        self.label_samplerate.setObjectName("label_samplerate")
+        self.verticalLayout_5.addWidget(self.label_samplerate)
+        self.comboBox_samplerate = QtWidgets.QComboBox(Settings_Dialog)
+        self.comboBox_samplerate.setObjectName("comboBox_samplerate")
+        self.verticalLayout_5.addWidget(self.comboBox_samplerate)
+        self.label_extraInputs = QtWidgets.QLabel(Settings_Dialog)
+        self.label_extraInputs.setObjectName("label_extraInputs")
+        self.verticalLayout_5.addWidget(self.label_extraInputs)
+        self.listWidget_extraInputs = QtWidgets.QListWidget(Settings_Dialog)
+        self.listWidget_extraInputs.setObjectName("listWidget_extraInputs")
+        self.verticalLayout_5.addWidget(self.listWidget_extraInputs)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout_5.addItem(spacerItem)
         self.horizontalLayout = QtWidgets.QHBoxLayout()
@@ -49,6 +61,10 @@ class Ui_Settings_Dialog(object):
         self.radioButton_duo.setObjectName("radioButton_duo")
         self.inputTypeButtonGroup.addButton(self.radioButton_duo)
         self.verticalLayout_3.addWidget(self.radioButton_duo)
+        self.radioButton_all = QtWidgets.QRadioButton(Settings_Dialog)
+        self.radioButton_all.setObjectName("radioButton_all")
+        self.inputTypeButtonGroup.addButton(self.radioButton_all)
+        self.verticalLayout_3.addWidget(self.radioButton_all)
         spacerItem2 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout_3.addItem(spacerItem2)
         self.horizontalLayout.addLayout(self.verticalLayout_3)
@@ -73,6 +89,9 @@ class Ui_Settings_Dialog(object):
         self.verticalLayout_4.addWidget(self.groupBox_second)
         self.horizontalLayout.addLayout(self.verticalLayout_4)
         self.verticalLayout_5.addLayout(self.horizontalLayout)
+        self.checkBox_float32 = QtWidgets.QCheckBox(Settings_Dialog)
+        self.checkBox_float32.setObjectName("checkBox_float32")
+        self.verticalLayout_5.addWidget(self.checkBox_float32)
 
         self.retranslateUi(Settings_Dialog)
         QtCore.QMetaObject.connectSlotsByName(Settings_Dialog)
@@ -81,8 +100,14 @@ class Ui_Settings_Dialog(object):
         _translate = QtCore.QCoreApplication.translate
         Settings_Dialog.setWindowTitle(_translate("Settings_Dialog", "Settings"))
         self.label_inputType_2.setText(_translate("Settings_Dialog", "Select the input device :"))
+        self.label_samplerate.setText(_translate("Settings_Dialog", "Select the sample rate :"))
+        self.label_extraInputs.setText(_translate("Settings_Dialog", "Additional input devices :"))
+        self.listWidget_extraInputs.setToolTip(_translate("Settings_Dialog", "Devices captured alongside the main input device, that the docks can select"))
         self.label_inputType.setText(_translate("Settings_Dialog", "Select the type of input :"))
         self.radioButton_single.setText(_translate("Settings_Dialog", "Single channel"))
         self.radioButton_duo.setText(_translate("Settings_Dialog", "Two channels"))
+        self.radioButton_all.setText(_translate("Settings_Dialog", "All channels"))
         self.groupBox_first.setTitle(_translate("Settings_Dialog", "First channel"))
         self.groupBox_second.setTitle(_translate("Settings_Dialog", "Second channel"))
+        self.checkBox_float32.setToolTip(_translate("Settings_Dialog", "Process the audio samples in single precision, which halves the memory bandwidth of the analysis"))
+        self.checkBox_float32.setText(_translate("Settings_Dialog", "Single precision processing (float32)"))
@@ -0,0 +1,122 @@
+import numpy as np
+
+# see INSTALL
+
+cimport cython
+from cython cimport floating
+
+# x can be float32 or float64, and y has the same type
+# the filters are always computed in float64
+# the states are (channels, size) float64 arrays, updated in place, and their last column
+# holds the number of input samples consumed, modulo 2, so that the chunks can have any length
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pyx_halfband_decimate(double[::1] coefs, floating[:, :] x, double[:, ::1] state):
+	# decimates by 2 each row of x, a (channels, samples) array, with a polyphase IIR half-band filter:
+	# H(z) = (A0(z^2) + z^-1 A1(z^2)) / 2, where A0 and A1 are cascades of first-order all-pass
+	# sections, with the even and the odd coefficients respectively
+	# the two branches run at the output rate, on the second and the first sample of each pair
+	# the state holds, for each section, its previous input and its previous output,
+	# then the first sample of an incomplete pair and the parity
+	cdef Py_ssize_t n_coefs = coefs.shape[0]
+	cdef Py_ssize_t n_channels = x.shape[0]
+	cdef Py_ssize_t len_x = x.shape[1]
+	cdef Py_ssize_t c, k, i, m
+	cdef Py_ssize_t parity, len_y
+	cdef double first, spl_0, spl_1, out
+
+	if state.shape[0] != n_channels or state.shape[1] != 2 * n_coefs + 2:
+		raise ValueError("The state must be a (%d, %d) array" % (n_channels, 2 * n_coefs + 2))
+
+	parity = <Py_ssize_t> state[0, 2 * n_coefs + 1] if n_channels > 0 else 0
+	len_y = (parity + len_x) // 2
+
+	cdef floating[:, ::1] y = np.empty((n_channels, len_y), dtype=np.asarray(x).dtype)
+
+	with nogil:
+		for c in range(n_channels):
+			first = state[c, 2 * n_coefs]
+			m = 0
+			for k in range(len_x):
+				if (parity + k) % 2 == 0:
+					first = x[c, k]
+					continue
+
+				spl_0 = x[c, k]
+				spl_1 = first
+
+				# x[i] = state[c, i], y[i] = state[c, n_coefs + i]
+				i = 0
+				while i < n_coefs:
+					out = (spl_0 - state[c, n_coefs + i]) * coefs[i] + state[c, i]
+					state[c, i] = spl_0
+					state[c, n_coefs + i] = out
+					spl_0 = out
+
+					if i + 1 < n_coefs:
+						out = (spl_1 - state[c, n_coefs + i + 1]) * coefs[i + 1] + state[c, i + 1]
+						state[c, i + 1] = spl_1
+						state[c, n_coefs + i + 1] = out
+						spl_1 = out
+
+					i += 2
+
+				y[c, m] = 0.5 * (spl_0 + spl_1)
+				m += 1
+
+			state[c, 2 * n_coefs] = first
+			state[c, 2 * n_coefs + 1] = (parity + len_x) % 2
+
+	return np.asarray(y)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pyx_fir_decimate(double[::1] b, floating[:, :] x, double[:, ::1] state):
+	# decimates by 2 each row of x, a (channels, samples) array, with a FIR filter,
+	# only computing the output samples that are kept, at the even input samples
+	# the state holds the last len(b) - 1 input samples, the most recent last, then the parity
+	cdef Py_ssize_t len_b = b.shape[0]
+	cdef Py_ssize_t n_history = len_b - 1
+	cdef Py_ssize_t n_channels = x.shape[0]
+	cdef Py_ssize_t len_x = x.shape[1]
+	cdef Py_ssize_t c, k, j, m, n
+	cdef Py_ssize_t parity, len_y
+	cdef double acc
+
+	if len_b == 0:
+		raise ValueError("The filter has no coefficients")
+	if state.shape[0] != n_channels or state.shape[1] != len_b:
+		raise ValueError("The state must be a (%d, %d) array" % (n_channels, len_b))
+
+	parity = <Py_ssize_t> state[0, n_history] if n_channels > 0 else 0
+	# the kept samples are the ones at an even position in the whole stream
+	len_y = max(0, (len_x - parity + 1) // 2)
+
+	cdef floating[:, ::1] y = np.empty((n_channels, len_y), dtype=np.asarray(x).dtype)
+	# the previous samples followed by the new ones
+	cdef double[::1] ext = np.empty(n_history + len_x)
+
+	with nogil:
+		for c in range(n_channels):
+			for j in range(n_history):
+				ext[j] = state[c, j]
+			for k in range(len_x):
+				ext[n_history + k] = x[c, k]
+
+			m = 0
+			for k in range(parity, len_x, 2):
+				# y[k] = sum of b[j] * x[k - j]
+				n = n_history + k
+				acc = 0.
+				for j in range(len_b):
+					acc = acc + b[j] * ext[n - j]
+				y[c, m] = acc
+				m += 1
+
+			for j in range(n_history):
+				state[c, j] = ext[len_x + j]
+			state[c, n_history] = (parity + len_x) % 2
+
+	return np.asarray(y)
@@ -0,0 +1,63 @@
+import numpy as np
+
+# see INSTALL
+
+cimport cython
+from cython cimport floating
+
+# x can be float32 or float64, the recursions are always computed in float64
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pyx_filter_bank_smoothed_energies(double[:, ::1] b,
+                                      double[:, ::1] a,
+                                      floating[:, :] x,
+                                      double[:, :, ::1] z,
+                                      double[::1] alphas,
+                                      double[:, ::1] energies):
+	# filters each row of x, a (channels, samples) array, with each filter of a bank of IIR filters
+	# of the same order, given as the rows of b and a (with a[:, 0] == 1), and smooths the energy
+	# of their outputs: s_i = alpha*y_i**2 + (1-alpha)*s_{i-1}, with one alpha per filter
+	# the filters are direct form II transposed, like pyx_lfilter_1D, and their outputs are not stored
+	# z holds the (filters, channels, order) filter delays and energies the (filters, channels)
+	# smoothed energies, they are both updated in place
+	cdef Py_ssize_t n_filters = b.shape[0]
+	cdef Py_ssize_t len_b = b.shape[1]
+	cdef Py_ssize_t n_channels = x.shape[0]
+	cdef Py_ssize_t len_x = x.shape[1]
+	cdef Py_ssize_t f, c, k, n
+	cdef double xk, yk, s, alpha, decay
+
+	if a.shape[0] != n_filters or a.shape[1] != len_b:
+		raise ValueError("a and b must be of the same shape")
+	if len_b == 0:
+		raise ValueError("The filters have no coefficients")
+	if z.shape[0] != n_filters or z.shape[1] != n_channels or z.shape[2] != len_b - 1:
+		raise ValueError("The filter delays must be a (%d, %d, %d) array" % (n_filters, n_channels, len_b - 1))
+	if alphas.shape[0] != n_filters:
+		raise ValueError("There are %d smoothing factors for %d filters" % (alphas.shape[0], n_filters))
+	if energies.shape[0] != n_filters or energies.shape[1] != n_channels:
+		raise ValueError("The energies must be a (%d, %d) array" % (n_filters, n_channels))
+
+	with nogil:
+		for f in range(n_filters):
+			alpha = alphas[f]
+			decay = 1. - alpha
+			for c in range(n_channels):
+				s = energies[f, c]
+				for k in range(len_x):
+					xk = x[c, k]
+					if len_b > 1:
+						yk = z[f, c, 0] + b[f, 0] * xk
+
+						for n in range(len_b - 2):
+							z[f, c, n] = z[f, c, 1 + n] + xk * b[f, 1 + n] - yk * a[f, 1 + n]
+
+						z[f, c, len_b - 2] = xk * b[f, len_b - 1] - yk * a[f, len_b - 1]
+					else:
+						yk = xk * b[f, 0]
+
+					s = decay * s + alpha * yk * yk
+				energies[f, c] = s
+
+	return np.asarray(energies)
@@ -7,13 +7,14 @@ dtype = np.float64
 ctypedef np.float64_t dtype_t
 
 cimport cython
+from cython cimport floating
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
-
-def pyx_lfilter_float64_1D(
+def pyx_lfilter_1D(
     np.ndarray[np.float64_t, ndim=1] b not None,
     np.ndarray[np.float64_t, ndim=1] a not None,
-    np.ndarray[np.float64_t, ndim=1] x not None,
+    np.ndarray[floating, ndim=1] x not None,
     np.ndarray[np.float64_t, ndim=1] zi not None):
 
     """
@@ -53,6 +54,9 @@ def pyx_lfilter_float64_1D(
 
     Notes
     -----
+    x can be float32 or float64, and y has the same type. The coefficients
+    and the filter delays are always float64.
+
     The filter function is implemented as a direct II transposed structure.
     This means that the filter implements
 
@@ -91,24 +95,75 @@ def pyx_lfilter_float64_1D(
     cdef Py_ssize_t len_b = b.shape[0]
     cdef np.int_t n
     cdef np.uint_t k
+    cdef double xk, yk
 
-    cdef np.ndarray[np.float64_t, ndim=1] y = np.empty(x.shape[0])
+    cdef np.ndarray[floating, ndim=1] y = np.empty(x.shape[0], dtype=x.dtype)
     cdef np.ndarray[np.float64_t, ndim=1] z = np.array(zi, copy=True)
 
     if len_b > 1:
         for k in range(len_x):
-            y[k] = z[0] + b[0] * x[k] # Calculate first delay (output)
+            # the recursion is computed in double precision, whatever the type of x
+            xk = x[k]
+            yk = z[0] + b[0] * xk # Calculate first delay (output)
+            y[k] = yk
 
             # Fill in middle delays
             for n in range(len_b - 2):
-                z[n] = z[1+n] + x[k] * b[1+n] - y[k] * a[1+n]
+                z[n] = z[1+n] + xk * b[1+n] - yk * a[1+n]
 
             # Calculate last delay
-            z[len_b - 2] = x[k] * b[len_b - 1] - y[k] * a[len_b - 1]
+            z[len_b - 2] = xk * b[len_b - 1] - yk * a[len_b - 1]
     else:
         for k in range(len_x):
             y[k] = x[k] * b[0]
 
 
 
-    return y, z
\ No newline at end of file
+    return y, z
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def pyx_lfilter_2D(
+    np.ndarray[np.float64_t, ndim=1] b not None,
+    np.ndarray[np.float64_t, ndim=1] a not None,
+    np.ndarray[floating, ndim=2] x not None,
+    np.ndarray[np.float64_t, ndim=2] zi not None):
+
+    """
+    Filter each row of x, a (channels, samples) array, with the same
+    IIR or FIR filter. See pyx_lfilter_1D.
+
+    zi holds the initial conditions of the filter delays of each channel,
+    as a (channels, max(len(a),len(b))-1) array. The final filter delays
+    are returned in an array of the same shape.
+    """
+
+    assert b.shape[0] == a.shape[0], "a and b must be of the same shape"
+    assert zi.shape[0] == x.shape[0]
+    assert zi.shape[1] == b.shape[0]-1
+
+    cdef Py_ssize_t n_channels = x.shape[0]
+    cdef Py_ssize_t len_x = x.shape[1]
+    cdef Py_ssize_t len_b = b.shape[0]
+    cdef Py_ssize_t c, k, n
+    cdef double xk, yk
+
+    cdef np.ndarray[floating, ndim=2] y = np.empty((n_channels, len_x), dtype=x.dtype)
+    cdef np.ndarray[np.float64_t, ndim=2] z = np.array(zi, copy=True)
+
+    for c in range(n_channels):
+        if len_b > 1:
+            for k in range(len_x):
+                xk = x[c, k]
+                yk = z[c, 0] + b[0] * xk
+                y[c, k] = yk
+
+                for n in range(len_b - 2):
+                    z[c, n] = z[c, 1+n] + xk * b[1+n] - yk * a[1+n]
+
+                z[c, len_b - 2] = xk * b[len_b - 1] - yk * a[len_b - 1]
+        else:
+            for k in range(len_x):
+                y[c, k] = x[c, k] * b[0]
+
+    return y, z
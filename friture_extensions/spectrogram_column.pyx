@@ -0,0 +1,123 @@
+import numpy as np
+
+# see INSTALL
+
+cimport cython
+from cython cimport floating
+from libc.math cimport log, ceil
+from libc.stdint cimport uint32_t
+
+# power can be float32 or float64, the computations are always done in float64
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def pyx_spectrogram_columns(floating[:, :] power,
+                            Py_ssize_t[::1] indptr,
+                            Py_ssize_t[::1] indices,
+                            double[::1] weights,
+                            double[::1] offsets,
+                            double gain,
+                            uint32_t[::1] lut,
+                            double[::1] previous,
+                            double orig_index,
+                            double resampled_index,
+                            double resampling_ratio,
+                            uint32_t[:, :] image,
+                            bint decibels=False):
+	# converts the (freq, frames) power spectra to the colors of the screen columns, in one pass:
+	# - dB, weighting and color scale: x = gain*log(p) + offsets[k], in units of lut entries
+	# - frequency resampling: row r is the sum of weights[k]*x[indices[k]] for k in indptr[r]:indptr[r + 1],
+	#   the sparse matrix of Frequency_Resampler.tables
+	# - time resampling: linear interpolation between consecutive frames, like Online_Linear_2D_resampler
+	# - clipping and colormap lookup, written to image[height - 1 - r, column] so that
+	#   the larger frequencies are at the top
+	# previous holds the last resampled frame, it is updated in place
+	# returns the new (orig_index, resampled_index) and the number of columns written
+	# with decibels, the input is 10*log10(p) instead of the power p
+	cdef Py_ssize_t Nf = power.shape[0]
+	cdef Py_ssize_t Nt = power.shape[1]
+	cdef Py_ssize_t height = indptr.shape[0] - 1
+	cdef Py_ssize_t nnz = indices.shape[0]
+	cdef Py_ssize_t top = lut.shape[0] - 1
+	cdef Py_ssize_t first, last, i, j, k, r, n
+	cdef Py_ssize_t column = 0
+	cdef double a, t, x
+	cdef double epsilon = 1e-30
+	# gain*log(p) = gain*log(10)/10 * 10*log10(p)
+	cdef double db_gain = gain * log(10.) / 10.
+
+	if previous.shape[0] != height or image.shape[0] != height:
+		raise ValueError("The tables, the previous frame and the image must have the same height")
+	if weights.shape[0] != nnz or indptr[0] != 0 or indptr[height] != nnz:
+		raise ValueError("The resampling tables are inconsistent")
+	if offsets.shape[0] != Nf:
+		raise ValueError("The offsets have %d bins, the spectra have %d" % (offsets.shape[0], Nf))
+	if height == 0 or nnz == 0 or top < 0:
+		return orig_index, resampled_index, 0
+
+	# only the bins that are used are converted to dB
+	first = indices[0]
+	last = indices[0]
+	for k in range(nnz):
+		first = min(first, indices[k])
+		last = max(last, indices[k])
+	for r in range(height):
+		if indptr[r + 1] < indptr[r]:
+			raise ValueError("The resampling tables are inconsistent")
+	if first < 0 or last >= Nf:
+		raise ValueError("The resampling tables are out of the spectra")
+
+	# the number of columns is checked before writing anything
+	a = orig_index
+	t = resampled_index
+	n = 0
+	for j in range(Nt):
+		a += 1.
+		k = <Py_ssize_t> ceil((a - (t + resampling_ratio)) / resampling_ratio)
+		for i in range(k):
+			t += resampling_ratio
+			n += 1
+	if n > image.shape[1]:
+		raise ValueError("The image has %d columns, %d are needed" % (image.shape[1], n))
+
+	cdef double[::1] db = np.empty(last - first + 1)
+	cdef double[::1] current = np.empty(height)
+
+	with nogil:
+		for j in range(Nt):
+			if decibels:
+				for k in range(first, last + 1):
+					db[k - first] = db_gain * power[k, j] + offsets[k]
+			else:
+				for k in range(first, last + 1):
+					db[k - first] = gain * log(power[k, j] + epsilon) + offsets[k]
+
+			for r in range(height):
+				x = 0.
+				for k in range(indptr[r], indptr[r + 1]):
+					x += weights[k] * db[indices[k] - first]
+				current[r] = x
+
+			orig_index += 1.
+			n = <Py_ssize_t> ceil((orig_index - (resampled_index + resampling_ratio)) / resampling_ratio)
+
+			for i in range(n):
+				resampled_index += resampling_ratio
+				a = orig_index - resampled_index
+				for r in range(height):
+					x = (1. - a) * current[r] + a * previous[r]
+					# also maps NaN to the first color
+					if not x > 0.:
+						k = 0
+					elif x >= top:
+						k = top
+					else:
+						k = <Py_ssize_t> x
+					image[height - 1 - r, column] = lut[k]
+				column += 1
+
+			for r in range(height):
+				previous[r] = current[r]
+
+	return orig_index, resampled_index, column
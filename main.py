@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
+import multiprocessing
+
 from friture.analyzer import main
 
 if __name__ == '__main__':
+    # the analysis workers are spawned from the frozen executable too
+    multiprocessing.freeze_support()
     main()
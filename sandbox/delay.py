@@ -21,7 +21,6 @@ from numpy import argmax
 import numpy
 import numpy as np
 from numpy.fft import rfft, irfft, fft, ifft
-from friture import generated_filters
 from friture.delay_estimator import DEFAULT_DELAYRANGE
 from friture.signal.decimate import decimate_multiple, decimate_multiple_filtic
 from scipy.io import wavfile
@@ -104,9 +103,8 @@ def main():
     # higher resolution even at low sample rates)
     Ndec = 2
     subsampled_sampling_rate = SAMPLING_RATE/2**(Ndec)
-    [bdec, adec] = generated_filters.PARAMS['dec']
-    zfs0 = decimate_multiple_filtic(Ndec, bdec, adec)
-    zfs1 = decimate_multiple_filtic(Ndec, bdec, adec)
+    zfs0 = decimate_multiple_filtic(Ndec)
+    zfs1 = decimate_multiple_filtic(Ndec)
     
     delayrange_s = DEFAULT_DELAYRANGE # confidence range
 
@@ -115,9 +113,9 @@ def main():
     x1 = m
     #subsample them
     print("subsampling x0")
-    x0_dec, zfs0 = decimate_multiple(Ndec, bdec, adec, x0, zfs0)
+    x0_dec, zfs0 = decimate_multiple(Ndec, x0, zfs0)
     print("subsampling x1")
-    x1_dec, zfs1 = decimate_multiple(Ndec, bdec, adec, x1, zfs1)
+    x1_dec, zfs1 = decimate_multiple(Ndec, x1, zfs1)
 
     time = 2*delayrange_s
     length = time*subsampled_sampling_rate
@@ -12,7 +12,7 @@ from scipy.signal.signaltools import lfilter
 from scipy.signal import remez
 from scipy.signal.filter_design import ellip, butter, firwin, cheby1, iirdesign, freqz
 
-from filter import octave_frequencies, octave_filter_bank, octave_filter_bank_decimation
+from filter import octave_frequencies, octave_filter_bank, octave_filter_bank_decimation, octave_filter_bank_decimation_filtic
 
 # bank of filters for any other kind of frequency scale
 # http://cobweb.ecn.purdue.edu/~malcolm/apple/tr35/PattersonsEar.pdf
@@ -290,7 +290,9 @@ def main():
 	legend()
 	
 	[boct, aoct, fi, flow, fhigh] = octave_filters_oneoctave(Nbands, BandsPerOctave)
-	y, dec, zfs = octave_filter_bank_decimation(bdec, adec, boct, aoct, impulse)
+	# the decimation uses the half-band filter of friture.signal.decimate, bdec and adec are only compared
+	zis = octave_filter_bank_decimation_filtic(boct, aoct)
+	y, dec, zfs = octave_filter_bank_decimation(boct, aoct, impulse, zis)
 	print("Filter lengths with decimation")
 	print(len(bdec), len(adec))
 	for b, a in zip(boct, aoct):
@@ -39,10 +39,12 @@ class LateIncludeExtension(Extension):
 # extensions
 ext_modules = [LateIncludeExtension("friture_extensions.exp_smoothing_conv",
                                     ["friture_extensions/exp_smoothing_conv.pyx"]),
-               LateIncludeExtension("friture_extensions.linear_interp",
-                                    ["friture_extensions/linear_interp.pyx"]),
-               LateIncludeExtension("friture_extensions.lookup_table",
-                                    ["friture_extensions/lookup_table.pyx"]),
+               LateIncludeExtension("friture_extensions.spectrogram_column",
+                                    ["friture_extensions/spectrogram_column.pyx"]),
+               LateIncludeExtension("friture_extensions.decimator",
+                                    ["friture_extensions/decimator.pyx"]),
+               LateIncludeExtension("friture_extensions.filter_bank",
+                                    ["friture_extensions/filter_bank.pyx"]),
                LateIncludeExtension("friture_extensions.lfilter",
                                     ["friture_extensions/lfilter.pyx"])]
 